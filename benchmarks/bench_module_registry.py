@@ -0,0 +1,127 @@
+"""
+Measures worker cold start with many liquidity modules: importing and instantiating every module eagerly, against a
+ModuleRegistry built by scanning the sources or read from the manifest, which imports only the module that is quoted.
+
+Every measurement runs in a fresh interpreter, after a first eager import has written the bytecode caches, as on a
+deployed worker.
+
+Usage: python -m benchmarks.bench_module_registry [--modules 1 50 500] [--functions 40] [--repeat 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from engine.module_registry import MANIFEST_NAME, scan_modules, write_manifest
+
+MODULE_TEMPLATE = '''from decimal import Decimal
+from typing import Dict, Optional
+
+from templates.liquidity_module import LiquidityModule, Token
+
+FEE_RATE = {index}
+
+
+{helpers}
+
+
+class Synthetic{index}LiquidityModule(LiquidityModule):
+    def __init__(self):
+        self.curve = [helper_0(value) for value in range(16)]
+
+    def get_amount_out(self, pool_state: Dict, fixed_parameters: Dict, input_token: Token, output_token: Token, input_amount: int) -> tuple[int | None, int | None]:
+        fee = input_amount * (FEE_RATE % 30) // 10**4
+        x, y = pool_state["reserve_in"], pool_state["reserve_out"]
+        return fee, y * (input_amount - fee) // (x + input_amount - fee)
+
+    def get_amount_in(self, pool_state: Dict, fixed_parameters: Dict, input_token: Token, output_token: Token, output_amount: int) -> tuple[int | None, int | None]:
+        return None, None
+
+    def get_apy(self, pool_state: Dict) -> Decimal:
+        return Decimal(0)
+
+    def get_tvl(self, pool_state: Dict, token: Optional[Token] = None) -> Decimal:
+        return Decimal(pool_state["reserve_in"] + pool_state["reserve_out"])
+'''
+
+HELPER_TEMPLATE = '''def helper_{number}(value: int) -> int:
+    # stands in for the pricing helpers a real module defines
+    total = value
+    for step in range({number} % 7 + 1):
+        total = (total * 1664525 + 1013904223 + step) % 2**32
+    return total'''
+
+# Each mode runs in a fresh interpreter; it prints how long it took
+MODES = {
+    "eager": """
+import importlib, os
+start = time.perf_counter()
+for file_name in sorted(os.listdir(directory)):
+    if file_name.endswith("_liquidity_module.py"):
+        module = importlib.import_module(package + "." + file_name[:-3])
+        for name, value in vars(module).items():
+            if name.endswith("LiquidityModule") and name != "LiquidityModule":
+                instance = value()
+""",
+    "scan": """
+from engine.module_registry import ModuleRegistry, scan_modules
+start = time.perf_counter()
+registry = ModuleRegistry(scan_modules(directory, package))
+""",
+    "manifest": """
+from engine.module_registry import ModuleRegistry
+start = time.perf_counter()
+registry = ModuleRegistry.load(directory, package)
+""",
+    "manifest + quote": """
+from engine.module_registry import ModuleRegistry
+start = time.perf_counter()
+registry = ModuleRegistry.load(directory, package)
+quote = registry.get_amount_out("synthetic0", {"reserve_in": 10**21, "reserve_out": 10**21}, {}, None, None, 10**18)
+""",
+}
+
+
+def write_modules(directory: str, count: int, functions: int):
+    os.makedirs(directory)
+    helpers = "\n\n\n".join(HELPER_TEMPLATE.format(number=number) for number in range(functions))
+    for index in range(count):
+        with open(os.path.join(directory, f"synthetic{index}_liquidity_module.py"), "w") as file:
+            file.write(MODULE_TEMPLATE.format(index=index, helpers=helpers))
+
+
+def run_mode(mode: str, root: str, directory: str, package: str) -> tuple[float, float]:
+    # The time the mode took inside the interpreter, and the wall time of the whole process
+    code = f"import time\ndirectory, package = {directory!r}, {package!r}\n" + MODES[mode] + "print(time.perf_counter() - start)\n"
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([os.getcwd(), root]))
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], env=environment, check=True, capture_output=True, text=True).stdout
+    return float(output), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", type=int, nargs="+", default=[1, 50, 500], help="module counts")
+    parser.add_argument("--functions", type=int, default=40, help="helper functions per synthetic module")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    print(f"{'modules':>8}{'mode':>18}{'startup (ms)':>14}{'process (ms)':>14}")
+    with tempfile.TemporaryDirectory() as root:
+        for count in args.modules:
+            package = f"synthetic_modules_{count}"
+            directory = os.path.join(root, package)
+            write_modules(directory, count, args.functions)
+            write_manifest(os.path.join(directory, MANIFEST_NAME), scan_modules(directory, package))
+            # writes the bytecode caches
+            run_mode("eager", root, directory, package)
+            for mode in MODES:
+                runs = [run_mode(mode, root, directory, package) for _ in range(args.repeat)]
+                startup, process = min(run[0] for run in runs), min(run[1] for run in runs)
+                print(f"{count:>8}{mode:>18}{startup * 1e3:>14.2f}{process * 1e3:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Splits one USDC -> cbBTC order across 2, 8 and 32 WOOFi venues with marginal-rate equalization and with the greedy
+chunk fallback, comparing time, quote calls and total output.
+
+Usage: python -m benchmarks.bench_order_splitting [--venues 2 8 32] [--chunks 100] [--seed 7]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, woofi_fixed_parameters, woofi_pool_state
+from engine.order_splitting import Venue, split_order
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from templates.liquidity_module import LiquidityModule
+
+
+class CountingModule(WOOFiLiquidityModule):
+    calls = 0
+
+    def get_amount_out(self, *args):
+        self.calls += 1
+        return super().get_amount_out(*args)
+
+    def get_marginal_rate(self, *args):
+        self.calls += 1
+        return super().get_marginal_rate(*args)
+
+
+class QuoteOnlyModule(LiquidityModule):
+    # A module with only the required interface, which forces the greedy fallback
+    def __init__(self, module: LiquidityModule):
+        self.module = module
+
+    def get_amount_out(self, *args):
+        return self.module.get_amount_out(*args)
+
+    def get_amount_in(self, *args):
+        return self.module.get_amount_in(*args)
+
+    def get_apy(self, pool_state):
+        pass
+
+    def get_tvl(self, pool_state, token=None):
+        pass
+
+
+def random_pool_states(count: int, rng: random.Random) -> list[dict]:
+    pool_states = []
+    for _ in range(count):
+        pool_state = woofi_pool_state()
+        pool_state["output_token_price"] = int(pool_state["output_token_price"] * rng.uniform(0.995, 1.005))
+        pool_state["output_token_spread"] = int(pool_state["output_token_spread"] * rng.uniform(0.5, 2))
+        pool_state["output_token_coeff"] = int(pool_state["output_token_coeff"] * rng.uniform(0.3, 3))
+        pool_state["output_token_reserve"] = int(pool_state["output_token_reserve"] * rng.uniform(0.05, 1))
+        pool_states.append(pool_state)
+    return pool_states
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--venues", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--chunks", type=int, default=100, help="chunks of the greedy fallback")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fixed_parameters = woofi_fixed_parameters()
+    print(f"{'venues':>7}{'order (USDC)':>14}{'method':>15}{'time (ms)':>11}{'calls':>8}{'output (cbBTC)':>16}{'unfilled':>10}")
+    for count in args.venues:
+        pool_states = random_pool_states(count, rng)
+        for input_amount in [10**9, 10**11, count * 5 * 10**11]:
+            module = CountingModule()
+            for venue_module in (module, QuoteOnlyModule(module)):
+                module.calls = 0
+                venues = [Venue(venue_module, pool_state, fixed_parameters) for pool_state in pool_states]
+                start = time.perf_counter()
+                split = split_order(venues, USDC, CBBTC, input_amount, greedy_chunks=args.chunks)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{count:>7}{input_amount / 10**6:>14,.0f}{split.method:>15}{elapsed * 1e3:>11.2f}{module.calls:>8}"
+                    f"{split.total_amount_out / 10**8:>16.8f}{split.unfilled_amount / 10**6:>10,.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Measures quoting hundreds of candidate multi-hop routes for one order: each route chained on its own, against
+quote_routes_out, which quotes every shared prefix once.
+
+Usage: python -m benchmarks.bench_path_quoting [--first 2 4] [--second 10] [--third 15] [--prepared] [--repeat 5]
+"""
+import argparse
+import itertools
+import time
+from decimal import Decimal
+
+from benchmarks.woofi_fixtures import USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.path_quoting import Hop, PathQuote, quote_routes_out
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from templates.liquidity_module import Token
+
+
+class CountingModule(WOOFiLiquidityModule):
+    calls = 0
+
+    def get_amount_out(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        CountingModule.calls += 1
+        return super().get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
+
+
+def build_hops(module: WOOFiLiquidityModule, first: int, second: int, third: int, prepared: bool) -> tuple[list, dict, dict]:
+    # WETH -> USDC on `first` deployments, then USDC -> Bi and Bi -> Cj on the first deployment
+    pool_state = woofi_pool_state()
+    record = {field: pool_state["input_token_" + field] for field in TOKEN_STATE_FIELDS}
+    middle = [Token(address=f"0x{index:040x}", decimals=18, symbol=f"B{index}", reference_price=Decimal(1)) for index in range(1, second + 1)]
+    final = [Token(address=f"0x{index:040x}", decimals=18, symbol=f"C{index}", reference_price=Decimal(1)) for index in range(101, third + 101)]
+
+    stores = []
+    for deployment in range(first):
+        store = WOOFiStateStore(woofi_fixed_parameters(), 10**15)
+        store.set_token(WETH, **dict(record, price=record["price"] + deployment))
+        for index, token in enumerate(middle + final):
+            store.set_token(token, **dict(record, price=10**8 + index, reserve=10**30))
+        stores.append(store)
+
+    def hop(store: WOOFiStateStore, input_token: Token, output_token: Token) -> Hop:
+        pool_state = dict(store.pair_state(input_token, output_token))
+        if prepared:
+            return Hop(module, module.prepare_pool(pool_state, store.fixed_parameters, input_token, output_token), None, input_token, output_token)
+        return Hop(module, pool_state, store.fixed_parameters, input_token, output_token)
+
+    first_hops = [hop(store, WETH, USDC) for store in stores]
+    second_hops = {token: hop(stores[0], USDC, token) for token in middle}
+    third_hops = {token: [hop(stores[0], token, output_token) for output_token in final] for token in middle}
+    return first_hops, second_hops, third_hops
+
+
+def chain(route: list[Hop], input_amount: int) -> PathQuote | None:
+    # Quoting one route hop by hop, as the router did by hand
+    amounts, fees = [input_amount], []
+    for hop in route:
+        fee, amount = hop.module.get_amount_out(hop.pool_state, hop.fixed_parameters, hop.input_token, hop.output_token, amounts[-1])
+        if amount is None:
+            return None
+        amounts.append(amount)
+        fees.append(fee)
+    return PathQuote(amounts, fees)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--first", type=int, nargs="+", default=[2, 4], help="distinct first hops")
+    parser.add_argument("--second", type=int, default=10, help="distinct second hops")
+    parser.add_argument("--third", type=int, default=15, help="third hops per second hop")
+    parser.add_argument("--prepared", action="store_true", help="quote prepared pools instead of pairwise pool_state dicts")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    module = CountingModule()
+    input_amount = 10**17
+
+    print(f"{'routes':>8}{'naive quotes':>14}{'tree quotes':>13}{'naive (ms)':>12}{'tree (ms)':>11}{'speedup':>10}")
+    for first in args.first:
+        first_hops, second_hops, third_hops = build_hops(module, first, args.second, args.third, args.prepared)
+        # WETH -> USDC -> Bi -> Cj for every combination
+        routes = [[a, second_hops[token], c] for a, token in itertools.product(first_hops, second_hops) for c in third_hops[token]]
+
+        results = {}
+        for name, function in [
+            ("naive", lambda: [chain(route, input_amount) for route in routes]),
+            ("tree", lambda: quote_routes_out(routes, input_amount)),
+        ]:
+            CountingModule.calls = 0
+            results[name] = function()
+            calls = CountingModule.calls
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                function()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[name + "_stats"] = (calls, best)
+        assert results["naive"] == results["tree"]
+        (naive_calls, naive_time), (tree_calls, tree_time) = results["naive_stats"], results["tree_stats"]
+        print(f"{len(routes):>8}{naive_calls:>14}{tree_calls:>13}{naive_time * 1e3:>12.2f}{tree_time * 1e3:>11.2f}{naive_time / tree_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Load-generates the quote server over a Unix socket: throughput and latency percentiles for a range of worker counts,
+against quoting in-process.
+
+Usage: python -m benchmarks.bench_quote_server [--workers 1 2 4] [--connections 8] [--depth 32] [--requests 20000]
+           [--window-us 500] [--max-batch 256]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.quote_server import QuoteClient, QuoteServer
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+
+
+POOL = "weth-cbbtc"
+
+
+def run_server(path: str, workers: int, batch_window: float, max_batch: int, ready):
+    # The server process; it stops on SIGTERM
+    server = QuoteServer(WOOFiLiquidityModule, workers, batch_window, max_batch)
+    for token in (WETH, CBBTC, USDC):
+        server.add_token(token)
+    server.set_pool(POOL, woofi_pool_state(), woofi_fixed_parameters())
+
+    async def serve():
+        stopped = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set_result, None)
+        listener = await server.serve_unix(path)
+        ready.set()
+        await stopped
+        listener.close()
+
+    try:
+        asyncio.run(serve())
+    finally:
+        server.close()
+
+
+async def generate_load(path: str, connections: int, depth: int, requests: int) -> tuple[float, list[float]]:
+    # `connections` clients, each keeping `depth` requests in flight, until `requests` are answered
+    clients = [await QuoteClient.connect_unix(path) for _ in range(connections)]
+    latencies = []
+    remaining = requests
+
+    async def sender(client: QuoteClient, index: int):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            _, amount = await client.quote_out(POOL, WETH.address, CBBTC.address, 10**16 + index)
+            latencies.append(time.perf_counter() - start)
+            assert amount is not None
+
+    # warm the workers' prepared pools
+    await asyncio.gather(*(client.quote_out(POOL, WETH.address, CBBTC.address, 10**16) for client in clients for _ in range(depth)))
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(client, index) for client in clients for index in range(depth)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    return elapsed, latencies
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker process counts")
+    parser.add_argument("--connections", type=int, default=8, help="client connections")
+    parser.add_argument("--depth", type=int, default=32, help="requests in flight per connection")
+    parser.add_argument("--requests", type=int, default=20000, help="requests per measurement")
+    parser.add_argument("--window-us", type=float, default=500, help="micro-batching window in microseconds")
+    parser.add_argument("--max-batch", type=int, default=256, help="requests per batch")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    prepared = module.prepare_pool(woofi_pool_state(), woofi_fixed_parameters(), WETH, CBBTC)
+    start = time.perf_counter()
+    for index in range(args.requests):
+        module.get_amount_out(prepared, None, WETH, CBBTC, 10**16 + index)
+    in_process = args.requests / (time.perf_counter() - start)
+
+    print(f"{os.cpu_count()} CPUs, {args.connections} connections x {args.depth} in flight")
+    print(f"{'workers':>8}{'quotes/s':>12}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    print(f"{'inline':>8}{in_process:>12.0f}{'-':>10}{'-':>10}")
+    context = multiprocessing.get_context()
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in args.workers:
+            path = os.path.join(directory, f"quotes-{workers}.sock")
+            ready = context.Event()
+            process = context.Process(target=run_server, args=(path, workers, args.window_us / 1e6, args.max_batch, ready))
+            process.start()
+            try:
+                if not ready.wait(30):
+                    raise RuntimeError("the quote server did not start")
+                elapsed, latencies = asyncio.run(generate_load(path, args.connections, args.depth, args.requests))
+            finally:
+                process.terminate()
+                process.join()
+            print(f"{workers:>8}{len(latencies) / elapsed:>12.0f}{percentile(latencies, 0.5) * 1e3:>10.2f}{percentile(latencies, 0.99) * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measures replaying a synthetic trade history: loading every snapshot and trade into memory and quoting one trade at a
+time, against the streaming replay engine in one process and sharded over several.
+
+Usage: python -m benchmarks.bench_replay [--blocks 2000 8000] [--pools 20] [--trades-per-block 5] [--processes 1 2 4]
+"""
+import argparse
+import bisect
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.quote_server import encode_fixed_parameters, encode_token
+from engine.replay import jsonl_states, read_trades, replay_sharded, run_replay
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+
+
+def write_history(directory: str, blocks: int, pools: int, trades_per_block: int, state_every: int = 10, seed: int = 0) -> tuple[str, str, str]:
+    generator = random.Random(seed)
+    fixed_parameters = encode_fixed_parameters(woofi_fixed_parameters())
+    pools_path = os.path.join(directory, "pools.json")
+    with open(pools_path, "w") as file:
+        json.dump({"tokens": [encode_token(token) for token in (WETH, CBBTC, USDC)], "pools": {f"p{pool}": {"fixed_parameters": fixed_parameters} for pool in range(pools)}}, file)
+
+    states_path, trades_path = os.path.join(directory, "states.jsonl"), os.path.join(directory, "trades.jsonl")
+    pool_state = woofi_pool_state()
+    with open(states_path, "w") as states, open(trades_path, "w") as trades:
+        for block in range(blocks):
+            if block % state_every == 0:
+                for pool in range(pools):
+                    state = dict(pool_state, input_token_price=pool_state["input_token_price"] + generator.randrange(10**8))
+                    states.write(json.dumps({"block": block, "pool": f"p{pool}", "input_token": WETH.address, "output_token": CBBTC.address, "pool_state": state}) + "\n")
+            for _ in range(trades_per_block):
+                trades.write(json.dumps({
+                    "block": block, "pool": f"p{generator.randrange(pools)}", "input_token": WETH.address,
+                    "output_token": CBBTC.address, "amount_in": generator.randrange(10**16, 10**19),
+                }) + "\n")
+    return pools_path, states_path, trades_path
+
+
+def in_memory(module, pools_path: str, states_path: str, trades_path: str, results_path: str) -> int:
+    # The status quo: load the whole history, then quote trade by trade and dump the results at the end
+    with open(pools_path) as file:
+        pools = json.load(file)["pools"]
+    fixed_parameters = woofi_fixed_parameters()
+    with open(states_path) as file:
+        states = [json.loads(line) for line in file]
+    with open(trades_path) as file:
+        trades = [json.loads(line) for line in file]
+    history = {}
+    for state in states:
+        history.setdefault(state["pool"], ([], []))
+        history[state["pool"]][0].append(state["block"])
+        history[state["pool"]][1].append(state["pool_state"])
+    results = []
+    for trade in trades:
+        blocks, pool_states = history[trade["pool"]]
+        assert trade["pool"] in pools
+        pool_state = pool_states[bisect.bisect_right(blocks, trade["block"]) - 1]
+        fee, amount_out = module.get_amount_out(pool_state, fixed_parameters, WETH, CBBTC, trade["amount_in"])
+        results.append(dict(trade, fee=fee, amount_out=amount_out))
+    with open(results_path, "w") as file:
+        for result in results:
+            file.write(json.dumps(result) + "\n")
+    return len(results)
+
+
+def streaming(module, pools_path: str, states_path: str, trades_path: str, results_path: str) -> int:
+    with open(results_path, "w") as results:
+        return run_replay(module, jsonl_states(states_path, pools_path), read_trades(trades_path), results).trades
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--blocks", type=int, nargs="+", default=[2000, 8000], help="history lengths in blocks")
+    parser.add_argument("--pools", type=int, default=20, help="pools in the history")
+    parser.add_argument("--trades-per-block", type=int, default=5, help="trades per block")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="process counts for the sharded replay")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'blocks':>8}{'trades':>9}{'method':>14}{'trades/s':>11}{'peak MiB':>10}")
+    for blocks in args.blocks:
+        with tempfile.TemporaryDirectory() as directory:
+            pools_path, states_path, trades_path = write_history(directory, blocks, args.pools, args.trades_per_block)
+            results_path = os.path.join(directory, "results.jsonl")
+            for name, function in [("in-memory", in_memory), ("streaming", streaming)]:
+                start = time.perf_counter()
+                count = function(module, pools_path, states_path, trades_path, results_path)
+                elapsed = time.perf_counter() - start
+                tracemalloc.start()
+                function(module, pools_path, states_path, trades_path, results_path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{blocks:>8}{count:>9}{name:>14}{count / elapsed:>11.0f}{peak / 2**20:>10.2f}")
+
+            open_states = partial(jsonl_states, states_path, pools_path)
+            for processes in args.processes:
+                output = os.path.join(directory, f"sharded-{processes}")
+                os.makedirs(output)
+                start = time.perf_counter()
+                summary = replay_sharded(WOOFiLiquidityModule, open_states, trades_path, processes, output)
+                elapsed = time.perf_counter() - start
+                print(f"{blocks:>8}{summary.trades:>9}{f'{processes} processes':>14}{summary.trades / elapsed:>11.0f}{'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Measures ingesting bursts of oracle updates while quoting: rebuilding the pairwise pool_state dicts of a token on every
+event, as the indexer did, against a StatePipeline that coalesces each tick into one WOOFiStateStore version.
+
+Usage: python -m benchmarks.bench_state_pipeline [--tokens 50] [--bursts 50] [--burst 500] [--period-ms 20] [--tick-ms 1]
+"""
+import argparse
+import asyncio
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.woofi_fixtures import USDC, woofi_fixed_parameters, woofi_pool_state
+from engine.state_pipeline import StateEvent, StatePipeline
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from templates.liquidity_module import Token
+
+
+def build_store(count: int) -> tuple[WOOFiStateStore, list[Token]]:
+    pool_state = woofi_pool_state()
+    record = {field: pool_state["input_token_" + field] for field in TOKEN_STATE_FIELDS}
+    tokens = [Token(address=f"0x{index:040x}", decimals=18, symbol=f"T{index}", reference_price=Decimal(1)) for index in range(1, count + 1)]
+    store = WOOFiStateStore(woofi_fixed_parameters(), pool_state["quote_token_reserve"])
+    for token in tokens:
+        store.set_token(token, **record)
+    return store, tokens
+
+
+async def bursts(tokens: list[Token], count: int, size: int, period: float, seed: int = 0):
+    # `count` bursts of `size` price ticks on random tokens, `period` seconds apart
+    generator = random.Random(seed)
+    addresses = [token.address for token in tokens]
+    for _ in range(count):
+        for _ in range(size):
+            yield StateEvent(generator.choice(addresses), {"price": 175000000000 + generator.randrange(10**6)})
+        await asyncio.sleep(period)
+
+
+async def quoter(quote, stop: asyncio.Event) -> list[float]:
+    # Quotes one pair in a loop, yielding to the event loop between quotes; returns the gaps between quotes
+    gaps = []
+    last = time.perf_counter()
+    while not stop.is_set():
+        quote()
+        await asyncio.sleep(0)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+    return gaps
+
+
+async def per_event(store: WOOFiStateStore, tokens: list[Token], source, module: WOOFiLiquidityModule) -> tuple[float, list[float], int]:
+    # Every event updates the store and rebuilds the pool_state dict of every pair the token is part of
+    pairs = [(a, b) for a in tokens + [USDC] for b in tokens + [USDC] if a is not b]
+    by_token = {}
+    for pair in pairs:
+        for token in pair:
+            by_token.setdefault(token.address, []).append(pair)
+    states = {pair: dict(store.pair_state(*pair)) for pair in pairs}
+    fixed_parameters, first = store.fixed_parameters, tokens[0]
+
+    stop = asyncio.Event()
+    quoting = asyncio.create_task(quoter(lambda: module.get_amount_out(states[first, USDC], fixed_parameters, first, USDC, 10**17), stop))
+    start = time.perf_counter()
+    events = 0
+    async for key, fields in source:
+        store.update_token(key, **fields)
+        for pair in by_token[key]:
+            states[pair] = dict(store.pair_state(*pair))
+        events += 1
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await quoting, events
+
+
+async def pipelined(store: WOOFiStateStore, tokens: list[Token], source, module: WOOFiLiquidityModule, tick: float) -> tuple[float, list[float], StatePipeline]:
+    pipeline = StatePipeline(store, WOOFiStateStore.with_updates, tick=tick)
+    first = tokens[0]
+    stop = asyncio.Event()
+    quoting = asyncio.create_task(quoter(lambda: module.get_amount_out(pipeline.current.state.prepare_pool(first, USDC), None, first, USDC, 10**17), stop))
+    start = time.perf_counter()
+    await pipeline.run(source)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await quoting, pipeline
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=50, help="base tokens in the pool")
+    parser.add_argument("--bursts", type=int, default=50, help="bursts of updates")
+    parser.add_argument("--burst", type=int, default=500, help="updates per burst")
+    parser.add_argument("--period-ms", type=float, default=20, help="milliseconds between bursts")
+    parser.add_argument("--tick-ms", type=float, default=1, help="pipeline tick in milliseconds")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    period, tick = args.period_ms / 1e3, args.tick_ms / 1e3
+
+    store, tokens = build_store(args.tokens)
+    elapsed, gaps, events = asyncio.run(per_event(store, tokens, bursts(tokens, args.bursts, args.burst, period), module))
+    print(f"{args.bursts} bursts of {args.burst} updates over {args.tokens} tokens, {args.period_ms:g} ms apart")
+    print(f"{'method':>10}{'seconds':>9}{'quotes':>9}{'p99 stall (ms)':>16}{'max stall (ms)':>16}{'versions':>10}{'coalesce':>10}{'p99 lag (ms)':>14}")
+    print(f"{'per-event':>10}{elapsed:>9.2f}{len(gaps):>9}{percentile(gaps, 0.99) * 1e3:>16.2f}{max(gaps) * 1e3:>16.2f}{events:>10}{1:>10.1f}{'-':>14}")
+
+    store, tokens = build_store(args.tokens)
+    elapsed, gaps, pipeline = asyncio.run(pipelined(store, tokens, bursts(tokens, args.bursts, args.burst, period), module, tick))
+    metrics = pipeline.metrics()
+    print(
+        f"{'pipeline':>10}{elapsed:>9.2f}{len(gaps):>9}{percentile(gaps, 0.99) * 1e3:>16.2f}{max(gaps) * 1e3:>16.2f}"
+        f"{metrics.versions:>10}{metrics.coalesce_ratio:>10.1f}{metrics.lag_p99 * 1e3:>14.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
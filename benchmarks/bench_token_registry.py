@@ -0,0 +1,99 @@
+"""
+Measures the memory of many Token objects with and without __slots__ and interning, and the cost of resolving the
+WOOFi swap direction by address comparison against a PairTable lookup on registered token ids, and of the dict path
+of get_amount_out with either.
+
+Usage: python -m benchmarks.bench_token_registry [--tokens 50000] [--lookups 200000]
+"""
+import argparse
+import time
+import tracemalloc
+from decimal import Decimal
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.token_registry import PairTable, TokenRegistry
+from modules.woofi_liquidity_module import WOOFiLiquidityModule, swap_direction
+from templates.liquidity_module import Token
+
+
+class DictToken:
+    # Token as it was before __slots__
+    def __init__(self, address: str, symbol: str, decimals: int, reference_price: Decimal):
+        self.address = address
+        self.symbol = symbol
+        self.decimals = decimals
+        self.reference_price = reference_price
+
+
+def measure_memory(build) -> tuple[int, object]:
+    tracemalloc.start()
+    objects = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, objects
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=50000, help="number of tokens")
+    parser.add_argument("--lookups", type=int, default=200000, help="direction lookups per measurement")
+    args = parser.parse_args()
+
+    price = Decimal(1)
+
+    def addresses():
+        # every token is seen twice, once checksummed and once lower case, as when several sources feed the router;
+        # each address is a fresh string, as decoded from a message
+        for index in range(args.tokens):
+            yield f"0x{index:040X}".replace("0X", "0x")
+            yield f"0x{index:040x}"
+
+    def registered_tokens():
+        registry = TokenRegistry()
+        tokens = [registry.register(address, "T", 18, price) for address in addresses()]
+        return registry, tokens
+
+    print(f"{'tokens':>28}{'objects':>10}{'bytes/token':>14}")
+    for name, build, count in [
+        ("dict Token", lambda: [DictToken(address, "T", 18, price) for address in addresses()], len),
+        ("slotted Token", lambda: [Token(address, "T", 18, price) for address in addresses()], len),
+        ("interned RegisteredToken", registered_tokens, lambda built: len(built[0])),
+    ]:
+        size, objects = measure_memory(build)
+        print(f"{name:>28}{count(objects):>10}{size / (2 * args.tokens):>14.1f}")
+
+    fixed_parameters = woofi_fixed_parameters()
+    registry = TokenRegistry()
+    plain = [Token(address, "T", 18, price) for address, _ in zip(addresses(), range(1000))] + [USDC]
+    registered = [registry.intern(token) for token in plain]
+    registered_fixed_parameters = dict(fixed_parameters, quote_token=registry.intern(USDC))
+    table = PairTable(lambda input_token, output_token: swap_direction(registered_fixed_parameters, input_token, output_token))
+    pairs = [(index % len(plain), (index * 7 + 1) % len(plain)) for index in range(args.lookups)]
+
+    print(f"\n{'direction lookup':>28}{'ns/lookup':>12}")
+    for name, tokens, lookup in [
+        ("swap_direction, plain", plain, lambda input_token, output_token: swap_direction(fixed_parameters, input_token, output_token)),
+        ("swap_direction, registered", registered, lambda input_token, output_token: swap_direction(registered_fixed_parameters, input_token, output_token)),
+        ("PairTable, registered", registered, table.get),
+    ]:
+        token_pairs = [(tokens[i], tokens[j]) for i, j in pairs]
+        start = time.perf_counter()
+        for input_token, output_token in token_pairs:
+            lookup(input_token, output_token)
+        print(f"{name:>28}{(time.perf_counter() - start) / args.lookups * 1e9:>12.0f}")
+
+    module, pool_state = WOOFiLiquidityModule(), woofi_pool_state()
+    quotes = args.lookups // 20
+    print(f"\n{'get_amount_out, WETH->cbBTC':>28}{'us/quote':>12}")
+    for name, quote_fixed_parameters, input_token, output_token in [
+        ("plain tokens", fixed_parameters, WETH, CBBTC),
+        ("registered tokens", registered_fixed_parameters, registry.intern(WETH), registry.intern(CBBTC)),
+    ]:
+        start = time.perf_counter()
+        for _ in range(quotes):
+            module.get_amount_out(pool_state, quote_fixed_parameters, input_token, output_token, 10**18)
+        print(f"{name:>28}{(time.perf_counter() - start) / quotes * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compares the batch methods of WOOFiLiquidityModule against looping the scalar calls: get_amounts_out / get_amounts_in
+with both raw pool_state dicts and a prepared pool, get_pair_amounts_out over every pair of a WOOFiStateStore, and
+get_state_amounts_out over many pool states of one pair.
+
+Usage: python -m benchmarks.bench_woofi_batch [--sizes 60] [--states 1000] [--repeat 200]
+"""
+import argparse
+import random
+import timeit
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+
+
+def log_ladder(low: int, high: int, sizes: int) -> list[int]:
+    ratio = (high / low) ** (1 / (sizes - 1))
+    return [int(low * ratio ** i) for i in range(sizes)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, default=60, help="number of amounts per ladder")
+    parser.add_argument("--states", type=int, default=1000, help="pool states of the many-states case")
+    parser.add_argument("--repeat", type=int, default=200, help="timed repetitions per case")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    pool_state, fixed_parameters = woofi_pool_state(), woofi_fixed_parameters()
+    cases = [
+        ("sell_quote_token_out", "out", USDC, CBBTC, log_ladder(10**6, 10**12, args.sizes)),
+        ("sell_base_token_out", "out", WETH, USDC, log_ladder(10**15, 10**20, args.sizes)),
+        ("swap_base_to_base_out", "out", WETH, CBBTC, log_ladder(10**15, 10**20, args.sizes)),
+        ("sell_quote_token_in", "in", USDC, CBBTC, log_ladder(10**3, 10**10, args.sizes)),
+        ("sell_base_token_in", "in", WETH, USDC, log_ladder(10**3, 10**10, args.sizes)),
+        ("swap_base_to_base_in", "in", WETH, CBBTC, log_ladder(10**3, 10**10, args.sizes)),
+    ]
+
+    print(f"{'path':<24}{'scalar loop (us)':>18}{'prepared loop (us)':>20}{'batch (us)':>14}{'speedup':>10}")
+    for name, side, input_token, output_token, amounts in cases:
+        scalar = module.get_amount_out if side == "out" else module.get_amount_in
+        batch = module.get_amounts_out if side == "out" else module.get_amounts_in
+
+        expected = [scalar(pool_state, fixed_parameters, input_token, output_token, amount) for amount in amounts]
+        assert list(zip(*batch(pool_state, fixed_parameters, input_token, output_token, amounts))) == expected, name
+
+        scalar_time = min(timeit.repeat(
+            lambda: [scalar(pool_state, fixed_parameters, input_token, output_token, amount) for amount in amounts],
+            number=args.repeat, repeat=5,
+        )) / args.repeat
+        pool = module.prepare_pool(pool_state, fixed_parameters, input_token, output_token)
+        prepared_time = min(timeit.repeat(
+            lambda: [scalar(pool, None, input_token, output_token, amount) for amount in amounts],
+            number=args.repeat, repeat=5,
+        )) / args.repeat
+        batch_time = min(timeit.repeat(
+            lambda: batch(pool_state, fixed_parameters, input_token, output_token, amounts),
+            number=args.repeat, repeat=5,
+        )) / args.repeat
+        print(f"{name:<24}{scalar_time * 1e6:>18.1f}{prepared_time * 1e6:>20.1f}{batch_time * 1e6:>14.1f}{scalar_time / batch_time:>9.2f}x")
+
+    # every pair of one store, a ladder each
+    store = WOOFiStateStore(fixed_parameters, pool_state["quote_token_reserve"])
+    for token, prefix in ((WETH, "input_token_"), (CBBTC, "output_token_")):
+        store.set_token(token, **{field: pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+    pairs = [(input_token, output_token) for input_token in (USDC, WETH, CBBTC) for output_token in (USDC, WETH, CBBTC) if input_token is not output_token]
+    quotes = [(input_token, output_token, amount) for input_token, output_token in pairs for amount in log_ladder(10**3, 10**18, args.sizes)]
+
+    def pair_loop():
+        return [module.get_amount_out(store.pair_state(input_token, output_token), fixed_parameters, input_token, output_token, amount) for input_token, output_token, amount in quotes]
+
+    assert list(zip(*module.get_pair_amounts_out(store, fixed_parameters, quotes))) == pair_loop()
+    number = max(args.repeat // 10, 1)
+    pair_time = min(timeit.repeat(pair_loop, number=number, repeat=5)) / number
+    batch_time = min(timeit.repeat(lambda: module.get_pair_amounts_out(store, fixed_parameters, quotes), number=number, repeat=5)) / number
+    print(f"{f'{len(pairs)} pairs':<24}{pair_time * 1e6:>18.1f}{'':>20}{batch_time * 1e6:>14.1f}{pair_time / batch_time:>9.2f}x")
+
+    # one pair over many states, e.g. the pool at many blocks
+    generator = random.Random(7)
+    states = []
+    for _ in range(args.states):
+        state = dict(pool_state, input_token_price=int(pool_state["input_token_price"] * generator.uniform(0.99, 1.01)))
+        states.append((state, fixed_parameters))
+    for name, input_token, output_token, amount in (("states sell_quote", USDC, CBBTC, 10**9), ("states sell_base", WETH, USDC, 10**18), ("states base_to_base", WETH, CBBTC, 10**18)):
+        def state_loop():
+            return [module.get_amount_out(state, state_fixed_parameters, input_token, output_token, amount) for state, state_fixed_parameters in states]
+
+        assert list(zip(*module.get_state_amounts_out(states, input_token, output_token, amount))) == state_loop()
+        loop_time = min(timeit.repeat(state_loop, number=5, repeat=3)) / 5
+        batch_time = min(timeit.repeat(lambda: module.get_state_amounts_out(states, input_token, output_token, amount), number=5, repeat=3)) / 5
+        print(f"{name:<24}{loop_time * 1e6:>18.1f}{'':>20}{batch_time * 1e6:>14.1f}{loop_time / batch_time:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
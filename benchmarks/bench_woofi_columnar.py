@@ -0,0 +1,56 @@
+"""
+Quotes one size across many WOOFi pools: a loop of get_amount_out over pool_state dicts, a loop over prepared pools,
+and one WOOFiColumnarStore.quote_out call.
+
+Usage: python -m benchmarks.bench_woofi_columnar [--pools 10 100 1000] [--repeat 20]
+"""
+import argparse
+import random
+import timeit
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_columnar import WOOFiColumnarStore
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pools", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20, help="timed repetitions per size")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    module = WOOFiLiquidityModule()
+    fixed_parameters = woofi_fixed_parameters()
+    input_amount = 10**18
+
+    print(f"{'pools':>7}{'dict loop (us)':>16}{'prepared loop (us)':>20}{'columnar (us)':>15}{'speedup':>9}")
+    for count in args.pools:
+        pools = []
+        for _ in range(count):
+            pool_state = woofi_pool_state()
+            pool_state["input_token_price"] = int(pool_state["input_token_price"] * rng.uniform(0.99, 1.01))
+            pool_state["output_token_reserve"] = int(pool_state["output_token_reserve"] * rng.uniform(0.001, 1))
+            pools.append((pool_state, WETH, rng.choice([CBBTC, USDC])))
+        store = WOOFiColumnarStore()
+        prepared = []
+        for pool_state, input_token, output_token in pools:
+            store.add_pool(pool_state, fixed_parameters, input_token, output_token)
+            prepared.append((module.prepare_pool(pool_state, fixed_parameters, input_token, output_token), input_token, output_token))
+
+        def dict_loop():
+            return [module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount) for pool_state, input_token, output_token in pools]
+
+        def prepared_loop():
+            return [module.get_amount_out(pool, None, input_token, output_token, input_amount) for pool, input_token, output_token in prepared]
+
+        fees, amounts_out, _ = store.quote_out(input_amount)
+        assert list(zip(fees, amounts_out)) == dict_loop() == prepared_loop()
+
+        times = [min(timeit.repeat(function, number=args.repeat, repeat=3)) / args.repeat for function in (dict_loop, prepared_loop, lambda: store.quote_out(input_amount))]
+        print(f"{count:>7}{times[0] * 1e6:>16.1f}{times[1] * 1e6:>20.1f}{times[2] * 1e6:>15.1f}{times[0] / times[2]:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compares the exact integer get_amount_in against the previous float quadratic solver followed by the retry loop
+routers needed to turn its answer into an input that actually covers the requested output.
+
+Usage: python -m benchmarks.bench_woofi_inverse [--quotes 300] [--seed 7]
+"""
+import argparse
+import math
+import random
+import time
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import SELL_BASE_TOKEN, SELL_QUOTE_TOKEN, WOOFiLiquidityModule, swap_direction
+
+
+def float_amount_in(module, pool_state, fixed_parameters, input_token, output_token, output_amount):
+    # The float exact-out path as it was before the integer solver
+    pool_math = module.pool_math
+    direction = swap_direction(fixed_parameters, input_token, output_token)
+    base_fee_rate = fixed_parameters["base_fee_rate"]
+    if direction == SELL_QUOTE_TOKEN:
+        if output_amount > pool_state["output_token_reserve"]:
+            return None
+        quote_token_amount_after_fee = pool_math.calc_base_token_amount_sell_quote_in(fixed_parameters, output_amount, *_side(pool_state, "output_token_", pool_state["output_token_spread"]), output_token.decimals)
+        if quote_token_amount_after_fee is None:
+            return None
+        return quote_token_amount_after_fee * base_fee_rate / (base_fee_rate - pool_state["output_token_fee_rate"])
+    elif direction == SELL_BASE_TOKEN:
+        quote_token_amount = output_amount * base_fee_rate / (base_fee_rate - pool_state["input_token_fee_rate"])
+        if quote_token_amount > pool_state["output_token_reserve"]:
+            return None
+        return pool_math.calc_quote_token_amount_sell_base_in(fixed_parameters, quote_token_amount, *_side(pool_state, "input_token_", pool_state["input_token_spread"]), input_token.decimals)
+    else:
+        if output_amount > pool_state["output_token_reserve"]:
+            return None
+        spread = max(pool_state["input_token_spread"], pool_state["output_token_spread"])
+        fee_rate = max(pool_state["input_token_fee_rate"], pool_state["output_token_fee_rate"])
+        quote_token_amount_after_fee = pool_math.calc_base_token_amount_sell_quote_in(fixed_parameters, output_amount, *_side(pool_state, "output_token_", spread), output_token.decimals)
+        if quote_token_amount_after_fee is None:
+            return None
+        quote_token_amount = quote_token_amount_after_fee * base_fee_rate / (base_fee_rate - fee_rate)
+        if quote_token_amount - quote_token_amount_after_fee > pool_state["quote_token_reserve"]:
+            return None
+        return pool_math.calc_quote_token_amount_sell_base_in(fixed_parameters, quote_token_amount, *_side(pool_state, "input_token_", spread), input_token.decimals)
+
+
+def _side(pool_state, prefix, spread):
+    return (
+        pool_state[prefix + "max_gamma"], pool_state[prefix + "max_notional_swap"], pool_state[prefix + "price"],
+        spread, pool_state[prefix + "coeff"], pool_state[prefix + "wo_feasible"],
+    )
+
+
+def float_amount_in_with_retries(module, pool_state, fixed_parameters, input_token, output_token, output_amount, max_retries=64):
+    # Returns (input amount, forward evaluations): bump the float answer until get_amount_out covers the target
+    amount_in = float_amount_in(module, pool_state, fixed_parameters, input_token, output_token, output_amount)
+    if amount_in is None:
+        return None, 0
+
+    amount_in, bump = math.ceil(amount_in), max(1, math.ceil(amount_in) >> 50)
+    for retry in range(1, max_retries + 1):
+        _, amount_out = module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, amount_in)
+        if amount_out is None:
+            return None, retry
+        if amount_out >= output_amount:
+            return amount_in, retry
+        amount_in, bump = amount_in + bump, bump * 2
+    return None, max_retries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=300, help="exact-out quotes per pair")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    module = WOOFiLiquidityModule()
+    pool_state, fixed_parameters = woofi_pool_state(), woofi_fixed_parameters()
+    pairs = [(USDC, CBBTC, 10**9), (WETH, USDC, 10**10), (WETH, CBBTC, 10**9)]
+
+    print(f"{'pair':<14}{'float+retry (us)':>18}{'forward evals':>15}{'exact (us)':>12}{'prepared (us)':>15}{'max float error':>18}")
+    for input_token, output_token, max_output in pairs:
+        output_amounts = [rng.randrange(1, max_output) for _ in range(args.quotes)]
+        pool = module.prepare_pool(pool_state, fixed_parameters, input_token, output_token)
+
+        start = time.perf_counter()
+        float_results = [float_amount_in_with_retries(module, pool_state, fixed_parameters, input_token, output_token, amount) for amount in output_amounts]
+        float_time = (time.perf_counter() - start) / args.quotes
+
+        start = time.perf_counter()
+        exact_results = [module.get_amount_in(pool_state, fixed_parameters, input_token, output_token, amount)[1] for amount in output_amounts]
+        exact_time = (time.perf_counter() - start) / args.quotes
+
+        start = time.perf_counter()
+        prepared_results = [module.get_amount_in(pool, None, input_token, output_token, amount)[1] for amount in output_amounts]
+        prepared_time = (time.perf_counter() - start) / args.quotes
+        assert prepared_results == exact_results
+
+        evaluations = sum(evaluations for _, evaluations in float_results) / args.quotes
+        errors = [abs(float_in - exact_in) for (float_in, _), exact_in in zip(float_results, exact_results) if float_in is not None and exact_in is not None]
+        pair = f"{input_token.symbol}->{output_token.symbol}"
+        print(f"{pair:<14}{float_time * 1e6:>18.1f}{evaluations:>15.2f}{exact_time * 1e6:>12.1f}{prepared_time * 1e6:>15.1f}{max(errors, default=0):>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compares WOOFiLiquidityModule.get_liquidity_bound against bisecting get_amount_out for the largest tradable input.
+
+Usage: python -m benchmarks.bench_woofi_liquidity_bound [--repeat 200]
+"""
+import argparse
+import timeit
+
+from benchmarks.bench_woofi_pool_math import max_tradable_amount, pair_states
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters
+from modules.woofi_liquidity_module import WOOFiLiquidityModule, WOOFiPoolMath
+
+
+class CountingPoolMath(WOOFiPoolMath):
+    calls = 0
+
+    def quote_out(self, pool, input_amount):
+        self.calls += 1
+        return super().quote_out(pool, input_amount)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="timed repetitions per pair")
+    args = parser.parse_args()
+
+    module, counting_module = WOOFiLiquidityModule(), WOOFiLiquidityModule()
+    counting_module.pool_math = CountingPoolMath()
+    fixed_parameters = woofi_fixed_parameters()
+    states = pair_states(fixed_parameters)
+
+    print(f"{'pair':<14}{'binding limit':<22}{'bisection (us)':>16}{'evals':>7}{'bound (us)':>12}{'evals':>7}")
+    for input_token, output_token in [(USDC, CBBTC), (WETH, USDC), (WETH, CBBTC)]:
+        state = states[input_token, output_token]
+        evaluations = [0]
+
+        def quote(pool_state, amount):
+            evaluations[0] += 1
+            return module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, amount)
+
+        bound = module.get_liquidity_bound(state, fixed_parameters, input_token, output_token)
+        assert max_tradable_amount(quote, state) == bound.max_input_amount
+        bisection_evaluations, evaluations[0] = evaluations[0], 0
+
+        counting_module.pool_math.calls = 0
+        counting_module.get_liquidity_bound(state, fixed_parameters, input_token, output_token)
+        bound_evaluations = counting_module.pool_math.calls
+
+        bisection_time = min(timeit.repeat(lambda: max_tradable_amount(quote, state), number=args.repeat, repeat=3)) / args.repeat
+        bound_time = min(timeit.repeat(lambda: module.get_liquidity_bound(state, fixed_parameters, input_token, output_token), number=args.repeat, repeat=3)) / args.repeat
+        pair = f"{input_token.symbol}->{output_token.symbol}"
+        print(f"{pair:<14}{bound.binding_limit:<22}{bisection_time * 1e6:>16.1f}{bisection_evaluations:>7}{bound_time * 1e6:>12.1f}{bound_evaluations:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Throughput and p50/p99 latency of the six WOOFiPoolMath swap paths across size regimes, with a JSON report and a
+regression check against a saved baseline.
+
+Usage: python -m benchmarks.bench_woofi_pool_math [--rounds 20] [--output results.json]
+                                                  [--baseline baseline.json] [--threshold 0.15]
+
+Regimes: tiny (a few base units), typical (0.1% - 1% of the largest tradable amount), near_limit (within 1% below
+the largest tradable amount, where max_gamma, max_notional_swap or a reserve binds) and rejected (just past it, so
+the path returns None). Exits with status 1 if any case's p50 regressed by more than --threshold.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiPoolMath
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+
+
+REGIMES = ("tiny", "typical", "near_limit", "rejected")
+
+
+def pair_states(fixed_parameters):
+    # Correct pairwise states for all three directions, built from the WETH / cbBTC fixture
+    pool_state = woofi_pool_state()
+    store = WOOFiStateStore(fixed_parameters, pool_state["quote_token_reserve"])
+    for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+        store.set_token(token, **{field: pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+    return {pair: dict(store.pair_state(*pair)) for pair in [(USDC, CBBTC), (WETH, USDC), (WETH, CBBTC)]}
+
+
+def paths(pool_math, fixed_parameters):
+    # name -> (pair, quote(pool_state, amount))
+    return {
+        "sell_quote_token_out": ((USDC, CBBTC), lambda state, amount: pool_math.sell_quote_token_out(state, fixed_parameters, CBBTC, amount)),
+        "sell_base_token_out": ((WETH, USDC), lambda state, amount: pool_math.sell_base_token_out(state, fixed_parameters, WETH, amount)),
+        "swap_base_to_base_out": ((WETH, CBBTC), lambda state, amount: pool_math.swap_base_to_base_out(state, fixed_parameters, WETH, CBBTC, amount)),
+        "sell_quote_token_in": ((USDC, CBBTC), lambda state, amount: pool_math.sell_quote_token_in(state, fixed_parameters, CBBTC, amount)),
+        "sell_base_token_in": ((WETH, USDC), lambda state, amount: pool_math.sell_base_token_in(state, fixed_parameters, WETH, amount)),
+        "swap_base_to_base_in": ((WETH, CBBTC), lambda state, amount: pool_math.swap_base_to_base_in(state, fixed_parameters, WETH, CBBTC, amount)),
+    }
+
+
+def max_tradable_amount(quote, state) -> int:
+    # The largest amount the path accepts, by bisection on the first rejection
+    high = 1
+    while quote(state, high)[1] is not None:
+        high *= 2
+    low = high // 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if quote(state, middle)[1] is None:
+            high = middle
+        else:
+            low = middle
+    return low
+
+
+def regime_amounts(regime: str, limit: int, count: int, rng: random.Random) -> list[int]:
+    if regime == "tiny":
+        return [rng.randint(1, 1000) for _ in range(count)]
+    elif regime == "typical":
+        return [rng.randint(limit // 1000, limit // 100) for _ in range(count)]
+    elif regime == "near_limit":
+        return [rng.randint(limit - limit // 100, limit) for _ in range(count)]
+    else:
+        return [rng.randint(limit + 1, limit * 2) for _ in range(count)]
+
+
+def percentile(sorted_values: list[int], fraction: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run(rounds: int, amounts_per_case: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    fixed_parameters = woofi_fixed_parameters()
+    states = pair_states(fixed_parameters)
+    results = {}
+    for name, (pair, quote) in paths(WOOFiPoolMath(), fixed_parameters).items():
+        state = states[pair]
+        limit = max_tradable_amount(quote, state)
+        for regime in REGIMES:
+            amounts = regime_amounts(regime, limit, amounts_per_case, rng)
+            # also the warm-up pass
+            outcomes = [quote(state, amount)[1] is not None for amount in amounts]
+            if regime == "rejected":
+                assert not any(outcomes), f"{name}/{regime} has accepted amounts"
+            elif regime != "tiny":
+                # tiny amounts may legitimately round to a zero output, but never fail
+                assert all(outcomes), f"{name}/{regime} has rejected amounts"
+
+            latencies = []
+            perf_counter_ns = time.perf_counter_ns
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for amount in amounts:
+                    call_start = perf_counter_ns()
+                    quote(state, amount)
+                    latencies.append(perf_counter_ns() - call_start)
+            elapsed = time.perf_counter() - start
+
+            latencies.sort()
+            results[f"{name}/{regime}"] = {
+                "calls": len(latencies),
+                "accepted": sum(outcomes) / len(outcomes),
+                "throughput_per_s": len(latencies) / elapsed,
+                "p50_us": percentile(latencies, 0.50) / 1e3,
+                "p99_us": percentile(latencies, 0.99) / 1e3,
+            }
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for case, result in results.items():
+        before = baseline.get(case)
+        if before is not None and result["p50_us"] > before["p50_us"] * (1 + threshold):
+            regressions.append(f"{case}: p50 {before['p50_us']:.2f}us -> {result['p50_us']:.2f}us")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="passes over each case's amounts")
+    parser.add_argument("--amounts", type=int, default=100, help="random amounts per case")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative p50 slowdown per case")
+    args = parser.parse_args()
+
+    results = run(args.rounds, args.amounts, args.seed)
+
+    print(f"{'case':<36}{'accepted':>10}{'calls/s':>12}{'p50 (us)':>10}{'p99 (us)':>10}")
+    for case, result in results.items():
+        print(f"{case:<36}{result['accepted']:>10.0%}{result['throughput_per_s']:>12.0f}{result['p50_us']:>10.2f}{result['p99_us']:>10.2f}")
+
+    if args.output:
+        report = {"python": platform.python_version(), "machine": platform.machine(), "rounds": args.rounds, "seed": args.seed, "results": results}
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no case regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
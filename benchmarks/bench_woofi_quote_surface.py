@@ -0,0 +1,85 @@
+"""
+Measures quoting from precomputed WOOFi quote surfaces against exact quotes: the lookup (binary search and interpolation)
+against quote_out on a prepared pool and get_amount_out on the pool_state dict, the size of the error envelope, and
+how long the background worker takes to publish the surfaces of a store after one token update.
+
+Usage: python -m benchmarks.bench_woofi_quote_surface [--points 128] [--quotes 20000] [--tokens 10]
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_quote_surface import WOOFiQuoteSurface, WOOFiQuoteSurfaces
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from templates.liquidity_module import Token
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=128, help="samples per surface")
+    parser.add_argument("--quotes", type=int, default=20000, help="quotes per pair and method")
+    parser.add_argument("--tokens", type=int, default=10, help="base tokens of the store the worker builds surfaces for")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    pool_math = module.pool_math
+    pool_state, fixed_parameters = woofi_pool_state(), woofi_fixed_parameters()
+    generator = random.Random(0)
+
+    print(f"{args.points} points, {args.quotes} quotes per pair at log-uniform sizes up to the liquidity bound")
+    print(f"{'pair':>14}{'build ms':>10}{'dict us':>10}{'exact us':>10}{'lookup us':>11}{'speedup':>9}{'max error':>11}")
+    for input_token, output_token in [(USDC, CBBTC), (WETH, USDC), (WETH, CBBTC)]:
+        pool = module.prepare_pool(pool_state, fixed_parameters, input_token, output_token)
+        start = time.perf_counter()
+        surface = WOOFiQuoteSurface(pool, args.points, pool_math)
+        build_time = time.perf_counter() - start
+        amounts = [int(surface.max_input_amount ** generator.random()) for _ in range(args.quotes)]
+
+        start = time.perf_counter()
+        for amount in amounts:
+            module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, amount)
+        dict_time = (time.perf_counter() - start) / len(amounts)
+        start = time.perf_counter()
+        exact = [pool_math.quote_out(pool, amount)[1] for amount in amounts]
+        exact_time = (time.perf_counter() - start) / len(amounts)
+        start = time.perf_counter()
+        quotes = [surface.lookup(amount) for amount in amounts]
+        lookup_time = (time.perf_counter() - start) / len(amounts)
+
+        assert all(abs(surface_amount_out - amount_out) <= error for (surface_amount_out, error), amount_out in zip(quotes, exact))
+        # relative to the output, over quotes of at least 1e6 output units
+        max_error = max((error / amount_out for (_, error), amount_out in zip(quotes, exact) if amount_out >= 10**6), default=0.0)
+        pair = f"{input_token.symbol}->{output_token.symbol}"
+        print(f"{pair:>14}{build_time * 1e3:>10.2f}{dict_time * 1e6:>10.2f}{exact_time * 1e6:>10.2f}{lookup_time * 1e6:>11.2f}"
+              f"{exact_time / lookup_time:>8.1f}x{max_error:>11.1e}")
+
+    tokens = [Token(address=f"0x{index:040x}", decimals=18, symbol=f"T{index}", reference_price=Decimal(1)) for index in range(1, args.tokens + 1)]
+    record = {field: pool_state["input_token_" + field] for field in TOKEN_STATE_FIELDS}
+    store = WOOFiStateStore(fixed_parameters, pool_state["quote_token_reserve"])
+    for token in tokens:
+        store.set_token(token, **record)
+    surfaces = WOOFiQuoteSurfaces(points=args.points, pool_math=pool_math)
+    start = time.perf_counter()
+    surfaces.submit(store)
+    surfaces.wait_for_version(store.version)
+    full_time = time.perf_counter() - start
+
+    store = store.with_updates({tokens[0].address: {"price": record["price"] + 10**6}})
+    start = time.perf_counter()
+    surfaces.submit(store)
+    submit_time = time.perf_counter() - start
+    surfaces.wait_for_version(store.version)
+    update_time = time.perf_counter() - start
+    surfaces.close()
+
+    pairs = len(surfaces.current.state)
+    print(f"\nbackground worker, {args.tokens} base tokens and the quote token, {pairs} pairs")
+    print(f"{'full build ms':>16}{'submit ms':>12}{'update ms':>12}")
+    print(f"{full_time * 1e3:>16.1f}{submit_time * 1e3:>12.2f}{update_time * 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
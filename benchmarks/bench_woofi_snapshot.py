@@ -0,0 +1,117 @@
+"""
+Measures worker cold start: the time from an on-disk state file to the first quote, for a JSON file of every pairwise
+pool_state and fixed_parameters dict against a memory-mapped WOOFi snapshot.
+
+Usage: python -m benchmarks.bench_woofi_snapshot [--pools 10 100 500] [--tokens 8] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+from benchmarks.woofi_fixtures import USDC, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_snapshot import WOOFiSnapshot, write_snapshot
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from templates.liquidity_module import Token
+
+
+def token_json(token: Token) -> dict:
+    return {"address": token.address, "symbol": token.symbol, "decimals": token.decimals, "reference_price": str(token.reference_price)}
+
+
+def write_json(path: str, block_number: int, stores: list[WOOFiStateStore]):
+    # The status quo: one entry per ordered pair of every pool, as the pairwise interface consumes them
+    pools = []
+    for store in stores:
+        fixed_parameters = dict(store.fixed_parameters, quote_token=token_json(store.quote_token))
+        tokens = store.tokens()
+        pairs = [
+            {"input_token": token_json(input_token), "output_token": token_json(output_token), "pool_state": dict(store.pair_state(input_token, output_token))}
+            for input_token in tokens for output_token in tokens if input_token is not output_token
+        ]
+        pools.append({"fixed_parameters": fixed_parameters, "pairs": pairs})
+    with open(path, "w") as file:
+        json.dump({"block_number": block_number, "pools": pools}, file)
+
+
+def load_json(path: str) -> list:
+    def token(fields: dict) -> Token:
+        return Token(address=fields["address"], symbol=fields["symbol"], decimals=fields["decimals"], reference_price=Decimal(fields["reference_price"]))
+
+    with open(path) as file:
+        document = json.load(file)
+    pools = []
+    for pool in document["pools"]:
+        fixed_parameters = dict(pool["fixed_parameters"], quote_token=token(pool["fixed_parameters"]["quote_token"]))
+        pools.append([(pair["pool_state"], fixed_parameters, token(pair["input_token"]), token(pair["output_token"])) for pair in pool["pairs"]])
+    return pools
+
+
+def build_stores(pools: int, tokens: int) -> list[WOOFiStateStore]:
+    pool_state = woofi_pool_state()
+    record = {field: pool_state["input_token_" + field] for field in TOKEN_STATE_FIELDS}
+    stores = []
+    for pool in range(pools):
+        store = WOOFiStateStore(woofi_fixed_parameters(), pool_state["quote_token_reserve"])
+        for index in range(1, tokens + 1):
+            token = Token(address=f"0x{index:040x}", decimals=18, symbol=f"T{index}", reference_price=Decimal(index))
+            store.set_token(token, **dict(record, price=record["price"] + pool))
+        stores.append(store)
+    return stores
+
+
+def best_of(repeat: int, function) -> tuple[float, object]:
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pools", type=int, nargs="+", default=[10, 100, 500], help="numbers of WOOFi deployments")
+    parser.add_argument("--tokens", type=int, default=8, help="base tokens per deployment")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    amount = 10**17
+
+    print(f"{'pools':>7}{'pairs':>9}{'json MB':>10}{'snapshot MB':>13}{'json (ms)':>12}{'snapshot (ms)':>15}{'speedup':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        json_path, snapshot_path = os.path.join(directory, "state.json"), os.path.join(directory, "state.snapshot")
+        for pools in args.pools:
+            stores = build_stores(pools, args.tokens)
+            write_json(json_path, 1, stores)
+            write_snapshot(snapshot_path, 1, stores)
+            pairs = pools * (args.tokens + 1) * args.tokens
+
+            def json_first_quote():
+                last_pool = load_json(json_path)[-1]
+                pool_state, fixed_parameters, input_token, output_token = next(pair for pair in last_pool if pair[3].address == USDC.address)
+                return module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, amount)
+
+            def snapshot_first_quote():
+                snapshot = WOOFiSnapshot(snapshot_path)
+                input_token = snapshot.tokens(pools - 1)[1]
+                quote = module.get_amount_out(snapshot.prepare_pool(pools - 1, input_token, USDC), None, input_token, USDC, amount)
+                snapshot.close()
+                return quote
+
+            json_time, json_quote = best_of(args.repeat, json_first_quote)
+            snapshot_time, snapshot_quote = best_of(args.repeat, snapshot_first_quote)
+            assert json_quote == snapshot_quote, (json_quote, snapshot_quote)
+            print(
+                f"{pools:>7}{pairs:>9}{os.path.getsize(json_path) / 1e6:>10.2f}{os.path.getsize(snapshot_path) / 1e6:>13.3f}"
+                f"{json_time * 1e3:>12.2f}{snapshot_time * 1e3:>15.3f}{json_time / snapshot_time:>9.0f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
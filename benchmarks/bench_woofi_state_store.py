@@ -0,0 +1,64 @@
+"""
+Measures the cost of one oracle tick (new price/spread/coeff for a single base token) when every pairwise pool_state
+dict is rebuilt, against a partial update of a WOOFiStateStore.
+
+Usage: python -m benchmarks.bench_woofi_state_store [--tokens 4 16 64] [--ticks 200]
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks.woofi_fixtures import USDC, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from templates.liquidity_module import Token
+
+
+def rebuild_pair_states(records, quote_token_reserve):
+    # What the pairwise interface needs without a store: one full dict per ordered base pair
+    states = {}
+    for input_address, input_record in records.items():
+        for output_address, output_record in records.items():
+            if input_address != output_address:
+                state = {"input_token_" + field: value for field, value in input_record.items()}
+                state.update(("output_token_" + field, value) for field, value in output_record.items())
+                state["quote_token_reserve"] = quote_token_reserve
+                states[input_address, output_address] = state
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[4, 16, 64], help="numbers of base tokens")
+    parser.add_argument("--ticks", type=int, default=200, help="oracle ticks per measurement")
+    args = parser.parse_args()
+
+    pool_state = woofi_pool_state()
+    record = {field: pool_state["input_token_" + field] for field in TOKEN_STATE_FIELDS}
+
+    print(f"{'tokens':>8}{'pairs':>8}{'rebuild (us/tick)':>20}{'store (us/tick)':>18}{'speedup':>10}")
+    for count in args.tokens:
+        tokens = [Token(address=f"0x{i:040x}", decimals=18, symbol=f"T{i}", reference_price=Decimal(1)) for i in range(1, count + 1)]
+        records = {token.address: dict(record) for token in tokens}
+        store = WOOFiStateStore(woofi_fixed_parameters(), pool_state["quote_token_reserve"])
+        for token in tokens:
+            store.set_token(token, **record)
+
+        start = time.perf_counter()
+        for tick in range(args.ticks):
+            records[tokens[tick % count].address].update(price=record["price"] + tick)
+            rebuild_pair_states(records, pool_state["quote_token_reserve"])
+        rebuild_time = (time.perf_counter() - start) / args.ticks
+
+        # the store side also re-prepares one affected pair, as a quoting engine would after the tick
+        start = time.perf_counter()
+        for tick in range(args.ticks):
+            token = tokens[tick % count]
+            store.update_token(token.address, price=record["price"] + tick)
+            store.prepare_pool(token, USDC)
+        store_time = (time.perf_counter() - start) / args.ticks
+
+        print(f"{count:>8}{count * (count - 1):>8}{rebuild_time * 1e6:>20.1f}{store_time * 1e6:>18.1f}{rebuild_time / store_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measures chained swap simulation: deep-copying pool_state and patching the reserves by hand after every
+get_amount_out, against apply_swap and a WOOFiSwapSimulation, plus the cost of rolling the simulation back.
+
+Usage: python -m benchmarks.bench_woofi_swap_simulation [--swaps 100 1000] [--repeat 5]
+"""
+import argparse
+import copy
+import time
+import tracemalloc
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore, WOOFiSwapSimulation
+
+
+def hand_patched(module, pool_state, fixed_parameters, swaps):
+    # The status quo for a base to base pair: deep copy, quote, patch the reserves (prices are not updated)
+    for amount in swaps:
+        fee, amount_out = module.get_amount_out(pool_state, fixed_parameters, WETH, CBBTC, amount)
+        pool_state = copy.deepcopy(pool_state)
+        pool_state["input_token_reserve"] += amount
+        pool_state["output_token_reserve"] -= amount_out
+        pool_state["quote_token_reserve"] -= fee
+    return pool_state
+
+
+def applied(module, pool_state, fixed_parameters, swaps):
+    for amount in swaps:
+        _, _, pool_state = module.apply_swap(pool_state, fixed_parameters, WETH, CBBTC, amount)
+    return pool_state
+
+
+def simulated(module, store, swaps):
+    simulation = WOOFiSwapSimulation(store, module.pool_math)
+    for amount in swaps:
+        simulation.swap(WETH, CBBTC, amount)
+    return simulation
+
+
+def measure(repeat: int, function) -> tuple[float, int]:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    function()
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--swaps", type=int, nargs="+", default=[100, 1000], help="lengths of the swap chain")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    fixed_parameters, pool_state = woofi_fixed_parameters(), woofi_pool_state()
+    store = WOOFiStateStore(fixed_parameters, pool_state["quote_token_reserve"] * 10**6)
+    for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+        store.set_token(token, **{field: pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+    store.update_token(CBBTC.address, reserve=10**14)
+    pool_state = dict(store.pair_state(WETH, CBBTC))
+
+    print(f"{'swaps':>7}{'method':>16}{'us/swap':>10}{'peak KiB':>10}")
+    for count in args.swaps:
+        swaps = [10**16 + index for index in range(count)]
+        for name, function in [
+            ("deepcopy+patch", lambda: hand_patched(module, pool_state, fixed_parameters, swaps)),
+            ("apply_swap", lambda: applied(module, pool_state, fixed_parameters, swaps)),
+            ("simulation", lambda: simulated(module, store, swaps)),
+        ]:
+            elapsed, allocated = measure(args.repeat, function)
+            print(f"{count:>7}{name:>16}{elapsed / count * 1e6:>10.2f}{allocated / 1024:>10.1f}")
+
+        simulation = simulated(module, store, swaps)
+        start = time.perf_counter()
+        simulation.rollback(simulation.base_version)
+        print(f"{count:>7}{'rollback':>16}{(time.perf_counter() - start) / count * 1e6:>10.2f}")
+        assert dict(simulation.pair_state(WETH, CBBTC)) == pool_state
+        assert simulation.swap(USDC, CBBTC, 10**6)[1] is not None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Measures keeping dashboard TVLs current under oracle and reserve updates: rescanning every pool with get_tvl after each
+update, as the dashboard jobs did, against a WOOFiTVLAggregator that moves its running totals by the updated token.
+
+Usage: python -m benchmarks.bench_woofi_tvl [--pools 20] [--tokens 50] [--updates 500]
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.woofi_fixtures import woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from modules.woofi_tvl import WOOFiTVLAggregator
+from templates.liquidity_module import Token
+
+
+def build_stores(pools: int, tokens: list[Token]) -> dict:
+    pool_state = woofi_pool_state()
+    record = {field: pool_state["input_token_" + field] for field in TOKEN_STATE_FIELDS}
+    stores = {}
+    for pool in range(pools):
+        store = WOOFiStateStore(woofi_fixed_parameters(), pool_state["quote_token_reserve"])
+        for token in tokens:
+            store.set_token(token, **record)
+        stores[pool] = store
+    return stores
+
+
+def updates(pools: int, tokens: list[Token], count: int, seed: int = 0) -> list:
+    generator = random.Random(seed)
+    return [
+        (generator.randrange(pools), generator.choice(tokens).address,
+         generator.choice([{"price": 175000000000 + generator.randrange(10**9)}, {"reserve": generator.randrange(10**20, 10**21)}]))
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pools", type=int, default=20, help="WOOFi pools (deployments)")
+    parser.add_argument("--tokens", type=int, default=50, help="base tokens per pool")
+    parser.add_argument("--updates", type=int, default=500, help="token updates, each followed by a TVL query")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    tokens = [Token(address=f"0x{index:040x}", decimals=18, symbol=f"T{index}", reference_price=Decimal(1)) for index in range(1, args.tokens + 1)]
+    stream = updates(args.pools, tokens, args.updates)
+    watched = tokens[0]
+
+    stores = build_stores(args.pools, tokens)
+    start = time.perf_counter()
+    for pool, address, fields in stream:
+        stores[pool].update_token(address, **fields)
+        total = sum(module.get_tvl(store) for store in stores.values())
+        token_total = sum(module.get_tvl(store, watched) for store in stores.values())
+    rescan_time = (time.perf_counter() - start) / len(stream)
+
+    stores = build_stores(args.pools, tokens)
+    aggregator = WOOFiTVLAggregator()
+    for pool, store in stores.items():
+        aggregator.add_pool(pool, store)
+    start = time.perf_counter()
+    for pool, address, fields in stream:
+        aggregator.update_token(pool, address, **fields)
+        aggregator_total = aggregator.tvl()
+        aggregator_token_total = aggregator.tvl(token=watched)
+    aggregator_time = (time.perf_counter() - start) / len(stream)
+    assert abs(aggregator_total - total) <= total * Decimal(1e-25) and abs(aggregator_token_total - token_total) <= token_total * Decimal(1e-25)
+
+    print(f"{args.pools} pools x {args.tokens} tokens, {args.updates} updates, total and per-token TVL after each")
+    print(f"{'method':>12}{'us/update':>12}")
+    print(f"{'rescan':>12}{rescan_time * 1e6:>12.1f}")
+    print(f"{'aggregator':>12}{aggregator_time * 1e6:>12.1f}")
+    print(f"{'speedup':>12}{rescan_time / aggregator_time:>11.0f}x")
+
+
+if __name__ == "__main__":
+    main()
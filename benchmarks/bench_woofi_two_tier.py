@@ -0,0 +1,92 @@
+"""
+Measures picking the best of many WOOFi candidates for one order: quote_out on every (pool, size) candidate, against
+best_quote_out, which ranks float estimates and quotes exactly only the candidates that can still win. "cold" is the
+first order on freshly prepared pools, "warm" the next ones, which reuse the ranking terms kept on the pools.
+
+Usage: python -m benchmarks.bench_woofi_two_tier [--pools 200] [--sizes 5] [--repeat 5]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+
+
+def build_candidates(module: WOOFiLiquidityModule, input_token, output_token, pools: int, sizes: list[int], seed: int = 0) -> list:
+    # Deployments and forks of the pool with slightly different oracle states; a few are paused or nearly drained
+    generator = random.Random(seed)
+    candidates = []
+    for _ in range(pools):
+        pool_state = dict(woofi_pool_state(), output_token_reserve=10**22, quote_token_reserve=10**13)
+        for prefix in ("input_token_", "output_token_"):
+            pool_state[prefix + "price"] = int(pool_state[prefix + "price"] * generator.uniform(0.99, 1.01))
+            pool_state[prefix + "spread"] = generator.randrange(5 * 10**14, 2 * 10**15)
+            pool_state[prefix + "coeff"] = generator.randrange(10**9, 3 * 10**9)
+            pool_state[prefix + "fee_rate"] = generator.choice([5, 10, 25])
+        roll = generator.random()
+        if roll < 0.05:
+            pool_state["output_token_wo_feasible"] = pool_state["input_token_wo_feasible"] = False
+        elif roll < 0.1:
+            pool_state["output_token_reserve"] = 10**4
+        pool = module.prepare_pool(pool_state, woofi_fixed_parameters(), input_token, output_token)
+        candidates.extend((pool, size) for size in sizes)
+    return candidates
+
+
+def exhaustive(pool_math, candidates: list) -> tuple[int, int, int]:
+    best = None
+    for index, (pool, input_amount) in enumerate(candidates):
+        fee, amount_out = pool_math.quote_out(pool, input_amount)
+        if amount_out is not None and (best is None or amount_out > best[2]):
+            best = (index, fee, amount_out)
+    return best
+
+
+def best_of(repeat: int, function) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pools", type=int, default=200, help="pools per direction")
+    parser.add_argument("--sizes", type=int, default=5, help="order sizes per pool, slightly apart")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    module = WOOFiLiquidityModule()
+    pool_math = module.pool_math
+    print(f"{'direction':>18}{'candidates':>12}{'exact quotes':>14}{'exhaustive (ms)':>17}{'cold (ms)':>11}{'warm (ms)':>11}{'speedup':>10}")
+    for name, input_token, output_token, order in [
+        ("sell_quote_token", USDC, CBBTC, 5 * 10**9),
+        ("sell_base_token", WETH, USDC, 2 * 10**18),
+        ("swap_base_to_base", WETH, CBBTC, 2 * 10**18),
+    ]:
+        # sizes a splitter would try around the order, e.g. after routing part of it elsewhere
+        sizes = [order - order * step // 1000 for step in range(args.sizes)]
+        candidates = build_candidates(module, input_token, output_token, args.pools, sizes)
+        cold_time = None
+        for _ in range(args.repeat):
+            fresh = build_candidates(module, input_token, output_token, args.pools, sizes)
+            start = time.perf_counter()
+            pool_math.best_quote_out(fresh)
+            elapsed = time.perf_counter() - start
+            cold_time = elapsed if cold_time is None else min(cold_time, elapsed)
+        best = pool_math.best_quote_out(candidates)
+        assert best[:3] == exhaustive(pool_math, candidates)
+        exhaustive_time = best_of(args.repeat, lambda: exhaustive(pool_math, candidates))
+        warm_time = best_of(args.repeat, lambda: pool_math.best_quote_out(candidates))
+        print(
+            f"{name:>18}{len(candidates):>12}{best.exact_quotes:>14}{exhaustive_time * 1e3:>17.2f}{cold_time * 1e3:>11.2f}"
+            f"{warm_time * 1e3:>11.2f}{exhaustive_time / warm_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
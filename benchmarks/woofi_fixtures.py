@@ -0,0 +1,41 @@
+from decimal import Decimal
+from typing import Dict
+
+from templates.liquidity_module import Token
+
+
+WETH = Token(address="0x4200000000000000000000000000000000000006", decimals=18, symbol="WETH", reference_price=Decimal(1_750))
+CBBTC = Token(address="0xcbB7C0000aB88B473b1f5aFd9ef808440eed33Bf", decimals=8, symbol="cbBTC", reference_price=Decimal(92_000))
+USDC = Token(address="0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913", decimals=6, symbol="USDC", reference_price=Decimal(1))
+
+
+def woofi_pool_state() -> Dict:
+    # WETH (input) / cbBTC (output) pair on Base, same shape as the unit test fixture
+    return {
+        "input_token_reserve": 100000000000000000000,
+        "input_token_fee_rate": 25,
+        "input_token_max_gamma": 3000000000000000,
+        "input_token_max_notional_swap": 1000000000000,
+        "input_token_price": 175000000000,
+        "input_token_spread": 941000000000000,
+        "input_token_coeff": 1660000000,
+        "input_token_wo_feasible": True,
+        "output_token_reserve": 10000000000,
+        "output_token_fee_rate": 25,
+        "output_token_max_gamma": 3000000000000000,
+        "output_token_max_notional_swap": 1000000000000,
+        "output_token_price": 9200000000000,
+        "output_token_spread": 1050000000000000,
+        "output_token_coeff": 1660000000,
+        "output_token_wo_feasible": True,
+        "quote_token_reserve": 1000000000,
+    }
+
+
+def woofi_fixed_parameters() -> Dict:
+    return {
+        "base_fee_rate": int(1e5),
+        "quote_token_decimals": 6,
+        "oracle_price_decimals": 8,
+        "quote_token": USDC,
+    }
@@ -0,0 +1,87 @@
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable
+
+# the sink interface lives with the module template, so liquidity modules can report to it without the engine
+from templates.liquidity_module import MetricsSink
+
+
+# upper bounds in seconds; quotes run from about a microsecond (early rejections) to a few hundred (exact-out)
+DEFAULT_LATENCY_BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 1e-2)
+
+
+class LatencyHistogram:
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        # one count per bound plus the overflow bucket
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, fraction: float) -> float:
+        """ The upper bound of the bucket holding the given quantile, or inf if it falls in the overflow bucket. """
+        rank, seen = fraction * self.count, 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank and seen > 0:
+                return bound
+        return float("inf")
+
+
+class InMemoryMetrics(MetricsSink):
+    """ Aggregates latency histograms and rejection counters in process, and renders them for Prometheus. """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.latencies: Dict[str, LatencyHistogram] = {}
+        self.rejections = Counter()
+
+    def observe_latency(self, operation: str, seconds: float):
+        histogram = self.latencies.get(operation)
+        if histogram is None:
+            histogram = self.latencies[operation] = LatencyHistogram(self.buckets)
+        histogram.observe(seconds)
+
+    def count_rejection(self, operation: str, reason: str):
+        self.rejections[operation, reason] += 1
+
+    def calls(self, operation: str) -> int:
+        histogram = self.latencies.get(operation)
+        return 0 if histogram is None else histogram.count
+
+    def rejection_counts(self, operation: str) -> Dict[str, int]:
+        return {reason: count for (rejected_operation, reason), count in self.rejections.items() if rejected_operation == operation}
+
+    def reset(self):
+        self.latencies.clear()
+        self.rejections.clear()
+
+    def render_prometheus(self, namespace: str = "liquidity_module") -> str:
+        """ The metrics in the Prometheus text exposition format. """
+        lines = [
+            f"# HELP {namespace}_quote_latency_seconds Wall time of quote calls.",
+            f"# TYPE {namespace}_quote_latency_seconds histogram",
+        ]
+        for operation, histogram in sorted(self.latencies.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{namespace}_quote_latency_seconds_bucket{{operation="{operation}",le="{le}"}} {cumulative}')
+            lines.append(f'{namespace}_quote_latency_seconds_sum{{operation="{operation}"}} {histogram.sum!r}')
+            lines.append(f'{namespace}_quote_latency_seconds_count{{operation="{operation}"}} {histogram.count}')
+
+        lines += [
+            f"# HELP {namespace}_quote_rejections_total Quotes that returned no amount, by reason.",
+            f"# TYPE {namespace}_quote_rejections_total counter",
+        ]
+        for (operation, reason), count in sorted(self.rejections.items()):
+            lines.append(f'{namespace}_quote_rejections_total{{operation="{operation}",reason="{reason}"}} {count}')
+        return "\n".join(lines) + "\n"
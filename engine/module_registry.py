@@ -0,0 +1,209 @@
+"""
+Discovers the liquidity modules of a directory without importing them, and imports each one the first time its
+protocol is used.
+
+Modules follow the <protocol>_liquidity_module.py naming convention and define one LiquidityModule subclass, deriving
+from LiquidityModule directly or through other classes of the same file. The subclasses are found by parsing the
+source, and the result is kept in a manifest (manifest.json next to the modules), so a process that starts from the
+manifest reads one small file instead of importing every module.
+
+Usage: python -m engine.module_registry [--directory modules] [--package modules] [--check]
+"""
+import argparse
+import ast
+import importlib
+import json
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional
+
+from templates.liquidity_module import LiquidityModule
+
+MODULE_SUFFIX = "_liquidity_module.py"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ModuleEntry(NamedTuple):
+    protocol: str
+    # importable module name and the LiquidityModule subclass it defines
+    module: str
+    name: str
+    # source file, relative to the modules directory
+    path: str
+
+
+def module_classes(source: str) -> list[str]:
+    """
+    The LiquidityModule subclasses a module source defines that no other class of it derives from.
+
+    A base counts as LiquidityModule if it is the name LiquidityModule, an alias it was imported as, or an attribute
+    named LiquidityModule (e.g. liquidity_module.LiquidityModule).
+    """
+    tree = ast.parse(source)
+    aliases = {"LiquidityModule"}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom):
+            aliases.update(alias.asname for alias in node.names if alias.name == "LiquidityModule" and alias.asname)
+
+    subclasses, bases_used = [], set()
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for base in node.bases:
+            if isinstance(base, ast.Name) and (base.id in aliases or base.id in subclasses):
+                bases_used.add(base.id)
+                break
+            if isinstance(base, ast.Attribute) and base.attr == "LiquidityModule":
+                break
+        else:
+            continue
+        subclasses.append(node.name)
+    return [name for name in subclasses if name not in bases_used]
+
+
+def scan_modules(directory: str, package: Optional[str] = None) -> list[ModuleEntry]:
+    """
+    Parses every <protocol>_liquidity_module.py of a directory, without importing anything.
+
+    :param directory: The modules directory.
+    :param package: The package the modules are imported from, the directory name by default.
+    :raises ValueError: If a module defines no LiquidityModule subclass, or several unrelated ones.
+    """
+    package = os.path.basename(os.path.normpath(directory)) if package is None else package
+    entries = []
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(MODULE_SUFFIX):
+            continue
+        with open(os.path.join(directory, file_name)) as file:
+            names = module_classes(file.read())
+        if len(names) != 1:
+            found = ", ".join(names) or "none"
+            raise ValueError(f"{file_name} must define exactly one LiquidityModule subclass, found {found}")
+        entries.append(ModuleEntry(file_name[:-len(MODULE_SUFFIX)], f"{package}.{file_name[:-len('.py')]}", names[0], file_name))
+    return entries
+
+
+def write_manifest(path: str, entries: Iterable[ModuleEntry]):
+    manifest = {"version": MANIFEST_VERSION, "modules": [entry._asdict() for entry in entries]}
+    with open(path, "w") as file:
+        json.dump(manifest, file, indent=2)
+        file.write("\n")
+
+
+def read_manifest(path: str) -> list[ModuleEntry]:
+    """ :raises ValueError: If the manifest was written by an incompatible version. """
+    with open(path) as file:
+        manifest = json.load(file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{path} has manifest version {manifest.get('version')}, expected {MANIFEST_VERSION}")
+    return [ModuleEntry(**entry) for entry in manifest["modules"]]
+
+
+def stale_entries(directory: str, entries: Iterable[ModuleEntry], package: Optional[str] = None) -> list[str]:
+    """
+    The protocols whose module was added, removed or renamed, or whose class was renamed, since the entries were
+    scanned; empty if they are current. Other edits to a module do not change its entry.
+    """
+    current = {entry.protocol: entry for entry in scan_modules(directory, package)}
+    recorded = {entry.protocol: entry for entry in entries}
+    return sorted(protocol for protocol in current.keys() | recorded.keys() if current.get(protocol) != recorded.get(protocol))
+
+
+class ModuleRegistry:
+    """
+    The liquidity modules of a manifest by protocol, imported on first use.
+
+    Every module is instantiated once and the instance is reused for all later quotes, so helpers a module builds in
+    its constructor (e.g. the WOOFiPoolMath of WOOFiLiquidityModule) are built once per process.
+    """
+
+    def __init__(self, entries: Iterable[ModuleEntry], factory: Optional[Callable[[type], LiquidityModule]] = None):
+        """
+        :param entries: The modules, e.g. from read_manifest or scan_modules.
+        :param factory: Builds the instance from the class, e.g. to pass instrumentation; calls the class by default.
+        :raises ValueError: If two entries have the same protocol.
+        """
+        self.entries = {}
+        for entry in entries:
+            if entry.protocol in self.entries:
+                raise ValueError(f"protocol {entry.protocol} is defined by {self.entries[entry.protocol].path} and {entry.path}")
+            self.entries[entry.protocol] = entry
+        self.factory = factory
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: str, package: Optional[str] = None, factory: Optional[Callable[[type], LiquidityModule]] = None) -> "ModuleRegistry":
+        """ The modules of a directory from its manifest, or by scanning the sources if it has none. """
+        path = os.path.join(directory, MANIFEST_NAME)
+        entries = read_manifest(path) if os.path.exists(path) else scan_modules(directory, package)
+        return cls(entries, factory)
+
+    def protocols(self) -> list[str]:
+        return list(self.entries)
+
+    def loaded(self) -> list[str]:
+        """ The protocols whose module has been imported. """
+        return list(self._instances)
+
+    def __contains__(self, protocol: str) -> bool:
+        return protocol in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def module(self, protocol: str) -> LiquidityModule:
+        """
+        The instance of the protocol's module, importing it on the first call.
+
+        :raises KeyError: If the protocol is not registered.
+        :raises TypeError: If the registered class is not a LiquidityModule.
+        """
+        instance = self._instances.get(protocol)
+        if instance is not None:
+            return instance
+        entry = self.entries[protocol]
+        with self._lock:
+            instance = self._instances.get(protocol)
+            if instance is None:
+                module_class = getattr(importlib.import_module(entry.module), entry.name)
+                if not (isinstance(module_class, type) and issubclass(module_class, LiquidityModule)):
+                    raise TypeError(f"{entry.module}.{entry.name} is not a LiquidityModule")
+                instance = self._instances[protocol] = module_class() if self.factory is None else self.factory(module_class)
+        return instance
+
+    def get_amount_out(self, protocol: str, pool_state: Any, fixed_parameters: Dict, input_token, output_token, input_amount: int) -> tuple[int | None, int | None]:
+        """ get_amount_out of the protocol's module. """
+        return self.module(protocol).get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
+
+    def get_amount_in(self, protocol: str, pool_state: Any, fixed_parameters: Dict, input_token, output_token, output_amount: int) -> tuple[int | None, int | None]:
+        """ get_amount_in of the protocol's module. """
+        return self.module(protocol).get_amount_in(pool_state, fixed_parameters, input_token, output_token, output_amount)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes the manifest of the liquidity modules of a directory.")
+    parser.add_argument("--directory", default="modules", help="the modules directory")
+    parser.add_argument("--package", help="the package the modules are imported from, the directory name by default")
+    parser.add_argument("--check", action="store_true", help="only check that the manifest is current; exits with 1 if not")
+    args = parser.parse_args()
+
+    path = os.path.join(args.directory, MANIFEST_NAME)
+    if args.check:
+        stale = stale_entries(args.directory, read_manifest(path) if os.path.exists(path) else [], args.package)
+        if stale:
+            print(f"{path} is out of date for {', '.join(stale)}; run python -m engine.module_registry", file=sys.stderr)
+            sys.exit(1)
+        return
+    entries = scan_modules(args.directory, args.package)
+    write_manifest(path, entries)
+    print(f"wrote {len(entries)} modules to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+from typing import Callable, Dict, NamedTuple, Sequence
+
+from templates.liquidity_module import LiquidityModule, Token
+
+
+MARGINAL_RATE = "marginal_rate"
+GREEDY = "greedy"
+# greedy chunks over the venues without marginal rates and the equalized group of those with them
+MIXED = "mixed"
+
+
+class Venue(NamedTuple):
+    module: LiquidityModule
+    pool_state: Dict
+    fixed_parameters: Dict
+
+
+class OrderSplit(NamedTuple):
+    allocations: list[int]
+    fees: list[int]
+    amounts_out: list[int]
+    total_amount_out: int
+    # the part of the order no venue can take
+    unfilled_amount: int
+    # MARGINAL_RATE, GREEDY or MIXED
+    method: str
+
+
+def split_order(
+    venues: Sequence[Venue],
+    input_token: Token,
+    output_token: Token,
+    input_amount: int,
+    greedy_chunks: int = 100,
+) -> OrderSplit:
+    """
+    Splits one exact-in order across venues to maximize the total output.
+
+    Venues whose module implements get_marginal_rate are allocated by equalizing the marginal rates: the common rate
+    is solved for so that the amounts at which each venue's rate falls to it add up to the order. Venues whose rate
+    never reaches it get nothing, and no venue gets more than it accepts. If no venue has marginal rates, the order is
+    cut into greedy_chunks equal chunks, each going to the venue that turns it into the most output. If only some do,
+    the chunks go either to one of the others or to the group of those with marginal rates, which splits its total by
+    equalizing (MIXED). A venue that accepts part of the order but has no marginal rate at zero size counts as one
+    without marginal rates.
+
+    :param venues: The (module, pool_state, fixed_parameters) that can fill the order.
+    :param input_token: The token being sold.
+    :param output_token: The token being bought.
+    :param input_amount: The size of the order.
+    :param greedy_chunks: The number of chunks of the greedy fallback.
+    :return: The allocation and the quotes of every venue, in the order of venues.
+    """
+    sides = [_VenueSide(venue, input_token, output_token) for venue in venues]
+    # a venue that takes some of the order but has no rate at zero size cannot be placed on the common rate, so it
+    # takes greedy chunks instead
+    rated = [
+        index for index, side in enumerate(sides)
+        if side.has_marginal_rate and (side.zero_size_rate is not None or side.capacity(input_amount) == 0)
+    ]
+    if len(rated) == len(sides):
+        allocations, method = _equalize_marginal_rates(sides, [side.capacity(input_amount) for side in sides], input_amount), MARGINAL_RATE
+    elif not rated:
+        allocations, method = _greedy(sides, input_amount, greedy_chunks), GREEDY
+    else:
+        group = _MarginalRateGroup([sides[index] for index in rated], input_amount)
+        others = [index for index in range(len(sides)) if index not in rated]
+        shares = _greedy([group] + [sides[index] for index in others], input_amount, greedy_chunks)
+        allocations = [0] * len(sides)
+        for index, allocation in zip(rated, group.allocations(shares[0])):
+            allocations[index] = allocation
+        for index, allocation in zip(others, shares[1:]):
+            allocations[index] = allocation
+        method = MIXED
+
+    fees, amounts_out = [], []
+    for side, allocation in zip(sides, allocations):
+        fee, amount_out = side.amount_out(allocation) if allocation > 0 else (0, 0)
+        fees.append(fee)
+        amounts_out.append(amount_out)
+    return OrderSplit(allocations, fees, amounts_out, sum(amounts_out), input_amount - sum(allocations), method)
+
+
+class _VenueSide:
+    # One venue quoted for the order's pair, with prepared state when the module supports it
+
+    def __init__(self, venue: Venue, input_token: Token, output_token: Token):
+        module, pool_state, fixed_parameters = venue
+        if hasattr(module, "prepare_pool"):
+            pool_state = module.prepare_pool(pool_state, fixed_parameters, input_token, output_token)
+        self.module, self.pool_state, self.fixed_parameters = module, pool_state, fixed_parameters
+        self.input_token, self.output_token = input_token, output_token
+        try:
+            self.zero_size_rate = self.marginal_rate(0)
+            self.has_marginal_rate = True
+        except NotImplementedError:
+            self.zero_size_rate, self.has_marginal_rate = None, False
+
+    def amount_out(self, input_amount: int) -> tuple[int | None, int | None]:
+        return self.module.get_amount_out(self.pool_state, self.fixed_parameters, self.input_token, self.output_token, input_amount)
+
+    def marginal_rate(self, input_amount: int) -> float | None:
+        return self.module.get_marginal_rate(self.pool_state, self.fixed_parameters, self.input_token, self.output_token, input_amount)
+
+    def capacity(self, input_amount: int) -> int:
+        # The largest input up to input_amount the venue accepts
+        if hasattr(self.module, "get_liquidity_bound"):
+            max_input_amount = self.module.get_liquidity_bound(self.pool_state, self.fixed_parameters, self.input_token, self.output_token).max_input_amount
+            return 0 if max_input_amount is None else min(max_input_amount, input_amount)
+
+        if self.amount_out(input_amount)[1] is not None:
+            return input_amount
+        low, high = -1, input_amount
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.amount_out(middle)[1] is None:
+                high = middle
+            else:
+                low = middle
+        return max(low, 0)
+
+
+def _illinois(function: Callable[[float], float], low: float, f_low: float, high: float, f_high: float, done: Callable) -> float:
+    # Root of a monotone function bracketed by (low, high) with f_low and f_high of opposite signs; regula falsi with
+    # the Illinois modification, so near-linear functions (like the WOOFi marginal rates) converge in a few steps
+    side = 0
+    for _ in range(100):
+        middle = (low * f_high - high * f_low) / (f_high - f_low)
+        if not low < middle < high and not high < middle < low:
+            middle = (low + high) / 2
+        f_middle = function(middle)
+        if done(low, high, f_middle):
+            return middle
+        if (f_middle > 0) == (f_low > 0):
+            low, f_low = middle, f_middle
+            if side == -1:
+                f_high /= 2
+            side = -1
+        else:
+            high, f_high = middle, f_middle
+            if side == 1:
+                f_low /= 2
+            side = 1
+    return middle
+
+
+class _MarginalRateGroup:
+    # The venues with marginal rates as one venue of the greedy loop, splitting any amount it gets by equalizing
+
+    def __init__(self, sides: list[_VenueSide], input_amount: int):
+        self.sides = sides
+        self.capacities = [side.capacity(input_amount) for side in sides]
+        self._allocations = {}
+
+    def allocations(self, input_amount: int) -> list[int]:
+        allocations = self._allocations.get(input_amount)
+        if allocations is None:
+            allocations = self._allocations[input_amount] = _equalize_marginal_rates(self.sides, self.capacities, input_amount)
+        return allocations
+
+    def amount_out(self, input_amount: int) -> tuple[int | None, int | None]:
+        if input_amount > sum(self.capacities):
+            return None, None
+        fees = amounts_out = 0
+        for side, allocation in zip(self.sides, self.allocations(input_amount)):
+            if allocation > 0:
+                fee, amount_out = side.amount_out(allocation)
+                fees, amounts_out = fees + fee, amounts_out + amount_out
+        return fees, amounts_out
+
+
+def _equalize_marginal_rates(sides: list[_VenueSide], capacities: list[int], input_amount: int) -> list[int]:
+    # venues that accept nothing, or have no rate at zero size, get nothing and do not bound the common rate;
+    # capacities may be those of a larger order, and no venue gets more than the order either way
+    active = [index for index, side in enumerate(sides) if capacities[index] > 0 and side.zero_size_rate is not None]
+    capacities = [min(capacities[index], input_amount) if index in active else 0 for index in range(len(sides))]
+    if sum(capacities) <= input_amount:
+        return capacities
+
+    full_rates = {index: sides[index].marginal_rate(capacities[index]) for index in active}
+
+    def amount_at_rate(index: int, rate: float) -> int:
+        # The input at which venue index's (decreasing) marginal rate falls to rate
+        side, capacity = sides[index], capacities[index]
+        if side.zero_size_rate <= rate:
+            return 0
+        if full_rates[index] >= rate:
+            return capacity
+        amount = _illinois(
+            lambda x: side.marginal_rate(int(x)) - rate, 0, side.zero_size_rate - rate, capacity, full_rates[index] - rate,
+            lambda low, high, f: abs(high - low) <= 1 or abs(f) <= rate * 1e-12,
+        )
+        return int(amount)
+
+    def allocate(rate: float) -> list[int]:
+        allocations = [0] * len(sides)
+        for index in active:
+            allocations[index] = amount_at_rate(index, rate)
+        return allocations
+
+    # the total allocation falls as the common rate rises: all capacity at the lowest full rate, nothing at the highest rate
+    slack = max(len(sides), input_amount >> 40)
+    low = min(full_rates.values())
+    high = max(sides[index].zero_size_rate for index in active)
+    rate = _illinois(
+        lambda rate: sum(allocate(rate)) - input_amount, low, sum(capacities) - input_amount, high, -input_amount,
+        lambda low, high, f: abs(f) <= slack or abs(high - low) <= abs(high) * 1e-15,
+    )
+    allocations = allocate(rate)
+
+    # hand the rounding remainder to the venues with the best marginal rates (or take it from the worst)
+    remainder = input_amount - sum(allocations)
+    while remainder != 0:
+        candidates = [index for index in active if (allocations[index] < capacities[index] if remainder > 0 else allocations[index] > 0)]
+        rates = {index: sides[index].marginal_rate(allocations[index]) for index in candidates}
+        index = max(candidates, key=rates.get) if remainder > 0 else min(candidates, key=rates.get)
+        change = min(remainder, capacities[index] - allocations[index]) if remainder > 0 else -min(-remainder, allocations[index])
+        allocations[index] += change
+        remainder -= change
+    return allocations
+
+
+def _greedy(sides: list, input_amount: int, chunks: int) -> list[int]:
+    # sides are _VenueSide or _MarginalRateGroup, anything with amount_out
+    allocations = [0] * len(sides)
+    amounts_out = [0] * len(sides)
+    chunk = max(1, -(-input_amount // chunks))
+    remaining = input_amount
+    while remaining > 0:
+        size = min(chunk, remaining)
+        best, best_gain, best_amount_out = None, None, None
+        for index, side in enumerate(sides):
+            amount_out = side.amount_out(allocations[index] + size)[1]
+            if amount_out is not None and (best is None or amount_out - amounts_out[index] > best_gain):
+                best, best_gain, best_amount_out = index, amount_out - amounts_out[index], amount_out
+        if best is None:
+            # no venue takes a full chunk any more
+            if size == 1:
+                break
+            chunk = max(1, size // 2)
+            continue
+        allocations[best] += size
+        amounts_out[best] = best_amount_out
+        remaining -= size
+    return allocations
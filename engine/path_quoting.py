@@ -0,0 +1,159 @@
+from typing import Callable, Dict, Hashable, NamedTuple, Sequence
+
+from engine.quote_cache import identity_fingerprint
+from engine.token_registry import same_address
+from templates.liquidity_module import LiquidityModule, Token
+
+
+class Hop(NamedTuple):
+    module: LiquidityModule
+    pool_state: Dict
+    fixed_parameters: Dict
+    input_token: Token
+    output_token: Token
+
+
+class PathQuote(NamedTuple):
+    # amounts[0] goes into the first hop, amounts[i + 1] comes out of hop i; amounts[-1] is the route's output
+    amounts: list[int]
+    # the fee of every hop, in terms of its input token
+    fees: list[int]
+
+    @property
+    def amount_in(self) -> int:
+        return self.amounts[0]
+
+    @property
+    def amount_out(self) -> int:
+        return self.amounts[-1]
+
+
+def check_route(route: Sequence[Hop]):
+    """
+    :raises ValueError: If the route is empty or a hop does not start with the token the previous hop ends with.
+    """
+    if not route:
+        raise ValueError("a route needs at least one hop")
+    for index in range(1, len(route)):
+        if not same_address(route[index - 1].output_token.address, route[index].input_token.address):
+            raise ValueError(f"hop {index} starts with {route[index].input_token.symbol}, hop {index - 1} ends with {route[index - 1].output_token.symbol}")
+
+
+def quote_path_out(route: Sequence[Hop], input_amount: int) -> PathQuote | None:
+    """
+    Quotes an exact-in swap through every hop of the route, feeding each hop's output into the next.
+
+    :param route: The hops, in swap order.
+    :param input_amount: The amount of the first hop's input token.
+    :return: The amounts and fees along the route, or None if any hop cannot fill its amount.
+    """
+    check_route(route)
+    amounts, fees = [input_amount], []
+    for hop in route:
+        fee, amount = hop.module.get_amount_out(hop.pool_state, hop.fixed_parameters, hop.input_token, hop.output_token, amounts[-1])
+        if amount is None:
+            return None
+        amounts.append(amount)
+        fees.append(fee)
+    return PathQuote(amounts, fees)
+
+
+def quote_path_in(route: Sequence[Hop], output_amount: int) -> PathQuote | None:
+    """
+    Quotes an exact-out swap through the route: each hop, from the last to the first, is asked for the input that
+    yields the amount the following hop needs.
+
+    :param route: The hops, in swap order.
+    :param output_amount: The amount of the last hop's output token.
+    :return: The amounts and fees along the route, or None if any hop cannot provide its amount.
+    """
+    check_route(route)
+    amounts, fees = [output_amount], []
+    for hop in reversed(route):
+        fee, amount = hop.module.get_amount_in(hop.pool_state, hop.fixed_parameters, hop.input_token, hop.output_token, amounts[-1])
+        if amount is None:
+            return None
+        amounts.append(amount)
+        fees.append(fee)
+    return PathQuote(amounts[::-1], fees[::-1])
+
+
+def quote_routes_out(
+    routes: Sequence[Sequence[Hop]],
+    input_amount: int,
+    fingerprint: Callable[[Dict, Dict], Hashable] = identity_fingerprint,
+) -> list[PathQuote | None]:
+    """
+    quote_path_out for many candidate routes of one order. Routes are merged into a prefix tree, so a hop sequence
+    shared by several routes (e.g. the same first hop into USDC) is quoted once.
+
+    :param routes: The candidate routes; all start with the same token.
+    :param input_amount: The amount of the input token.
+    :param fingerprint: Keys the state of a hop, see engine.quote_cache; hops are shared if their modules, state
+        fingerprints and tokens are equal.
+    :return: One quote (or None) per route, in the order of routes.
+    """
+    return _quote_routes(routes, input_amount, fingerprint, exact_out=False)
+
+
+def quote_routes_in(
+    routes: Sequence[Sequence[Hop]],
+    output_amount: int,
+    fingerprint: Callable[[Dict, Dict], Hashable] = identity_fingerprint,
+) -> list[PathQuote | None]:
+    """
+    quote_path_in for many candidate routes of one order. Exact-out quotes run from the last hop backwards, so
+    routes are merged on their shared suffixes (e.g. the same last hop out of USDC).
+
+    :return: One quote (or None) per route, in the order of routes.
+    """
+    return _quote_routes(routes, output_amount, fingerprint, exact_out=True)
+
+
+class _Node:
+    # A hop of the prefix tree (suffix tree for exact-out) and the routes that end there
+    __slots__ = ("hop", "children", "routes")
+
+    def __init__(self, hop: Hop | None):
+        self.hop = hop
+        self.children: Dict[Hashable, _Node] = {}
+        self.routes: list[int] = []
+
+
+def _quote_routes(routes: Sequence[Sequence[Hop]], amount: int, fingerprint: Callable, exact_out: bool) -> list[PathQuote | None]:
+    root = _Node(None)
+    # candidate routes are usually built from a small set of hop objects, so each one is keyed once
+    keys = {}
+    for index, route in enumerate(routes):
+        if not route:
+            raise ValueError("a route needs at least one hop")
+        node = root
+        for hop in (reversed(route) if exact_out else route):
+            key = keys.get(id(hop))
+            if key is None:
+                key = keys[id(hop)] = (id(hop.module), fingerprint(hop.pool_state, hop.fixed_parameters), hop.input_token.address.lower(), hop.output_token.address.lower())
+            child = node.children.get(key)
+            if child is None:
+                # every edge of the tree is a link between consecutive hops, so checking new edges checks every route
+                if node.hop is not None:
+                    check_route([hop, node.hop] if exact_out else [node.hop, hop])
+                child = node.children[key] = _Node(hop)
+            node = child
+        node.routes.append(index)
+
+    quotes = [None] * len(routes)
+    # depth first; every node is quoted once with the amount its parent produced, and the amounts and fees of the
+    # path so far are shared by all routes below it
+    stack = [(child, amount, [amount], []) for child in root.children.values()]
+    while stack:
+        node, node_amount, amounts, fees = stack.pop()
+        hop = node.hop
+        quote = hop.module.get_amount_in if exact_out else hop.module.get_amount_out
+        fee, next_amount = quote(hop.pool_state, hop.fixed_parameters, hop.input_token, hop.output_token, node_amount)
+        if next_amount is None:
+            continue
+        amounts, fees = amounts + [next_amount], fees + [fee]
+        for index in node.routes:
+            quotes[index] = PathQuote(amounts[::-1], fees[::-1]) if exact_out else PathQuote(amounts, fees)
+        stack.extend((child, next_amount, amounts, fees) for child in node.children.values())
+    return quotes
@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Callable, Dict, Hashable, NamedTuple, Optional
+
+from templates.liquidity_module import LiquidityModule, Token
+
+
+AMOUNT_OUT = 0
+AMOUNT_IN = 1
+
+
+def identity_fingerprint(pool_state: Dict, fixed_parameters: Dict) -> Hashable:
+    """
+    Keys a state on the identity of its objects. This is the cheapest fingerprint, but a state that is mutated in
+    place must be passed to CachedLiquidityModule.invalidate before it is quoted again.
+    """
+    return id(pool_state), id(fixed_parameters)
+
+
+def content_fingerprint(pool_state: Dict, fixed_parameters: Dict) -> Hashable:
+    """
+    Keys a state on its values, so in-place updates are picked up without invalidation. States that are not dicts
+    (such as prepared pools) are keyed on their identity, as by identity_fingerprint.
+    """
+    if not isinstance(pool_state, dict):
+        return id(pool_state), id(fixed_parameters)
+    return tuple(pool_state.items()), id(fixed_parameters)
+
+
+class QuoteCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class CachedLiquidityModule(LiquidityModule):
+    """
+    Memoizes get_amount_out / get_amount_in of any liquidity module with bounded LRU eviction.
+
+    Quotes are keyed on the fingerprint of (pool_state, fixed_parameters), the token addresses and the amount. The
+    addresses are taken as passed, since normalizing them would double the cost of a hit: a token passed in another
+    checksum casing misses and is quoted again, so callers that mix casings should pass the RegisteredTokens of an
+    engine.token_registry.TokenRegistry. The states of cached quotes are referenced by the cache, so identity
+    fingerprints cannot be reused by another object while their quotes are alive.
+
+    Every other method of the wrapped module (get_marginal_rate, get_liquidity_bound, prepare_pool, ...) is forwarded
+    to it uncached. So are the batch methods it implements natively, which keeps their faster path; the other batch
+    methods loop over the cached scalar quotes.
+    """
+
+    def __init__(
+        self,
+        module: LiquidityModule,
+        maxsize: int = 65536,
+        fingerprint: Callable[[Dict, Dict], Hashable] = identity_fingerprint,
+    ):
+        """
+        :param module: The liquidity module whose quotes are cached.
+        :param maxsize: The maximum number of quotes kept.
+        :param fingerprint: Maps (pool_state, fixed_parameters) to the hashable state part of the cache key.
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.module = module
+        # the natively batched methods of the module shadow the looping defaults
+        for name in module.native_batch_methods():
+            setattr(self, name, getattr(module, name))
+        self.maxsize = maxsize
+        self.fingerprint = fingerprint
+        self.hits = self.misses = self.evictions = 0
+        self._quotes = OrderedDict()
+        # fingerprint -> (pool_state, fixed_parameters, keys of its cached quotes)
+        self._states = {}
+
+    def get_amount_out(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> tuple[int | None, int | None]:
+        state_key = self.fingerprint(pool_state, fixed_parameters)
+        key = (state_key, AMOUNT_OUT, input_token.address, output_token.address, input_amount)
+        quote = self._quotes.get(key)
+        if quote is not None:
+            self._quotes.move_to_end(key)
+            self.hits += 1
+            return quote
+
+        self.misses += 1
+        quote = self.module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
+        self._store(state_key, key, quote, pool_state, fixed_parameters)
+        return quote
+
+    def get_amount_in(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        output_amount: int
+    ) -> tuple[int | None, int | None]:
+        state_key = self.fingerprint(pool_state, fixed_parameters)
+        key = (state_key, AMOUNT_IN, input_token.address, output_token.address, output_amount)
+        quote = self._quotes.get(key)
+        if quote is not None:
+            self._quotes.move_to_end(key)
+            self.hits += 1
+            return quote
+
+        self.misses += 1
+        quote = self.module.get_amount_in(pool_state, fixed_parameters, input_token, output_token, output_amount)
+        self._store(state_key, key, quote, pool_state, fixed_parameters)
+        return quote
+
+    def get_marginal_rate(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> float | None:
+        return self.module.get_marginal_rate(pool_state, fixed_parameters, input_token, output_token, input_amount)
+
+    def get_price_impact(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> float | None:
+        return self.module.get_price_impact(pool_state, fixed_parameters, input_token, output_token, input_amount)
+
+    def get_apy(self, pool_state: Dict) -> Decimal:
+        return self.module.get_apy(pool_state)
+
+    def get_tvl(self, pool_state: Dict, token: Optional[Token] = None) -> Decimal:
+        return self.module.get_tvl(pool_state, token)
+
+    def native_batch_methods(self) -> frozenset[str]:
+        return self.module.native_batch_methods()
+
+    def __getattr__(self, name: str):
+        # only reached for attributes the cache does not define, such as the module's optional methods
+        if name == "module":
+            raise AttributeError(name)
+        return getattr(self.module, name)
+
+    def invalidate(self, pool_state: Optional[Dict] = None, fixed_parameters: Optional[Dict] = None) -> int:
+        """
+        Drops the cached quotes of one state, or of every state if pool_state is None.
+
+        :param pool_state: The state being replaced, as it was passed to the quoting methods.
+        :param fixed_parameters: The fixed parameters it was quoted with.
+        :return: The number of quotes dropped.
+        """
+        if pool_state is None:
+            dropped = len(self._quotes)
+            self._quotes.clear()
+            self._states.clear()
+            return dropped
+
+        entry = self._states.pop(self.fingerprint(pool_state, fixed_parameters), None)
+        if entry is None:
+            return 0
+        for key in entry[2]:
+            del self._quotes[key]
+        return len(entry[2])
+
+    def cache_info(self) -> QuoteCacheInfo:
+        return QuoteCacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._quotes))
+
+    def _store(self, state_key: Hashable, key: tuple, quote: tuple, pool_state: Dict, fixed_parameters: Dict):
+        entry = self._states.get(state_key)
+        if entry is None:
+            entry = self._states[state_key] = (pool_state, fixed_parameters, set())
+        entry[2].add(key)
+        self._quotes[key] = quote
+
+        if len(self._quotes) > self.maxsize:
+            evicted, _ = self._quotes.popitem(last=False)
+            self.evictions += 1
+            keys = self._states[evicted[0]][2]
+            keys.discard(evicted)
+            if not keys:
+                del self._states[evicted[0]]
@@ -0,0 +1,433 @@
+"""
+A quote server for any LiquidityModule: clients send JSON lines over a Unix or TCP socket, requests arriving within a
+short window are coalesced into micro-batches, and batches are quoted by worker processes that each hold every pool
+state in their own memory.
+
+Requests (one JSON object per line, answered with the same "id"):
+    {"id": 1, "op": "amount_out", "pool": "base", "input_token": "0x...", "output_token": "0x...", "amount": 10}
+        -> {"id": 1, "fee": 0, "amount": 9}, or {"id": 1, "error": "..."}; "op": "amount_in" quotes exact-out
+    {"id": 2, "op": "token", "token": {"address": "0x...", "symbol": "USDC", "decimals": 6, "reference_price": "1"}}
+    {"id": 3, "op": "update", "pool": "base", "pool_state": {...}, "fixed_parameters": {...}}
+        -> {"id": 3, "ok": true}; fixed_parameters may be omitted to keep the current ones, and tokens inside it are
+           written as {"token": "0x..."}
+
+Quotes are answered as their batches complete, so answers on one connection can arrive out of order. Updates and
+tokens are broadcast to every worker once the quotes received before them are sent, and apply to every quote received
+after them.
+
+Usage: python -m engine.quote_server --module modules.woofi_liquidity_module:WOOFiLiquidityModule --state state.json
+           (--unix /tmp/quotes.sock | --port 8765) [--workers 4] [--window-us 500] [--max-batch 256]
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+from decimal import Decimal
+from typing import Callable, Dict, Optional
+
+from templates.liquidity_module import LiquidityModule, Token, decode_fixed_parameters, decode_token, encode_fixed_parameters, encode_token
+
+
+AMOUNT_OUT = "amount_out"
+AMOUNT_IN = "amount_in"
+UPDATE = "update"
+TOKEN = "token"
+
+
+def _worker_main(module_factory: Callable[[], LiquidityModule], connection):
+    # Worker process: holds tokens and pools, answers batches of raw request lines with raw response lines
+    module = module_factory()
+    prepare_pool = getattr(module, "prepare_pool", None)
+    tokens, pools, prepared = {}, {}, {}
+
+    def answer(line: bytes) -> bytes:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            pool_id, side, amount = request["pool"], request["op"], int(request["amount"])
+            input_token, output_token = tokens[request["input_token"].lower()], tokens[request["output_token"].lower()]
+            pool_state, fixed_parameters = pools[pool_id]
+            if prepare_pool is not None:
+                key = (pool_id, input_token.address, output_token.address)
+                pool_state = prepared.get(key)
+                if pool_state is None:
+                    pool_state = prepared[key] = prepare_pool(*pools[pool_id], input_token, output_token)
+            if side == AMOUNT_OUT:
+                fee, amount = module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, amount)
+            elif side == AMOUNT_IN:
+                fee, amount = module.get_amount_in(pool_state, fixed_parameters, input_token, output_token, amount)
+            else:
+                raise ValueError(f"unknown op {side!r}")
+            response = {"id": request_id, "fee": fee, "amount": amount}
+        except KeyError as error:
+            response = {"id": request_id, "error": f"unknown {error.args[0]}"}
+        except Exception as error:
+            response = {"id": request_id, "error": f"{type(error).__name__}: {error}"}
+        return json.dumps(response).encode() + b"\n"
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            # the server is gone
+            break
+        kind = message[0]
+        if kind == "batch":
+            connection.send(("result", message[1], [answer(line) for line in message[2]]))
+        elif kind == "token":
+            token = message[1]
+            tokens[token.address.lower()] = token
+        elif kind == "pool":
+            _, pool_id, pool_state, fixed_parameters = message
+            pools[pool_id] = (pool_state, fixed_parameters)
+            for key in [key for key in prepared if key[0] == pool_id]:
+                del prepared[key]
+        elif kind == "stop":
+            break
+    connection.close()
+
+
+class _Worker:
+    __slots__ = ("process", "connection", "in_flight")
+
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.in_flight = 0
+
+
+class QuoteServer:
+    """
+    The front end of the quote server. It parses nothing but control messages: quote requests are forwarded as raw
+    lines, so JSON decoding, quoting and encoding all run in the workers.
+
+    Each worker has at most max_in_flight batches outstanding; requests wait in the current batch while every worker
+    is busy, and connections are not read while it is full. This bounds the pipes between the processes and pushes
+    back on clients.
+    """
+
+    def __init__(
+        self,
+        module_factory: Callable[[], LiquidityModule],
+        workers: int = os.cpu_count() or 1,
+        batch_window: float = 0.0005,
+        max_batch: int = 256,
+        max_in_flight: int = 2,
+        start_method: Optional[str] = None,
+    ):
+        """
+        :param module_factory: Builds the module in every worker, e.g. WOOFiLiquidityModule; it must be picklable
+            under the "spawn" start method.
+        :param workers: The number of worker processes.
+        :param batch_window: Seconds a request may wait for others to join its batch.
+        :param max_batch: Requests per batch; a full batch is sent without waiting for the window.
+        :param max_in_flight: Batches a worker may hold at once.
+        :param start_method: The multiprocessing start method, the platform default if None.
+        """
+        if workers <= 0 or max_batch <= 0 or max_in_flight <= 0:
+            raise ValueError("workers, max_batch and max_in_flight must be positive")
+        self.module_factory = module_factory
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self.batches_sent = 0
+        self.requests_sent = 0
+        self.tokens: Dict[str, Token] = {}
+        self.pools: Dict[str, tuple[Dict, Dict]] = {}
+
+        context = multiprocessing.get_context(start_method)
+        self._workers = []
+        for _ in range(workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_worker_main, args=(module_factory, worker_connection), daemon=True)
+            process.start()
+            worker_connection.close()
+            self._workers.append(_Worker(process, connection))
+
+        self._loop = None
+        self._worker_free = None
+        # (writer, line) per quote request and (None, message) per update, which waits for the requests before it
+        self._pending = []
+        self._flush_handle = None
+        # batch id -> writers of its requests, in order
+        self._batches = {}
+        self._next_batch_id = 0
+
+    def add_token(self, token: Token):
+        """ Adds a token to every worker; like set_pool, it is queued behind the requests already received. """
+        self.tokens[token.address.lower()] = token
+        self._queue_update(("token", token))
+
+    def set_pool(self, pool_id: str, pool_state: Dict, fixed_parameters: Optional[Dict] = None):
+        """
+        Sets the state of a pool in every worker. Requests already received are quoted against the previous state:
+        the update is queued behind them and broadcast once they are sent, which waits for a free worker if every
+        worker is at max_in_flight.
+
+        :param fixed_parameters: The new fixed parameters, or None to keep the current ones.
+        :raises KeyError: If fixed_parameters is None for a new pool.
+        """
+        if fixed_parameters is None:
+            fixed_parameters = self.pools[pool_id][1]
+        self.pools[pool_id] = (pool_state, fixed_parameters)
+        self._queue_update(("pool", pool_id, pool_state, fixed_parameters))
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        self._attach()
+        return await asyncio.start_unix_server(self._handle, path=path, limit=2**22)
+
+    async def serve_tcp(self, host: str, port: int) -> asyncio.AbstractServer:
+        self._attach()
+        return await asyncio.start_server(self._handle, host=host, port=port, limit=2**22)
+
+    def close(self):
+        if self._loop is not None:
+            for worker in self._workers:
+                self._loop.remove_reader(worker.connection.fileno())
+        for worker in self._workers:
+            try:
+                worker.connection.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.connection.close()
+
+    def _attach(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._worker_free = asyncio.Event()
+            for worker in self._workers:
+                self._loop.add_reader(worker.connection.fileno(), self._on_result, worker)
+
+    def _queue_update(self, message):
+        self._pending.append((None, message))
+        while self._pending and self._flush():
+            pass
+
+    def _broadcast(self, message):
+        for worker in self._workers:
+            worker.connection.send(message)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if b'"update"' in line or b'"token"' in line:
+                    response = self._control(line)
+                    if response is not None:
+                        writer.write(response)
+                        continue
+                self._pending.append((writer, line))
+                if len(self._pending) >= self.max_batch:
+                    if not self._flush():
+                        # every worker is busy: stop reading until one of them answers
+                        self._worker_free.clear()
+                        await self._worker_free.wait()
+                elif self._flush_handle is None:
+                    self._flush_handle = self._loop.call_later(self.batch_window, self._on_window)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _control(self, line: bytes) -> bytes | None:
+        # Handles update and token messages; None if the line is a quote request after all
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return None
+        op = request.get("op")
+        if op not in (UPDATE, TOKEN):
+            return None
+        try:
+            if op == TOKEN:
+                self.add_token(decode_token(request["token"]))
+            else:
+                fixed_parameters = request.get("fixed_parameters")
+                if fixed_parameters is not None:
+                    fixed_parameters = decode_fixed_parameters(fixed_parameters, self.tokens)
+                self.set_pool(request["pool"], request["pool_state"], fixed_parameters)
+            response = {"id": request.get("id"), "ok": True}
+        except KeyError as error:
+            response = {"id": request.get("id"), "error": f"unknown {error.args[0]}"}
+        except Exception as error:
+            response = {"id": request.get("id"), "error": f"{type(error).__name__}: {error}"}
+        return json.dumps(response).encode() + b"\n"
+
+    def _on_window(self):
+        self._flush_handle = None
+        self._flush()
+
+    def _flush(self) -> bool:
+        # Sends up to max_batch pending requests, up to the next update, to the least busy worker; False if no requests
+        # are pending or every worker is at max_in_flight
+        self._broadcast_updates()
+        if not self._pending:
+            return False
+        worker = min(self._workers, key=lambda worker: worker.in_flight)
+        if worker.in_flight >= self.max_in_flight:
+            return False
+        pending, size = self._pending, 0
+        while size < self.max_batch and size < len(pending) and pending[size][0] is not None:
+            size += 1
+        batch, self._pending = pending[:size], pending[size:]
+        batch_id = self._next_batch_id
+        self._next_batch_id += 1
+        self._batches[batch_id] = [writer for writer, _ in batch]
+        worker.connection.send(("batch", batch_id, [line for _, line in batch]))
+        worker.in_flight += 1
+        self.batches_sent += 1
+        self.requests_sent += len(batch)
+        self._broadcast_updates()
+        if self._pending and self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self.batch_window, self._on_window)
+        return True
+
+    def _broadcast_updates(self):
+        # The updates at the head of the queue: every request before them is with a worker, whose pipe delivers it first
+        pending, count = self._pending, 0
+        while count < len(pending) and pending[count][0] is None:
+            self._broadcast(pending[count][1])
+            count += 1
+        if count:
+            del pending[:count]
+
+    def _on_result(self, worker: _Worker):
+        connection = worker.connection
+        while connection.poll():
+            _, batch_id, responses = connection.recv()
+            worker.in_flight -= 1
+            for writer, response in zip(self._batches.pop(batch_id), responses):
+                if not writer.is_closing():
+                    writer.write(response)
+        # requests that waited for a free worker; without a window running, theirs has already expired
+        while self._pending and (len(self._pending) >= self.max_batch or self._flush_handle is None) and self._flush():
+            pass
+        self._worker_free.set()
+
+
+class QuoteClient:
+    """ An asyncio client for QuoteServer; requests may be issued concurrently and are matched to answers by id. """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._reading = asyncio.get_running_loop().create_task(self._read())
+
+    @classmethod
+    async def connect_unix(cls, path: str) -> "QuoteClient":
+        return cls(*await asyncio.open_unix_connection(path, limit=2**22))
+
+    @classmethod
+    async def connect_tcp(cls, host: str, port: int) -> "QuoteClient":
+        return cls(*await asyncio.open_connection(host, port, limit=2**22))
+
+    async def quote_out(self, pool: str, input_token: str, output_token: str, input_amount: int) -> tuple[int | None, int | None]:
+        response = await self._request({"op": AMOUNT_OUT, "pool": pool, "input_token": input_token, "output_token": output_token, "amount": input_amount})
+        return response["fee"], response["amount"]
+
+    async def quote_in(self, pool: str, input_token: str, output_token: str, output_amount: int) -> tuple[int | None, int | None]:
+        response = await self._request({"op": AMOUNT_IN, "pool": pool, "input_token": input_token, "output_token": output_token, "amount": output_amount})
+        return response["fee"], response["amount"]
+
+    async def add_token(self, token: Token):
+        await self._request({"op": TOKEN, "token": encode_token(token)})
+
+    async def update_pool(self, pool: str, pool_state: Dict, fixed_parameters: Optional[Dict] = None):
+        request = {"op": UPDATE, "pool": pool, "pool_state": pool_state}
+        if fixed_parameters is not None:
+            request["fixed_parameters"] = encode_fixed_parameters(fixed_parameters)
+        await self._request(request)
+
+    async def close(self):
+        self._writer.close()
+        self._reading.cancel()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def _request(self, request: Dict) -> Dict:
+        """
+        :raises ValueError: If the server answers with an error.
+        """
+        request_id = self._next_id
+        self._next_id += 1
+        future = self._futures[request_id] = asyncio.get_running_loop().create_future()
+        self._writer.write(json.dumps(dict(request, id=request_id)).encode() + b"\n")
+        response = await future
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response
+
+    async def _read(self):
+        try:
+            while line := await self._reader.readline():
+                response = json.loads(line)
+                future = self._futures.pop(response["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("quote server closed the connection"))
+
+
+def load_state(server: QuoteServer, path: str):
+    """ Loads {"tokens": [token, ...], "pools": {pool id: {"pool_state": ..., "fixed_parameters": ...}}} into server. """
+    with open(path) as file:
+        state = json.load(file)
+    for fields in state["tokens"]:
+        server.add_token(decode_token(fields))
+    for pool_id, pool in state["pools"].items():
+        server.set_pool(pool_id, pool["pool_state"], decode_fixed_parameters(pool["fixed_parameters"], server.tokens))
+
+
+def import_factory(spec: str) -> Callable[[], LiquidityModule]:
+    """ "package.module:Name" -> the object Name of package.module. """
+    module_name, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), name)
+
+
+async def serve(server: QuoteServer, unix: Optional[str] = None, host: str = "127.0.0.1", port: Optional[int] = None):
+    listener = await (server.serve_unix(unix) if unix is not None else server.serve_tcp(host, port))
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves liquidity module quotes over a local socket.")
+    parser.add_argument("--module", required=True, help="the module class or factory, as package.module:Name")
+    parser.add_argument("--state", required=True, help="JSON file with the tokens and pools to load")
+    parser.add_argument("--unix", help="Unix socket path to listen on")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host to listen on")
+    parser.add_argument("--port", type=int, help="TCP port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--window-us", type=float, default=500, help="micro-batching window in microseconds")
+    parser.add_argument("--max-batch", type=int, default=256, help="requests per batch")
+    args = parser.parse_args()
+    if (args.unix is None) == (args.port is None):
+        parser.error("give exactly one of --unix and --port")
+
+    server = QuoteServer(import_factory(args.module), args.workers, args.window_us / 1e6, args.max_batch)
+    try:
+        load_state(server, args.state)
+        asyncio.run(serve(server, args.unix, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Replays historical trades through a liquidity module, against the pool states that were current at their blocks.
+
+Everything is streamed: states and trades are read lazily, the latest state of every pool is the only history kept,
+and per-trade results are written as they are produced, so memory does not grow with the length of the history.
+Trade logs can be split into contiguous block ranges that are replayed by separate processes.
+
+Files (JSON lines, sorted by block):
+    trades  {"block": 1, "pool": "weth-usdc", "input_token": "0x...", "output_token": "0x...", "amount_in": 10,
+             "amount_out": 9, "tx": "0x..."}; amount_out (what the trade received) and tx are optional
+    states  {"block": 1, "pool": "weth-usdc", "input_token": "0x...", "output_token": "0x...", "pool_state": {...}}; the
+             pairwise state of the pool from that block on, which only quotes trades from input_token to output_token,
+            or, for WOOFi pools, {"block": 1, "pool": "weth-usdc", "quote_token_reserve": 10, "tokens": {"0x...": {...}}}
+             with the TOKEN_STATE_FIELDS of every base token, which quotes every pair of the pool
+    pools   {"tokens": [...], "pools": {"weth-usdc": {"fixed_parameters": {...}}}}, as for engine.quote_server
+Binary WOOFi snapshots (modules.woofi_snapshot) can be used as states instead, see snapshot_states.
+
+Usage: python -m engine.replay --module modules.woofi_liquidity_module:WOOFiLiquidityModule --trades trades.jsonl
+           (--states states.jsonl --pools pools.json | --snapshots snapshot ...) --output results/ [--processes 4]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from functools import partial
+from typing import Callable, Dict, Hashable, Iterable, Iterator, Mapping, NamedTuple, Optional
+
+from engine.quote_server import import_factory
+from templates.liquidity_module import LiquidityModule, Token, decode_fixed_parameters, decode_token
+
+
+class StateUpdate(NamedTuple):
+    block: int
+    pool: Hashable
+    # (input token, output token) -> the pool_state of the pair from this block on
+    pair_state: Callable[[Token, Token], Dict]
+    fixed_parameters: Dict
+    # lower-case address -> token, for every token of the pool
+    tokens: Mapping[str, Token]
+
+
+class Trade(NamedTuple):
+    block: int
+    pool: Hashable
+    input_token: str
+    output_token: str
+    amount_in: int
+    # what the trade actually received, if known
+    amount_out: Optional[int] = None
+    tx: Optional[str] = None
+
+
+class TradeResult(NamedTuple):
+    trade: Trade
+    fee: Optional[int]
+    # the quoted amount, None if the module rejected the trade or it could not be quoted
+    amount_out: Optional[int]
+    # why the trade could not be quoted
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict:
+        trade = self.trade
+        return {
+            "block": trade.block, "pool": trade.pool, "tx": trade.tx, "input_token": trade.input_token,
+            "output_token": trade.output_token, "amount_in": trade.amount_in, "observed_amount_out": trade.amount_out,
+            "fee": self.fee, "amount_out": self.amount_out, "error": self.error,
+        }
+
+
+class ReplaySummary:
+    """ Aggregates of a replay; summaries of shards are combined with merge. """
+
+    FIELDS = ("trades", "quoted", "rejected", "errors", "compared", "exact", "abs_bps_sum", "max_abs_bps", "first_block", "last_block")
+
+    def __init__(self):
+        self.trades = self.quoted = self.rejected = self.errors = 0
+        # trades with an observed amount_out, and those the quote matched exactly
+        self.compared = self.exact = 0
+        # deviation of the quoted from the observed amount, in basis points
+        self.abs_bps_sum = self.max_abs_bps = 0.0
+        self.first_block = self.last_block = None
+
+    def add(self, result: TradeResult):
+        trade = result.trade
+        self.trades += 1
+        if self.first_block is None:
+            self.first_block = trade.block
+        self.last_block = trade.block
+        if result.error is not None:
+            self.errors += 1
+        elif result.amount_out is None:
+            self.rejected += 1
+        else:
+            self.quoted += 1
+            if trade.amount_out:
+                bps = abs(result.amount_out - trade.amount_out) / trade.amount_out * 1e4
+                self.compared += 1
+                self.exact += result.amount_out == trade.amount_out
+                self.abs_bps_sum += bps
+                self.max_abs_bps = max(self.max_abs_bps, bps)
+
+    def merge(self, other: "ReplaySummary"):
+        """ Adds the counts of a summary of later trades. """
+        for field in ("trades", "quoted", "rejected", "errors", "compared", "exact", "abs_bps_sum"):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.max_abs_bps = max(self.max_abs_bps, other.max_abs_bps)
+        if self.first_block is None:
+            self.first_block = other.first_block
+        if other.last_block is not None:
+            self.last_block = other.last_block
+
+    def as_dict(self) -> Dict:
+        summary = {field: getattr(self, field) for field in self.FIELDS}
+        summary["mean_abs_bps"] = self.abs_bps_sum / self.compared if self.compared else None
+        return summary
+
+
+def read_trades(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Trade]:
+    """
+    The trades of a trade log, read lazily.
+
+    :param start: Byte offset; a line belongs to the range it starts in, so ranges that split the file partition it.
+    :param end: Byte offset the range ends before, or None for the end of the file.
+    """
+    with open(path, "rb") as file:
+        if start > 0:
+            # skip the rest of the line that started before the range
+            file.seek(start - 1)
+            file.readline()
+        while end is None or file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            if line.strip():
+                trade = json.loads(line)
+                yield Trade(
+                    trade["block"], trade["pool"], trade["input_token"], trade["output_token"], int(trade["amount_in"]),
+                    None if trade.get("amount_out") is None else int(trade["amount_out"]), trade.get("tx"),
+                )
+
+
+def load_pools(path: str) -> tuple[Dict[Hashable, Dict], Dict[str, Token]]:
+    """ The fixed parameters of every pool of a pools file, and its tokens by lower-case address. """
+    with open(path) as file:
+        config = json.load(file)
+    tokens = {}
+    for fields in config["tokens"]:
+        token = decode_token(fields)
+        tokens[token.address.lower()] = token
+    return {pool: decode_fixed_parameters(entry["fixed_parameters"], tokens) for pool, entry in config["pools"].items()}, tokens
+
+
+def jsonl_states(path: str, pools_path: str, start_block: Optional[int] = None) -> Iterator[StateUpdate]:
+    """
+    The state updates of a states file, read lazily. Every update before start_block still has to be read to know the
+    state at start_block, so with many shards binary snapshots, which can be skipped, start faster.
+
+    :param pools_path: The pools file with the fixed parameters and tokens.
+    """
+    fixed_parameters, tokens = load_pools(pools_path)
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                update = json.loads(line)
+                pool = update["pool"]
+                if "tokens" in update:
+                    pair_state = _woofi_pair_states(fixed_parameters[pool], tokens, update)
+                else:
+                    pair_state = partial(_directed_pair_state, pool, update["input_token"].lower(), update["output_token"].lower(), update["pool_state"])
+                yield StateUpdate(update["block"], pool, pair_state, fixed_parameters[pool], tokens)
+
+
+def _directed_pair_state(pool: Hashable, input_address: str, output_address: str, pool_state: Dict, input_token: Token, output_token: Token) -> Dict:
+    # a pairwise state read in the other direction, or for another pair, would quote the wrong reserves and prices
+    if (input_token.address.lower(), output_token.address.lower()) != (input_address, output_address):
+        raise ValueError(f"the state of {pool} quotes {input_address} -> {output_address}")
+    return pool_state
+
+
+def _woofi_pair_states(fixed_parameters: Dict, tokens: Mapping[str, Token], update: Dict) -> Callable[[Token, Token], Dict]:
+    from modules.woofi_state_store import WOOFiStateStore
+    store = WOOFiStateStore(fixed_parameters, update["quote_token_reserve"])
+    for address, record in update["tokens"].items():
+        store.set_token(tokens[address.lower()], **record)
+    return store.pair_state
+
+
+def snapshot_states(paths: Iterable[str], start_block: Optional[int] = None) -> Iterator[StateUpdate]:
+    """
+    The pools of a series of WOOFi snapshots as state updates, pool index as pool id.
+
+    A snapshot is closed once every pool it holds has a newer state, and taking the next update is what tells the
+    generator that the consumer has moved on to the update before it, as replay does. When the generator is closed,
+    e.g. by a replay whose trades ran out, every snapshot still open is closed; once it is exhausted, the latest
+    snapshot of each pool stays open, since its states are still in use.
+
+    :param paths: Snapshot files in block order.
+    :param start_block: Snapshots before the last one at or before start_block are skipped after reading their header.
+    """
+    from modules.woofi_snapshot import WOOFiSnapshot
+
+    # pool -> the snapshot of its latest update, and snapshot -> the number of pools whose latest update it holds
+    latest, holders = {}, {}
+
+    def updates(snapshot) -> Iterator[StateUpdate]:
+        for update in _snapshot_updates(snapshot):
+            yield update
+            previous = latest.get(update.pool)
+            latest[update.pool] = snapshot
+            holders[snapshot] = holders.get(snapshot, 0) + 1
+            if previous is not None:
+                holders[previous] -= 1
+                if not holders[previous]:
+                    del holders[previous]
+                    previous.close()
+
+    skipped = snapshot = None
+    try:
+        for path in paths:
+            snapshot = WOOFiSnapshot(path)
+            if start_block is not None and snapshot.block_number <= start_block:
+                if skipped is not None:
+                    skipped.close()
+                skipped = snapshot
+                continue
+            if skipped is not None:
+                yield from updates(skipped)
+                skipped = None
+            yield from updates(snapshot)
+        if skipped is not None:
+            yield from updates(skipped)
+    except BaseException:
+        for open_snapshot in {skipped, snapshot, *latest.values()} - {None}:
+            open_snapshot.close()
+        raise
+
+
+def _snapshot_updates(snapshot) -> Iterator[StateUpdate]:
+    for pool in range(snapshot.pool_count):
+        tokens = {token.address.lower(): token for token in snapshot.tokens(pool)}
+        yield StateUpdate(snapshot.block_number, pool, partial(snapshot.pair_state, pool), snapshot.fixed_parameters(pool), tokens)
+
+
+def replay(module: LiquidityModule, states: Iterable[StateUpdate], trades: Iterable[Trade]) -> Iterator[TradeResult]:
+    """
+    Quotes every trade with get_amount_out against the latest state of its pool at or before its block.
+
+    :param states: State updates in block order.
+    :param trades: Trades in block order.
+    :raises ValueError: If a trade is older than the one before it.
+    """
+    states = iter(states)
+    pending = next(states, None)
+    current = {}
+    last_block = None
+    for trade in trades:
+        if last_block is not None and trade.block < last_block:
+            raise ValueError(f"trade at block {trade.block} after block {last_block}; trades must be in block order")
+        last_block = trade.block
+        while pending is not None and pending.block <= trade.block:
+            current[pending.pool] = pending
+            pending = next(states, None)
+
+        update = current.get(trade.pool)
+        if update is None:
+            yield TradeResult(trade, None, None, "no state")
+            continue
+        input_token, output_token = update.tokens.get(trade.input_token.lower()), update.tokens.get(trade.output_token.lower())
+        if input_token is None or output_token is None:
+            yield TradeResult(trade, None, None, "unknown token")
+            continue
+        try:
+            pool_state = update.pair_state(input_token, output_token)
+            fee, amount_out = module.get_amount_out(pool_state, update.fixed_parameters, input_token, output_token, trade.amount_in)
+        except (KeyError, ValueError) as error:
+            yield TradeResult(trade, None, None, f"{type(error).__name__}: {error}")
+            continue
+        yield TradeResult(trade, fee, amount_out)
+
+
+def run_replay(module: LiquidityModule, states: Iterable[StateUpdate], trades: Iterable[Trade], results=None) -> ReplaySummary:
+    """
+    Replays trades and aggregates the results.
+
+    :param results: A text file the results are written to as JSON lines, one per trade as it is replayed.
+    """
+    summary = ReplaySummary()
+    for result in replay(module, states, trades):
+        summary.add(result)
+        if results is not None:
+            results.write(json.dumps(result.as_dict()))
+            results.write("\n")
+    return summary
+
+
+def _replay_shard(
+    module_factory: Callable[[], LiquidityModule],
+    open_states: Callable[..., Iterable[StateUpdate]],
+    trades_path: str,
+    start: int,
+    end: int,
+    results_path: Optional[str],
+) -> ReplaySummary:
+    trades = read_trades(trades_path, start, end)
+    first = next(trades, None)
+    if first is None:
+        return ReplaySummary()
+    states = open_states(start_block=first.block)
+
+    def shard_trades():
+        yield first
+        yield from trades
+
+    if results_path is None:
+        return run_replay(module_factory(), states, shard_trades())
+    with open(results_path, "w") as results:
+        return run_replay(module_factory(), states, shard_trades(), results)
+
+
+def replay_sharded(
+    module_factory: Callable[[], LiquidityModule],
+    open_states: Callable[..., Iterable[StateUpdate]],
+    trades_path: str,
+    processes: int = os.cpu_count() or 1,
+    output_directory: Optional[str] = None,
+    shards: Optional[int] = None,
+) -> ReplaySummary:
+    """
+    Replays a trade log in contiguous block ranges on a pool of processes. The log is cut at byte offsets, so shards
+    are found without reading it; every shard opens the states at its first block.
+
+    :param module_factory: Builds the module in every process, e.g. WOOFiLiquidityModule.
+    :param open_states: Called with start_block= to read the states of a shard, e.g. partial(jsonl_states, states,
+        pools); both must be picklable.
+    :param processes: Worker processes; 1 replays in this process.
+    :param output_directory: Where results-<shard>.jsonl files are written, in block order of the shards.
+    :param shards: Block ranges to cut the log into, processes by default.
+    """
+    shards = shards or processes
+    size = os.path.getsize(trades_path)
+    bounds = [size * shard // shards for shard in range(shards + 1)]
+    arguments = [
+        (module_factory, open_states, trades_path, bounds[shard], bounds[shard + 1],
+         None if output_directory is None else os.path.join(output_directory, f"results-{shard:05d}.jsonl"))
+        for shard in range(shards)
+    ]
+    if processes == 1:
+        summaries = [_replay_shard(*shard_arguments) for shard_arguments in arguments]
+    else:
+        with multiprocessing.get_context().Pool(processes) as pool:
+            summaries = pool.starmap(_replay_shard, arguments)
+    summary = ReplaySummary()
+    for shard_summary in summaries:
+        summary.merge(shard_summary)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays historical trades through a liquidity module.")
+    parser.add_argument("--module", required=True, help="the module class or factory, as package.module:Name")
+    parser.add_argument("--trades", required=True, help="JSON lines trade log, in block order")
+    parser.add_argument("--states", help="JSON lines state updates, in block order")
+    parser.add_argument("--pools", help="JSON file with the tokens and fixed parameters of the pools")
+    parser.add_argument("--snapshots", nargs="+", help="WOOFi snapshot files, in block order, instead of --states")
+    parser.add_argument("--output", required=True, help="directory for the results and summary.json")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--shards", type=int, help="block ranges to cut the trade log into, --processes by default")
+    args = parser.parse_args()
+
+    if args.snapshots is not None:
+        open_states = partial(snapshot_states, args.snapshots)
+    elif args.states is not None and args.pools is not None:
+        open_states = partial(jsonl_states, args.states, args.pools)
+    else:
+        parser.error("give --snapshots, or --states and --pools")
+
+    os.makedirs(args.output, exist_ok=True)
+    summary = replay_sharded(import_factory(args.module), open_states, args.trades, args.processes, args.output, args.shards)
+    with open(os.path.join(args.output, "summary.json"), "w") as file:
+        json.dump(summary.as_dict(), file, indent=2)
+    print(json.dumps(summary.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
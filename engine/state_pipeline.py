@@ -0,0 +1,198 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Generic, Hashable, Mapping, NamedTuple, TypeVar
+
+from engine.instrumentation import LatencyHistogram
+
+
+S = TypeVar("S")
+
+# upper bounds in seconds; an event waits at least one tick and a backlog can hold it for a while
+DEFAULT_LAG_BUCKETS = (1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 0.1, 1.0)
+
+
+class StateEvent(NamedTuple):
+    # what the event updates, e.g. a token address
+    key: Hashable
+    # the fields that changed; a later event for the same key overrides an earlier one field by field
+    fields: Mapping
+
+
+class StateVersion(NamedTuple):
+    version: int
+    state: Any
+
+
+class PipelineMetrics(NamedTuple):
+    # events received from the source
+    events: int
+    # coalesced updates handed to apply, one per key and tick
+    updates: int
+    # updates apply refused
+    rejected: int
+    # states published
+    versions: int
+    queue_depth: int
+    max_queue_depth: int
+    # times the source had to wait for room in the queue
+    source_waits: int
+    # seconds from receiving an event to publishing a state that contains it
+    lag_p50: float
+    lag_p99: float
+    max_lag: float
+
+    @property
+    def coalesce_ratio(self) -> float:
+        return self.events / self.updates if self.updates else 1.0
+
+
+class StatePipeline(Generic[S]):
+    """
+    Ingests state events from an asynchronous source and publishes immutable state versions to quoting code.
+
+    The events of one tick are coalesced per key and applied in one call that builds a new state; the previous state
+    is never modified. Publishing replaces the single reference current, so readers take `version, state =
+    pipeline.current` without a lock and keep a consistent state for as long as they hold it.
+
+    The source feeds a bounded queue and is not read while the queue is full, so a source that is faster than apply
+    is slowed down (a socket stops being read) instead of growing a backlog in memory.
+    """
+
+    def __init__(
+        self,
+        state: S,
+        apply: Callable[[S, Dict[Hashable, Dict]], S],
+        tick: float = 0.001,
+        max_queue: int = 4096,
+        lag_buckets=DEFAULT_LAG_BUCKETS,
+    ):
+        """
+        :param state: The initial state, published as version 0.
+        :param apply: Returns a new state with a batch of key -> fields updates applied, without modifying the state
+            it is given, e.g. WOOFiStateStore.with_updates. It raises KeyError or ValueError for an update it refuses.
+        :param tick: Seconds to collect events after the first one arrives, before applying them.
+        :param max_queue: Events that may wait to be applied.
+        """
+        self.apply = apply
+        self.tick = tick
+        self.max_queue = max_queue
+        self.current = StateVersion(0, state)
+        self._published = None
+        self._events = self._updates = self._rejected = self._source_waits = self._max_queue_depth = 0
+        self._queue = None
+        self._lag = LatencyHistogram(lag_buckets)
+        self._max_lag = 0.0
+
+    async def run(self, source: AsyncIterable[StateEvent]):
+        """ Consumes source until it is exhausted; every event received is published before run returns. """
+        self._queue = asyncio.Queue(self.max_queue)
+        ingesting = asyncio.create_task(self._ingest(source))
+        try:
+            await self._consume()
+        finally:
+            if not ingesting.done():
+                ingesting.cancel()
+        await ingesting
+
+    async def wait_for_version(self, version: int) -> StateVersion:
+        """ Waits until a state newer than version is published, and returns it. """
+        while self.current.version <= version:
+            if self._published is None:
+                self._published = asyncio.Event()
+            await self._published.wait()
+        return self.current
+
+    def metrics(self) -> PipelineMetrics:
+        queue_depth = 0 if self._queue is None else self._queue.qsize()
+        return PipelineMetrics(
+            self._events, self._updates, self._rejected, self.current.version, queue_depth, self._max_queue_depth,
+            self._source_waits, self._lag.quantile(0.5), self._lag.quantile(0.99), self._max_lag,
+        )
+
+    async def _ingest(self, source: AsyncIterable[StateEvent]):
+        queue = self._queue
+        try:
+            async for event in source:
+                if queue.full():
+                    self._source_waits += 1
+                await queue.put((time.perf_counter(), event))
+                self._events += 1
+        except Exception:
+            # publish what was received, then fail run
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _consume(self):
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            # let the rest of the tick arrive; a full queue holds back the source meanwhile
+            await asyncio.sleep(self.tick)
+            self._max_queue_depth = max(self._max_queue_depth, queue.qsize() + 1)
+            batch, finished = [item], False
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+            self._publish(batch)
+            if finished:
+                return
+
+    def _publish(self, batch: list):
+        updates = {}
+        for _, (key, fields) in batch:
+            coalesced = updates.get(key)
+            if coalesced is None:
+                updates[key] = dict(fields)
+            else:
+                coalesced.update(fields)
+        self._updates += len(updates)
+
+        version, state = self.current
+        try:
+            state = self.apply(state, updates)
+        except (KeyError, ValueError):
+            # apply the updates one by one to drop only those that are refused
+            for key, fields in updates.items():
+                try:
+                    state = self.apply(state, {key: fields})
+                except (KeyError, ValueError):
+                    self._rejected += 1
+        self.current = StateVersion(version + 1, state)
+
+        now = time.perf_counter()
+        for received, _ in batch:
+            self._lag.observe(now - received)
+        self._max_lag = max(self._max_lag, now - batch[0][0])
+        if self._published is not None:
+            self._published.set()
+            self._published = None
+
+
+async def jsonl_events(path: str, lines_per_yield: int = 256) -> AsyncIterator[StateEvent]:
+    """
+    Events from a JSON lines file of {"key": ..., "fields": {...}}, e.g. a recorded stream of oracle updates.
+
+    :param lines_per_yield: Lines read between two yields to the event loop.
+    """
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            if line.strip():
+                event = json.loads(line)
+                yield StateEvent(event["key"], event["fields"])
+            if number % lines_per_yield == 0:
+                await asyncio.sleep(0)
+
+
+async def stream_events(reader: asyncio.StreamReader) -> AsyncIterator[StateEvent]:
+    """ Events sent as JSON lines over a socket, e.g. from asyncio.open_unix_connection; ends when the peer closes. """
+    while line := await reader.readline():
+        if line.strip():
+            event = json.loads(line)
+            yield StateEvent(event["key"], event["fields"])
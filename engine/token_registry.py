@@ -0,0 +1,58 @@
+from decimal import Decimal
+from typing import Dict, Iterator, Optional
+
+# the address helpers, RegisteredToken and PairTable live with Token, so liquidity modules can use them without the engine
+from templates.liquidity_module import (
+    PairTable, RegisteredToken, Token, normalize_address, pair_key, same_address, same_token, token_address,
+)
+
+
+class TokenRegistry:
+    """
+    Interns tokens by normalized address. Every address is registered once, whatever its casing, and ids are dense
+    (0, 1, 2, ...) so they can index lists or be packed into pair keys (see PairTable).
+    """
+
+    def __init__(self):
+        self._tokens: list[RegisteredToken] = []
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __iter__(self) -> Iterator[RegisteredToken]:
+        return iter(self._tokens)
+
+    def __getitem__(self, id: int) -> RegisteredToken:
+        return self._tokens[id]
+
+    def __contains__(self, address: str) -> bool:
+        return address.strip().lower() in self._ids
+
+    def register(self, address: str, symbol: str, decimals: int, reference_price: Decimal) -> RegisteredToken:
+        """
+        :return: The token registered under address, created on first registration.
+        :raises ValueError: If the address is registered with different decimals.
+        """
+        key = normalize_address(address)
+        id = self._ids.get(key)
+        if id is not None:
+            token = self._tokens[id]
+            if token.decimals != decimals:
+                raise ValueError(f"{address} is registered with {token.decimals} decimals, not {decimals}")
+            return token
+        token = RegisteredToken(len(self._tokens), key, symbol, decimals, reference_price)
+        self._ids[key] = token.id
+        self._tokens.append(token)
+        return token
+
+    def intern(self, token: Token) -> RegisteredToken:
+        """ The registered token for a plain Token, registering it if needed. """
+        if isinstance(token, RegisteredToken) and self._ids.get(token.address) == token.id and self._tokens[token.id] is token:
+            return token
+        return self.register(token.address, token.symbol, token.decimals, token.reference_price)
+
+    def get(self, address: str) -> Optional[RegisteredToken]:
+        id = self._ids.get(address.strip().lower())
+        return None if id is None else self._tokens[id]
+
@@ -0,0 +1,197 @@
+from typing import Dict, Iterable, Optional
+
+from modules.woofi_liquidity_module import SELL_BASE_TOKEN, SELL_QUOTE_TOKEN, SWAP_BASE_TO_BASE, WOOFiPreparedPool
+from templates.liquidity_module import Token, token_address
+
+
+POOL_COLUMNS = ("base_fee_rate", "fee_rate", "qd", "pd", "output_reserve", "quote_token_reserve")
+TOKEN_COLUMNS = ("feasible", "max_notional_swap", "max_gamma", "price", "spread", "coeff", "bd", "bd_pd", "price_qd", "price_coeff")
+
+
+class WOOFiColumns:
+    """
+    The pools of one swap direction, one list per field. Lists of Python ints keep every value exact, so the kernels
+    below reproduce the scalar WOOFiPoolMath arithmetic bit for bit.
+    """
+
+    def __init__(self, direction: str):
+        self.direction = direction
+        # store index of each row
+        self.index = []
+        for column in POOL_COLUMNS:
+            setattr(self, column, [])
+        for column in TOKEN_COLUMNS:
+            setattr(self, "input_" + column, [])
+            setattr(self, "output_" + column, [])
+
+    def append(self, index: int, pool: WOOFiPreparedPool) -> int:
+        self.index.append(index)
+        for column in POOL_COLUMNS:
+            getattr(self, column).append(getattr(pool, column))
+        for side, base in (("input_", pool.input), ("output_", pool.output)):
+            for column in TOKEN_COLUMNS:
+                getattr(self, side + column).append(None if base is None else getattr(base, column))
+        return len(self.index) - 1
+
+    def replace(self, row: int, pool: WOOFiPreparedPool):
+        for column in POOL_COLUMNS:
+            getattr(self, column)[row] = getattr(pool, column)
+        for side, base in (("input_", pool.input), ("output_", pool.output)):
+            for column in TOKEN_COLUMNS:
+                getattr(self, side + column)[row] = None if base is None else getattr(base, column)
+
+
+class WOOFiColumnarStore:
+    """
+    Many WOOFi pools (pairs, chains, forks) held column-wise for quoting one size across all of them in one call.
+
+    Rows are grouped by swap direction and each group is quoted by a single loop over its columns, with no dict
+    lookups or per-pool method calls. Results are identical to get_amount_out of WOOFiLiquidityModule per pool.
+    """
+
+    def __init__(self):
+        self.columns = {direction: WOOFiColumns(direction) for direction in (SELL_QUOTE_TOKEN, SELL_BASE_TOKEN, SWAP_BASE_TO_BASE)}
+        # store index -> (direction, row in its columns)
+        self.rows = []
+        # store index -> (input address, output address), normalized
+        self.pairs = []
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add_pool(self, pool_state: Dict, fixed_parameters: Dict, input_token: Token, output_token: Token) -> int:
+        """
+        :return: The index of the pool in the results of quote_out.
+        :raises ValueError: If the state lacks a field required by the pair's swap direction.
+        """
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token)
+        index = len(self.rows)
+        self.rows.append((pool.direction, self.columns[pool.direction].append(index, pool)))
+        self.pairs.append((token_address(input_token), token_address(output_token)))
+        return index
+
+    def update_pool(self, index: int, pool_state: Dict, fixed_parameters: Dict, input_token: Token, output_token: Token):
+        """ Replaces the state of the pool at index; the pair must stay the same. """
+        input_address, output_address = self.pairs[index]
+        if token_address(input_token) is not input_address or token_address(output_token) is not output_address:
+            raise ValueError(f"pool {index} is {self.pairs[index][0]} -> {self.pairs[index][1]}")
+        direction, row = self.rows[index]
+        self.columns[direction].replace(row, WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token, direction))
+
+    def quote_out(self, input_amounts: int | Iterable[int]) -> tuple[list[int | None], list[int | None], list[bool]]:
+        """
+        get_amount_out for every pool.
+
+        :param input_amounts: One amount for all pools, or one amount per pool.
+        :return: Per pool: the fee, the output amount and whether the swap is feasible (output not None).
+        """
+        count = len(self.rows)
+        if isinstance(input_amounts, int):
+            input_amounts = [input_amounts] * count
+        else:
+            input_amounts = [int(input_amount) for input_amount in input_amounts]
+            if len(input_amounts) != count:
+                raise ValueError(f"expected {count} input amounts, got {len(input_amounts)}")
+
+        fees, amounts_out = [None] * count, [None] * count
+        for direction, kernel in ((SELL_QUOTE_TOKEN, _sell_quote_token_out), (SELL_BASE_TOKEN, _sell_base_token_out), (SWAP_BASE_TO_BASE, _swap_base_to_base_out)):
+            columns = self.columns[direction]
+            if columns.index:
+                kernel(columns, [input_amounts[index] for index in columns.index], fees, amounts_out)
+        return fees, amounts_out, [amount_out is not None for amount_out in amounts_out]
+
+    def best_pool(self, input_amount: int, output_token: Optional[Token] = None) -> tuple[int, int, int] | None:
+        """
+        The pool giving the most output for input_amount.
+
+        :param output_token: Only consider pools paying out this token; pools with different output tokens are not comparable.
+        :return: (index, fee, amount_out) of the best pool, or None if no pool can fill input_amount.
+        """
+        fees, amounts_out, _ = self.quote_out(input_amount)
+        output_address = None if output_token is None else token_address(output_token)
+        best = None
+        for index, amount_out in enumerate(amounts_out):
+            if amount_out is None or (output_address is not None and self.pairs[index][1] is not output_address):
+                continue
+            if best is None or amount_out > amounts_out[best]:
+                best = index
+        return None if best is None else (best, fees[best], amounts_out[best])
+
+
+# The kernels repeat WOOFiPoolMath._sell_quote_token_out etc. expression for expression over the columns; keep them
+# in sync with those. The paths check of modules.woofi_fuzz compares them with get_amount_out on every case.
+
+def _sell_quote_token_out(c: WOOFiColumns, input_amounts: list[int], fees: list, amounts_out: list):
+    for index, input_amount, fee_rate, base_fee_rate, qd, reserve, feasible, max_notional_swap, max_gamma, price, spread, coeff, bd_pd in zip(
+        c.index, input_amounts, c.fee_rate, c.base_fee_rate, c.qd, c.output_reserve,
+        c.output_feasible, c.output_max_notional_swap, c.output_max_gamma, c.output_price, c.output_spread, c.output_coeff, c.output_bd_pd,
+    ):
+        if not feasible:
+            continue
+        swap_fee = int(input_amount * fee_rate / base_fee_rate)
+        quote_token_amount_after_fee = input_amount - swap_fee
+        if quote_token_amount_after_fee > max_notional_swap:
+            continue
+        gamma = quote_token_amount_after_fee * coeff // qd
+        if gamma > max_gamma:
+            continue
+        base_token_amount = int(((quote_token_amount_after_fee * bd_pd // price) * (1e18 - gamma - spread)) // 1e18 // qd)
+        if base_token_amount > reserve:
+            continue
+        fees[index], amounts_out[index] = swap_fee, base_token_amount
+
+
+def _sell_base_token_out(c: WOOFiColumns, input_amounts: list[int], fees: list, amounts_out: list):
+    for index, input_amount, fee_rate, base_fee_rate, pd, reserve, feasible, max_notional_swap, max_gamma, spread, bd, bd_pd, price_qd, price_coeff in zip(
+        c.index, input_amounts, c.fee_rate, c.base_fee_rate, c.pd, c.output_reserve,
+        c.input_feasible, c.input_max_notional_swap, c.input_max_gamma, c.input_spread, c.input_bd, c.input_bd_pd, c.input_price_qd, c.input_price_coeff,
+    ):
+        if not feasible:
+            continue
+        amount_price_qd = input_amount * price_qd
+        if amount_price_qd / bd / pd > max_notional_swap:
+            continue
+        gamma = input_amount * price_coeff // bd_pd
+        if gamma > max_gamma:
+            continue
+        quote_token_amount = int(((amount_price_qd // pd) * (1e18 - gamma - spread)) // 1e18 // bd)
+        if quote_token_amount > reserve:
+            continue
+        swap_fee = int(quote_token_amount * fee_rate / base_fee_rate)
+        fees[index], amounts_out[index] = swap_fee, quote_token_amount - swap_fee
+
+
+def _swap_base_to_base_out(c: WOOFiColumns, input_amounts: list[int], fees: list, amounts_out: list):
+    for (
+        index, input_amount, fee_rate, base_fee_rate, qd, pd, reserve, quote_token_reserve,
+        feasible1, max_notional_swap1, max_gamma1, spread1, bd1, bd_pd1, price_qd1, price_coeff1,
+        feasible2, max_notional_swap2, max_gamma2, price2, spread2, coeff2, bd_pd2,
+    ) in zip(
+        c.index, input_amounts, c.fee_rate, c.base_fee_rate, c.qd, c.pd, c.output_reserve, c.quote_token_reserve,
+        c.input_feasible, c.input_max_notional_swap, c.input_max_gamma, c.input_spread, c.input_bd, c.input_bd_pd, c.input_price_qd, c.input_price_coeff,
+        c.output_feasible, c.output_max_notional_swap, c.output_max_gamma, c.output_price, c.output_spread, c.output_coeff, c.output_bd_pd,
+    ):
+        if not feasible1 or not feasible2:
+            continue
+        amount_price_qd = input_amount * price_qd1
+        if amount_price_qd / bd1 / pd > max_notional_swap1:
+            continue
+        gamma = input_amount * price_coeff1 // bd_pd1
+        if gamma > max_gamma1:
+            continue
+        quote_token_amount = int(((amount_price_qd // pd) * (1e18 - gamma - spread1)) // 1e18 // bd1)
+
+        swap_fee = int(quote_token_amount * fee_rate / base_fee_rate)
+        if swap_fee > quote_token_reserve:
+            continue
+
+        quote_token_amount_after_fee = quote_token_amount - swap_fee
+        if quote_token_amount_after_fee > max_notional_swap2:
+            continue
+        gamma = quote_token_amount_after_fee * coeff2 // qd
+        if gamma > max_gamma2:
+            continue
+        base2_token_amount = int(((quote_token_amount_after_fee * bd_pd2 // price2) * (1e18 - gamma - spread2)) // 1e18 // qd)
+        if base2_token_amount > reserve:
+            continue
+        fees[index], amounts_out[index] = swap_fee, base2_token_amount
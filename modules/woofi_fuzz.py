@@ -0,0 +1,410 @@
+"""
+Differential fuzzing of WOOFiPoolMath against the exact model of modules.woofi_reference.
+
+Random valid pools, fixed parameters and amounts are generated for all six quotes (exact-in and exact-out of selling the
+quote token, selling a base token and swapping base to base), including amounts at the liquidity bound of the pool.
+Each case is checked three ways:
+    paths       prepared pools, the batch paths, the states paths (get_state_amounts_out / get_state_amounts_in) and
+                the kernels that repeat the swap math over columns (WOOFiColumnarStore) return exactly what
+                get_amount_out / get_amount_in return
+    reference   get_amount_out and get_amount_in agree with the exact model; the production path computes some
+                products in float64, so amounts may differ by FLOAT_TOLERANCE relative plus one unit, after the quote
+                amount of the swap lost or gained a unit, and the two may only disagree on accepting a swap where the
+                limit that decides it is met within that tolerance (--exact allows no difference at all)
+    round trip  the input get_amount_in returns is the smallest one get_amount_out turns into the output, and
+                get_amount_in only rejects outputs get_amount_out does not reach
+Cases are spread over a process pool, and every divergent case is shrunk to a small reproducer that --replay re-checks.
+A process checks about 3300 cases a second, so a million cases take under a minute on eight cores.
+
+Usage: python -m modules.woofi_fuzz [--cases 1000000] [--processes 4] [--seed 0] [--exact] [--output reproducers/]
+       python -m modules.woofi_fuzz --replay reproducers/reference-0.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, NamedTuple
+
+from modules.woofi_columnar import WOOFiColumnarStore
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_reference import reference_in, reference_out
+from templates.liquidity_module import Token, decode_fixed_parameters, decode_token, encode_fixed_parameters, encode_token
+
+# relative difference the float64 products of the production path can cause, with a wide margin
+FLOAT_TOLERANCE = 2.0**-40
+PATHS, REFERENCE, ROUND_TRIP = "paths", "reference", "round_trip"
+KINDS = (PATHS, REFERENCE, ROUND_TRIP)
+CHUNK_SIZE = 2000
+
+
+class FuzzCase(NamedTuple):
+    # "out" quotes input amount -> output amount, "in" output amount -> input amount
+    side: str
+    pool_state: Dict
+    fixed_parameters: Dict
+    input_token: Token
+    output_token: Token
+    amount: int
+
+    def as_dict(self) -> Dict:
+        return {
+            "side": self.side, "pool_state": self.pool_state, "fixed_parameters": encode_fixed_parameters(self.fixed_parameters),
+            "quote_token": encode_token(self.fixed_parameters["quote_token"]), "input_token": encode_token(self.input_token),
+            "output_token": encode_token(self.output_token), "amount": self.amount,
+        }
+
+    @classmethod
+    def from_dict(cls, fields: Dict) -> "FuzzCase":
+        quote_token, input_token, output_token = (decode_token(fields[key]) for key in ("quote_token", "input_token", "output_token"))
+        tokens = {token.address.lower(): token for token in (quote_token, input_token, output_token)}
+        fixed_parameters = decode_fixed_parameters(fields["fixed_parameters"], tokens)
+        return cls(fields["side"], fields["pool_state"], fixed_parameters, input_token, output_token, fields["amount"])
+
+
+class FuzzReport:
+    """ Counts of a fuzzing run and its minimized reproducers; reports of chunks are combined with merge. """
+
+    def __init__(self):
+        self.cases = self.exact = self.tolerated = 0
+        self.divergent = {kind: 0 for kind in KINDS}
+        # as_dict of the minimized case, with the kinds it diverges in and the results of each side
+        self.reproducers = []
+        self.seconds = 0.0
+
+    def merge(self, other: "FuzzReport", max_reproducers: int):
+        self.cases += other.cases
+        self.exact += other.exact
+        self.tolerated += other.tolerated
+        for kind in KINDS:
+            self.divergent[kind] += other.divergent[kind]
+        self.reproducers.extend(other.reproducers[:max_reproducers - len(self.reproducers)])
+
+    def failed(self) -> bool:
+        return any(self.divergent.values())
+
+    def as_dict(self) -> Dict:
+        return {
+            "cases": self.cases, "exact": self.exact, "tolerated": self.tolerated, "divergent": self.divergent,
+            "seconds": self.seconds, "cases_per_second": self.cases / self.seconds if self.seconds else None,
+        }
+
+
+def _log_uniform(generator: random.Random, low: float, high: float) -> int:
+    return int(10 ** generator.uniform(low, high))
+
+
+def random_case(generator: random.Random, module: WOOFiLiquidityModule) -> FuzzCase:
+    """
+    A random valid case: prices, spreads, coefficients and limits spanning the ranges deployed pools use, with
+    spread + max_gamma below 1e18, so accepted swaps never exhaust the price. A fifth of the amounts sit at the
+    liquidity bound of the pool, or at its output for exact-out quotes, and a fifth of the exact-out outputs are what
+    get_amount_out returns for an accepted input, at or below the bound.
+    """
+    quote_decimals, price_decimals = generator.choice((6, 6, 18)), generator.choice((8, 8, 18))
+    quote_token = Token(address="0x" + "11" * 20, symbol="QUOTE", decimals=quote_decimals, reference_price=Decimal(1))
+    base_tokens = [
+        Token(address="0x" + byte * 20, symbol=f"BASE{index}", decimals=generator.choice((0, 6, 8, 18, 18, 24)), reference_price=Decimal(1))
+        for index, byte in enumerate(("22", "33"))
+    ]
+    fixed_parameters = {
+        "base_fee_rate": generator.choice((10**5, 10**5, 10**4)),
+        "quote_token_decimals": quote_decimals,
+        "oracle_price_decimals": price_decimals,
+        "quote_token": quote_token,
+    }
+
+    pool_state = {}
+    for prefix in ("input_token_", "output_token_"):
+        pool_state[prefix + "fee_rate"] = generator.choice((0, 1, 5, 25, 100, 1000))
+        pool_state[prefix + "max_gamma"] = _log_uniform(generator, 12, 17)
+        pool_state[prefix + "max_notional_swap"] = _log_uniform(generator, quote_decimals + 1, quote_decimals + 10)
+        pool_state[prefix + "price"] = max(1, _log_uniform(generator, price_decimals - 4, price_decimals + 6))
+        pool_state[prefix + "spread"] = generator.choice((0, generator.randrange(10**16)))
+        pool_state[prefix + "coeff"] = generator.choice((0, _log_uniform(generator, 5, 11)))
+        pool_state[prefix + "wo_feasible"] = generator.random() > 0.02
+    direction = generator.randrange(3)
+    input_token, output_token = [(quote_token, base_tokens[1]), (base_tokens[0], quote_token), tuple(base_tokens)][direction]
+    pool_state["input_token_reserve"] = _log_uniform(generator, 0, input_token.decimals + 10)
+    pool_state["output_token_reserve"] = _log_uniform(generator, 0, output_token.decimals + 10)
+    pool_state["quote_token_reserve"] = _log_uniform(generator, 0, quote_decimals + 10)
+
+    side = generator.choice(("out", "in"))
+    decimals = input_token.decimals if side == "out" else output_token.decimals
+    roll = generator.random()
+    if roll < 0.2:
+        bound = module.get_liquidity_bound(pool_state, fixed_parameters, input_token, output_token)
+        limit = bound.max_input_amount if side == "out" else bound.max_output_amount
+        amount = max(0, (limit or 0) + generator.randint(-1, 1))
+    elif roll < 0.3:
+        amount = generator.randrange(1000)
+    elif roll < 0.5 and side == "in":
+        amount = _reachable_output(generator, module, pool_state, fixed_parameters, input_token, output_token, decimals)
+    else:
+        amount = _log_uniform(generator, 0, decimals + 8)
+    return FuzzCase(side, pool_state, fixed_parameters, input_token, output_token, amount)
+
+
+def _reachable_output(generator: random.Random, module: WOOFiLiquidityModule, pool_state: Dict, fixed_parameters: Dict, input_token: Token, output_token: Token, decimals: int) -> int:
+    # What get_amount_out returns at the liquidity bound or a log-uniform input below it; any amount if none is accepted
+    max_input_amount = module.get_liquidity_bound(pool_state, fixed_parameters, input_token, output_token).max_input_amount
+    if max_input_amount is None:
+        return _log_uniform(generator, 0, decimals + 8)
+    input_amount = generator.choice((max_input_amount, min(max_input_amount, _log_uniform(generator, 0, len(str(max_input_amount))))))
+    return module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)[1]
+
+
+def _agrees(module: WOOFiLiquidityModule, pool, case: FuzzCase, input_amount: int, tolerance: float) -> bool:
+    # Whether get_amount_out agrees with reference_out at input_amount, up to the tolerance and a unit of the quote
+    # amount either way, which a float floor of the production path can lose or gain
+    pool_state, fixed_parameters, input_token, output_token = case[1:5]
+    production = tuple(module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount))
+
+    def near(value: int, limit: int) -> bool:
+        return abs(value - limit) <= 1 + tolerance * abs(limit)
+
+    for quote_error in ((0, -1, 1) if tolerance else (0,)):
+        trace = {}
+        reference = reference_out(pool_state, fixed_parameters, input_token, output_token, input_amount, trace, quote_error)
+        if production == reference:
+            return True
+        if not tolerance:
+            continue
+        if reference[1] is None:
+            # accepted by production only: the check the reference failed must be met within the tolerance
+            if trace["checks"] and near(*trace["checks"][-1][1:]):
+                return True
+        elif production[1] is None:
+            reason = module.pool_math.rejection_reason_out(pool, input_amount)
+            if any(near(value, limit) for name, value, limit in trace["checks"] if name == reason):
+                return True
+        elif near(production[0], reference[0]) and near(production[1], reference[1]):
+            return True
+    return False
+
+
+def check_case(module: WOOFiLiquidityModule, case: FuzzCase, tolerance: float = FLOAT_TOLERANCE) -> tuple[list[str], Dict]:
+    """
+    Checks one case.
+
+    An exact-in quote agrees with the exact model if the exact-out quotes of both sides agree at the inputs each side
+    returned, so the difference comes from the exact-out quotes alone; where the two sides disagree on accepting a
+    swap, the limit that decides it must be met within the tolerance.
+
+    :param tolerance: Relative difference allowed between production and reference amounts, on top of one unit; 0
+        requires identical results.
+    :return: The kinds the case diverges in, and the results it was judged on, with the paths that differ from
+        production.
+    """
+    pool_state, fixed_parameters, input_token, output_token, amount = case[1:]
+    pool = module.prepare_pool(pool_state, fixed_parameters, input_token, output_token)
+    kinds = []
+    if case.side == "out":
+        production = tuple(module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, amount))
+        fees, amounts = module.get_amounts_out(pool, None, input_token, output_token, [amount])
+        state_fees, state_amounts = module.get_state_amounts_out([(pool_state, fixed_parameters)], input_token, output_token, amount)
+        columns = WOOFiColumnarStore()
+        columns.add_pool(pool_state, fixed_parameters, input_token, output_token)
+        column_fees, column_amounts, _ = columns.quote_out(amount)
+        paths = {
+            "prepared": module.get_amount_out(pool, None, input_token, output_token, amount),
+            "batch": (fees[0], amounts[0]),
+            "states": (state_fees[0], state_amounts[0]),
+            "columnar": (column_fees[0], column_amounts[0]),
+        }
+        reference = reference_out(pool_state, fixed_parameters, input_token, output_token, amount)
+        agrees = _agrees(module, pool, case, amount, tolerance)
+    else:
+        production = tuple(module.get_amount_in(pool_state, fixed_parameters, input_token, output_token, amount))
+        fees, amounts = module.get_amounts_in(pool, None, input_token, output_token, [amount])
+        state_fees, state_amounts = module.get_state_amounts_in([(pool_state, fixed_parameters)], input_token, output_token, amount)
+        paths = {
+            "prepared": module.get_amount_in(pool, None, input_token, output_token, amount),
+            "batch": (fees[0], amounts[0]),
+            "states": (state_fees[0], state_amounts[0]),
+        }
+        reference = reference_in(pool_state, fixed_parameters, input_token, output_token, amount, production[1])
+        inputs = {production[1], reference[1]} - {None}
+        agrees = production == reference or (tolerance > 0 and all(_agrees(module, pool, case, input_amount, tolerance) for input_amount in inputs))
+
+        input_amount = production[1]
+        if input_amount is not None:
+            fee, amount_out = module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
+            below = module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount - 1)[1] if input_amount > 0 else None
+            if fee != production[0] or amount_out is None or amount_out < amount or (below is not None and below >= amount):
+                kinds.append(ROUND_TRIP)
+        else:
+            # the output must be out of reach of get_amount_out: not at the liquidity bound, nor at the exact model's input
+            bound = module.get_liquidity_bound(pool_state, fixed_parameters, input_token, output_token)
+            for input_amount in {bound.max_input_amount, reference[1]} - {None}:
+                amount_out = module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)[1]
+                if amount_out is not None and amount_out >= amount:
+                    kinds.append(ROUND_TRIP)
+                    break
+
+    divergent_paths = [name for name, path in paths.items() if tuple(path) != production]
+    if divergent_paths:
+        kinds.append(PATHS)
+    if not agrees:
+        kinds.append(REFERENCE)
+    return sorted(kinds), {"production": list(production), "reference": list(reference), "exact": production == reference, "paths": divergent_paths}
+
+
+def _simpler(value) -> Iterator:
+    # Candidates for a smaller, rounder value, simplest first
+    if isinstance(value, bool):
+        if not value:
+            yield True
+        return
+    if value == 0:
+        return
+    yield 0
+    yield 1
+    digits = len(str(value))
+    yield 10 ** (digits - 1)
+    for significant in (1, 2, 3):
+        if digits > significant:
+            scale = 10 ** (digits - significant)
+            yield value // scale * scale
+    yield value // 2
+
+
+def minimize(module: WOOFiLiquidityModule, case: FuzzCase, kinds: list[str], tolerance: float = FLOAT_TOLERANCE, budget: int = 3000) -> FuzzCase:
+    """
+    Shrinks a divergent case greedily: the amount, every pool_state field and the decimals are replaced by smaller,
+    rounder values as long as the case still diverges in one of the same kinds and stays valid.
+
+    :param budget: Checks to spend at most.
+    """
+    wanted = set(kinds)
+
+    def diverges(candidate: FuzzCase) -> bool:
+        state = candidate.pool_state
+        for prefix in ("input_token_", "output_token_"):
+            if state[prefix + "price"] <= 0 or state[prefix + "spread"] + state[prefix + "max_gamma"] >= 10**18:
+                return False
+        return bool(wanted.intersection(check_case(module, candidate, tolerance)[0]))
+
+    def replacements(current: FuzzCase) -> Iterator[FuzzCase]:
+        for amount in _simpler(current.amount):
+            yield current._replace(amount=amount)
+        for key, value in current.pool_state.items():
+            for simpler in _simpler(value):
+                yield current._replace(pool_state=dict(current.pool_state, **{key: simpler}))
+        for field in ("input_token", "output_token"):
+            token = getattr(current, field)
+            if token.address == current.fixed_parameters["quote_token"].address:
+                # its decimals are also a fixed parameter
+                continue
+            for decimals in (18, 8, 6, 0):
+                if decimals < token.decimals or (decimals == 18 and token.decimals != 18):
+                    replaced = Token(address=token.address, symbol=token.symbol, decimals=decimals, reference_price=token.reference_price)
+                    yield current._replace(**{field: replaced})
+
+    changed = True
+    while changed and budget > 0:
+        changed = False
+        for candidate in replacements(case):
+            budget -= 1
+            if budget < 0:
+                break
+            if candidate != case and diverges(candidate):
+                case, changed = candidate, True
+                break
+    return case
+
+
+def _run_chunk(module_factory: Callable[[], WOOFiLiquidityModule], seed: int, chunk: int, count: int, tolerance: float, max_reproducers: int) -> FuzzReport:
+    module = module_factory()
+    generator = random.Random(f"{seed}:{chunk}")
+    report = FuzzReport()
+    for _ in range(count):
+        case = random_case(generator, module)
+        kinds, results = check_case(module, case, tolerance)
+        report.cases += 1
+        if not kinds:
+            if results["exact"]:
+                report.exact += 1
+            else:
+                report.tolerated += 1
+            continue
+        for kind in kinds:
+            report.divergent[kind] += 1
+        if len(report.reproducers) < max_reproducers:
+            minimized = minimize(module, case, kinds, tolerance)
+            minimized_kinds, minimized_results = check_case(module, minimized, tolerance)
+            report.reproducers.append(dict(minimized.as_dict(), kinds=minimized_kinds, **minimized_results))
+    return report
+
+
+def run(
+    cases: int,
+    processes: int = os.cpu_count() or 1,
+    seed: int = 0,
+    tolerance: float = FLOAT_TOLERANCE,
+    max_reproducers: int = 10,
+    module_factory: Callable[[], WOOFiLiquidityModule] = WOOFiLiquidityModule,
+) -> FuzzReport:
+    """
+    Generates and checks cases in chunks of CHUNK_SIZE on a pool of processes; the cases depend only on the seed.
+
+    :param processes: Worker processes; 1 runs in this process.
+    :param tolerance: See check_case; 0 requires the exact model's results.
+    :param module_factory: Builds the module under test in every process; must be picklable.
+    """
+    start = time.perf_counter()
+    chunks = [(module_factory, seed, chunk, min(CHUNK_SIZE, cases - chunk * CHUNK_SIZE), tolerance, max_reproducers) for chunk in range(-(-cases // CHUNK_SIZE))]
+    report = FuzzReport()
+    if processes == 1:
+        reports = (_run_chunk(*arguments) for arguments in chunks)
+        for chunk_report in reports:
+            report.merge(chunk_report, max_reproducers)
+    else:
+        with multiprocessing.get_context().Pool(processes) as pool:
+            for chunk_report in pool.starmap(_run_chunk, chunks):
+                report.merge(chunk_report, max_reproducers)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def replay(path: str, tolerance: float = FLOAT_TOLERANCE) -> tuple[list[str], Dict]:
+    """ Re-checks a reproducer written by the harness. """
+    with open(path) as file:
+        case = FuzzCase.from_dict(json.load(file))
+    return check_case(WOOFiLiquidityModule(), case, tolerance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=1_000_000, help="cases to generate")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="seed the cases are generated from")
+    parser.add_argument("--exact", action="store_true", help="require the exact model's amounts, without the float tolerance")
+    parser.add_argument("--max-reproducers", type=int, default=10, help="divergent cases to minimize and keep")
+    parser.add_argument("--output", help="directory the reproducers are written to")
+    parser.add_argument("--replay", help="re-check a reproducer instead of fuzzing")
+    args = parser.parse_args()
+
+    tolerance = 0.0 if args.exact else FLOAT_TOLERANCE
+    if args.replay is not None:
+        kinds, results = replay(args.replay, tolerance)
+        print(json.dumps(dict(results, kinds=kinds)))
+        sys.exit(1 if kinds else 0)
+
+    report = run(args.cases, args.processes, args.seed, tolerance, args.max_reproducers)
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        for index, reproducer in enumerate(report.reproducers):
+            with open(os.path.join(args.output, f"{reproducer['kinds'][0]}-{index}.json"), "w") as file:
+                json.dump(reproducer, file, indent=2)
+    for reproducer in report.reproducers:
+        print(json.dumps(reproducer), file=sys.stderr)
+    print(json.dumps(report.as_dict(), indent=2))
+    sys.exit(1 if report.failed() else 0)
+
+
+if __name__ == "__main__":
+    main()
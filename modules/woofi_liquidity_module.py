@@ -1,16 +1,298 @@
 import math
-from templates.liquidity_module import LiquidityModule, Token
-from typing import Dict, Optional
+import time
+from functools import partial
+from templates.liquidity_module import LiquidityModule, MetricsSink, PairTable, RegisteredToken, Token, same_address, same_token
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional, Sequence
 from decimal import Decimal
+from fractions import Fraction
+
+
+SELL_QUOTE_TOKEN = "sell_quote_token"
+SELL_BASE_TOKEN = "sell_base_token"
+SWAP_BASE_TO_BASE = "swap_base_to_base"
+
+BASE_TOKEN_STATE_FIELDS = ("fee_rate", "max_gamma", "max_notional_swap", "price", "spread", "coeff", "wo_feasible")
+FIXED_PARAMETER_FIELDS = ("base_fee_rate", "quote_token_decimals", "oracle_price_decimals", "quote_token")
+
+WO_NOT_FEASIBLE = "wo_not_feasible"
+NON_POSITIVE_PRICE = "non_positive_price"
+MAX_NOTIONAL_SWAP = "max_notional_swap"
+MAX_GAMMA = "max_gamma"
+INSUFFICIENT_RESERVE = "insufficient_reserve"
+INSUFFICIENT_QUOTE_RESERVE = "insufficient_quote_reserve"
+NEGATIVE_DISCRIMINANT = "negative_discriminant"
+UNREACHABLE_OUTPUT = "unreachable_output"
+REJECTION_REASONS = (
+    WO_NOT_FEASIBLE, NON_POSITIVE_PRICE, MAX_NOTIONAL_SWAP, MAX_GAMMA,
+    INSUFFICIENT_RESERVE, INSUFFICIENT_QUOTE_RESERVE, NEGATIVE_DISCRIMINANT, UNREACHABLE_OUTPUT,
+)
+
+# relative margin of estimate_out for float rounding, about a thousand times what the float operations can lose
+ESTIMATE_RELATIVE_ERROR = 1e-12
+
+# TVL and fee values are integers with this many decimals of the native token, so running totals add up exactly
+VALUE_DECIMALS = 36
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+
+def swap_direction(fixed_parameters: Dict, input_token: Token, output_token: Token) -> str:
+    # Addresses match regardless of checksum casing
+    quote_token = fixed_parameters["quote_token"]
+    if same_token(input_token, quote_token):
+        return SELL_QUOTE_TOKEN
+    elif same_token(output_token, quote_token):
+        return SELL_BASE_TOKEN
+    else:
+        return SWAP_BASE_TO_BASE
+
+
+def token_value(fixed_parameters: Dict, token: Token, record: Mapping, amount: Optional[int] = None) -> int:
+    """
+    The value of a token amount in the native token, as an integer with VALUE_DECIMALS decimals, rounded down: base
+    tokens at their oracle price in the quote token, and the quote token at its reference_price.
+
+    :param record: The record of the token in a WOOFiStateStore; the quote token record only has a reserve.
+    :param amount: The amount to value, the reserve of the record by default.
+    """
+    reference_price = Fraction(fixed_parameters["quote_token"].reference_price)
+    amount = record["reserve"] if amount is None else amount
+    if "price" in record:
+        numerator, decimals = amount * record["price"], token.decimals + fixed_parameters["oracle_price_decimals"]
+    else:
+        numerator, decimals = amount, fixed_parameters["quote_token_decimals"]
+    return numerator * reference_price.numerator * 10**VALUE_DECIMALS // (reference_price.denominator * 10**decimals)
+
+
+def fee_apy(fee_value: int, tvl_value: int, seconds: int) -> Decimal:
+    """ Fees earned over `seconds` relative to the TVL, both values as from token_value, annualized without compounding. """
+    if tvl_value <= 0 or seconds <= 0:
+        return Decimal(0)
+    return Decimal(fee_value) * SECONDS_PER_YEAR / (Decimal(tvl_value) * seconds)
+
+
+class WOOFiPreparedToken:
+    """ The parameters of one base token of a prepared pair, with its scale factors and inverse quadratic terms precomputed. """
+    __slots__ = (
+        "fee_rate", "max_gamma", "max_notional_swap", "price", "spread", "coeff", "wo_feasible", "feasible",
+        "bd", "bd_pd", "price_qd", "price_coeff", "sell_quote_in_terms", "sell_base_in_terms",
+    )
+
+    def __init__(self, pool_state: Dict, prefix: str, decimals: int, spread: int, qd: int, pd: int):
+        """
+        :param pool_state: The pairwise WOOFi pool state.
+        :param prefix: Either "input_token_" or "output_token_".
+        :param decimals: The decimals of the base token.
+        :param spread: The spread to quote with (the max of both spreads for base to base swaps).
+        :param qd: 10 ** quote_token_decimals.
+        :param pd: 10 ** oracle_price_decimals.
+        """
+        setattr_ = object.__setattr__
+        price, coeff = pool_state[prefix + "price"], pool_state[prefix + "coeff"]
+        bd = 10 ** decimals
+        for field in ("fee_rate", "max_gamma", "max_notional_swap"):
+            setattr_(self, field, pool_state[prefix + field])
+        setattr_(self, "price", price)
+        setattr_(self, "spread", spread)
+        setattr_(self, "coeff", coeff)
+        setattr_(self, "wo_feasible", bool(pool_state[prefix + "wo_feasible"]))
+        setattr_(self, "feasible", self.wo_feasible and price > 0)
+        setattr_(self, "bd", bd)
+        setattr_(self, "bd_pd", bd * pd)
+        setattr_(self, "price_qd", price * qd)
+        setattr_(self, "price_coeff", price * coeff)
+
+        # Integer (a, b, c per unit) terms of a * x**2 - b * x + c * amount = 0, the continuous inverse of each leg:
+        # quote in -> base out for calc_base_token_amount_sell_quote_out, base in -> quote out for calc_quote_token_amount_sell_base_out
+        one_minus_spread = 10**18 - spread
+        sell_quote_in_terms = (bd * pd * coeff, bd * pd * one_minus_spread * qd, 10**18 * qd * qd * price)
+        sell_base_in_terms = (price * price * qd * coeff, price * qd * one_minus_spread * pd * bd, 10**18 * bd * bd * pd * pd)
+        setattr_(self, "sell_quote_in_terms", sell_quote_in_terms)
+        setattr_(self, "sell_base_in_terms", sell_base_in_terms)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+class WOOFiPreparedPool:
+    """
+    A pairwise WOOFi pool state compiled once for repeated quoting.
+
+    All dict lookups, decimal scale factors and inverse quadratic terms are resolved when the pool is prepared, so quoting
+    through WOOFiPoolMath.quote_out / quote_in only does the per-amount arithmetic. Prepare again whenever the
+    pool state changes.
+    """
+    __slots__ = (
+        "direction", "input_address", "output_address", "base_fee_rate", "fee_rate", "qd", "pd",
+        "input", "output", "output_reserve", "quote_token_reserve", "ranking_terms",
+    )
+
+    def __init__(self, pool_state: Dict, fixed_parameters: Dict, input_token: Token, output_token: Token, direction: Optional[str] = None):
+        """
+        :param pool_state: A dictionary representing the state of the liquidity pool.
+        :param fixed_parameters: A dictionary of fixed parameters for the liquidity module.
+        :param input_token: The token being swapped in.
+        :param output_token: The token being swapped out.
+        :param direction: One of SELL_QUOTE_TOKEN, SELL_BASE_TOKEN or SWAP_BASE_TO_BASE; derived from the tokens if omitted.
+        :raises ValueError: If pool_state or fixed_parameters lack a field required by the swap direction.
+        """
+        missing = [field for field in FIXED_PARAMETER_FIELDS if field not in fixed_parameters]
+        if missing:
+            raise ValueError(f"fixed_parameters is missing {', '.join(missing)}")
+
+        if direction is None:
+            direction = swap_direction(fixed_parameters, input_token, output_token)
+        required = ["output_token_reserve"]
+        if direction != SELL_QUOTE_TOKEN:
+            required += ["input_token_" + field for field in BASE_TOKEN_STATE_FIELDS]
+        if direction != SELL_BASE_TOKEN:
+            required += ["output_token_" + field for field in BASE_TOKEN_STATE_FIELDS]
+        if direction == SWAP_BASE_TO_BASE:
+            required.append("quote_token_reserve")
+        missing = [field for field in required if field not in pool_state]
+        if missing:
+            raise ValueError(f"pool_state is missing {', '.join(missing)} for {direction}")
+
+        base_fee_rate = fixed_parameters["base_fee_rate"]
+        if base_fee_rate <= 0:
+            raise ValueError("base_fee_rate must be positive")
+
+        qd = 10 ** fixed_parameters["quote_token_decimals"]
+        pd = 10 ** fixed_parameters["oracle_price_decimals"]
+        output_reserve = pool_state["output_token_reserve"]
+
+        input_side = output_side = quote_token_reserve = None
+        if direction == SELL_QUOTE_TOKEN:
+            fee_rate = pool_state["output_token_fee_rate"]
+            output_side = WOOFiPreparedToken(pool_state, "output_token_", output_token.decimals, pool_state["output_token_spread"], qd, pd)
+        elif direction == SELL_BASE_TOKEN:
+            fee_rate = pool_state["input_token_fee_rate"]
+            input_side = WOOFiPreparedToken(pool_state, "input_token_", input_token.decimals, pool_state["input_token_spread"], qd, pd)
+        else:
+            fee_rate = max(pool_state["input_token_fee_rate"], pool_state["output_token_fee_rate"])
+            spread = max(pool_state["input_token_spread"], pool_state["output_token_spread"])
+            input_side = WOOFiPreparedToken(pool_state, "input_token_", input_token.decimals, spread, qd, pd)
+            output_side = WOOFiPreparedToken(pool_state, "output_token_", output_token.decimals, spread, qd, pd)
+            quote_token_reserve = pool_state["quote_token_reserve"]
+
+        setattr_ = object.__setattr__
+        setattr_(self, "direction", direction)
+        setattr_(self, "input_address", input_token.address)
+        setattr_(self, "output_address", output_token.address)
+        setattr_(self, "base_fee_rate", base_fee_rate)
+        setattr_(self, "fee_rate", fee_rate)
+        setattr_(self, "qd", qd)
+        setattr_(self, "pd", pd)
+        setattr_(self, "input", input_side)
+        setattr_(self, "output", output_side)
+        setattr_(self, "output_reserve", output_reserve)
+        setattr_(self, "quote_token_reserve", quote_token_reserve)
+        # filled in by the first WOOFiPoolMath.best_quote_out that ranks the pool
+        setattr_(self, "ranking_terms", None)
+
+    def check_pair(self, input_token: Token, output_token: Token):
+        if not same_address(input_token.address, self.input_address) or not same_address(output_token.address, self.output_address):
+            raise ValueError(f"pool was prepared for {self.input_address} -> {self.output_address}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+class WOOFiLiquidityBound(NamedTuple):
+    # The largest input a pair accepts, its output, and the limit (one of REJECTION_REASONS) that rejects one more unit
+    max_input_amount: int | None
+    max_output_amount: int | None
+    binding_limit: str | None
+
+
+class WOOFiSwapEffect(NamedTuple):
+    # What an exact-in swap does to the pool, as WooPPV2 books it
+    fee: int
+    amount_out: int
+    # signed reserve changes of the input and output tokens; fees leave the pool, so they are not added back
+    input_reserve_change: int
+    output_reserve_change: int
+    # the fee taken from the quote token reserve when the quote token is neither side (base to base swaps), else 0
+    quote_token_reserve_change: int
+    # the prices the pool posts to the oracle after the swap, None for the quote token
+    input_token_price: int | None
+    output_token_price: int | None
+
+
+class WOOFiEstimate(NamedTuple):
+    # bounds on the amount quote_out returns; lower is None if quote_out may reject the amount
+    lower: float | None
+    upper: float
+
+
+class WOOFiBestQuote(NamedTuple):
+    # the winning candidate, its exact quote, and how many candidates were quoted exactly to find it
+    index: int
+    fee: int
+    amount_out: int
+    exact_quotes: int
 
 
 class WOOFiPoolMath:
+    def __init__(self, instrumentation: Optional[MetricsSink] = None):
+        """
+        :param instrumentation: Receives the latency and, for rejected quotes, the rejection reason of every call of
+            the quoting entry points: the dict, prepared and batch quotes, quote_out_states and quote_in_states. Quotes
+            other methods make internally, e.g. liquidity_bound, are not recorded. When it is None each entry point only
+            checks it.
+        """
+        self.instrumentation = instrumentation
+
     def sell_quote_token_out(
         self,
         pool_state: Dict,
         fixed_parameters: Dict,
         output_token: Token,
         input_amount: int
+    ) -> tuple[int | None, int | None]:
+        if self.instrumentation is not None:
+            quote_token = fixed_parameters["quote_token"]
+            return self._observed("out", SELL_QUOTE_TOKEN, self._sell_quote_token_out_dict, (pool_state, fixed_parameters, output_token, input_amount),
+                                  lambda: WOOFiPreparedPool(pool_state, fixed_parameters, quote_token, output_token, SELL_QUOTE_TOKEN))
+        return self._sell_quote_token_out_dict(pool_state, fixed_parameters, output_token, input_amount)
+
+    def sell_base_token_out(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        input_amount: int
+    ) -> tuple[int | None, int | None]:
+        if self.instrumentation is not None:
+            quote_token = fixed_parameters["quote_token"]
+            return self._observed("out", SELL_BASE_TOKEN, self._sell_base_token_out_dict, (pool_state, fixed_parameters, input_token, input_amount),
+                                  lambda: WOOFiPreparedPool(pool_state, fixed_parameters, input_token, quote_token, SELL_BASE_TOKEN))
+        return self._sell_base_token_out_dict(pool_state, fixed_parameters, input_token, input_amount)
+
+    def swap_base_to_base_out(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int
+    ) -> tuple[int | None, int | None]:
+        if self.instrumentation is not None:
+            return self._observed("out", SWAP_BASE_TO_BASE, self._swap_base_to_base_out_dict, (pool_state, fixed_parameters, input_token, output_token, input_amount),
+                                  lambda: WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token, SWAP_BASE_TO_BASE))
+        return self._swap_base_to_base_out_dict(pool_state, fixed_parameters, input_token, output_token, input_amount)
+
+    def _sell_quote_token_out_dict(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        output_token: Token,
+        input_amount: int
     ) -> tuple[int | None, int | None]:
         base_token_fee_rate = pool_state["output_token_fee_rate"]
         base_token_max_gamma = pool_state["output_token_max_gamma"]
@@ -36,7 +318,7 @@ class WOOFiPoolMath:
         
         return swap_fee, base_token_amount
     
-    def sell_base_token_out(
+    def _sell_base_token_out_dict(
         self,
         pool_state: Dict,
         fixed_parameters: Dict,
@@ -67,7 +349,7 @@ class WOOFiPoolMath:
 
         return swap_fee, quote_token_amount_after_fee
     
-    def swap_base_to_base_out(
+    def _swap_base_to_base_out_dict(
         self,
         pool_state: Dict,
         fixed_parameters: Dict,
@@ -182,29 +464,8 @@ class WOOFiPoolMath:
         output_token: Token,
         output_amount: int
     ) -> tuple[int | None, int | None]:
-        base_token_reserve = pool_state["output_token_reserve"]
-        if output_amount > base_token_reserve:
-            return None, None
-        
-        base_token_fee_rate = pool_state["output_token_fee_rate"]
-        base_token_max_gamma = pool_state["output_token_max_gamma"]
-        base_token_max_notional_swap = pool_state["output_token_max_notional_swap"]
-
-        base_token_price = pool_state["output_token_price"]
-        base_token_spread = pool_state["output_token_spread"]
-        base_token_coeff = pool_state["output_token_coeff"]
-        base_token_wo_feasible = pool_state["output_token_wo_feasible"]
-
-        base_token_decimals = output_token.decimals
-
-        quote_token_amount_after_fee = self.calc_base_token_amount_sell_quote_in(fixed_parameters, output_amount, base_token_max_gamma, base_token_max_notional_swap, base_token_price, base_token_spread, base_token_coeff, base_token_wo_feasible, base_token_decimals)
-        if quote_token_amount_after_fee is None:
-            return None, None
-
-        quote_token_amount = quote_token_amount_after_fee * fixed_parameters["base_fee_rate"] / (fixed_parameters["base_fee_rate"] - base_token_fee_rate)
-        swap_fee = quote_token_amount - quote_token_amount_after_fee
-
-        return swap_fee, quote_token_amount
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, fixed_parameters["quote_token"], output_token, SELL_QUOTE_TOKEN)
+        return self.quote_in(pool, output_amount)
 
     def sell_base_token_in(
         self,
@@ -213,29 +474,8 @@ class WOOFiPoolMath:
         input_token: Token,
         output_amount: int
     ) -> tuple[int | None, int | None]:
-        base_token_fee_rate = pool_state["input_token_fee_rate"]
-        base_token_max_gamma = pool_state["input_token_max_gamma"]
-        base_token_max_notional_swap = pool_state["input_token_max_notional_swap"]
-
-        base_token_price = pool_state["input_token_price"]
-        base_token_spread = pool_state["input_token_spread"]
-        base_token_coeff = pool_state["input_token_coeff"]
-        base_token_wo_feasible = pool_state["input_token_wo_feasible"]
-
-        base_token_decimals = input_token.decimals
-
-        quote_token_amount = output_amount * fixed_parameters["base_fee_rate"] / (fixed_parameters["base_fee_rate"] - base_token_fee_rate)
-        quote_token_reserve = pool_state["output_token_reserve"]
-        if quote_token_amount > quote_token_reserve:
-            return None, None
-        
-        swap_fee = quote_token_amount - output_amount
-
-        base_token_amount = self.calc_quote_token_amount_sell_base_in(fixed_parameters, quote_token_amount, base_token_max_gamma, base_token_max_notional_swap, base_token_price, base_token_spread, base_token_coeff, base_token_wo_feasible, base_token_decimals)
-        if base_token_amount is None:
-            return None, None
-
-        return swap_fee, base_token_amount
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, input_token, fixed_parameters["quote_token"], SELL_BASE_TOKEN)
+        return self.quote_in(pool, output_amount)
 
     def swap_base_to_base_in(
         self,
@@ -244,40 +484,12 @@ class WOOFiPoolMath:
         input_token: Token,
         output_token: Token,
         output_amount: int
-    ):
-        base2_token_reserve = pool_state["output_token_reserve"]
-        if output_amount > base2_token_reserve:
-            return None, None
-        
-        base1_token_fee_rate, base2_token_fee_rate = pool_state["input_token_fee_rate"], pool_state["output_token_fee_rate"]
-        base1_token_max_gamma, base2_token_max_gamma = pool_state["input_token_max_gamma"], pool_state["output_token_max_gamma"]
-        base1_token_max_notional_swap, base2_token_max_notional_swap = pool_state["input_token_max_notional_swap"], pool_state["output_token_max_notional_swap"]
-
-        base1_token_price, base2_token_price = pool_state["input_token_price"], pool_state["output_token_price"]
-        base1_token_spread, base2_token_spread = pool_state["input_token_spread"], pool_state["output_token_spread"]
-        base1_token_coeff, base2_token_coeff = pool_state["input_token_coeff"], pool_state["output_token_coeff"]
-        base1_token_wo_feasible, base2_token_wo_feasible = pool_state["input_token_wo_feasible"], pool_state["output_token_wo_feasible"]
-
-        base1_token_decimals, base2_token_decimals = input_token.decimals, output_token.decimals
-
-        fee_rate = max(base1_token_fee_rate, base2_token_fee_rate)
-        spread = max(base1_token_spread, base2_token_spread)
-
-        quote_token_amount_after_fee = self.calc_base_token_amount_sell_quote_in(fixed_parameters, output_amount, base2_token_max_gamma, base2_token_max_notional_swap, base2_token_price, spread, base2_token_coeff, base2_token_wo_feasible, base2_token_decimals)
-        if quote_token_amount_after_fee is None:
-            return None, None
-        
-        quote_token_amount = quote_token_amount_after_fee * fixed_parameters["base_fee_rate"] / (fixed_parameters["base_fee_rate"] - fee_rate)
-        swap_fee = quote_token_amount - quote_token_amount_after_fee
-        if swap_fee > pool_state["quote_token_reserve"]:
-            return None, None
-        
-        base1_token_amount = self.calc_quote_token_amount_sell_base_in(fixed_parameters, quote_token_amount, base1_token_max_gamma, base1_token_max_notional_swap, base1_token_price, spread, base1_token_coeff, base1_token_wo_feasible, base1_token_decimals)
-        if base1_token_amount is None:
-            return None, None
+    ) -> tuple[int | None, int | None]:
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token, SWAP_BASE_TO_BASE)
+        return self.quote_in(pool, output_amount)
 
-        return swap_fee, base1_token_amount
-    
+    # Float solvers of the old exact-out paths, superseded by the integer inverse in _min_input_amount.
+    # Kept for callers that relied on them and as the baseline in benchmarks/bench_woofi_inverse.py.
     def calc_base_token_amount_sell_quote_in(
         self,
         fixed_parameters: Dict,
@@ -383,46 +595,1189 @@ class WOOFiPoolMath:
         
         return base_token_amount
 
+    def sell_quote_token_out_batch(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        output_token: Token,
+        input_amounts: Iterable[int]
+    ) -> tuple[list[int | None], list[int | None]]:
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, fixed_parameters["quote_token"], output_token, SELL_QUOTE_TOKEN)
+        return self.quote_out_batch(pool, input_amounts)
+
+    def sell_base_token_out_batch(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        input_amounts: Iterable[int]
+    ) -> tuple[list[int | None], list[int | None]]:
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, input_token, fixed_parameters["quote_token"], SELL_BASE_TOKEN)
+        return self.quote_out_batch(pool, input_amounts)
+
+    def swap_base_to_base_out_batch(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amounts: Iterable[int]
+    ) -> tuple[list[int | None], list[int | None]]:
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token, SWAP_BASE_TO_BASE)
+        return self.quote_out_batch(pool, input_amounts)
+
+    def sell_quote_token_in_batch(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        output_token: Token,
+        output_amounts: Iterable[int]
+    ) -> tuple[list[int | None], list[int | None]]:
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, fixed_parameters["quote_token"], output_token, SELL_QUOTE_TOKEN)
+        return self.quote_in_batch(pool, output_amounts)
+
+    def sell_base_token_in_batch(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_amounts: Iterable[int]
+    ) -> tuple[list[int | None], list[int | None]]:
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, input_token, fixed_parameters["quote_token"], SELL_BASE_TOKEN)
+        return self.quote_in_batch(pool, output_amounts)
+
+    def swap_base_to_base_in_batch(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        output_amounts: Iterable[int]
+    ) -> tuple[list[int | None], list[int | None]]:
+        pool = WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token, SWAP_BASE_TO_BASE)
+        return self.quote_in_batch(pool, output_amounts)
+
+    def quote_out(self, pool: WOOFiPreparedPool, input_amount: int) -> tuple[int | None, int | None]:
+        if self.instrumentation is not None:
+            return self._observed("out", pool.direction, self._quote_out, (pool, input_amount), pool)
+        return self._quote_out(pool, input_amount)
+
+    def quote_in(self, pool: WOOFiPreparedPool, output_amount: int) -> tuple[int | None, int | None]:
+        if self.instrumentation is not None:
+            return self._observed("in", pool.direction, self._quote_in, (pool, output_amount), pool)
+        return self._quote_in(pool, output_amount)
+
+    def quote_out_batch(self, pool: WOOFiPreparedPool, input_amounts: Iterable[int]) -> tuple[list[int | None], list[int | None]]:
+        kernels = {SELL_QUOTE_TOKEN: self._sell_quote_token_out, SELL_BASE_TOKEN: self._sell_base_token_out, SWAP_BASE_TO_BASE: self._swap_base_to_base_out}
+        if self.instrumentation is not None:
+            return self._observed_batch("out", pool, kernels[pool.direction], input_amounts)
+        return self._batch(kernels[pool.direction], pool, input_amounts)
+
+    def quote_in_batch(self, pool: WOOFiPreparedPool, output_amounts: Iterable[int]) -> tuple[list[int | None], list[int | None]]:
+        kernels = {SELL_QUOTE_TOKEN: self._sell_quote_token_in, SELL_BASE_TOKEN: self._sell_base_token_in, SWAP_BASE_TO_BASE: self._swap_base_to_base_in}
+        if self.instrumentation is not None:
+            return self._observed_batch("in", pool, kernels[pool.direction], output_amounts)
+        return self._batch(kernels[pool.direction], pool, output_amounts)
+
+    def quote_out_states(
+        self,
+        states: Iterable[tuple[Dict | WOOFiPreparedPool, Dict]],
+        input_token: Token,
+        output_token: Token,
+        input_amounts: int | Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        """
+        get_amount_out of one pair over many pool states without preparing them: the states of each set of fixed
+        parameters resolve the swap direction once and run the dict kernel of get_amount_out on every state, with no
+        per-state dispatch. Prepared pools among the states go through quote_out. Results are identical to
+        get_amount_out per state.
+
+        :param states: (pool_state, fixed_parameters) per state.
+        :param input_amounts: One amount for all states, or one amount per state.
+        """
+        def group_quote(direction: str, fixed_parameters: Dict):
+            if direction == SELL_QUOTE_TOKEN:
+                return lambda pool_state, amount: self._sell_quote_token_out_dict(pool_state, fixed_parameters, output_token, amount)
+            elif direction == SELL_BASE_TOKEN:
+                return lambda pool_state, amount: self._sell_base_token_out_dict(pool_state, fixed_parameters, input_token, amount)
+            return lambda pool_state, amount: self._swap_base_to_base_out_dict(pool_state, fixed_parameters, input_token, output_token, amount)
+
+        return self._quote_states("out", states, input_token, output_token, input_amounts, group_quote)
+
+    def quote_in_states(
+        self,
+        states: Iterable[tuple[Dict | WOOFiPreparedPool, Dict]],
+        input_token: Token,
+        output_token: Token,
+        output_amounts: int | Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        """
+        get_amount_in of one pair over many pool states: the states of each set of fixed parameters resolve the swap
+        direction once, and every state is prepared and quoted by the kernel of its direction, as get_amount_in does.
+        Results are identical to get_amount_in per state.
+
+        :param states: (pool_state, fixed_parameters) per state.
+        :param output_amounts: One amount for all states, or one amount per state.
+        """
+        kernels = {SELL_QUOTE_TOKEN: self._sell_quote_token_in, SELL_BASE_TOKEN: self._sell_base_token_in, SWAP_BASE_TO_BASE: self._swap_base_to_base_in}
+
+        def group_quote(direction: str, fixed_parameters: Dict):
+            kernel = kernels[direction]
+            return lambda pool_state, amount: kernel(WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token, direction), amount)
+
+        return self._quote_states("in", states, input_token, output_token, output_amounts, group_quote)
+
+    def _quote_states(self, side: str, states: Iterable[tuple[Dict | WOOFiPreparedPool, Dict]], input_token: Token, output_token: Token, amounts: int | Iterable[int], group_quote) -> tuple[list, list]:
+        # group_quote(direction, fixed_parameters) returns quote(pool_state, amount) for the dict states of the group
+        states = list(states)
+        count = len(states)
+        if isinstance(amounts, int):
+            amounts = [amounts] * count
+        else:
+            amounts = [int(amount) for amount in amounts]
+            if len(amounts) != count:
+                raise ValueError(f"expected {count} {'input' if side == 'out' else 'output'} amounts, got {len(amounts)}")
+
+        fees, results = [None] * count, [None] * count
+        prepared_quote = self.quote_out if side == "out" else self.quote_in
+        # id of the fixed parameters -> (fixed parameters, indices, pool states, amounts)
+        groups = {}
+        for index, ((pool_state, fixed_parameters), amount) in enumerate(zip(states, amounts)):
+            if isinstance(pool_state, WOOFiPreparedPool):
+                pool_state.check_pair(input_token, output_token)
+                fees[index], results[index] = prepared_quote(pool_state, amount)
+                continue
+            group = groups.get(id(fixed_parameters))
+            if group is None:
+                group = groups[id(fixed_parameters)] = (fixed_parameters, [], [], [])
+            group[1].append(index)
+            group[2].append(pool_state)
+            group[3].append(amount)
+
+        sink = self.instrumentation
+        for fixed_parameters, indices, pool_states, group_amounts in groups.values():
+            direction = swap_direction(fixed_parameters, input_token, output_token)
+            quote = group_quote(direction, fixed_parameters)
+            if sink is None:
+                for index, pool_state, amount in zip(indices, pool_states, group_amounts):
+                    fees[index], results[index] = quote(pool_state, amount)
+                continue
+            start = time.perf_counter()
+            for index, pool_state, amount in zip(indices, pool_states, group_amounts):
+                fees[index], results[index] = quote(pool_state, amount)
+            sink.observe_latency(f"{direction}_{side}_states", time.perf_counter() - start)
+            rejection_reason = self.rejection_reason_out if side == "out" else self.rejection_reason_in
+            for index, pool_state, amount in zip(indices, pool_states, group_amounts):
+                if results[index] is None:
+                    pool = WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token, direction)
+                    sink.count_rejection(f"{direction}_{side}", rejection_reason(pool, amount))
+        return fees, results
+
+    def rejection_reason_out(self, pool: WOOFiPreparedPool, input_amount: int) -> str | None:
+        """
+        Explains why quote_out(pool, input_amount) is rejected by replaying its checks in order.
+
+        :return: One of REJECTION_REASONS, or None if the quote succeeds.
+        """
+        if self._quote_out(pool, input_amount)[1] is not None:
+            return None
+
+        direction = pool.direction
+        if direction == SELL_QUOTE_TOKEN:
+            swap_fee = int(input_amount * pool.fee_rate / pool.base_fee_rate)
+            return self._limit_rejection(pool, pool.output, input_amount - swap_fee, True) or INSUFFICIENT_RESERVE
+        elif direction == SELL_BASE_TOKEN:
+            return self._limit_rejection(pool, pool.input, input_amount, False) or INSUFFICIENT_RESERVE
+
+        reason = self._limit_rejection(pool, pool.input, input_amount, False)
+        if reason is not None:
+            return reason
+        quote_token_amount = self._calc_quote_token_amount_sell_base_out(pool, pool.input, input_amount)
+        swap_fee = int(quote_token_amount * pool.fee_rate / pool.base_fee_rate)
+        if swap_fee > pool.quote_token_reserve:
+            return INSUFFICIENT_QUOTE_RESERVE
+        return self._limit_rejection(pool, pool.output, quote_token_amount - swap_fee, True) or INSUFFICIENT_RESERVE
+
+    def rejection_reason_in(self, pool: WOOFiPreparedPool, output_amount: int) -> str | None:
+        """
+        Explains why quote_in(pool, output_amount) is rejected.
+
+        :return: One of REJECTION_REASONS, or None if the quote succeeds.
+        """
+        if self._quote_in(pool, output_amount)[1] is not None:
+            return None
+
+        if output_amount > pool.output_reserve:
+            return INSUFFICIENT_RESERVE
+        for base in (pool.input, pool.output):
+            if base is not None and not base.feasible:
+                return WO_NOT_FEASIBLE if not base.wo_feasible else NON_POSITIVE_PRICE
+
+        estimate = self._input_estimate(pool, output_amount)
+        if estimate is None:
+            return NEGATIVE_DISCRIMINANT
+        # the output needs at least about the estimate, which the forward path rejects
+        return self.rejection_reason_out(pool, estimate) or self.rejection_reason_out(pool, estimate + max(2, estimate >> 50)) or UNREACHABLE_OUTPUT
+
+    def liquidity_bound(self, pool: WOOFiPreparedPool) -> WOOFiLiquidityBound:
+        """
+        The largest input quote_out accepts for the pool, the output it returns and the limit that stops it.
+
+        Every limit (max_notional_swap, max_gamma, the output reserve and, for base to base swaps, the quote token
+        reserve that pays the fee) is inverted in closed form; the tightest estimate is then checked against
+        quote_out, so max_input_amount is accepted and max_input_amount + 1 is rejected.
+
+        The check is not O(1): the estimate ignores the floor divisions and float products of quote_out, so the exact
+        boundary is found by galloping and bisecting from a step of estimate >> 50. That costs a few quote_out calls
+        below 2**50 and about log2(estimate) - 50 more above it, around two dozen for 18-decimal amounts.
+        """
+        if self._quote_out(pool, 0)[1] is None:
+            return WOOFiLiquidityBound(None, None, self.rejection_reason_out(pool, 0))
+
+        direction = pool.direction
+        if direction == SELL_QUOTE_TOKEN:
+            estimate = self._max_gross_amount(pool, self._max_sell_quote_amount(pool, pool.output, pool.output_reserve))
+        elif direction == SELL_BASE_TOKEN:
+            estimate = self._max_sell_base_amount(pool, pool.input, pool.output_reserve)
+        else:
+            # the quote amount is capped by the fee paid from the quote reserve and by what base2 can absorb after fees
+            quote_token_amount_after_fee = self._max_sell_quote_amount(pool, pool.output, pool.output_reserve)
+            quote_token_amount = self._max_gross_amount(pool, quote_token_amount_after_fee)
+            if pool.fee_rate > 0:
+                quote_token_amount = min(quote_token_amount, ((pool.quote_token_reserve + 1) * pool.base_fee_rate - 1) // pool.fee_rate)
+            estimate = self._max_sell_base_amount(pool, pool.input, quote_token_amount)
+
+        max_input_amount = self._max_accepted_input(pool, estimate)
+        return WOOFiLiquidityBound(max_input_amount, self._quote_out(pool, max_input_amount)[1], self.rejection_reason_out(pool, max_input_amount + 1))
+
+    def marginal_rate(self, pool: WOOFiPreparedPool, input_amount: int) -> float | None:
+        """
+        dOut/dIn of quote_out at input_amount, from the closed-form derivative of the swap curve.
+
+        The curve is out = rate * amount * (1e18 - spread - gamma(amount)) / 1e18 with gamma linear in the amount, so
+        the derivative is exact for the continuous curve and free of the integer rounding of quote_out.
+
+        :return: Output units per input unit, or None where quote_out rejects the amount.
+        """
+        if self._quote_out(pool, input_amount)[1] is None:
+            return None
+        return self._curve(pool, input_amount)[1]
+
+    def price_impact(self, pool: WOOFiPreparedPool, input_amount: int) -> float | None:
+        """
+        1 - (average rate of input_amount) / (marginal rate at zero). Fees and spread apply to every size and are not
+        part of the impact; for a single leg it is gamma / (1e18 - spread).
+
+        :return: The impact as a fraction, or None where quote_out rejects the amount.
+        """
+        if self._quote_out(pool, input_amount)[1] is None:
+            return None
+        if input_amount <= 0:
+            return 0.0
+        amount_out, _, zero_size_rate = self._curve(pool, input_amount)
+        return 1 - amount_out / (input_amount * zero_size_rate)
+
+    def swap_effect(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> WOOFiSwapEffect | None:
+        """
+        The reserve and price changes of swapping input_amount, following WooPPV2: the swap fee is paid out of the
+        quote token, and every base token leg posts its new price (price / (1 - gamma) when bought, price * (1 - gamma)
+        when sold). The oracle spread is left as is.
+
+        Amounts come from the dict path of get_amount_out; a single forward quote does not pay for preparing the pool.
+
+        :return: The effect, or None where get_amount_out rejects the amount.
+        """
+        direction = swap_direction(fixed_parameters, input_token, output_token)
+        qd = 10 ** fixed_parameters["quote_token_decimals"]
+        if direction == SELL_QUOTE_TOKEN:
+            fee, amount_out = self._sell_quote_token_out_dict(pool_state, fixed_parameters, output_token, input_amount)
+            if amount_out is None:
+                return None
+            output_token_price = self._price_after_buy(pool_state, "output_token_", qd, input_amount - fee)
+            return WOOFiSwapEffect(fee, amount_out, input_amount - fee, -amount_out, 0, None, output_token_price)
+
+        pd = 10 ** fixed_parameters["oracle_price_decimals"]
+        if direction == SELL_BASE_TOKEN:
+            fee, amount_out = self._sell_base_token_out_dict(pool_state, fixed_parameters, input_token, input_amount)
+            if amount_out is None:
+                return None
+            input_token_price = self._price_after_sell(pool_state, "input_token_", pd, input_token.decimals, input_amount)
+            return WOOFiSwapEffect(fee, amount_out, input_amount, -(amount_out + fee), 0, input_token_price, None)
+
+        fee, amount_out = self._swap_base_to_base_out_dict(pool_state, fixed_parameters, input_token, output_token, input_amount)
+        if amount_out is None:
+            return None
+        quote_token_amount = self.calc_quote_token_amount_sell_base_out(
+            fixed_parameters, input_amount, pool_state["input_token_max_gamma"], pool_state["input_token_max_notional_swap"], pool_state["input_token_price"],
+            max(pool_state["input_token_spread"], pool_state["output_token_spread"]), pool_state["input_token_coeff"], pool_state["input_token_wo_feasible"], input_token.decimals,
+        )
+        input_token_price = self._price_after_sell(pool_state, "input_token_", pd, input_token.decimals, input_amount)
+        output_token_price = self._price_after_buy(pool_state, "output_token_", qd, quote_token_amount - fee)
+        return WOOFiSwapEffect(fee, amount_out, input_amount, -amount_out, -fee, input_token_price, output_token_price)
+
+    def estimate_out(self, pool: WOOFiPreparedPool, input_amount: int) -> WOOFiEstimate | None:
+        """
+        Float bounds on the amount quote_out(pool, input_amount) returns, without big-int arithmetic.
+
+        The estimate is the continuous swap curve in float64. The bounds add what the integer path can differ by: one
+        unit for every truncated division (fee, gamma and the final scaling, five per leg), the slope of the next leg
+        times the uncertainty of its input, and ESTIMATE_RELATIVE_ERROR of the linear output for float rounding. The
+        limit checks are classified with the same margins; a check the estimate cannot decide leaves lower open.
+
+        :return: None if quote_out surely rejects the amount, else the bounds.
+        """
+        terms = self._estimate_terms(pool)
+        bounds = None if terms is None else self._estimate(terms, input_amount)
+        return None if bounds is None else WOOFiEstimate(*bounds)
+
+    def estimate_error(self, pool: WOOFiPreparedPool, input_amount: int) -> float | None:
+        """
+        How far quote_out(pool, input_amount) can be from the continuous swap curve if it accepts the amount: the half
+        width of the estimate_out bounds, also where estimate_out cannot tell whether a limit rejects the amount. The
+        error grows with the amount.
+
+        :return: None if a base token of the pair is not feasible.
+        """
+        terms = self._estimate_terms(pool)
+        if terms is None:
+            return None
+        # the same terms without limits, so the lower bound is never left open
+        fee_ratio, sell_base, sell_quote, _, _ = terms
+        if sell_base is not None:
+            sell_base = sell_base[:5] + (math.inf, math.inf)
+        if sell_quote is not None:
+            sell_quote = sell_quote[:4] + (math.inf, math.inf)
+        lower, upper = self._estimate((fee_ratio, sell_base, sell_quote, math.inf, math.inf), input_amount)
+        return (upper - lower) / 2
+
+    def best_quote_out(self, candidates: Sequence[tuple[WOOFiPreparedPool, int]]) -> WOOFiBestQuote | None:
+        """
+        The (prepared pool, input amount) candidate with the largest quote_out, e.g. one order over every pool and
+        size a router considers; all candidates must pay out the same token.
+
+        A float pass ranks every candidate by an upper bound on its output: the bounds of estimate_out folded into one
+        quadratic per pool (two for base to base), valid for every amount quote_out accepts, with inputs beyond the
+        pool's notional and gamma limits dropped. Candidates are then quoted exactly from the highest bound down,
+        until the next bound is below the best exact output, so only candidates whose bound reaches the winner are
+        quoted. The result is the maximum of quote_out over all candidates, ties going to the first one.
+
+        The folded terms are kept on the prepared pool, so ranking it again for the next order skips them.
+
+        :return: The winner, or None if every candidate is rejected.
+        """
+        ranked = []
+        for index, (pool, input_amount) in enumerate(candidates):
+            pool_terms = pool.ranking_terms
+            if pool_terms is None:
+                pool_terms = self._ranking_terms(pool)
+                object.__setattr__(pool, "ranking_terms", pool_terms)
+            if not pool_terms:
+                continue
+            amount = float(input_amount)
+            if amount > pool_terms[1]:
+                continue
+            if pool_terms[0]:
+                _, _, a, b, c = pool_terms
+                upper = amount * (a - b * amount) + c
+            else:
+                _, _, a1, b1, a2, b2, c, d = pool_terms
+                quote_token_amount = amount * (a1 - b1 * amount)
+                upper = quote_token_amount * (a2 - b2 * quote_token_amount) + c + d * amount
+            ranked.append((-upper, index))
+        ranked.sort()
+
+        best, exact_quotes = None, 0
+        for negative_upper, index in ranked:
+            if best is not None and -negative_upper < best[2]:
+                break
+            pool, input_amount = candidates[index]
+            fee, amount_out = self._quote_out(pool, input_amount)
+            exact_quotes += 1
+            if amount_out is not None and (best is None or amount_out > best[2] or (amount_out == best[2] and index < best[0])):
+                best = (index, fee, amount_out)
+        return None if best is None else WOOFiBestQuote(*best, exact_quotes)
+
+    def marginal_rate_batch(self, pool: WOOFiPreparedPool, input_amounts: Iterable[int]) -> list[float | None]:
+        return [self.marginal_rate(pool, int(input_amount)) for input_amount in input_amounts]
+
+    def price_impact_batch(self, pool: WOOFiPreparedPool, input_amounts: Iterable[int]) -> list[float | None]:
+        return [self.price_impact(pool, int(input_amount)) for input_amount in input_amounts]
+
+    def _quote_out(self, pool: WOOFiPreparedPool, input_amount: int) -> tuple[int | None, int | None]:
+        direction = pool.direction
+        if direction == SELL_QUOTE_TOKEN:
+            return self._sell_quote_token_out(pool, input_amount)
+        elif direction == SELL_BASE_TOKEN:
+            return self._sell_base_token_out(pool, input_amount)
+        else:
+            return self._swap_base_to_base_out(pool, input_amount)
+
+    def _quote_in(self, pool: WOOFiPreparedPool, output_amount: int) -> tuple[int | None, int | None]:
+        direction = pool.direction
+        if direction == SELL_QUOTE_TOKEN:
+            return self._sell_quote_token_in(pool, output_amount)
+        elif direction == SELL_BASE_TOKEN:
+            return self._sell_base_token_in(pool, output_amount)
+        else:
+            return self._swap_base_to_base_in(pool, output_amount)
+
+    def _observed(self, side: str, direction: str, quote, args: tuple, pool) -> tuple[int | None, int | None]:
+        # quote(*args) timed as one call of the operation; pool is the prepared pool of the quote, or a callable
+        # preparing it, which only rejected quotes call to diagnose the rejection after the fact
+        sink, operation = self.instrumentation, f"{direction}_{side}"
+        start = time.perf_counter()
+        result = quote(*args)
+        sink.observe_latency(operation, time.perf_counter() - start)
+        if result[1] is None:
+            if not isinstance(pool, WOOFiPreparedPool):
+                pool = pool()
+            rejection_reason = self.rejection_reason_out if side == "out" else self.rejection_reason_in
+            sink.count_rejection(operation, rejection_reason(pool, args[-1]))
+        return result
+
+    def _observed_batch(self, side: str, pool: WOOFiPreparedPool, kernel, amounts: Iterable[int]) -> tuple[list, list]:
+        sink, operation = self.instrumentation, f"{pool.direction}_{side}"
+        amounts = [int(amount) for amount in amounts]
+        start = time.perf_counter()
+        result = self._batch(kernel, pool, amounts)
+        sink.observe_latency(operation + "_batch", time.perf_counter() - start)
+        rejection_reason = self.rejection_reason_out if side == "out" else self.rejection_reason_in
+        for amount, amount_out in zip(amounts, result[1]):
+            if amount_out is None:
+                sink.count_rejection(operation, rejection_reason(pool, amount))
+        return result
+
+    @staticmethod
+    def _batch(kernel, pool: WOOFiPreparedPool, amounts: Iterable[int]) -> tuple[list, list]:
+        # int() so NumPy integer arrays take the same big-int path as the scalar call
+        results = [kernel(pool, int(amount)) for amount in amounts]
+        return [fee for fee, _ in results], [amount for _, amount in results]
+
+    def _sell_quote_token_out(self, pool: WOOFiPreparedPool, input_amount: int) -> tuple[int | None, int | None]:
+        base = pool.output
+        if not base.feasible:
+            return None, None
+
+        swap_fee = int(input_amount * pool.fee_rate / pool.base_fee_rate)
+        base_token_amount = self._calc_base_token_amount_sell_quote_out(pool, base, input_amount - swap_fee)
+        if base_token_amount is None or base_token_amount > pool.output_reserve:
+            return None, None
+
+        return swap_fee, base_token_amount
+
+    def _sell_base_token_out(self, pool: WOOFiPreparedPool, input_amount: int) -> tuple[int | None, int | None]:
+        base = pool.input
+        if not base.feasible:
+            return None, None
+
+        quote_token_amount = self._calc_quote_token_amount_sell_base_out(pool, base, input_amount)
+        if quote_token_amount is None or quote_token_amount > pool.output_reserve:
+            return None, None
+
+        swap_fee = int(quote_token_amount * pool.fee_rate / pool.base_fee_rate)
+        return swap_fee, quote_token_amount - swap_fee
+
+    def _swap_base_to_base_out(self, pool: WOOFiPreparedPool, input_amount: int) -> tuple[int | None, int | None]:
+        base1, base2 = pool.input, pool.output
+        if not base1.feasible or not base2.feasible:
+            return None, None
+
+        quote_token_amount = self._calc_quote_token_amount_sell_base_out(pool, base1, input_amount)
+        if quote_token_amount is None:
+            return None, None
+
+        swap_fee = int(quote_token_amount * pool.fee_rate / pool.base_fee_rate)
+        if swap_fee > pool.quote_token_reserve:
+            return None, None
+
+        base2_token_amount = self._calc_base_token_amount_sell_quote_out(pool, base2, quote_token_amount - swap_fee)
+        if base2_token_amount is None or base2_token_amount > pool.output_reserve:
+            return None, None
+
+        return swap_fee, base2_token_amount
+
+    def _sell_quote_token_in(self, pool: WOOFiPreparedPool, output_amount: int) -> tuple[int | None, int | None]:
+        if output_amount > pool.output_reserve:
+            return None, None
+
+        if not pool.output.feasible:
+            return None, None
+
+        return self._min_input_amount(self._sell_quote_token_out, pool, output_amount, self._input_estimate(pool, output_amount))
+
+    def _sell_base_token_in(self, pool: WOOFiPreparedPool, output_amount: int) -> tuple[int | None, int | None]:
+        if output_amount > pool.output_reserve:
+            return None, None
+
+        if not pool.input.feasible:
+            return None, None
+
+        return self._min_input_amount(self._sell_base_token_out, pool, output_amount, self._input_estimate(pool, output_amount))
+
+    def _swap_base_to_base_in(self, pool: WOOFiPreparedPool, output_amount: int) -> tuple[int | None, int | None]:
+        if output_amount > pool.output_reserve:
+            return None, None
+
+        if not pool.input.feasible or not pool.output.feasible:
+            return None, None
+
+        return self._min_input_amount(self._swap_base_to_base_out, pool, output_amount, self._input_estimate(pool, output_amount))
+
+    def _input_estimate(self, pool: WOOFiPreparedPool, output_amount: int) -> int | None:
+        # Inverts the swap curves of the pool's direction exactly; None if the quadratic has no root
+        direction = pool.direction
+        if direction == SELL_QUOTE_TOKEN:
+            return self._gross_up_fee(pool, self._solve_inverse(pool.output.sell_quote_in_terms, output_amount))
+        elif direction == SELL_BASE_TOKEN:
+            return self._solve_inverse(pool.input.sell_base_in_terms, self._gross_up_fee(pool, output_amount))
+        else:
+            quote_token_amount_after_fee = self._solve_inverse(pool.output.sell_quote_in_terms, output_amount)
+            return self._solve_inverse(pool.input.sell_base_in_terms, self._gross_up_fee(pool, quote_token_amount_after_fee))
+
+    def _curve(self, pool: WOOFiPreparedPool, input_amount: int) -> tuple[float, float, float]:
+        # (continuous output, its derivative, the derivative at zero) of the pool's direction
+        net_fee_factor = 1 - pool.fee_rate / pool.base_fee_rate
+        direction = pool.direction
+        if direction == SELL_QUOTE_TOKEN:
+            amount_out, slope, zero_size_slope = self._sell_quote_curve(pool, pool.output, net_fee_factor * input_amount)
+            return amount_out, net_fee_factor * slope, net_fee_factor * zero_size_slope
+        elif direction == SELL_BASE_TOKEN:
+            quote_token_amount, slope, zero_size_slope = self._sell_base_curve(pool, pool.input, input_amount)
+            return net_fee_factor * quote_token_amount, net_fee_factor * slope, net_fee_factor * zero_size_slope
+        else:
+            quote_token_amount, slope1, zero_size_slope1 = self._sell_base_curve(pool, pool.input, input_amount)
+            amount_out, slope2, zero_size_slope2 = self._sell_quote_curve(pool, pool.output, net_fee_factor * quote_token_amount)
+            return amount_out, slope2 * net_fee_factor * slope1, zero_size_slope2 * net_fee_factor * zero_size_slope1
+
+    @staticmethod
+    def _sell_quote_curve(pool: WOOFiPreparedPool, base: WOOFiPreparedToken, quote_token_amount: float) -> tuple[float, float, float]:
+        # out = rate * q * (1 - spread - k * q) of calc_base_token_amount_sell_quote_out, with gamma = k * q
+        rate = base.bd_pd / (base.price * pool.qd)
+        headroom = 1 - base.spread / 1e18
+        k = base.coeff / (pool.qd * 1e18)
+        return rate * quote_token_amount * (headroom - k * quote_token_amount), rate * (headroom - 2 * k * quote_token_amount), rate * headroom
+
+    @staticmethod
+    def _sell_base_curve(pool: WOOFiPreparedPool, base: WOOFiPreparedToken, base_token_amount: float) -> tuple[float, float, float]:
+        # out = rate * x * (1 - spread - k * x) of calc_quote_token_amount_sell_base_out, with gamma = k * x
+        rate = base.price_qd / base.bd_pd
+        headroom = 1 - base.spread / 1e18
+        k = base.price_coeff / (base.bd_pd * 1e18)
+        return rate * base_token_amount * (headroom - k * base_token_amount), rate * (headroom - 2 * k * base_token_amount), rate * headroom
+
+    @staticmethod
+    def _estimate_terms(pool: WOOFiPreparedPool) -> tuple | None:
+        # The float constants of estimate_out, or None if a base token of the pair is not feasible
+        direction = pool.direction
+        sell_base = sell_quote = None
+        if direction != SELL_QUOTE_TOKEN:
+            base = pool.input
+            if not base.feasible:
+                return None
+            # rate, headroom, k of _sell_base_curve, then the notional and gamma per unit and their limits
+            sell_base = (
+                base.price_qd / base.bd_pd, 1 - base.spread / 1e18, base.price_coeff / (base.bd_pd * 1e18),
+                base.price_qd / base.bd / pool.pd, base.price_coeff / base.bd_pd, base.max_notional_swap, base.max_gamma,
+            )
+        if direction != SELL_BASE_TOKEN:
+            base = pool.output
+            if not base.feasible:
+                return None
+            # rate, headroom, k of _sell_quote_curve, then gamma per unit and the limits
+            sell_quote = (
+                base.bd_pd / (base.price * pool.qd), 1 - base.spread / 1e18, base.coeff / (pool.qd * 1e18),
+                base.coeff / pool.qd, base.max_notional_swap, base.max_gamma,
+            )
+        return pool.fee_rate / pool.base_fee_rate, sell_base, sell_quote, pool.output_reserve, pool.quote_token_reserve
+
+    @staticmethod
+    def _ranking_terms(pool: WOOFiPreparedPool) -> tuple | bool:
+        # The upper bound of best_quote_out for the pool: (True, max input, a, b, c) for out <= x * (a - b * x) + c, or
+        # for base to base (False, max input, a1, b1, a2, b2, c, d) for out <= q * (a2 - b2 * q) + c + d * x with
+        # q = x * (a1 - b1 * x); False if the pool rejects every amount. Derived from the error terms of _estimate,
+        # with k * q bounded by max_gamma for every accepted amount and one more ESTIMATE_RELATIVE_ERROR of margin
+        # for evaluating the folded form.
+        eps = ESTIMATE_RELATIVE_ERROR
+        net = 1 - pool.fee_rate / pool.base_fee_rate
+        direction = pool.direction
+        if net <= 2 * eps:
+            # fees of 100% or more: quote exactly
+            return True, math.inf, 0.0, 0.0, math.inf
+        max_input = math.inf
+        if direction != SELL_QUOTE_TOKEN:
+            base = pool.input
+            if not base.feasible:
+                return False
+            rate, headroom, k = base.price_qd / base.bd_pd, 1 - base.spread / 1e18, base.price_coeff / (base.bd_pd * 1e18)
+            max_input = base.max_notional_swap / (base.price_qd / base.bd / pool.pd)
+            if base.price_coeff > 0:
+                max_input = min(max_input, (base.max_gamma + 1) * base.bd_pd / base.price_coeff)
+            max_input = max_input * (1 + eps) + 1
+            if direction == SELL_BASE_TOKEN:
+                return True, max_input, rate * headroom * net + eps * rate * (net + 3), rate * k * net, 6.0
+            a1, b1, first_rate = rate * headroom * net, rate * k * net, rate
+
+        base = pool.output
+        if not base.feasible:
+            return False
+        rate, headroom, k = base.bd_pd / (base.price * pool.qd), 1 - base.spread / 1e18, base.coeff / (pool.qd * 1e18)
+        slope = rate * (abs(headroom) + 2 * (base.max_gamma + 2) / 1e18)
+        if direction == SELL_QUOTE_TOKEN:
+            max_quote = base.max_notional_swap
+            if base.coeff > 0:
+                max_quote = min(max_quote, (base.max_gamma + 1) * pool.qd / base.coeff)
+            max_input = (max_quote + 1) / (net - eps) + 1
+            return True, max_input, rate * net * headroom + eps * (slope + 3 * rate), rate * k * net * net, slope + 5
+        return False, max_input, a1, b1, rate * headroom, rate * k, 6 * slope + 5, eps * first_rate * (3 * slope + 3 * rate)
+
+    @staticmethod
+    def _estimate(terms: tuple, input_amount: int) -> tuple[float | None, float] | None:
+        # (lower or None, upper) of quote_out, None if surely rejected; the checks follow the order of the exact path
+        fee_ratio, sell_base, sell_quote, output_reserve, quote_token_reserve = terms
+        eps = ESTIMATE_RELATIVE_ERROR
+        amount = float(input_amount)
+        certain = True
+        if sell_base is not None:
+            rate, headroom, k, notional_per_unit, gamma_per_unit, max_notional_swap, max_gamma = sell_base
+            notional = amount * notional_per_unit
+            if notional * (1 - eps) > max_notional_swap:
+                return None
+            certain = notional * (1 + eps) <= max_notional_swap
+            gamma = amount * gamma_per_unit
+            error = 1 + eps * gamma
+            if gamma - error > max_gamma:
+                return None
+            certain = certain and gamma + error <= max_gamma
+            quote_token_amount = rate * amount * (headroom - k * amount)
+            quote_error = eps * rate * amount + 5
+            if sell_quote is None:
+                if quote_token_amount - quote_error > output_reserve:
+                    return None
+                certain = certain and quote_token_amount + quote_error <= output_reserve
+                amount_out = quote_token_amount * (1 - fee_ratio)
+                error = quote_error + 1 + eps * abs(quote_token_amount)
+                return (amount_out - error if certain else None), amount_out + error
+            # base to base: the fee is paid from the quote token reserve, the rest is sold for the output token
+            fee = quote_token_amount * fee_ratio
+            error = quote_error * fee_ratio + 1 + eps * abs(quote_token_amount)
+            if fee - error > quote_token_reserve:
+                return None
+            certain = certain and fee + error <= quote_token_reserve
+            amount, amount_error = quote_token_amount - fee, quote_error + 1 + eps * abs(quote_token_amount)
+        else:
+            amount, amount_error = amount - amount * fee_ratio, 1 + eps * amount
+
+        rate, headroom, k, gamma_per_unit, max_notional_swap, max_gamma = sell_quote
+        if amount - amount_error > max_notional_swap:
+            return None
+        certain = certain and amount + amount_error <= max_notional_swap
+        gamma = amount * gamma_per_unit
+        error = gamma_per_unit * amount_error + 1 + eps * abs(gamma)
+        if gamma - error > max_gamma:
+            return None
+        certain = certain and gamma + error <= max_gamma
+        amount_out = rate * amount * (headroom - k * amount)
+        # the slope of the curve bounds the effect of the input uncertainty
+        error = rate * ((abs(headroom) + 2 * k * abs(amount)) * amount_error + eps * abs(amount)) + 5
+        if amount_out - error > output_reserve:
+            return None
+        certain = certain and amount_out + error <= output_reserve
+        return (amount_out - error if certain else None), amount_out + error
+
+    def _max_sell_quote_amount(self, pool: WOOFiPreparedPool, base: WOOFiPreparedToken, max_base_token_amount: int) -> int:
+        # Estimate of the largest quote amount (after fee) base accepts without paying out more than max_base_token_amount
+        limit = base.max_notional_swap
+        if base.coeff > 0:
+            limit = min(limit, ((base.max_gamma + 1) * pool.qd - 1) // base.coeff)
+        quote_token_amount = self._solve_inverse(base.sell_quote_in_terms, max_base_token_amount + 1)
+        if quote_token_amount is not None:
+            limit = min(limit, quote_token_amount - 1)
+        return max(limit, 0)
+
+    def _max_sell_base_amount(self, pool: WOOFiPreparedPool, base: WOOFiPreparedToken, max_quote_token_amount: int) -> int:
+        # Estimate of the largest base amount base accepts without paying out more than max_quote_token_amount
+        limit = base.max_notional_swap * base.bd_pd // base.price_qd
+        if base.price_coeff > 0:
+            limit = min(limit, ((base.max_gamma + 1) * base.bd_pd - 1) // base.price_coeff)
+        base_token_amount = self._solve_inverse(base.sell_base_in_terms, max_quote_token_amount + 1)
+        if base_token_amount is not None:
+            limit = min(limit, base_token_amount - 1)
+        return max(limit, 0)
+
+    def _max_gross_amount(self, pool: WOOFiPreparedPool, max_amount_after_fee: int) -> int:
+        # The largest amount that is at most max_amount_after_fee once the swap fee is taken
+        amount = self._gross_up_fee(pool, max_amount_after_fee + 1)
+        return max_amount_after_fee if amount is None else amount - 1
+
+    def _max_accepted_input(self, pool: WOOFiPreparedPool, estimate: int) -> int:
+        # The estimates ignore the floor divisions and float products of the forward path, so settle the boundary
+        # against quote_out itself, galloping from a step sized to its float rounding. quote_out(pool, 0) is accepted.
+        def accepted(input_amount: int) -> bool:
+            return self._quote_out(pool, input_amount)[1] is not None
+
+        step = max(2, estimate >> 50)
+        if accepted(estimate):
+            low, high = estimate, estimate + step
+            while accepted(high):
+                low, high = high, high + step
+                step *= 2
+        else:
+            low, high = max(estimate - step, 0), estimate
+            while not accepted(low):
+                high, low = low, max(low - step, 0)
+                step *= 2
+
+        while high - low > 1:
+            middle = (low + high) // 2
+            if accepted(middle):
+                low = middle
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def _solve_inverse(terms: tuple[int, int, int], amount: int | None) -> int | None:
+        # Smallest root of a * x**2 - b * x + c * amount = 0 rounded up, or None past the top of the curve
+        if amount is None:
+            return None
+        if amount <= 0:
+            return 0
+
+        a, b, c = terms
+        c *= amount
+        if b <= 0:
+            return None
+        if a == 0:
+            return -(-c // b)
+
+        delta = b * b - 4 * a * c
+        if delta < 0:
+            return None
+        return -(-(b - math.isqrt(delta)) // (2 * a))
+
+    @staticmethod
+    def _gross_up_fee(pool: WOOFiPreparedPool, amount_after_fee: int | None) -> int | None:
+        # Smallest x with x - floor(x * fee_rate / base_fee_rate) >= amount_after_fee
+        net_fee_rate = pool.base_fee_rate - pool.fee_rate
+        if amount_after_fee is None or net_fee_rate <= 0:
+            return None
+        if amount_after_fee <= 0:
+            return 0
+        return (amount_after_fee - 1) * pool.base_fee_rate // net_fee_rate + 1
+
+    @staticmethod
+    def _min_input_amount(forward, pool: WOOFiPreparedPool, output_amount: int, estimate: int | None) -> tuple[int | None, int | None]:
+        # The estimate ignores the floor divisions and float products of the forward path, so correct it against
+        # forward itself: gallop away from the estimate until the answer is bracketed, then bisect. The first step is
+        # sized to the float rounding of the forward path (about 2**-52 relative). Amounts past a swap limit count as
+        # covering the target, which keeps the predicate monotone; if the minimum lands there the output is not reachable.
+        # That is only known once the target is bracketed from below: near a limit, base to base quotes move in steps
+        # of one quote token unit, far wider than the first step.
+        if estimate is None:
+            return None, None
+
+        results = {}
+
+        def covers(input_amount: int) -> bool:
+            results[input_amount] = result = forward(pool, input_amount)
+            amount_out = result[1]
+            return amount_out is None or amount_out >= output_amount
+
+        step = max(2, estimate >> 50)
+        if covers(estimate):
+            low, high = estimate - step, estimate
+            while low >= 0 and covers(low):
+                high, low = low, low - step
+                step *= 2
+            low = max(low, -1)
+        else:
+            low, high = estimate, estimate + step
+            while not covers(high):
+                low, high = high, high + step
+                step *= 2
+
+        while high - low > 1:
+            middle = (low + high) // 2
+            if covers(middle):
+                high = middle
+            else:
+                low = middle
+
+        swap_fee, amount_out = results[high]
+        if amount_out is None:
+            return None, None
+        return swap_fee, high
+
+    @staticmethod
+    def _limit_rejection(pool: WOOFiPreparedPool, base: WOOFiPreparedToken, amount: int, sell_quote: bool) -> str | None:
+        # The checks of calc_base_token_amount_sell_quote_out / calc_quote_token_amount_sell_base_out, in their order
+        if not base.wo_feasible:
+            return WO_NOT_FEASIBLE
+        if base.price <= 0:
+            return NON_POSITIVE_PRICE
+        if sell_quote:
+            if amount > base.max_notional_swap:
+                return MAX_NOTIONAL_SWAP
+            if amount * base.coeff // pool.qd > base.max_gamma:
+                return MAX_GAMMA
+        else:
+            if amount * base.price_qd / base.bd / pool.pd > base.max_notional_swap:
+                return MAX_NOTIONAL_SWAP
+            if amount * base.price_coeff // base.bd_pd > base.max_gamma:
+                return MAX_GAMMA
+        return None
+
+    @staticmethod
+    def _price_after_buy(pool_state: Dict, prefix: str, qd: int, quote_token_amount_after_fee: int) -> int:
+        # _calcBaseAmountSellQuote: newPrice = 1e18 * price / (1e18 - gamma)
+        gamma = quote_token_amount_after_fee * pool_state[prefix + "coeff"] // qd
+        return 10**18 * pool_state[prefix + "price"] // (10**18 - gamma)
+
+    @staticmethod
+    def _price_after_sell(pool_state: Dict, prefix: str, pd: int, decimals: int, base_token_amount: int) -> int:
+        # _calcQuoteAmountSellBase: newPrice = (1e18 - gamma) * price / 1e18
+        price = pool_state[prefix + "price"]
+        gamma = base_token_amount * price * pool_state[prefix + "coeff"] // pd // 10**decimals
+        return (10**18 - gamma) * price // 10**18
+
+    @staticmethod
+    def _calc_base_token_amount_sell_quote_out(pool: WOOFiPreparedPool, base: WOOFiPreparedToken, quote_token_amount_after_fee: int) -> int | None:
+        if quote_token_amount_after_fee > base.max_notional_swap:
+            return None
+
+        gamma = quote_token_amount_after_fee * base.coeff // pool.qd
+        if gamma > base.max_gamma:
+            return None
+
+        return int(((quote_token_amount_after_fee * base.bd_pd // base.price) * (1e18 - gamma - base.spread)) // 1e18 // pool.qd)
+
+    @staticmethod
+    def _calc_quote_token_amount_sell_base_out(pool: WOOFiPreparedPool, base: WOOFiPreparedToken, base_token_amount: int) -> int | None:
+        amount_price_qd = base_token_amount * base.price_qd
+        if amount_price_qd / base.bd / pool.pd > base.max_notional_swap:
+            return None
+
+        gamma = base_token_amount * base.price_coeff // base.bd_pd
+        if gamma > base.max_gamma:
+            return None
+
+        return int(((amount_price_qd // pool.pd) * (1e18 - gamma - base.spread)) // 1e18 // base.bd)
+
 
 class WOOFiLiquidityModule(LiquidityModule):
-    def get_amount_out(
+    def __init__(self, instrumentation: Optional[MetricsSink] = None):
+        """
+        :param instrumentation: Receives per-path latencies and rejection reasons of every quote, recorded by the
+            entry points of pool_math that every quoting method goes through. When it is None they skip it with one
+            check, so uninstrumented quoting costs next to nothing extra.
+        """
+        self.pool_math = WOOFiPoolMath(instrumentation)
+        self.instrumentation = instrumentation
+        # quote token id -> the swap direction of every pair of registered tokens quoted against it
+        self._directions: Dict[int, PairTable[str]] = {}
+
+    def _direction(self, fixed_parameters: Dict, input_token: Token, output_token: Token) -> str:
+        # Registered tokens (of one TokenRegistry) find the direction of their pair by id; plain tokens compare addresses
+        quote_token = fixed_parameters["quote_token"]
+        if isinstance(input_token, RegisteredToken) and isinstance(output_token, RegisteredToken) and isinstance(quote_token, RegisteredToken):
+            table = self._directions.get(quote_token.id)
+            if table is None:
+                table = self._directions[quote_token.id] = PairTable(partial(swap_direction, {"quote_token": quote_token}))
+            return table.get(input_token, output_token)
+        return swap_direction(fixed_parameters, input_token, output_token)
+
+    def prepare_pool(
         self,
         pool_state: Dict,
         fixed_parameters: Dict,
         input_token: Token,
         output_token: Token,
+    ) -> WOOFiPreparedPool:
+        # Compile the pool once; the result can be passed as pool_state to every quoting method until the state changes
+        return WOOFiPreparedPool(pool_state, fixed_parameters, input_token, output_token, self._direction(fixed_parameters, input_token, output_token))
+
+    def _pool(self, pool_state: Dict | WOOFiPreparedPool, fixed_parameters: Dict, input_token: Token, output_token: Token) -> WOOFiPreparedPool:
+        if isinstance(pool_state, WOOFiPreparedPool):
+            pool_state.check_pair(input_token, output_token)
+            return pool_state
+        return self.prepare_pool(pool_state, fixed_parameters, input_token, output_token)
+
+    def get_amount_out(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
         input_amount: int,
     ) -> tuple[int | None, int | None]:
         # Implement logic to calculate output amount given input amount
-        pool_math = WOOFiPoolMath()
-        if input_token.address == fixed_parameters["quote_token"].address:
+        if isinstance(pool_state, WOOFiPreparedPool):
+            pool_state.check_pair(input_token, output_token)
+            return self.pool_math.quote_out(pool_state, input_amount)
+
+        pool_math = self.pool_math
+        direction = self._direction(fixed_parameters, input_token, output_token)
+        if direction == SELL_QUOTE_TOKEN:
             return pool_math.sell_quote_token_out(pool_state, fixed_parameters, output_token, input_amount)
-        elif output_token.address == fixed_parameters["quote_token"].address:
+        elif direction == SELL_BASE_TOKEN:
             return pool_math.sell_base_token_out(pool_state, fixed_parameters, input_token, input_amount)
         else:
             return pool_math.swap_base_to_base_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
 
     def get_amount_in(
         self,
-        pool_state: Dict,
+        pool_state: Dict | WOOFiPreparedPool,
         fixed_parameters: Dict,
         input_token: Token,
         output_token: Token,
         output_amount: int
     ) -> tuple[int | None, int | None]:
         # Implement logic to calculate required input amount given output amount
-        pool_math = WOOFiPoolMath()
-        if input_token.address == fixed_parameters["quote_token"].address:
+        if isinstance(pool_state, WOOFiPreparedPool):
+            pool_state.check_pair(input_token, output_token)
+            return self.pool_math.quote_in(pool_state, output_amount)
+
+        pool_math = self.pool_math
+        direction = self._direction(fixed_parameters, input_token, output_token)
+        if direction == SELL_QUOTE_TOKEN:
             return pool_math.sell_quote_token_in(pool_state, fixed_parameters, output_token, output_amount)
-        elif output_token.address == fixed_parameters["quote_token"].address:
+        elif direction == SELL_BASE_TOKEN:
             return pool_math.sell_base_token_in(pool_state, fixed_parameters, input_token, output_amount)
         else:
             return pool_math.swap_base_to_base_in(pool_state, fixed_parameters, input_token, output_token, output_amount)
 
+    def get_amounts_out(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amounts: Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        # Quote a ladder of input amounts for one pair; element i matches get_amount_out(..., input_amounts[i])
+        return self.pool_math.quote_out_batch(self._pool(pool_state, fixed_parameters, input_token, output_token), input_amounts)
+
+    def get_amounts_in(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        output_amounts: Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        # Quote a ladder of output amounts for one pair; element i matches get_amount_in(..., output_amounts[i])
+        return self.pool_math.quote_in_batch(self._pool(pool_state, fixed_parameters, input_token, output_token), output_amounts)
+
+    def get_pair_amounts_out(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        quotes: Iterable[tuple[Token, Token, int]],
+    ) -> tuple[list[int | None], list[int | None]]:
+        # Quote the amounts of each pair with the batch path of its prepared pool. pool_state is usually a
+        # WOOFiStateStore, whose prepared pools also carry over between calls; a pairwise state serves its own pair
+        return self._pair_batches(pool_state, fixed_parameters, quotes, self.pool_math.quote_out_batch)
+
+    def get_pair_amounts_in(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        quotes: Iterable[tuple[Token, Token, int]],
+    ) -> tuple[list[int | None], list[int | None]]:
+        return self._pair_batches(pool_state, fixed_parameters, quotes, self.pool_math.quote_in_batch)
+
+    def get_state_amounts_out(
+        self,
+        states: Iterable[tuple[Dict | WOOFiPreparedPool, Dict]],
+        input_token: Token,
+        output_token: Token,
+        input_amounts: int | Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        return self.pool_math.quote_out_states(states, input_token, output_token, input_amounts)
+
+    def get_state_amounts_in(
+        self,
+        states: Iterable[tuple[Dict | WOOFiPreparedPool, Dict]],
+        input_token: Token,
+        output_token: Token,
+        output_amounts: int | Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        return self.pool_math.quote_in_states(states, input_token, output_token, output_amounts)
+
+    def get_liquidity_bound(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+    ) -> WOOFiLiquidityBound:
+        """
+        The largest input get_amount_out accepts for the pair, its output and the binding limit.
+
+        The limits are inverted in closed form, then the boundary is settled against the forward quote with
+        O(log(estimate)) quotes, see WOOFiPoolMath.liquidity_bound; prepare the pool when bounding it repeatedly.
+        """
+        return self.pool_math.liquidity_bound(self._pool(pool_state, fixed_parameters, input_token, output_token))
+
+    def apply_swap(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> tuple[int | None, int | None, Dict | None]:
+        """
+        Swaps input_amount exactly as get_amount_out quotes it and returns the pool state after the swap.
+
+        The new state is a shallow copy of pool_state with the reserves and the posted base token prices replaced;
+        pool_state itself is not modified, so it stays valid for quoting other branches. For long chains over many
+        pairs, WOOFiSwapSimulation replaces only the touched token records instead.
+
+        :param pool_state: A dictionary representing the state of the liquidity pool (not a prepared pool, which does not hold every reserve).
+        :return: The fee, the amount of output_token, and the new pool state; (None, None, None) if the swap is not possible.
+        """
+        if isinstance(pool_state, WOOFiPreparedPool):
+            raise ValueError("apply_swap needs the pool_state mapping, not a prepared pool")
+        effect = self.pool_math.swap_effect(pool_state, fixed_parameters, input_token, output_token, input_amount)
+        if effect is None:
+            return None, None, None
+
+        # in pairwise states the quote token reserve may also appear as the input or output token reserve
+        direction = swap_direction(fixed_parameters, input_token, output_token)
+        quote_token_reserve_change = effect.quote_token_reserve_change
+        if direction == SELL_QUOTE_TOKEN:
+            quote_token_reserve_change = effect.input_reserve_change
+        elif direction == SELL_BASE_TOKEN:
+            quote_token_reserve_change = effect.output_reserve_change
+
+        new_state = dict(pool_state)
+        for key, change in (
+            ("input_token_reserve", effect.input_reserve_change),
+            ("output_token_reserve", effect.output_reserve_change),
+            ("quote_token_reserve", quote_token_reserve_change),
+        ):
+            if key in new_state:
+                new_state[key] += change
+        if effect.input_token_price is not None:
+            new_state["input_token_price"] = effect.input_token_price
+        if effect.output_token_price is not None:
+            new_state["output_token_price"] = effect.output_token_price
+        return effect.fee, effect.amount_out, new_state
+
+    def get_marginal_rate(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> float | None:
+        # Closed-form dOut/dIn of the swap curve; one forward quote checks the amount is within the limits
+        return self.pool_math.marginal_rate(self._pool(pool_state, fixed_parameters, input_token, output_token), input_amount)
+
+    def get_price_impact(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> float | None:
+        return self.pool_math.price_impact(self._pool(pool_state, fixed_parameters, input_token, output_token), input_amount)
+
+    def get_marginal_rates(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amounts: Iterable[int],
+    ) -> list[float | None]:
+        return self.pool_math.marginal_rate_batch(self._pool(pool_state, fixed_parameters, input_token, output_token), input_amounts)
+
+    def get_price_impacts(
+        self,
+        pool_state: Dict | WOOFiPreparedPool,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amounts: Iterable[int],
+    ) -> list[float | None]:
+        return self.pool_math.price_impact_batch(self._pool(pool_state, fixed_parameters, input_token, output_token), input_amounts)
+
     def get_apy(self, pool_state: Dict) -> Decimal:
-        # Implement APY calculation logic
-        pass
+        """
+        The fee APY of a WOOFi pool: the swap fees in its fee window relative to its TVL, annualized without
+        compounding.
+
+        :param pool_state: The WOOFiStateStore of the pool, with the swap fees recorded in its fees window. A pairwise
+            pool_state records no fees, so its APY is 0.
+        """
+        if not hasattr(pool_state, "tokens"):
+            return Decimal(0)
+        fees = pool_state.fees
+        quote_token = pool_state.quote_token
+        fee_value = token_value(pool_state.fixed_parameters, quote_token, pool_state.record(quote_token.address), fees.total)
+        return fee_apy(fee_value, self._tvl_value(pool_state, None), fees.seconds())
 
     def get_tvl(self, pool_state: Dict, token: Optional[Token] = None) -> Decimal:
-        # Implement TVL calculation logic
-        pass
+        """
+        The value of the reserves of a WOOFi pool in the native token: base tokens at their oracle price in the quote
+        token, and the quote token at its reference_price.
+
+        A pairwise pool_state has no fixed parameters to value oracle prices with, and names its tokens only if it has
+        "input_token" / "output_token" addresses. The reserve of the side token names is valued at token's
+        reference_price; 0 if the pool_state does not name token.
+
+        :param pool_state: The WOOFiStateStore of the pool, or a pairwise pool_state.
+        :param token: If provided, the value of its reserve only; 0 if the pool does not hold it.
+        :raises TypeError: If pool_state is a pairwise pool_state and token is None: the TVL of the whole pool needs its
+            WOOFiStateStore.
+        """
+        if not hasattr(pool_state, "tokens"):
+            if token is None:
+                raise TypeError("the TVL of a whole WOOFi pool needs its WOOFiStateStore, not a pairwise pool_state")
+            for side in ("input_token", "output_token"):
+                address = pool_state.get(side)
+                if address is not None and same_address(address, token.address):
+                    return Decimal(pool_state[side + "_reserve"]).scaleb(-token.decimals) * token.reference_price
+            return Decimal(0)
+        return Decimal(self._tvl_value(pool_state, token)).scaleb(-VALUE_DECIMALS)
+
+    @staticmethod
+    def _tvl_value(store, token: Optional[Token]) -> int:
+        fixed_parameters = store.fixed_parameters
+        if token is not None:
+            try:
+                return token_value(fixed_parameters, token, store.record(token.address))
+            except KeyError:
+                return 0
+        return sum(token_value(fixed_parameters, token, store.record(token.address)) for token in store.tokens())
+
+    def _pair_batches(self, pool_state, fixed_parameters: Dict, quotes: Iterable[tuple[Token, Token, int]], quote_batch) -> tuple[list, list]:
+        # (input address, output address) -> (input token, output token, indices, amounts)
+        groups = {}
+        count = 0
+        for input_token, output_token, amount in quotes:
+            group = groups.get((input_token.address, output_token.address))
+            if group is None:
+                group = groups[(input_token.address, output_token.address)] = (input_token, output_token, [], [])
+            group[2].append(count)
+            group[3].append(amount)
+            count += 1
+
+        fees, amounts = [None] * count, [None] * count
+        whole_pool = hasattr(pool_state, "tokens")
+        for input_token, output_token, indices, group_amounts in groups.values():
+            pool = pool_state.prepare_pool(input_token, output_token) if whole_pool else self._pool(pool_state, fixed_parameters, input_token, output_token)
+            for index, fee, amount in zip(indices, *quote_batch(pool, group_amounts)):
+                fees[index], amounts[index] = fee, amount
+        return fees, amounts
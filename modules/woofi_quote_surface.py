@@ -0,0 +1,196 @@
+import math
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from modules.woofi_liquidity_module import WOOFiPoolMath, WOOFiPreparedPool
+from modules.woofi_state_store import WOOFiStateStore
+from templates.liquidity_module import Token, same_token, token_address
+
+DEFAULT_POINTS = 128
+# float margin on the envelope terms, which are computed in float64
+ENVELOPE_MARGIN = 1e-9
+
+
+class WOOFiQuoteSurface:
+    """
+    The exact-in quotes of one prepared pool, sampled at log-spaced input sizes from 0 to its liquidity bound, for
+    lookups by binary search and linear interpolation.
+
+    Samples are exact quote_out outputs in lists of Python ints. Between two samples a and b the interpolation is
+    within a guaranteed envelope: the continuous swap curve is concave, so it lies above its chord by at most
+    (slope(a) - slope(b)) * (b - a) / 4, and quote_out is within estimate_error(b) of the curve on the interval. The
+    interpolated amount is centered in that envelope. Both hold while every leg of the swap still grows at max_gamma,
+    i.e. 2 * max_gamma is below 1e18 - spread for every base token of the pair; surfaces of pools that are not, or
+    that charge fees of 100% or more, are left empty and look every amount up exactly.
+    """
+
+    def __init__(self, pool: WOOFiPreparedPool, points: int = DEFAULT_POINTS, pool_math: Optional[WOOFiPoolMath] = None):
+        """
+        :param pool: The prepared pool of the pair.
+        :param points: The number of log-spaced samples up to the liquidity bound, besides 0.
+        :param pool_math: The math of the exact quotes.
+        """
+        self.pool = pool
+        self.pool_math = WOOFiPoolMath() if pool_math is None else pool_math
+        self.max_input_amount = self.pool_math.liquidity_bound(pool).max_input_amount
+        self.inputs = []
+        self.outputs = []
+        # per interval ending at sample i: the offset added to the interpolation and the envelope around it
+        self.offsets = []
+        self.errors = []
+        if self.max_input_amount is None or not self._concave():
+            return
+
+        pool_math, max_input_amount = self.pool_math, self.max_input_amount
+        inputs = {0, max_input_amount}
+        if max_input_amount > 1:
+            log_max = math.log(max_input_amount)
+            inputs.update(min(int(math.exp(log_max * i / (points - 1))), max_input_amount) for i in range(points))
+        self.inputs = sorted(inputs)
+        self.outputs = [pool_math.quote_out(pool, amount)[1] for amount in self.inputs]
+        slopes = [pool_math.marginal_rate(pool, amount) for amount in self.inputs]
+        self.offsets, self.errors = [0], [0]
+        for i in range(1, len(self.inputs)):
+            # exact - interpolation lies in [-2 * error, gap + 2 * error + 1], the 1 for the floored interpolation
+            gap = max(slopes[i - 1] - slopes[i], 0.0) * (self.inputs[i] - self.inputs[i - 1]) / 4 * (1 + ENVELOPE_MARGIN)
+            error = 2 * pool_math.estimate_error(pool, self.inputs[i]) * (1 + ENVELOPE_MARGIN)
+            offset = int(gap / 2)
+            self.offsets.append(offset)
+            self.errors.append(math.ceil(max(error + offset, gap - offset + error + 1)) + 1)
+
+    def lookup(self, input_amount: int, exact: bool = False) -> tuple[int | None, int | None]:
+        """
+        The output amount of quote_out(pool, input_amount) within the envelope, in O(log n).
+
+        :param exact: Quote with WOOFiPoolMath instead, e.g. to execute a swap.
+        :return: (amount_out, error), with error 0 for sampled and exact amounts; (None, None) if quote_out rejects
+            the amount.
+        """
+        inputs = self.inputs
+        if exact or input_amount < 0 or not inputs:
+            amount_out = self.pool_math.quote_out(self.pool, input_amount)[1]
+            return (None, None) if amount_out is None else (amount_out, 0)
+        if input_amount > self.max_input_amount:
+            return None, None
+        i = bisect_left(inputs, input_amount)
+        high = inputs[i]
+        if high == input_amount:
+            return self.outputs[i], 0
+        outputs, low = self.outputs, inputs[i - 1]
+        low_output = outputs[i - 1]
+        return low_output + (outputs[i] - low_output) * (input_amount - low) // (high - low) + self.offsets[i], self.errors[i]
+
+    def _concave(self) -> bool:
+        pool = self.pool
+        if pool.fee_rate >= pool.base_fee_rate:
+            return False
+        # a leg grows while gamma, at most max_gamma + 1 before its check, stays below half the headroom
+        return all(base is None or 2 * (base.max_gamma + 1) <= 10**18 - base.spread for base in (pool.input, pool.output))
+
+
+class WOOFiSurfacesVersion(NamedTuple):
+    # shaped like engine.state_pipeline.StateVersion, so readers of either unpack (version, state)
+    version: int
+    state: Dict[tuple[str, str], WOOFiQuoteSurface]
+
+
+class WOOFiQuoteSurfaces:
+    """
+    Quote surfaces of the pairs of a WOOFiStateStore, rebuilt by a background worker whenever a new store version is
+    submitted, so that quoting only reads the published surfaces.
+
+    submit prepares the pools of the pairs on the caller's thread, which the store caches per unchanged token, and
+    hands them to the worker; the worker builds a surface for every pool that changed and reuses the others. A newer
+    submission replaces one that is waiting or being built. Publishing replaces the single reference current, so
+    readers take `version, surfaces = quote_surfaces.current` without a lock, as with StatePipeline.
+    """
+
+    def __init__(self, pairs: Optional[Iterable[tuple[Token, Token]]] = None, points: int = DEFAULT_POINTS, pool_math: Optional[WOOFiPoolMath] = None):
+        """
+        :param pairs: The (input token, output token) pairs to build surfaces for, every ordered pair of the store's
+            tokens by default.
+        :param points: The number of samples per surface, see WOOFiQuoteSurface.
+        :param pool_math: The math of the exact quotes.
+        """
+        self.pairs = None if pairs is None else list(pairs)
+        self.points = points
+        self.pool_math = WOOFiPoolMath() if pool_math is None else pool_math
+        # (store version, {(input address, output address): WOOFiQuoteSurface}), None until the first build; the
+        # addresses are normalized, see token_address
+        self.current: WOOFiSurfacesVersion | None = None
+        self.builds = 0
+        self._pending = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._worker = None
+
+    def submit(self, store: WOOFiStateStore):
+        """ Schedules building the surfaces of a store version; the store must not be modified afterwards. """
+        tokens = store.tokens()
+        pairs = self.pairs if self.pairs is not None else [(a, b) for a in tokens for b in tokens if not same_token(a, b)]
+        pools = {(token_address(a), token_address(b)): store.prepare_pool(a, b) for a, b in pairs}
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("the quote surfaces are closed")
+            self._pending = (store.version, pools)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="woofi-quote-surfaces", daemon=True)
+                self._worker.start()
+            self._condition.notify_all()
+
+    def wait_for_version(self, version: int, timeout: Optional[float] = None) -> WOOFiSurfacesVersion | None:
+        """ Blocks until the surfaces of a version at least this one are published; None on timeout. """
+        with self._condition:
+            published = self._condition.wait_for(lambda: self.current is not None and self.current.version >= version, timeout)
+            return self.current if published else None
+
+    def close(self):
+        """ Stops the worker; the published surfaces stay readable. """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+
+    def surface(self, input_token: Token, output_token: Token) -> WOOFiQuoteSurface:
+        """ :raises KeyError: If no surface of the pair is published yet. """
+        key = (token_address(input_token), token_address(output_token))
+        if self.current is None:
+            raise KeyError(key)
+        return self.current.state[key]
+
+    def quote(self, input_token: Token, output_token: Token, input_amount: int, exact: bool = False) -> tuple[int | None, int | None]:
+        """ WOOFiQuoteSurface.lookup on the published surface of the pair, as of current.version. """
+        return self.surface(input_token, output_token).lookup(input_amount, exact)
+
+    def _run(self):
+        condition = self._condition
+        # surfaces by pair, including those of a build a newer submission interrupted
+        cache = {}
+        while True:
+            with condition:
+                condition.wait_for(lambda: self._pending is not None or self._closed)
+                if self._closed:
+                    return
+                (version, pools), self._pending = self._pending, None
+            surfaces = self._build(pools, cache)
+            if surfaces is None:
+                continue
+            cache = dict(surfaces)
+            with condition:
+                self.current = WOOFiSurfacesVersion(version, surfaces)
+                self.builds += 1
+                condition.notify_all()
+
+    def _build(self, pools: dict, cache: dict) -> dict | None:
+        # None if a newer submission arrived, which then reuses what this build added to the cache
+        surfaces = {}
+        for key, pool in pools.items():
+            surface = cache.get(key)
+            if surface is None or surface.pool is not pool:
+                if self._pending is not None or self._closed:
+                    return None
+                surface = cache[key] = WOOFiQuoteSurface(pool, self.points, self.pool_math)
+            surfaces[key] = surface
+        return surfaces
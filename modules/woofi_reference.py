@@ -0,0 +1,157 @@
+"""
+An exact model of WOOFi quoting with the integer semantics of the WooPPV2 contract, to check WOOFiPoolMath against.
+
+Every quantity is an integer and every division rounds down, as in Solidity; nothing goes through floats. Limits are
+checked in the order WOOFiPoolMath checks them, and a swap whose spread and gamma use up the whole price reverts, as
+the unsigned subtraction does on chain. The model is written for clarity, not speed: it reads the pool_state dict on
+every call and finds exact-in amounts by bisection on the exact-out model.
+
+Callers can pass a trace dict to reference_out to see how close a swap came to each limit: "checks" collects a
+(reason, value, limit) triple for every threshold compared, named by the rejection reasons of WOOFiPoolMath.
+"""
+from typing import Dict, Optional
+
+from modules.woofi_liquidity_module import (
+    INSUFFICIENT_QUOTE_RESERVE, INSUFFICIENT_RESERVE, MAX_GAMMA, MAX_NOTIONAL_SWAP, SELL_BASE_TOKEN, SELL_QUOTE_TOKEN, swap_direction,
+)
+from templates.liquidity_module import Token
+
+ONE = 10**18
+# the swap's spread and gamma use up the whole price; WOOFiPoolMath has no such check, its limits keep them below 1e18
+PRICE_EXHAUSTED = "price_exhausted"
+
+
+def _exceeds(checks: list, reason: str, value: int, limit: int) -> bool:
+    checks.append((reason, value, limit))
+    return value > limit
+
+
+def _sell_base(pool_state: Dict, fixed_parameters: Dict, prefix: str, decimals: int, spread: int, base_amount: int, checks: list) -> Optional[int]:
+    # quoteAmount of WooPPV2._calcQuoteAmountSellBase, before the fee
+    if not pool_state[prefix + "wo_feasible"] or pool_state[prefix + "price"] <= 0:
+        return None
+    price, coeff = pool_state[prefix + "price"], pool_state[prefix + "coeff"]
+    base_dec, quote_dec, price_dec = 10**decimals, 10 ** fixed_parameters["quote_token_decimals"], 10 ** fixed_parameters["oracle_price_decimals"]
+
+    notional_swap = base_amount * price * quote_dec // base_dec // price_dec
+    if _exceeds(checks, MAX_NOTIONAL_SWAP, notional_swap, pool_state[prefix + "max_notional_swap"]):
+        return None
+    gamma = base_amount * price * coeff // price_dec // base_dec
+    if _exceeds(checks, MAX_GAMMA, gamma, pool_state[prefix + "max_gamma"]) or _exceeds(checks, PRICE_EXHAUSTED, gamma + spread, ONE):
+        return None
+    return base_amount * price * quote_dec // price_dec * (ONE - gamma - spread) // ONE // base_dec
+
+
+def _sell_quote(pool_state: Dict, fixed_parameters: Dict, prefix: str, decimals: int, spread: int, quote_amount: int, checks: list) -> Optional[int]:
+    # baseAmount of WooPPV2._calcBaseAmountSellQuote, for a quote amount after the fee
+    if not pool_state[prefix + "wo_feasible"] or pool_state[prefix + "price"] <= 0:
+        return None
+    price, coeff = pool_state[prefix + "price"], pool_state[prefix + "coeff"]
+    base_dec, quote_dec, price_dec = 10**decimals, 10 ** fixed_parameters["quote_token_decimals"], 10 ** fixed_parameters["oracle_price_decimals"]
+
+    if _exceeds(checks, MAX_NOTIONAL_SWAP, quote_amount, pool_state[prefix + "max_notional_swap"]):
+        return None
+    gamma = quote_amount * coeff // quote_dec
+    if _exceeds(checks, MAX_GAMMA, gamma, pool_state[prefix + "max_gamma"]) or _exceeds(checks, PRICE_EXHAUSTED, gamma + spread, ONE):
+        return None
+    return quote_amount * base_dec * price_dec // price * (ONE - gamma - spread) // ONE // quote_dec
+
+
+def reference_out(
+    pool_state: Dict,
+    fixed_parameters: Dict,
+    input_token: Token,
+    output_token: Token,
+    input_amount: int,
+    trace: Optional[Dict] = None,
+    quote_error: int = 0,
+) -> tuple[int | None, int | None]:
+    """
+    The fee and output amount of get_amount_out, or (None, None) if the swap reverts.
+
+    :param trace: If provided, receives the limit checks of the swap (see the module docstring).
+    :param quote_error: Added to the quote amount the swap trades (after the fee when selling the quote token, before it
+        otherwise), to model an implementation that rounds it differently.
+    """
+    checks = []
+    if trace is not None:
+        trace["checks"] = checks
+    base_fee_rate = fixed_parameters["base_fee_rate"]
+    direction = swap_direction(fixed_parameters, input_token, output_token)
+    if direction == SELL_QUOTE_TOKEN:
+        fee = input_amount * pool_state["output_token_fee_rate"] // base_fee_rate
+        amount_out = _sell_quote(pool_state, fixed_parameters, "output_token_", output_token.decimals, pool_state["output_token_spread"], input_amount - fee + quote_error, checks)
+        if amount_out is None or _exceeds(checks, INSUFFICIENT_RESERVE, amount_out, pool_state["output_token_reserve"]):
+            return None, None
+        return fee, amount_out
+
+    if direction == SELL_BASE_TOKEN:
+        quote_amount = _sell_base(pool_state, fixed_parameters, "input_token_", input_token.decimals, pool_state["input_token_spread"], input_amount, checks)
+        if quote_amount is not None:
+            quote_amount += quote_error
+        if quote_amount is None or _exceeds(checks, INSUFFICIENT_RESERVE, quote_amount, pool_state["output_token_reserve"]):
+            return None, None
+        fee = quote_amount * pool_state["input_token_fee_rate"] // base_fee_rate
+        return fee, quote_amount - fee
+
+    # base to base pays the higher fee rate and spread of the two tokens
+    fee_rate = max(pool_state["input_token_fee_rate"], pool_state["output_token_fee_rate"])
+    spread = max(pool_state["input_token_spread"], pool_state["output_token_spread"])
+    quote_amount = _sell_base(pool_state, fixed_parameters, "input_token_", input_token.decimals, spread, input_amount, checks)
+    if quote_amount is None:
+        return None, None
+    quote_amount += quote_error
+    fee = quote_amount * fee_rate // base_fee_rate
+    if _exceeds(checks, INSUFFICIENT_QUOTE_RESERVE, fee, pool_state["quote_token_reserve"]):
+        return None, None
+    amount_out = _sell_quote(pool_state, fixed_parameters, "output_token_", output_token.decimals, spread, quote_amount - fee, checks)
+    if amount_out is None or _exceeds(checks, INSUFFICIENT_RESERVE, amount_out, pool_state["output_token_reserve"]):
+        return None, None
+    return fee, amount_out
+
+
+def reference_in(
+    pool_state: Dict, fixed_parameters: Dict, input_token: Token, output_token: Token, output_amount: int, guess: Optional[int] = None,
+) -> tuple[int | None, int | None]:
+    """
+    The fee and the smallest input amount for which reference_out returns at least output_amount, or (None, None) if
+    no accepted input does.
+
+    Accepted inputs form a range from 0 (every limit is a threshold on an amount that grows with the input) and the
+    output grows with the input on it, so the answer is found by bisection.
+
+    :param guess: Where to start looking, e.g. an estimate; only the number of steps depends on it.
+    """
+    def quote(amount: int) -> Optional[int]:
+        return reference_out(pool_state, fixed_parameters, input_token, output_token, amount)[1]
+
+    def covers(amount: int) -> bool:
+        # past the accepted range counts as covering, which keeps the predicate monotone
+        amount_out = quote(amount)
+        return amount_out is None or amount_out >= output_amount
+
+    if quote(0) is None:
+        return None, None
+    if covers(0):
+        return reference_out(pool_state, fixed_parameters, input_token, output_token, 0)
+
+    # gallop from the guess until covers changes between low and high, then bisect
+    low, high, step = 0, max(guess or 1, 1), max((guess or 1) >> 40, 1)
+    if covers(high):
+        while high - step > low and covers(high - step):
+            high -= step
+            step *= 2
+        low = max(low, high - step)
+    else:
+        low = high
+        while not covers(high):
+            low, high = high, high + step
+            step *= 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if covers(middle):
+            high = middle
+        else:
+            low = middle
+    fee, amount_out = reference_out(pool_state, fixed_parameters, input_token, output_token, high)
+    return (fee, high) if amount_out is not None else (None, None)
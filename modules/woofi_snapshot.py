@@ -0,0 +1,228 @@
+"""
+A versioned binary snapshot of WOOFi state for fast worker start-up.
+
+Layout (little endian), version 1:
+    header   HEADER, at offset 0
+    tokens   token_count x TOKEN: address, symbol, decimals and reference price of every token
+    pools    pool_count x POOL: fixed parameters, quote token reserve and the record range of one WOOFi deployment
+    records  record_count x RECORD: the TOKEN_STATE_FIELDS of one base token of one pool
+
+Integer state fields are stored as signed 128-bit values, so every value the contracts can hold round-trips exactly.
+WOOFiSnapshot maps the file and decodes a record only when a pair that uses it is quoted.
+"""
+import mmap
+import os
+import struct
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping
+
+from modules.woofi_liquidity_module import WOOFiPreparedPool
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiPairView, WOOFiStateStore
+from templates.liquidity_module import Token, normalize_address, same_token
+
+
+MAGIC = b"WOOFISNP"
+VERSION = 1
+
+# magic, version, block number, token count, pool count, record count, token / pool / record table offsets
+HEADER = struct.Struct("<8sH6xQIIIQQQ")
+# address, symbol, reference price (decimal string), decimals
+TOKEN = struct.Struct("<42s32s40sB5x")
+# quote token index, base fee rate, quote token decimals, oracle price decimals, quote token reserve, first record, record count
+POOL = struct.Struct("<IQBB2x16sII")
+# token index, wo_feasible, fee_rate, then the 128-bit RECORD_INT_FIELDS
+RECORD = struct.Struct("<IB3xQ16s16s16s16s16s16s")
+RECORD_INT_FIELDS = ("reserve", "max_gamma", "max_notional_swap", "price", "spread", "coeff")
+
+
+def _int128(value: int) -> bytes:
+    return value.to_bytes(16, "little", signed=True)
+
+
+def _text(value: str, size: int, name: str) -> bytes:
+    encoded = value.encode()
+    if len(encoded) > size:
+        raise ValueError(f"{name} {value!r} is longer than {size} bytes")
+    return encoded
+
+
+def write_snapshot(path: str, block_number: int, stores: Iterable[WOOFiStateStore]):
+    """
+    Writes the state of WOOFi deployments as a snapshot. The file is replaced atomically.
+
+    :param path: The snapshot file.
+    :param block_number: The block the state was read at.
+    :param stores: One WOOFiStateStore per deployment (chain or fork); pools are numbered in this order.
+    :raises ValueError: If a value does not fit its field.
+    """
+    token_indexes, token_rows, pool_rows, record_rows = {}, [], [], []
+
+    def token_index(token: Token) -> int:
+        key = (token.address, token.symbol, token.decimals, str(token.reference_price))
+        index = token_indexes.get(key)
+        if index is None:
+            index = token_indexes[key] = len(token_rows)
+            token_rows.append(TOKEN.pack(
+                _text(token.address, 42, "address"), _text(token.symbol, 32, "symbol"),
+                _text(str(token.reference_price), 40, "reference price"), token.decimals,
+            ))
+        return index
+
+    for store in stores:
+        fixed_parameters = store.fixed_parameters
+        quote_token = store.quote_token
+        first_record = len(record_rows)
+        for token in store.tokens():
+            if same_token(token, quote_token):
+                continue
+            record = store.record(token.address)
+            try:
+                record_rows.append(RECORD.pack(
+                    token_index(token), bool(record["wo_feasible"]), record["fee_rate"],
+                    *(_int128(record[field]) for field in RECORD_INT_FIELDS),
+                ))
+            except (OverflowError, struct.error) as error:
+                raise ValueError(f"{token.symbol} state does not fit the snapshot format: {error}") from error
+        pool_rows.append(POOL.pack(
+            token_index(store.quote_token), fixed_parameters["base_fee_rate"], fixed_parameters["quote_token_decimals"],
+            fixed_parameters["oracle_price_decimals"], _int128(store.record(quote_token.address)["reserve"]),
+            first_record, len(record_rows) - first_record,
+        ))
+
+    token_offset = HEADER.size
+    pool_offset = token_offset + TOKEN.size * len(token_rows)
+    record_offset = pool_offset + POOL.size * len(pool_rows)
+    header = HEADER.pack(MAGIC, VERSION, block_number, len(token_rows), len(pool_rows), len(record_rows), token_offset, pool_offset, record_offset)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(header)
+        file.write(b"".join(token_rows))
+        file.write(b"".join(pool_rows))
+        file.write(b"".join(record_rows))
+    os.replace(temporary_path, path)
+
+
+class WOOFiSnapshot:
+    """
+    A memory-mapped snapshot. Opening it only checks the header; tokens, fixed parameters and token records are
+    decoded on first use and cached, so start-up cost does not grow with the number of pools.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: A file written by write_snapshot.
+        :raises ValueError: If the file is not a snapshot of a supported version or is truncated.
+        """
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        if len(self._buffer) < HEADER.size:
+            raise ValueError(f"{path} is too short for a WOOFi snapshot")
+
+        magic, version, self.block_number, self.token_count, self.pool_count, self.record_count, \
+            self._token_offset, self._pool_offset, self._record_offset = HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a WOOFi snapshot")
+        if version != VERSION:
+            raise ValueError(f"{path} has snapshot version {version}, expected {VERSION}")
+        if len(self._buffer) < self._record_offset + RECORD.size * self.record_count:
+            raise ValueError(f"{path} is truncated")
+
+        self._tokens = {}
+        self._pools = {}
+
+    def close(self):
+        self._buffer.release()
+        self._mmap.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._mmap.closed
+
+    def __enter__(self) -> "WOOFiSnapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def token(self, index: int) -> Token:
+        token = self._tokens.get(index)
+        if token is None:
+            address, symbol, reference_price, decimals = TOKEN.unpack_from(self._buffer, self._token_offset + index * TOKEN.size)
+            token = self._tokens[index] = Token(
+                address=address.rstrip(b"\0").decode(), symbol=symbol.rstrip(b"\0").decode(),
+                decimals=decimals, reference_price=Decimal(reference_price.rstrip(b"\0").decode()),
+            )
+        return token
+
+    def fixed_parameters(self, pool: int) -> Dict:
+        return self._pool(pool).fixed_parameters
+
+    def tokens(self, pool: int) -> list[Token]:
+        """ The quote token and the base tokens of a pool. """
+        snapshot_pool = self._pool(pool)
+        return [snapshot_pool.fixed_parameters["quote_token"]] + [self.token(index) for index in snapshot_pool.records]
+
+    def pair_state(self, pool: int, input_token: Token, output_token: Token) -> WOOFiPairView:
+        """ The pairwise pool_state of a pool, usable wherever a pool_state dict is. """
+        snapshot_pool = self._pool(pool)
+        return WOOFiPairView(snapshot_pool.record(input_token.address), snapshot_pool.record(output_token.address), snapshot_pool.quote_record)
+
+    def prepare_pool(self, pool: int, input_token: Token, output_token: Token) -> WOOFiPreparedPool:
+        return WOOFiPreparedPool(self.pair_state(pool, input_token, output_token), self.fixed_parameters(pool), input_token, output_token)
+
+    def state_store(self, pool: int) -> WOOFiStateStore:
+        """ Loads a whole pool into a WOOFiStateStore, e.g. to keep applying updates on top of the snapshot. """
+        snapshot_pool = self._pool(pool)
+        store = WOOFiStateStore(snapshot_pool.fixed_parameters, snapshot_pool.quote_record["reserve"])
+        for token in self.tokens(pool)[1:]:
+            store.set_token(token, **snapshot_pool.record(token.address))
+        return store
+
+    def _pool(self, pool: int) -> "_SnapshotPool":
+        snapshot_pool = self._pools.get(pool)
+        if snapshot_pool is None:
+            if not 0 <= pool < self.pool_count:
+                raise IndexError(f"pool {pool} is not in the snapshot ({self.pool_count} pools)")
+            snapshot_pool = self._pools[pool] = _SnapshotPool(self, pool)
+        return snapshot_pool
+
+
+class _SnapshotPool:
+    # The fixed parameters of one pool and its token records, decoded lazily from the snapshot buffer
+
+    def __init__(self, snapshot: WOOFiSnapshot, pool: int):
+        buffer = snapshot._buffer
+        quote_token_index, base_fee_rate, quote_token_decimals, oracle_price_decimals, quote_token_reserve, first_record, record_count = \
+            POOL.unpack_from(buffer, snapshot._pool_offset + pool * POOL.size)
+        quote_token = snapshot.token(quote_token_index)
+        self.fixed_parameters = {
+            "base_fee_rate": base_fee_rate,
+            "quote_token_decimals": quote_token_decimals,
+            "oracle_price_decimals": oracle_price_decimals,
+            "quote_token": quote_token,
+        }
+        self.quote_record = MappingProxyType({"reserve": int.from_bytes(quote_token_reserve, "little", signed=True)})
+        self._snapshot = snapshot
+        # token index -> record offset, then normalized address -> decoded record
+        self.records = {}
+        for record in range(first_record, first_record + record_count):
+            offset = snapshot._record_offset + record * RECORD.size
+            self.records[struct.unpack_from("<I", buffer, offset)[0]] = offset
+        self._addresses = None
+        self._decoded = {normalize_address(quote_token.address): self.quote_record}
+
+    def record(self, address: str) -> Mapping:
+        address = normalize_address(address)
+        record = self._decoded.get(address)
+        if record is None:
+            if self._addresses is None:
+                self._addresses = {normalize_address(self._snapshot.token(index).address): offset for index, offset in self.records.items()}
+            _, wo_feasible, fee_rate, *fields = RECORD.unpack_from(self._snapshot._buffer, self._addresses[address])
+            values = {"wo_feasible": bool(wo_feasible), "fee_rate": fee_rate}
+            for field, value in zip(RECORD_INT_FIELDS, fields):
+                values[field] = int.from_bytes(value, "little", signed=True)
+            record = self._decoded[address] = MappingProxyType({field: values[field] for field in TOKEN_STATE_FIELDS})
+        return record
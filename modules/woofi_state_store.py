@@ -0,0 +1,325 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Dict, Iterator, Optional
+
+from modules.woofi_liquidity_module import BASE_TOKEN_STATE_FIELDS, WOOFiPoolMath, WOOFiPreparedPool
+from templates.liquidity_module import Token, normalize_address, token_address
+
+
+TOKEN_STATE_FIELDS = ("reserve",) + BASE_TOKEN_STATE_FIELDS
+
+# pairwise pool_state key -> (source, record field); sources are (input record, output record, quote record)
+PAIR_STATE_KEYS = {"quote_token_reserve": (2, "reserve")}
+for _field in TOKEN_STATE_FIELDS:
+    PAIR_STATE_KEYS["input_token_" + _field] = (0, _field)
+    PAIR_STATE_KEYS["output_token_" + _field] = (1, _field)
+del _field
+
+
+class WOOFiPairView(Mapping):
+    """
+    A read-only pairwise pool_state backed by the per-token records of a WOOFiStateStore.
+
+    Nothing is copied: the view holds the records that were current when it was created. Records are replaced rather
+    than mutated on update, so a view keeps quoting the state it was taken from.
+    """
+    __slots__ = ("_sources",)
+
+    def __init__(self, input_record: Mapping, output_record: Mapping, quote_record: Mapping):
+        self._sources = (input_record, output_record, quote_record)
+
+    def __getitem__(self, key: str):
+        source, field = PAIR_STATE_KEYS[key]
+        return self._sources[source][field]
+
+    def __iter__(self) -> Iterator[str]:
+        sources = self._sources
+        return (key for key, (source, field) in PAIR_STATE_KEYS.items() if field in sources[source])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class WOOFiFeeWindow:
+    """
+    The swap fees of a sliding time window, summed in a fixed ring of time buckets: memory does not grow with the
+    number of swaps, and fees leave the window a bucket at a time without being rescanned.
+    """
+    __slots__ = ("bucket_seconds", "total", "_sums", "_head", "_first")
+
+    def __init__(self, buckets: int = 24, bucket_seconds: int = 3600):
+        """
+        :param buckets: Buckets in the ring; the window spans buckets * bucket_seconds.
+        :param bucket_seconds: Seconds per bucket, the resolution at which fees leave the window.
+        """
+        if buckets <= 0 or bucket_seconds <= 0:
+            raise ValueError("buckets and bucket_seconds must be positive")
+        self.bucket_seconds = bucket_seconds
+        # the fees in the window, in the units they were added in
+        self.total = 0
+        self._sums = [0] * buckets
+        # number (timestamp // bucket_seconds) of the newest bucket, and of the oldest bucket a fee was added to
+        self._head = self._first = None
+
+    def add(self, timestamp: float, fee: int) -> bool:
+        """
+        Adds the fee of a swap; swaps may arrive slightly out of order.
+
+        :return: False if the swap is older than the window and was dropped.
+        """
+        bucket = int(timestamp // self.bucket_seconds)
+        self.advance(timestamp)
+        if bucket <= self._head - len(self._sums):
+            return False
+        self._sums[bucket % len(self._sums)] += fee
+        self.total += fee
+        if self._first is None or bucket < self._first:
+            self._first = bucket
+        return True
+
+    def advance(self, timestamp: float):
+        """ Moves the window forward to end at timestamp, dropping the buckets that leave it. """
+        bucket = int(timestamp // self.bucket_seconds)
+        head = self._head
+        if head is None or bucket <= head:
+            if head is None:
+                self._head = bucket
+            return
+        sums, size = self._sums, len(self._sums)
+        if bucket - head >= size:
+            sums[:] = [0] * size
+            self.total = 0
+        else:
+            for number in range(head + 1, bucket + 1):
+                self.total -= sums[number % size]
+                sums[number % size] = 0
+        self._head = bucket
+
+    def copy(self) -> "WOOFiFeeWindow":
+        window = WOOFiFeeWindow.__new__(WOOFiFeeWindow)
+        window.bucket_seconds, window.total, window._sums = self.bucket_seconds, self.total, list(self._sums)
+        window._head, window._first = self._head, self._first
+        return window
+
+    def seconds(self) -> int:
+        """ The time the window covers: all of it once fees were added for longer, else since the first fee. """
+        if self._first is None:
+            return 0
+        return min(len(self._sums), self._head - self._first + 1) * self.bucket_seconds
+
+
+class WOOFiStateStore:
+    """
+    Holds the WOOFi state once per token instead of once per pair.
+
+    Each base token has one record with the TOKEN_STATE_FIELDS, and the quote token has a record with its reserve.
+    Oracle ticks update a single record in O(1) with update_token, pair states are views over two records, and the
+    prepared pools of a pair are rebuilt only after one of its tokens changed.
+
+    Tokens are keyed by normalized address (see normalize_address), so addresses and tokens may be passed in any
+    checksum casing.
+
+    The swap fees of the pool, in quote token units, are recorded in the fees window, from which
+    WOOFiLiquidityModule.get_apy computes the fee APY.
+    """
+
+    def __init__(self, fixed_parameters: Dict, quote_token_reserve: int = 0, fees: Optional[WOOFiFeeWindow] = None):
+        """
+        :param fixed_parameters: The fixed parameters of the WOOFi pool, including the quote token.
+        :param quote_token_reserve: The reserve of the quote token.
+        :param fees: The window swap fees are recorded in, a day in hourly buckets by default.
+        """
+        self.fixed_parameters = fixed_parameters
+        self.quote_token = fixed_parameters["quote_token"]
+        self.fees = WOOFiFeeWindow() if fees is None else fees
+        self.version = 0
+        # every key of the store is a normalized address
+        self._quote_address = token_address(self.quote_token)
+        self._tokens = {self._quote_address: self.quote_token}
+        self._records = {self._quote_address: MappingProxyType({"reserve": quote_token_reserve})}
+        self._prepared = {}
+        # token address -> keys of the prepared pools built from its record
+        self._prepared_by_token = {}
+
+    def set_token(self, token: Token, **fields):
+        """
+        Adds a base token or replaces its whole record.
+
+        :param token: The base token.
+        :param fields: All of TOKEN_STATE_FIELDS.
+        :raises ValueError: If a field is missing or unknown.
+        """
+        missing = [field for field in TOKEN_STATE_FIELDS if field not in fields]
+        if missing:
+            raise ValueError(f"{token.symbol} is missing {', '.join(missing)}")
+        self._check_fields(fields)
+        address = token_address(token)
+        if address is self._quote_address:
+            raise ValueError("the quote token only has a reserve, use set_quote_token_reserve")
+
+        self._tokens[address] = token
+        self._replace(address, MappingProxyType(dict(fields)))
+
+    def update_token(self, address: str, **fields):
+        """
+        Applies a partial update, e.g. an oracle push of price, spread and coeff, to one base token.
+
+        :param address: The address of the base token.
+        :param fields: A subset of TOKEN_STATE_FIELDS.
+        :raises KeyError: If the token was never set.
+        :raises ValueError: If a field is unknown.
+        """
+        address = normalize_address(address)
+        if address is self._quote_address:
+            raise ValueError("the quote token only has a reserve, use set_quote_token_reserve")
+        self._check_fields(fields)
+        record = self._records[address]
+        self._replace(address, MappingProxyType({**record, **fields}))
+
+    def set_quote_token_reserve(self, reserve: int):
+        self._replace(self._quote_address, MappingProxyType({"reserve": reserve}))
+
+    def with_updates(self, updates: Mapping[str, Mapping]) -> "WOOFiStateStore":
+        """
+        A new store with a batch of partial updates applied; this store is left unchanged, so it can be published to
+        readers while the next one is built. The new store shares every record that is not updated and the prepared
+        pools of every pair that none of the updated tokens is part of. It gets a copy of the fees window, so fees
+        recorded in one version do not show in the other.
+
+        :param updates: Token address -> a subset of TOKEN_STATE_FIELDS; the quote token only takes "reserve".
+        :raises KeyError: If a token was never set.
+        :raises ValueError: If a field is unknown.
+        """
+        store = WOOFiStateStore.__new__(WOOFiStateStore)
+        store.fixed_parameters, store.quote_token, store.version = self.fixed_parameters, self.quote_token, self.version
+        store._quote_address = self._quote_address
+        store.fees = self.fees.copy()
+        store._tokens = dict(self._tokens)
+        store._records = dict(self._records)
+        store._prepared = dict(self._prepared)
+        store._prepared_by_token = {address: set(keys) for address, keys in self._prepared_by_token.items()}
+        for address, fields in updates.items():
+            if normalize_address(address) is self._quote_address:
+                if fields.keys() != {"reserve"}:
+                    raise ValueError("the quote token only has a reserve")
+                store.set_quote_token_reserve(fields["reserve"])
+            else:
+                store.update_token(address, **fields)
+        return store
+
+    def token(self, address: str) -> Token:
+        return self._tokens[normalize_address(address)]
+
+    def tokens(self) -> list[Token]:
+        return list(self._tokens.values())
+
+    def record(self, address: str) -> Mapping:
+        return self._records[normalize_address(address)]
+
+    def pair_state(self, input_token: Token, output_token: Token) -> WOOFiPairView:
+        """ The pairwise pool_state for input_token -> output_token, usable wherever a pool_state dict is. """
+        records = self._records
+        return WOOFiPairView(records[token_address(input_token)], records[token_address(output_token)], records[self._quote_address])
+
+    def prepare_pool(self, input_token: Token, output_token: Token) -> WOOFiPreparedPool:
+        """ The prepared pool of a pair, rebuilt only if one of its tokens changed since it was last prepared. """
+        key = (token_address(input_token), token_address(output_token))
+        pool = self._prepared.get(key)
+        if pool is None:
+            pool = WOOFiPreparedPool(self.pair_state(input_token, output_token), self.fixed_parameters, input_token, output_token)
+            self._prepared[key] = pool
+            # base to base pools also read the quote token reserve
+            for address in (*key, self._quote_address):
+                self._prepared_by_token.setdefault(address, set()).add(key)
+        return pool
+
+    def _replace(self, address: str, record: Mapping):
+        self._records[address] = record
+        self.version += 1
+        self._invalidate(address)
+
+    def _invalidate(self, address: str):
+        prepared = self._prepared
+        for key in self._prepared_by_token.pop(address, ()):
+            prepared.pop(key, None)
+
+    @staticmethod
+    def _check_fields(fields: Dict):
+        unknown = [field for field in fields if field not in TOKEN_STATE_FIELDS]
+        if unknown:
+            raise ValueError(f"unknown token state fields {', '.join(unknown)}")
+
+
+class WOOFiSwapSimulation(WOOFiStateStore):
+    """
+    A scratch copy of a WOOFiStateStore on which swaps are executed in sequence, e.g. the legs of a route that crosses
+    the pool more than once, or the user swaps of one block.
+
+    The copy shares every token record with the store it is made from. A swap replaces only the records of the tokens
+    it touches, and the replaced records are kept in an undo log, so rolling back to any earlier version restores
+    a handful of records. Nothing is ever written back to the original store.
+    """
+
+    def __init__(self, store: WOOFiStateStore, pool_math: Optional[WOOFiPoolMath] = None):
+        """
+        :param store: The state to start from.
+        :param pool_math: The WOOFiPoolMath to quote with, e.g. the pool_math of a WOOFiLiquidityModule.
+        """
+        super().__init__(store.fixed_parameters)
+        self._tokens = dict(store._tokens)
+        self._records = dict(store._records)
+        self.version = self.base_version = store.version
+        self.pool_math = WOOFiPoolMath() if pool_math is None else pool_math
+        # (version before the change, address, replaced record or None if the simulation added the token)
+        self._undo = []
+
+    def swap(self, input_token: Token, output_token: Token, input_amount: int) -> tuple[int | None, int | None]:
+        """
+        Swaps input_amount exactly as get_amount_out quotes it against the current state, then books the reserve
+        changes and the posted prices (see WOOFiPoolMath.swap_effect).
+
+        :return: The fee and the amount of output_token, or (None, None) if the swap is not possible; a rejected swap
+            leaves the state unchanged.
+        """
+        effect = self.pool_math.swap_effect(self.pair_state(input_token, output_token), self.fixed_parameters, input_token, output_token, input_amount)
+        if effect is None:
+            return None, None
+
+        records = self._records
+        for address, reserve_change, price in (
+            (token_address(input_token), effect.input_reserve_change, effect.input_token_price),
+            (token_address(output_token), effect.output_reserve_change, effect.output_token_price),
+            (self._quote_address, effect.quote_token_reserve_change, None),
+        ):
+            if reserve_change == 0 and price is None:
+                continue
+            record = records[address]
+            fields = {"reserve": record["reserve"] + reserve_change}
+            if price is not None:
+                fields["price"] = price
+            self._replace(address, MappingProxyType({**record, **fields}))
+        return effect.fee, effect.amount_out
+
+    def rollback(self, version: int):
+        """
+        Restores the state the simulation had at version, i.e. the value of self.version at that point. Versions
+        after it are discarded and their numbers are reused by later changes.
+
+        :raises ValueError: If version is older than the simulation or newer than its current version.
+        """
+        if not self.base_version <= version <= self.version:
+            raise ValueError(f"version {version} is not between {self.base_version} and {self.version}")
+        undo, records = self._undo, self._records
+        while undo and undo[-1][0] >= version:
+            _, address, record = undo.pop()
+            if record is None:
+                del records[address]
+                del self._tokens[address]
+            else:
+                records[address] = record
+            self._invalidate(address)
+        self.version = version
+
+    def _replace(self, address: str, record: Mapping):
+        self._undo.append((self.version, address, self._records.get(address)))
+        super()._replace(address, record)
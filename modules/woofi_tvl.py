@@ -0,0 +1,129 @@
+from decimal import Decimal
+from typing import Hashable, Iterable, Optional
+
+from modules.woofi_liquidity_module import VALUE_DECIMALS, fee_apy, token_value
+from modules.woofi_state_store import WOOFiFeeWindow, WOOFiStateStore
+from templates.liquidity_module import Token, normalize_address, token_address
+
+# the token state fields the value of a token depends on
+VALUED_FIELDS = ("reserve", "price")
+
+
+class WOOFiTVLAggregator:
+    """
+    Running TVL totals of many WOOFi pools: per token of every pool, per pool, per token over all pools and overall.
+
+    Values are exact integers (see token_value), so a change to the reserve or price of one token moves every total by
+    the change in its value, and the totals always equal a full rescan. TVL queries read a total. Fee APYs come from
+    the fees windows of the pool stores, and from one more window over all pools in native token value.
+    """
+
+    def __init__(self, fees: Optional[WOOFiFeeWindow] = None):
+        """
+        :param fees: The window of the fees of all pools, a day in hourly buckets by default.
+        """
+        self.stores = {}
+        self.fees = WOOFiFeeWindow() if fees is None else fees
+        # pool -> normalized token address -> value
+        self._values = {}
+        self._pool_totals = {}
+        # token address -> value over all pools
+        self._token_totals = {}
+        self._total = 0
+
+    def add_pool(self, pool: Hashable, store: WOOFiStateStore):
+        """ Adds a pool, or replaces its store and revalues all of its tokens. """
+        if pool in self.stores:
+            self.remove_pool(pool)
+        self.stores[pool] = store
+        self._values[pool] = {}
+        self._pool_totals[pool] = 0
+        self.revalue(pool, [token.address for token in store.tokens()])
+
+    def remove_pool(self, pool: Hashable):
+        for address, value in self._values.pop(pool).items():
+            self._token_totals[address] -= value
+        self._total -= self._pool_totals.pop(pool)
+        del self.stores[pool]
+
+    def set_store(self, pool: Hashable, store: WOOFiStateStore, addresses: Iterable[str]):
+        """
+        Switches a pool to a new version of its store, e.g. one made by WOOFiStateStore.with_updates, revaluing only
+        the tokens that changed.
+
+        :param addresses: The tokens whose record differs from the previous store.
+        """
+        self.stores[pool] = store
+        self.revalue(pool, addresses)
+
+    def update_token(self, pool: Hashable, address: str, **fields):
+        """
+        Applies a partial update to a token of a pool's store, as WOOFiStateStore.update_token does, and revalues the
+        token if its reserve or price changed. The quote token only takes a reserve.
+        """
+        store = self.stores[pool]
+        if normalize_address(address) is token_address(store.quote_token):
+            if fields.keys() != {"reserve"}:
+                raise ValueError("the quote token only has a reserve")
+            store.set_quote_token_reserve(fields["reserve"])
+        else:
+            store.update_token(address, **fields)
+        if any(field in fields for field in VALUED_FIELDS):
+            self.revalue(pool, [address])
+
+    def revalue(self, pool: Hashable, addresses: Iterable[str]):
+        """ Values tokens of a pool again after their records were replaced in its store, e.g. by set_token. """
+        store, values = self.stores[pool], self._values[pool]
+        token_totals, fixed_parameters = self._token_totals, store.fixed_parameters
+        change = 0
+        for address in map(normalize_address, addresses):
+            value = token_value(fixed_parameters, store.token(address), store.record(address))
+            delta = value - values.get(address, 0)
+            values[address] = value
+            token_totals[address] = token_totals.get(address, 0) + delta
+            change += delta
+        self._pool_totals[pool] += change
+        self._total += change
+
+    def record_fee(self, pool: Hashable, timestamp: float, fee: int):
+        """
+        Records the fee of a swap in the pool's fees window and, valued at the current quote token price, in the window
+        of all pools.
+
+        :param fee: The fee in quote token units, as get_amount_out returns it.
+        """
+        store = self.stores[pool]
+        if store.fees.add(timestamp, fee):
+            quote_token = store.quote_token
+            self.fees.add(timestamp, token_value(store.fixed_parameters, quote_token, store.record(quote_token.address), fee))
+
+    def tvl(self, pool: Optional[Hashable] = None, token: Optional[Token] = None) -> Decimal:
+        """
+        TVL in the native token, valued as WOOFiLiquidityModule.get_tvl values it.
+
+        :param pool: If provided, the TVL of this pool only.
+        :param token: If provided, the TVL of this token only.
+        """
+        if pool is None:
+            value = self._total if token is None else self._token_totals.get(token_address(token), 0)
+        else:
+            value = self._pool_totals[pool] if token is None else self._values[pool].get(token_address(token), 0)
+        return Decimal(value).scaleb(-VALUE_DECIMALS)
+
+    def apy(self, pool: Optional[Hashable] = None, timestamp: Optional[float] = None) -> Decimal:
+        """
+        The fee APY of a pool, as WOOFiLiquidityModule.get_apy computes it, or of all pools together.
+
+        :param timestamp: The current time; fees that left the window by then no longer count. By default the window
+            ends at the last recorded fee.
+        """
+        if pool is None:
+            if timestamp is not None:
+                self.fees.advance(timestamp)
+            return fee_apy(self.fees.total, self._total, self.fees.seconds())
+        store = self.stores[pool]
+        if timestamp is not None:
+            store.fees.advance(timestamp)
+        quote_token = store.quote_token
+        fee_value = token_value(store.fixed_parameters, quote_token, store.record(quote_token.address), store.fees.total)
+        return fee_apy(fee_value, self._pool_totals[pool], store.fees.seconds())
@@ -1,10 +1,23 @@
+import sys
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import Callable, Dict, Generic, Iterable, Optional, TypeVar
 from decimal import Decimal
 
+T = TypeVar("T")
+
+_MISSING = object()
+
+# the optional batch methods, whose defaults loop over the scalar methods; see LiquidityModule.native_batch_methods
+BATCH_METHODS = (
+    "get_amounts_out", "get_amounts_in", "get_pair_amounts_out", "get_pair_amounts_in",
+    "get_state_amounts_out", "get_state_amounts_in", "get_marginal_rates", "get_price_impacts",
+)
+
 
 class Token:
     """ A representation of a token within the liquidity module. """
+    __slots__ = ("address", "symbol", "decimals", "reference_price")
+
     def __init__(self, address: str, symbol: str, decimals: int, reference_price: Decimal):
         """
         :param address: The blockchain address of the token.
@@ -18,6 +31,142 @@ class Token:
         self.reference_price = reference_price
 
 
+def normalize_address(address: str) -> str:
+    """ The canonical form of an address: lower case and interned, so equal addresses are the same string object. """
+    return sys.intern(address.strip().lower())
+
+
+def token_address(token: Token) -> str:
+    """ The normalized address of a token, to key stores by; registered tokens carry it already. """
+    if isinstance(token, RegisteredToken):
+        return token.address
+    return normalize_address(token.address)
+
+
+def same_address(address: str, other: str) -> bool:
+    """ Whether two addresses are the same regardless of checksum casing; exact matches never pay for the lower(). """
+    return address == other or address.lower() == other.lower()
+
+
+def same_token(token: Token, other: Token) -> bool:
+    """ same_address for tokens; registered tokens are already normalized, so they are compared without case folding. """
+    address, other_address = token.address, other.address
+    if address == other_address:
+        return True
+    if isinstance(token, RegisteredToken) and isinstance(other, RegisteredToken):
+        return False
+    return address.lower() == other_address.lower()
+
+
+class RegisteredToken(Token):
+    """
+    A Token interned by an engine.token_registry.TokenRegistry. Its address is normalized, it has a dense integer id and it is immutable,
+    so it can be hashed and compared by address. It is a Token, so it can be passed to any liquidity module.
+    """
+    __slots__ = ("id",)
+
+    def __init__(self, id: int, address: str, symbol: str, decimals: int, reference_price: Decimal):
+        setattr_ = object.__setattr__
+        setattr_(self, "id", id)
+        setattr_(self, "address", normalize_address(address))
+        setattr_(self, "symbol", symbol)
+        setattr_(self, "decimals", decimals)
+        setattr_(self, "reference_price", reference_price)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RegisteredToken):
+            return self.address is other.address
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.address)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.id}, {self.symbol}, {self.address})"
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+def pair_key(input_token: RegisteredToken, output_token: RegisteredToken) -> int:
+    """ One int for an ordered pair of tokens of the same registry. """
+    return input_token.id << 32 | output_token.id
+
+
+class PairTable(Generic[T]):
+    """
+    A value per ordered pair of registered tokens (e.g. a swap direction or a handler), computed once by resolve and
+    then found with a single dict lookup on their packed ids. The tokens must come from one TokenRegistry, whose ids
+    are unique.
+    """
+    __slots__ = ("_resolve", "_values")
+
+    def __init__(self, resolve: Callable[[RegisteredToken, RegisteredToken], T]):
+        self._resolve = resolve
+        self._values: Dict[int, T] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, input_token: RegisteredToken, output_token: RegisteredToken) -> T:
+        key = input_token.id << 32 | output_token.id
+        value = self._values.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._values[key] = self._resolve(input_token, output_token)
+        return value
+
+    def clear(self):
+        self._values.clear()
+
+
+# the JSON form of tokens and fixed parameters, whose tokens are written as {"token": address}
+def encode_token(token: Token) -> Dict:
+    return {"address": token.address, "symbol": token.symbol, "decimals": token.decimals, "reference_price": str(token.reference_price)}
+
+
+def decode_token(fields: Dict) -> Token:
+    return Token(address=fields["address"], symbol=fields["symbol"], decimals=fields["decimals"], reference_price=Decimal(fields["reference_price"]))
+
+
+def encode_fixed_parameters(fixed_parameters: Dict) -> Dict:
+    return {key: {"token": value.address} if isinstance(value, Token) else value for key, value in fixed_parameters.items()}
+
+
+def decode_fixed_parameters(fixed_parameters: Dict, tokens: Dict[str, Token]) -> Dict:
+    """ Replaces {"token": address} values by the registered tokens (keyed by lower-case address). """
+    return {
+        key: tokens[value["token"].lower()] if isinstance(value, dict) and value.keys() == {"token"} else value
+        for key, value in fixed_parameters.items()
+    }
+
+
+class MetricsSink(ABC):
+    """ Receives quote metrics from an instrumented liquidity module. """
+
+    @abstractmethod
+    def observe_latency(self, operation: str, seconds: float):
+        """
+        Records one call.
+
+        :param operation: What was called, e.g. "sell_base_token_out".
+        :param seconds: The wall time of the call.
+        """
+        pass
+
+    @abstractmethod
+    def count_rejection(self, operation: str, reason: str):
+        """
+        Records one quote that came back as (None, None).
+
+        :param operation: What was called.
+        :param reason: Why the quote was rejected.
+        """
+        pass
+
+
 class LiquidityModule(ABC):
     """
     Abstract base class that all GlueX liquidity modules must inherit from.
@@ -85,4 +234,202 @@ class LiquidityModule(ABC):
         :param token: If provided, returns TVL for the specific token. Otherwise, returns total TVL.
         :return: The total value locked in the pool, denominated in the blockchain's native token.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def get_marginal_rate(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> float | None:
+        """
+        Optional. Computes the marginal rate dOut/dIn after `input_amount` of `input_token` has been swapped in.
+
+        :param pool_state: A dictionary representing the state of the liquidity pool.
+        :param fixed_parameters: A dictionary of fixed parameters for the liquidity module.
+        :param input_token: The token being swapped in.
+        :param output_token: The token being swapped out.
+        :param input_amount: The amount of input_token already provided.
+        :return: The rate in output_token units per input_token unit (both in their smallest denomination), or None if the swap is not possible.
+        :raises NotImplementedError: If the module does not provide marginal rates.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not provide marginal rates")
+
+    def get_price_impact(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amount: int,
+    ) -> float | None:
+        """
+        Optional. Computes the price impact of swapping `input_amount` of `input_token`, i.e. how much worse the
+        average rate is than the rate of an infinitesimal swap.
+
+        :param pool_state: A dictionary representing the state of the liquidity pool.
+        :param fixed_parameters: A dictionary of fixed parameters for the liquidity module.
+        :param input_token: The token being swapped in.
+        :param output_token: The token being swapped out.
+        :param input_amount: The amount of input_token being provided.
+        :return: The price impact as a fraction (e.g., 0.01 for 1%), or None if the swap is not possible.
+        :raises NotImplementedError: If the module does not provide price impacts.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not provide price impacts")
+
+    def get_marginal_rates(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amounts: Iterable[int],
+    ) -> list[float | None]:
+        """
+        Optional. get_marginal_rate for several input amounts of one pair; modules may override it with a faster version.
+        """
+        return [self.get_marginal_rate(pool_state, fixed_parameters, input_token, output_token, input_amount) for input_amount in input_amounts]
+
+    def get_price_impacts(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amounts: Iterable[int],
+    ) -> list[float | None]:
+        """
+        Optional. get_price_impact for several input amounts of one pair; modules may override it with a faster version.
+        """
+        return [self.get_price_impact(pool_state, fixed_parameters, input_token, output_token, input_amount) for input_amount in input_amounts]
+
+    def get_amounts_out(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        input_amounts: Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        """
+        Optional. get_amount_out for several input amounts of one pair (e.g. a ladder of order sizes); modules may
+        override it with a faster version.
+
+        :return: The fees and the output amounts; element i matches get_amount_out(..., input_amounts[i]).
+        """
+        return _unzip(self.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount) for input_amount in input_amounts)
+
+    def get_amounts_in(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        input_token: Token,
+        output_token: Token,
+        output_amounts: Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        """
+        Optional. get_amount_in for several output amounts of one pair; modules may override it with a faster version.
+
+        :return: The fees and the input amounts; element i matches get_amount_in(..., output_amounts[i]).
+        """
+        return _unzip(self.get_amount_in(pool_state, fixed_parameters, input_token, output_token, output_amount) for output_amount in output_amounts)
+
+    def get_pair_amounts_out(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        quotes: Iterable[tuple[Token, Token, int]],
+    ) -> tuple[list[int | None], list[int | None]]:
+        """
+        Optional. get_amount_out for several pairs of one pool state (e.g. every pair a pool can swap); modules may
+        override it with a faster version.
+
+        :param pool_state: A state the module can quote every pair of quotes from.
+        :param quotes: (input_token, output_token, input_amount) per quote.
+        :return: The fees and the output amounts, one per quote.
+        """
+        return _unzip(self.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount) for input_token, output_token, input_amount in quotes)
+
+    def get_pair_amounts_in(
+        self,
+        pool_state: Dict,
+        fixed_parameters: Dict,
+        quotes: Iterable[tuple[Token, Token, int]],
+    ) -> tuple[list[int | None], list[int | None]]:
+        """
+        Optional. get_amount_in for several pairs of one pool state; modules may override it with a faster version.
+
+        :param quotes: (input_token, output_token, output_amount) per quote.
+        :return: The fees and the input amounts, one per quote.
+        """
+        return _unzip(self.get_amount_in(pool_state, fixed_parameters, input_token, output_token, output_amount) for input_token, output_token, output_amount in quotes)
+
+    def get_state_amounts_out(
+        self,
+        states: Iterable[tuple[Dict, Dict]],
+        input_token: Token,
+        output_token: Token,
+        input_amounts: int | Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        """
+        Optional. get_amount_out of one pair for several pool states (e.g. the pools of many deployments, or one pool
+        over many blocks); modules may override it with a faster version.
+
+        :param states: (pool_state, fixed_parameters) per state.
+        :param input_amounts: One amount for all states, or one amount per state.
+        :return: The fees and the output amounts, one per state.
+        """
+        states = list(states)
+        return _unzip(
+            self.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
+            for (pool_state, fixed_parameters), input_amount in zip(states, _per_state(input_amounts, len(states)))
+        )
+
+    def get_state_amounts_in(
+        self,
+        states: Iterable[tuple[Dict, Dict]],
+        input_token: Token,
+        output_token: Token,
+        output_amounts: int | Iterable[int],
+    ) -> tuple[list[int | None], list[int | None]]:
+        """
+        Optional. get_amount_in of one pair for several pool states; modules may override it with a faster version.
+
+        :param states: (pool_state, fixed_parameters) per state.
+        :param output_amounts: One amount for all states, or one amount per state.
+        :return: The fees and the input amounts, one per state.
+        """
+        states = list(states)
+        return _unzip(
+            self.get_amount_in(pool_state, fixed_parameters, input_token, output_token, output_amount)
+            for (pool_state, fixed_parameters), output_amount in zip(states, _per_state(output_amounts, len(states)))
+        )
+
+    def native_batch_methods(self) -> frozenset[str]:
+        """
+        The methods of BATCH_METHODS this module implements with a faster path than looping over its scalar methods.
+        Routers can use it to decide whether collecting quotes into batches pays off; every batch method works either way.
+
+        By default, the batch methods the module's class overrides.
+        """
+        cls = type(self)
+        return frozenset(name for name in BATCH_METHODS if getattr(cls, name) is not getattr(LiquidityModule, name))
+
+
+def _unzip(quotes: Iterable[tuple[int | None, int | None]]) -> tuple[list[int | None], list[int | None]]:
+    fees, amounts = [], []
+    for fee, amount in quotes:
+        fees.append(fee)
+        amounts.append(amount)
+    return fees, amounts
+
+
+def _per_state(amounts: int | Iterable[int], count: int) -> list[int]:
+    if isinstance(amounts, int):
+        return [amounts] * count
+    amounts = list(amounts)
+    if len(amounts) != count:
+        raise ValueError(f"expected {count} amounts, got {len(amounts)}")
+    return amounts
@@ -0,0 +1,34 @@
+import unittest
+
+from engine.instrumentation import InMemoryMetrics, LatencyHistogram
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_histogram_buckets(self):
+        histogram = LatencyHistogram((1e-6, 1e-5, 1e-4))
+        for seconds in [5e-7, 2e-6, 3e-6, 1e-5, 5e-3]:
+            histogram.observe(seconds)
+        self.assertEqual(histogram.counts, [1, 3, 0, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.quantile(0.5), 1e-5)
+        self.assertEqual(histogram.quantile(0.99), float("inf"))
+
+    def test_render_prometheus(self):
+        metrics = InMemoryMetrics(buckets=(1e-6, 1e-5))
+        metrics.observe_latency("sell_base_token_out", 2e-6)
+        metrics.observe_latency("sell_base_token_out", 2e-5)
+        metrics.count_rejection("sell_base_token_out", "max_gamma")
+
+        text = metrics.render_prometheus("woofi")
+        self.assertIn('woofi_quote_latency_seconds_bucket{operation="sell_base_token_out",le="1e-06"} 0\n', text)
+        self.assertIn('woofi_quote_latency_seconds_bucket{operation="sell_base_token_out",le="1e-05"} 1\n', text)
+        self.assertIn('woofi_quote_latency_seconds_bucket{operation="sell_base_token_out",le="+Inf"} 2\n', text)
+        self.assertIn('woofi_quote_latency_seconds_count{operation="sell_base_token_out"} 2\n', text)
+        self.assertIn('woofi_quote_rejections_total{operation="sell_base_token_out",reason="max_gamma"} 1\n', text)
+
+        metrics.reset()
+        self.assertEqual(metrics.calls("sell_base_token_out"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
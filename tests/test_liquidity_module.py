@@ -0,0 +1,61 @@
+from decimal import Decimal
+import unittest
+
+from templates.liquidity_module import LiquidityModule, Token
+
+
+class ConstantRateLiquidityModule(LiquidityModule):
+    # A minimal module that only implements the required methods and marginal rates
+    def get_amount_out(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        return 0, input_amount * pool_state["rate"]
+
+    def get_amount_in(self, pool_state, fixed_parameters, input_token, output_token, output_amount):
+        return 0, output_amount // pool_state["rate"]
+
+    def get_apy(self, pool_state):
+        return Decimal(0)
+
+    def get_tvl(self, pool_state, token=None):
+        return Decimal(0)
+
+    def get_marginal_rate(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        return float(pool_state["rate"])
+
+
+class TestLiquidityModule(unittest.TestCase):
+    def setUp(self):
+        self.module = ConstantRateLiquidityModule()
+        self.token = Token(address="0x0", symbol="T", decimals=18, reference_price=Decimal(1))
+
+    def test_optional_methods_raise_not_implemented(self):
+        with self.assertRaises(NotImplementedError):
+            self.module.get_price_impact({"rate": 2}, {}, self.token, self.token, 1)
+        with self.assertRaises(NotImplementedError):
+            self.module.get_price_impacts({"rate": 2}, {}, self.token, self.token, [1])
+
+    def test_batch_defaults_loop_over_scalar_methods(self):
+        self.assertEqual(self.module.get_marginal_rates({"rate": 2}, {}, self.token, self.token, [1, 10, 100]), [2.0, 2.0, 2.0])
+        self.assertEqual(self.module.get_amounts_out({"rate": 2}, {}, self.token, self.token, [1, 10]), ([0, 0], [2, 20]))
+        self.assertEqual(self.module.get_amounts_in({"rate": 2}, {}, self.token, self.token, [10, 20]), ([0, 0], [5, 10]))
+        self.assertEqual(self.module.get_pair_amounts_out({"rate": 3}, {}, [(self.token, self.token, 1), (self.token, self.token, 2)]), ([0, 0], [3, 6]))
+        self.assertEqual(self.module.get_pair_amounts_in({"rate": 3}, {}, [(self.token, self.token, 9)]), ([0], [3]))
+
+        states = [({"rate": 2}, {}), ({"rate": 5}, {})]
+        self.assertEqual(self.module.get_state_amounts_out(states, self.token, self.token, 10), ([0, 0], [20, 50]))
+        self.assertEqual(self.module.get_state_amounts_in(states, self.token, self.token, [10, 100]), ([0, 0], [5, 20]))
+        with self.assertRaises(ValueError):
+            self.module.get_state_amounts_out(states, self.token, self.token, [10])
+
+    def test_native_batch_methods(self):
+        self.assertEqual(self.module.native_batch_methods(), frozenset())
+
+        class BatchingModule(ConstantRateLiquidityModule):
+            def get_amounts_out(self, pool_state, fixed_parameters, input_token, output_token, input_amounts):
+                input_amounts = list(input_amounts)
+                return [0] * len(input_amounts), [input_amount * pool_state["rate"] for input_amount in input_amounts]
+
+        self.assertEqual(BatchingModule().native_batch_methods(), {"get_amounts_out"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import ast
+import os
+import sys
+import tempfile
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.module_registry import MANIFEST_NAME, ModuleRegistry, module_classes, read_manifest, scan_modules, stale_entries, write_manifest
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+
+MODULES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modules")
+
+COUNTING_MODULE = '''from templates import liquidity_module
+
+
+class Base(liquidity_module.LiquidityModule):
+    def get_amount_in(self, pool_state, fixed_parameters, input_token, output_token, output_amount):
+        return None, None
+
+    def get_apy(self, pool_state):
+        return 0
+
+    def get_tvl(self, pool_state, token=None):
+        return 0
+
+
+class CountingLiquidityModule(Base):
+    instances = 0
+
+    def __init__(self):
+        CountingLiquidityModule.instances += 1
+
+    def get_amount_out(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        return 0, input_amount * pool_state["rate"]
+'''
+
+
+class TestModuleRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.package = f"registry_test_modules_{id(self)}"
+        self.modules = os.path.join(self.directory.name, self.package)
+        os.makedirs(self.modules)
+        self.write("counting_liquidity_module.py", COUNTING_MODULE)
+        self.write("broken_liquidity_module.py", "from templates.liquidity_module import LiquidityModule as Base\n\nraise ImportError('not for this process')\n\nclass BrokenLiquidityModule(Base):\n    pass\n")
+        self.write("helpers.py", "raise ImportError('never imported')\n")
+        sys.path.insert(0, self.directory.name)
+        self.addCleanup(sys.path.remove, self.directory.name)
+
+    def write(self, name: str, source: str):
+        with open(os.path.join(self.modules, name), "w") as file:
+            file.write(source)
+
+    def test_module_classes(self):
+        self.assertEqual(module_classes(COUNTING_MODULE), ["CountingLiquidityModule"])
+        self.assertEqual(module_classes("from templates.liquidity_module import LiquidityModule as LM\nclass A(LM): pass\nclass B: pass\n"), ["A"])
+        self.assertEqual(module_classes("class A(Base): pass\n"), [])
+
+    def test_manifest_is_current(self):
+        entries = read_manifest(os.path.join(MODULES_DIRECTORY, MANIFEST_NAME))
+        self.assertEqual(stale_entries(MODULES_DIRECTORY, entries), [], "run python -m engine.module_registry")
+        self.assertEqual({entry.protocol: entry.name for entry in entries}, {"myprotocol": "MyProtocolLiquidityModule", "woofi": "WOOFiLiquidityModule"})
+
+    def test_imports_lazily_and_reuses_the_instance(self):
+        write_manifest(os.path.join(self.modules, MANIFEST_NAME), scan_modules(self.modules))
+        registry = ModuleRegistry.load(self.modules)
+        self.assertEqual(registry.protocols(), ["broken", "counting"])
+        self.assertFalse(any(name.startswith(self.package) for name in sys.modules))
+
+        self.assertEqual(registry.get_amount_out("counting", {"rate": 3}, {}, None, None, 5), (0, 15))
+        module = registry.module("counting")
+        self.assertEqual(registry.get_amount_in("counting", {"rate": 3}, {}, None, None, 5), (None, None))
+        self.assertIs(registry.module("counting"), module)
+        self.assertEqual(type(module).instances, 1)
+        self.assertEqual(registry.loaded(), ["counting"])
+        with self.assertRaises(ImportError):
+            registry.module("broken")
+        with self.assertRaises(KeyError):
+            registry.module("unknown")
+
+    def test_stale_manifest(self):
+        path = os.path.join(self.modules, MANIFEST_NAME)
+        write_manifest(path, scan_modules(self.modules))
+        self.write("counting_liquidity_module.py", COUNTING_MODULE.replace("* pool_state", "// pool_state"))
+        self.assertEqual(stale_entries(self.modules, read_manifest(path)), [])
+        self.write("counting_liquidity_module.py", COUNTING_MODULE.replace("CountingLiquidityModule", "RenamedLiquidityModule"))
+        self.write("other_liquidity_module.py", COUNTING_MODULE)
+        self.assertEqual(stale_entries(self.modules, read_manifest(path)), ["counting", "other"])
+        self.write("empty_liquidity_module.py", "")
+        with self.assertRaisesRegex(ValueError, "empty_liquidity_module.py"):
+            scan_modules(self.modules)
+
+    def test_repository_modules(self):
+        registry = ModuleRegistry.load(MODULES_DIRECTORY, factory=lambda module_class: module_class(instrumentation=None) if module_class is WOOFiLiquidityModule else module_class())
+        module = registry.module("woofi")
+        self.assertIsInstance(module, WOOFiLiquidityModule)
+        self.assertEqual(
+            registry.get_amount_out("woofi", woofi_pool_state(), woofi_fixed_parameters(), WETH, CBBTC, 10**18),
+            module.get_amount_out(woofi_pool_state(), woofi_fixed_parameters(), WETH, CBBTC, 10**18),
+        )
+
+    def test_repository_modules_do_not_import_the_engine(self):
+        # the engine imports the modules, so modules only build on templates/
+        for name in sorted(os.listdir(MODULES_DIRECTORY)):
+            if name.endswith(".py"):
+                with open(os.path.join(MODULES_DIRECTORY, name)) as file:
+                    tree = ast.parse(file.read())
+                imported = [alias.name for node in ast.walk(tree) if isinstance(node, ast.Import) for alias in node.names]
+                imported += [node.module for node in ast.walk(tree) if isinstance(node, ast.ImportFrom) and node.module]
+                self.assertEqual([module for module in imported if module.split(".")[0] == "engine"], [], name)
+
+
+if __name__ == "__main__":
+    unittest.main()
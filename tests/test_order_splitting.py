@@ -0,0 +1,126 @@
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, woofi_fixed_parameters, woofi_pool_state
+from engine.order_splitting import GREEDY, MARGINAL_RATE, MIXED, Venue, split_order
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from templates.liquidity_module import LiquidityModule
+
+
+class QuoteOnlyModule(LiquidityModule):
+    # Implements only the required interface, so splitting has to fall back to greedy chunks
+    def __init__(self):
+        self.module = WOOFiLiquidityModule()
+
+    def get_amount_out(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        return self.module.get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
+
+    def get_amount_in(self, pool_state, fixed_parameters, input_token, output_token, output_amount):
+        return self.module.get_amount_in(pool_state, fixed_parameters, input_token, output_token, output_amount)
+
+    def get_apy(self, pool_state):
+        pass
+
+    def get_tvl(self, pool_state, token=None):
+        pass
+
+
+class NoZeroSizeRateModule(WOOFiLiquidityModule):
+    # Quotes marginal rates, but none at zero size
+    def get_marginal_rate(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        if input_amount == 0:
+            return None
+        return super().get_marginal_rate(pool_state, fixed_parameters, input_token, output_token, input_amount)
+
+
+class TestOrderSplitting(unittest.TestCase):
+    def setUp(self):
+        self.fixed_parameters = woofi_fixed_parameters()
+        self.pool_states = []
+        for price_change, coeff, reserve in [(1.0, 1660000000, 10**10), (1.002, 5000000000, 4 * 10**9), (0.999, 800000000, 10**9)]:
+            pool_state = woofi_pool_state()
+            pool_state.update(output_token_price=int(pool_state["output_token_price"] * price_change), output_token_coeff=coeff, output_token_reserve=reserve)
+            self.pool_states.append(pool_state)
+
+    def venues(self, module):
+        return [Venue(module, pool_state, self.fixed_parameters) for pool_state in self.pool_states]
+
+    def test_marginal_rate_split_beats_greedy(self):
+        for input_amount in [10**9, 10**11, 10**12, 2 * 10**12]:
+            split = split_order(self.venues(WOOFiLiquidityModule()), USDC, CBBTC, input_amount)
+            greedy = split_order(self.venues(QuoteOnlyModule()), USDC, CBBTC, input_amount)
+            self.assertEqual((split.method, greedy.method), (MARGINAL_RATE, GREEDY))
+            self.assertEqual(sum(split.allocations), input_amount)
+            self.assertEqual(split.unfilled_amount, 0)
+            self.assertGreaterEqual(split.total_amount_out, greedy.total_amount_out)
+            for venue, allocation, amount_out in zip(self.venues(WOOFiLiquidityModule()), split.allocations, split.amounts_out):
+                if allocation > 0:
+                    self.assertEqual(WOOFiLiquidityModule().get_amount_out(venue.pool_state, self.fixed_parameters, USDC, CBBTC, allocation)[1], amount_out)
+
+    def test_marginal_rates_are_equalized(self):
+        module = WOOFiLiquidityModule()
+        split = split_order(self.venues(module), USDC, CBBTC, 2 * 10**12)
+        rates, capped_rates = [], []
+        for pool_state, allocation in zip(self.pool_states, split.allocations):
+            rate = module.get_marginal_rate(pool_state, self.fixed_parameters, USDC, CBBTC, allocation)
+            if allocation == module.get_liquidity_bound(pool_state, self.fixed_parameters, USDC, CBBTC).max_input_amount:
+                capped_rates.append(rate)
+            elif allocation > 0:
+                rates.append(rate)
+        self.assertEqual((len(rates), len(capped_rates)), (2, 1))
+        self.assertAlmostEqual(min(rates) / max(rates), 1, delta=1e-9)
+        # a venue filled to its limit would still have taken more at the common rate
+        self.assertGreater(capped_rates[0], max(rates))
+
+    def test_respects_venue_limits(self):
+        module = WOOFiLiquidityModule()
+        split = split_order(self.venues(module), USDC, CBBTC, 10**14)
+        self.assertGreater(split.unfilled_amount, 0)
+        for pool_state, allocation in zip(self.pool_states, split.allocations):
+            bound = module.get_liquidity_bound(pool_state, self.fixed_parameters, USDC, CBBTC)
+            self.assertEqual(allocation, bound.max_input_amount)
+
+        greedy = split_order(self.venues(QuoteOnlyModule()), USDC, CBBTC, 10**14)
+        self.assertEqual(greedy.allocations, split.allocations)
+
+    def test_infeasible_venue_gets_nothing(self):
+        module = WOOFiLiquidityModule()
+        infeasible = dict(woofi_pool_state(), output_token_wo_feasible=False)
+        venues = self.venues(module)[:2] + [Venue(module, infeasible, self.fixed_parameters)]
+        for input_amount in [10**9, 10**11]:
+            split = split_order(venues, USDC, CBBTC, input_amount)
+            self.assertEqual(split.method, MARGINAL_RATE)
+            self.assertEqual(split.allocations[2], 0)
+            self.assertEqual(sum(split.allocations), input_amount)
+
+    def test_mixed_venues_split_the_rated_ones_by_marginal_rate(self):
+        module = WOOFiLiquidityModule()
+        venues = self.venues(module)[:2] + [Venue(QuoteOnlyModule(), self.pool_states[2], self.fixed_parameters)]
+        for input_amount in [10**9, 10**12, 10**14]:
+            split = split_order(venues, USDC, CBBTC, input_amount)
+            greedy = split_order([Venue(QuoteOnlyModule(), *venue[1:]) for venue in venues], USDC, CBBTC, input_amount)
+            self.assertEqual(split.method, MIXED)
+            self.assertEqual(sum(split.allocations) + split.unfilled_amount, input_amount)
+            self.assertEqual(split.unfilled_amount, greedy.unfilled_amount)
+            self.assertGreaterEqual(split.total_amount_out, greedy.total_amount_out)
+            for venue, allocation, amount_out in zip(venues, split.allocations, split.amounts_out):
+                if allocation > 0:
+                    self.assertEqual(module.get_amount_out(venue.pool_state, self.fixed_parameters, USDC, CBBTC, allocation)[1], amount_out)
+
+    def test_venue_without_a_rate_at_zero_size(self):
+        module = WOOFiLiquidityModule()
+        venues = self.venues(module)[2:] + [Venue(NoZeroSizeRateModule(), self.pool_states[0], self.fixed_parameters)]
+        capacity = module.get_liquidity_bound(self.pool_states[2], self.fixed_parameters, USDC, CBBTC).max_input_amount
+        for input_amount in [10**9, capacity + 10**9]:
+            split = split_order(venues, USDC, CBBTC, input_amount)
+            self.assertEqual(split.method, MIXED)
+            self.assertEqual(split.unfilled_amount, 0)
+            self.assertEqual(sum(split.allocations), input_amount)
+        self.assertGreater(split.allocations[1], 0)
+
+        split = split_order(venues[1:], USDC, CBBTC, 10**9)
+        self.assertEqual(split.method, GREEDY)
+        self.assertEqual(split.allocations, [10**9])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+from decimal import Decimal
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.path_quoting import Hop, check_route, quote_path_in, quote_path_out, quote_routes_in, quote_routes_out
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from templates.liquidity_module import LiquidityModule, Token
+
+
+DAI = Token(address="0x50c5725949A6F0c72E6C4a641F24049A917DB0Cb", decimals=18, symbol="DAI", reference_price=Decimal(1))
+
+
+class CountingRateModule(LiquidityModule):
+    # Swaps at a fixed rate and counts its quotes
+    def __init__(self):
+        self.calls = 0
+
+    def get_amount_out(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        self.calls += 1
+        if input_amount > pool_state["max_input"]:
+            return None, None
+        return 0, input_amount * pool_state["rate"]
+
+    def get_amount_in(self, pool_state, fixed_parameters, input_token, output_token, output_amount):
+        self.calls += 1
+        return 0, -(-output_amount // pool_state["rate"])
+
+    def get_apy(self, pool_state):
+        return Decimal(0)
+
+    def get_tvl(self, pool_state, token=None):
+        return Decimal(0)
+
+
+class TestPathQuoting(unittest.TestCase):
+    def setUp(self):
+        self.module = WOOFiLiquidityModule()
+        self.fixed_parameters = woofi_fixed_parameters()
+        pool_state = woofi_pool_state()
+        self.store = WOOFiStateStore(self.fixed_parameters, pool_state["quote_token_reserve"])
+        for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+            self.store.set_token(token, **{field: pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+
+    def woofi_hop(self, input_token: Token, output_token: Token) -> Hop:
+        return Hop(self.module, self.store.pair_state(input_token, output_token), self.fixed_parameters, input_token, output_token)
+
+    def test_path_matches_chained_quotes(self):
+        counting = CountingRateModule()
+        route = [self.woofi_hop(WETH, USDC), self.woofi_hop(USDC, CBBTC), Hop(counting, {"rate": 3, "max_input": 10**20}, {}, CBBTC, DAI)]
+        quote = quote_path_out(route, 10**17)
+
+        fee1, usdc = self.module.get_amount_out(route[0].pool_state, self.fixed_parameters, WETH, USDC, 10**17)
+        fee2, cbbtc = self.module.get_amount_out(route[1].pool_state, self.fixed_parameters, USDC, CBBTC, usdc)
+        self.assertEqual(quote.amounts, [10**17, usdc, cbbtc, 3 * cbbtc])
+        self.assertEqual(quote.fees, [fee1, fee2, 0])
+        self.assertEqual((quote.amount_in, quote.amount_out), (10**17, 3 * cbbtc))
+
+        exact_out = quote_path_in(route, quote.amount_out)
+        self.assertEqual(exact_out.amount_out, quote.amount_out)
+        self.assertLessEqual(exact_out.amount_in, 10**17)
+        self.assertGreaterEqual(quote_path_out(route, exact_out.amount_in).amount_out, quote.amount_out)
+
+    def test_shared_prefixes_are_quoted_once(self):
+        counting = CountingRateModule()
+        first = Hop(counting, {"rate": 2, "max_input": 10**20}, {}, WETH, USDC)
+        routes = [[first, Hop(counting, {"rate": rate, "max_input": 10**20}, {}, USDC, DAI)] for rate in (1, 2, 3)]
+        routes.append([first])
+        quotes = quote_routes_out(routes, 100)
+        self.assertEqual([quote.amount_out for quote in quotes], [200, 400, 600, 200])
+        self.assertEqual(counting.calls, 4)
+
+        # exact-out routes share suffixes
+        counting.calls = 0
+        last = Hop(counting, {"rate": 2, "max_input": 10**20}, {}, USDC, DAI)
+        routes = [[Hop(counting, {"rate": rate, "max_input": 10**20}, {}, WETH, USDC), last] for rate in (1, 2, 4)]
+        quotes = quote_routes_in(routes, 400)
+        self.assertEqual([quote.amounts for quote in quotes], [[200, 200, 400], [100, 200, 400], [50, 200, 400]])
+        self.assertEqual(counting.calls, 4)
+
+    def test_failed_hops_only_drop_their_routes(self):
+        counting = CountingRateModule()
+        first = Hop(counting, {"rate": 10, "max_input": 10**20}, {}, WETH, USDC)
+        routes = [[first, Hop(counting, {"rate": 1, "max_input": 500}, {}, USDC, DAI)], [first, Hop(counting, {"rate": 1, "max_input": 5000}, {}, USDC, DAI)]]
+        quotes = quote_routes_out(routes, 100)
+        self.assertIsNone(quotes[0])
+        self.assertEqual(quotes[1].amount_out, 1000)
+
+    def test_rejects_broken_routes(self):
+        with self.assertRaises(ValueError):
+            check_route([])
+        with self.assertRaises(ValueError):
+            check_route([self.woofi_hop(WETH, USDC), self.woofi_hop(CBBTC, USDC)])
+        first = self.woofi_hop(WETH, USDC)
+        for quote_routes in (quote_routes_out, quote_routes_in):
+            with self.assertRaises(ValueError):
+                quote_routes([[first, self.woofi_hop(USDC, CBBTC)], [first, self.woofi_hop(CBBTC, USDC)]], 10**17)
+        # addresses match regardless of case
+        lower_usdc = Token(address=USDC.address.lower(), symbol="USDC", decimals=6, reference_price=Decimal(1))
+        check_route([self.woofi_hop(WETH, USDC), Hop(CountingRateModule(), {}, {}, lower_usdc, DAI)])
@@ -0,0 +1,119 @@
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.order_splitting import MARGINAL_RATE, Venue, split_order
+from engine.quote_cache import CachedLiquidityModule, content_fingerprint
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+
+
+class CountingModule(WOOFiLiquidityModule):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def get_amount_out(self, *args):
+        self.calls += 1
+        return super().get_amount_out(*args)
+
+    def get_amount_in(self, *args):
+        self.calls += 1
+        return super().get_amount_in(*args)
+
+
+class TestCachedLiquidityModule(unittest.TestCase):
+    def setUp(self):
+        self.module = CountingModule()
+        self.pool_state = woofi_pool_state()
+        self.fixed_parameters = woofi_fixed_parameters()
+
+    def test_cached_quotes_match_module(self):
+        cache = CachedLiquidityModule(self.module)
+        for amount in [10**6, 10**18, int(10e18), 10**6]:
+            self.assertEqual(
+                cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, CBBTC, amount),
+                WOOFiLiquidityModule().get_amount_out(self.pool_state, self.fixed_parameters, WETH, CBBTC, amount),
+            )
+        self.assertEqual(
+            cache.get_amount_in(self.pool_state, self.fixed_parameters, WETH, CBBTC, 10**8),
+            WOOFiLiquidityModule().get_amount_in(self.pool_state, self.fixed_parameters, WETH, CBBTC, 10**8),
+        )
+        info = cache.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 4, 4))
+        self.assertEqual(self.module.calls, 4)
+
+    def test_out_and_in_are_cached_separately(self):
+        cache = CachedLiquidityModule(self.module)
+        cache.get_amount_out(self.pool_state, self.fixed_parameters, USDC, CBBTC, 10**8)
+        cache.get_amount_in(self.pool_state, self.fixed_parameters, USDC, CBBTC, 10**8)
+        cache.get_amount_out(self.pool_state, self.fixed_parameters, CBBTC, USDC, 10**8)
+        self.assertEqual(cache.cache_info().misses, 3)
+
+    def test_lru_eviction(self):
+        cache = CachedLiquidityModule(self.module, maxsize=2)
+        for amount in [1, 2, 1, 3]:
+            cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, amount * 10**18)
+        info = cache.cache_info()
+        self.assertEqual((info.hits, info.misses, info.evictions, info.currsize), (1, 3, 1, 2))
+        # 2 was the least recently used quote
+        cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18)
+        cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, 2 * 10**18)
+        self.assertEqual(cache.cache_info().hits, 2)
+
+    def test_invalidate_replaced_state(self):
+        cache = CachedLiquidityModule(self.module)
+        other_state = woofi_pool_state()
+        cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18)
+        cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, CBBTC, 10**18)
+        cache.get_amount_out(other_state, self.fixed_parameters, WETH, USDC, 10**18)
+
+        self.pool_state["output_token_reserve"] = 0
+        self.assertEqual(cache.invalidate(self.pool_state, self.fixed_parameters), 2)
+        self.assertEqual(cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18), (None, None))
+        self.assertEqual(cache.cache_info().currsize, 2)
+        self.assertEqual(cache.invalidate(), 2)
+        self.assertEqual(cache.cache_info().currsize, 0)
+
+    def test_content_fingerprint_follows_updates(self):
+        cache = CachedLiquidityModule(self.module, fingerprint=content_fingerprint)
+        quote = cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18)
+        self.assertEqual(cache.get_amount_out(woofi_pool_state(), self.fixed_parameters, WETH, USDC, 10**18), quote)
+        self.pool_state["output_token_reserve"] = 0
+        self.assertEqual(cache.get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18), (None, None))
+        self.assertEqual(self.module.calls, 2)
+
+    def test_content_fingerprint_of_prepared_pool(self):
+        cache = CachedLiquidityModule(self.module, fingerprint=content_fingerprint)
+        prepared = cache.prepare_pool(self.pool_state, self.fixed_parameters, WETH, USDC)
+        quote = cache.get_amount_out(prepared, self.fixed_parameters, WETH, USDC, 10**18)
+        self.assertEqual(quote, WOOFiLiquidityModule().get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18))
+        self.assertEqual(cache.get_amount_out(prepared, self.fixed_parameters, WETH, USDC, 10**18), quote)
+        self.assertEqual(self.module.calls, 1)
+
+    def test_forwards_optional_methods(self):
+        cache = CachedLiquidityModule(self.module)
+        module = WOOFiLiquidityModule()
+        self.assertEqual(cache.native_batch_methods(), module.native_batch_methods())
+        self.assertEqual(
+            cache.get_marginal_rate(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18),
+            module.get_marginal_rate(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18),
+        )
+        self.assertEqual(
+            cache.get_liquidity_bound(self.pool_state, self.fixed_parameters, WETH, USDC),
+            module.get_liquidity_bound(self.pool_state, self.fixed_parameters, WETH, USDC),
+        )
+        self.assertEqual(
+            cache.get_amounts_out(self.pool_state, self.fixed_parameters, WETH, USDC, [10**17, 10**18]),
+            module.get_amounts_out(self.pool_state, self.fixed_parameters, WETH, USDC, [10**17, 10**18]),
+        )
+        self.assertFalse(hasattr(cache, "get_unknown_quote"))
+
+        split = split_order([Venue(cache, self.pool_state, self.fixed_parameters)], WETH, USDC, 10**18)
+        self.assertEqual(split.method, MARGINAL_RATE)
+
+    def test_rejects_empty_cache(self):
+        with self.assertRaises(ValueError):
+            CachedLiquidityModule(self.module, maxsize=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
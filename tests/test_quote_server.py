@@ -0,0 +1,141 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.quote_server import QuoteClient, QuoteServer
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+
+
+class SlowModule(WOOFiLiquidityModule):
+    # a quote of 1 unit keeps its worker busy, so the requests after it wait in the server
+    def get_amount_out(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        if input_amount == 1:
+            time.sleep(0.5)
+        return super().get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
+
+
+class TestQuoteServer(unittest.TestCase):
+    def setUp(self):
+        self.module = WOOFiLiquidityModule()
+        self.fixed_parameters = woofi_fixed_parameters()
+        self.pool_state = woofi_pool_state()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "quotes.sock")
+        self.server = QuoteServer(WOOFiLiquidityModule, workers=2, batch_window=0.005, max_batch=64)
+        for token in (WETH, CBBTC, USDC):
+            self.server.add_token(token)
+        self.server.set_pool("weth-cbbtc", self.pool_state, self.fixed_parameters)
+
+    def tearDown(self):
+        self.server.close()
+        self.directory.cleanup()
+
+    def run_client(self, session):
+        async def run():
+            listener = await self.server.serve_unix(self.path)
+            client = await QuoteClient.connect_unix(self.path)
+            try:
+                return await session(client)
+            finally:
+                await client.close()
+                listener.close()
+                await listener.wait_closed()
+        return asyncio.run(run())
+
+    def test_quotes_match_module(self):
+        amounts = [10**16 * index for index in range(1, 51)]
+
+        async def session(client):
+            quotes = await asyncio.gather(*(client.quote_out("weth-cbbtc", WETH.address, CBBTC.address, amount) for amount in amounts))
+            return quotes, await client.quote_in("weth-cbbtc", WETH.address.lower(), CBBTC.address, 10**6)
+
+        quotes, exact_out = self.run_client(session)
+        expected = [self.module.get_amount_out(self.pool_state, self.fixed_parameters, WETH, CBBTC, amount) for amount in amounts]
+        self.assertEqual(quotes, expected)
+        # concurrent requests are coalesced
+        self.assertEqual(self.server.requests_sent, len(amounts) + 1)
+        self.assertLess(self.server.batches_sent, len(amounts) + 1)
+        self.assertEqual(exact_out, self.module.get_amount_in(self.pool_state, self.fixed_parameters, WETH, CBBTC, 10**6))
+
+    def test_updates_reach_every_worker(self):
+        updated = dict(self.pool_state, output_token_price=9300000000000)
+
+        async def session(client):
+            before = await client.quote_out("weth-cbbtc", WETH.address, CBBTC.address, 10**18)
+            await client.update_pool("weth-cbbtc", updated)
+            after = await asyncio.gather(*(client.quote_out("weth-cbbtc", WETH.address, CBBTC.address, 10**18) for _ in range(20)))
+            return before, after
+
+        before, after = self.run_client(session)
+        self.assertEqual(before, self.module.get_amount_out(self.pool_state, self.fixed_parameters, WETH, CBBTC, 10**18))
+        expected = self.module.get_amount_out(updated, self.fixed_parameters, WETH, CBBTC, 10**18)
+        self.assertNotEqual(expected, before)
+        self.assertEqual(after, [expected] * 20)
+
+    def test_updates_wait_for_the_requests_before_them(self):
+        self.server.close()
+        self.server = QuoteServer(SlowModule, workers=1, batch_window=0.001, max_in_flight=1)
+        for token in (WETH, CBBTC, USDC):
+            self.server.add_token(token)
+        self.server.set_pool("weth-cbbtc", self.pool_state, self.fixed_parameters)
+        updated = dict(self.pool_state, output_token_price=9300000000000)
+
+        async def session(client):
+            busy = asyncio.ensure_future(client.quote_out("weth-cbbtc", WETH.address, CBBTC.address, 1))
+            await asyncio.sleep(0.1)
+            # the only worker is still busy, so this request is pending when the update arrives
+            before = asyncio.ensure_future(client.quote_out("weth-cbbtc", WETH.address, CBBTC.address, 10**18))
+            await asyncio.sleep(0.01)
+            await client.update_pool("weth-cbbtc", updated)
+            after = await client.quote_out("weth-cbbtc", WETH.address, CBBTC.address, 10**18)
+            await busy
+            return await before, after
+
+        before, after = self.run_client(session)
+        self.assertEqual(before, self.module.get_amount_out(self.pool_state, self.fixed_parameters, WETH, CBBTC, 10**18))
+        self.assertEqual(after, self.module.get_amount_out(updated, self.fixed_parameters, WETH, CBBTC, 10**18))
+        self.assertNotEqual(before, after)
+
+    def test_tokens_wait_for_the_requests_before_them(self):
+        self.server.close()
+        self.server = QuoteServer(SlowModule, workers=1, batch_window=0.001, max_in_flight=1)
+        for token in (WETH, CBBTC):
+            self.server.add_token(token)
+        self.server.set_pool("weth-cbbtc", self.pool_state, self.fixed_parameters)
+
+        async def session(client):
+            busy = asyncio.ensure_future(client.quote_out("weth-cbbtc", WETH.address, CBBTC.address, 1))
+            await asyncio.sleep(0.1)
+            # received before the token, so quoted without it
+            before = asyncio.ensure_future(client.quote_out("weth-cbbtc", WETH.address, USDC.address, 10**18))
+            await asyncio.sleep(0.01)
+            await client.add_token(USDC)
+            after = await client.quote_out("weth-cbbtc", WETH.address, USDC.address, 10**18)
+            await busy
+            with self.assertRaises(ValueError):
+                await before
+            return after
+
+        self.assertEqual(self.run_client(session), self.module.get_amount_out(self.pool_state, self.fixed_parameters, WETH, USDC, 10**18))
+
+    def test_errors_are_answered(self):
+        async def session(client):
+            errors = []
+            for pool, output_token in [("missing", CBBTC.address), ("weth-cbbtc", "0x" + "00" * 20)]:
+                try:
+                    await client.quote_out(pool, WETH.address, output_token, 10**18)
+                except ValueError as error:
+                    errors.append(str(error))
+            # a bad update is answered with its error and leaves the server running
+            try:
+                await client._request({"op": "token", "token": {"address": "0x1", "symbol": "X", "decimals": 18, "reference_price": "x"}})
+            except ValueError as error:
+                errors.append(str(error).split(":")[0])
+            # a rejected swap is not an error
+            errors.append(await client.quote_out("weth-cbbtc", WETH.address, CBBTC.address, 10**30))
+            return errors
+
+        self.assertEqual(self.run_client(session), ["unknown missing", "unknown " + "0x" + "00" * 20, "InvalidOperation", (None, None)])
@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+import unittest
+from functools import partial
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.quote_server import encode_fixed_parameters, encode_token
+from engine.replay import jsonl_states, read_trades, replay_sharded, run_replay, snapshot_states
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_snapshot import write_snapshot
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.module = WOOFiLiquidityModule()
+        self.fixed_parameters = woofi_fixed_parameters()
+        self.states = {10: woofi_pool_state(), 20: dict(woofi_pool_state(), input_token_price=176000000000)}
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.pools_path = self.write("pools.json", [{
+            "tokens": [encode_token(token) for token in (WETH, CBBTC, USDC)],
+            "pools": {"weth-cbbtc": {"fixed_parameters": encode_fixed_parameters(self.fixed_parameters)}},
+        }])
+        self.states_path = self.write("states.jsonl", [
+            {"block": block, "pool": "weth-cbbtc", "input_token": WETH.address, "output_token": CBBTC.address, "pool_state": state}
+            for block, state in self.states.items()
+        ])
+        self.trades = [
+            {"block": block, "pool": "weth-cbbtc", "input_token": WETH.address.lower(), "output_token": CBBTC.address, "amount_in": 10**17 * block, "tx": f"0x{block:02x}"}
+            for block in range(5, 30)
+        ]
+        self.trades[7]["amount_out"] = 1
+        self.trades.append({"block": 30, "pool": "weth-cbbtc", "input_token": USDC.address, "output_token": "0x0", "amount_in": 1})
+        self.trades.append({"block": 30, "pool": "weth-cbbtc", "input_token": WETH.address, "output_token": CBBTC.address, "amount_in": 10**30})
+        # the pairwise states only quote WETH -> cbBTC
+        self.trades.append({"block": 31, "pool": "weth-cbbtc", "input_token": CBBTC.address, "output_token": WETH.address, "amount_in": 10**6})
+        self.trades_path = self.write("trades.jsonl", self.trades)
+
+    def write(self, name: str, records: list) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as file:
+            file.writelines(json.dumps(record) + "\n" for record in records)
+        return path
+
+    def expected(self, trade: dict) -> tuple:
+        state = self.states[20] if trade["block"] >= 20 else self.states[10]
+        return self.module.get_amount_out(state, self.fixed_parameters, WETH, CBBTC, trade["amount_in"])
+
+    def test_replays_against_the_state_of_each_block(self):
+        results_path = os.path.join(self.directory.name, "results.jsonl")
+        with open(results_path, "w") as results:
+            summary = run_replay(self.module, jsonl_states(self.states_path, self.pools_path), read_trades(self.trades_path), results)
+        with open(results_path) as file:
+            results = [json.loads(line) for line in file]
+
+        self.assertEqual(len(results), len(self.trades))
+        self.assertEqual(results[0]["error"], "no state")
+        for result, trade in zip(results[5:25], self.trades[5:25]):
+            self.assertEqual((result["fee"], result["amount_out"]), self.expected(trade))
+            self.assertEqual(result["tx"], trade["tx"])
+        self.assertEqual(results[-3]["error"], "unknown token")
+        self.assertEqual((results[-2]["amount_out"], results[-2]["error"]), (None, None))
+        self.assertEqual(results[-1]["amount_out"], None)
+        self.assertIn("quotes " + WETH.address.lower(), results[-1]["error"])
+        self.assertEqual(
+            {key: summary.as_dict()[key] for key in ("trades", "quoted", "rejected", "errors", "compared", "exact", "first_block", "last_block")},
+            {"trades": 28, "quoted": 20, "rejected": 1, "errors": 7, "compared": 1, "exact": 0, "first_block": 5, "last_block": 31},
+        )
+
+    def test_token_states_quote_both_directions(self):
+        updates = []
+        for block, state in self.states.items():
+            records = {token.address: {field: state[prefix + field] for field in TOKEN_STATE_FIELDS} for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]}
+            updates.append({"block": block, "pool": "weth-cbbtc", "quote_token_reserve": state["quote_token_reserve"], "tokens": records})
+        states_path = self.write("token-states.jsonl", updates)
+        results_path = os.path.join(self.directory.name, "token-results.jsonl")
+        with open(results_path, "w") as results:
+            run_replay(self.module, jsonl_states(states_path, self.pools_path), read_trades(self.trades_path), results)
+        with open(results_path) as file:
+            results = [json.loads(line) for line in file]
+
+        for result, trade in zip(results[5:25], self.trades[5:25]):
+            self.assertEqual((result["fee"], result["amount_out"]), self.expected(trade))
+        # the cbBTC -> WETH trade reads the state with the tokens the other way round
+        reverse = {key.replace("input_", "output_", 1) if key.startswith("input_") else key.replace("output_", "input_", 1): value for key, value in self.states[20].items()}
+        self.assertEqual((results[-1]["fee"], results[-1]["amount_out"], results[-1]["error"]), (*self.module.get_amount_out(reverse, self.fixed_parameters, CBBTC, WETH, 10**6), None))
+        self.assertIsNotNone(results[-1]["amount_out"])
+
+    def test_byte_ranges_partition_the_trades(self):
+        whole = list(read_trades(self.trades_path))
+        size = os.path.getsize(self.trades_path)
+        for cuts in ([0, size], [0, 1, size], [0, 100, 101, 1000, size]):
+            parts = [trade for start, end in zip(cuts, cuts[1:]) for trade in read_trades(self.trades_path, start, end)]
+            self.assertEqual(parts, whole)
+
+    def test_sharded_replay_matches_one_pass(self):
+        whole = run_replay(self.module, jsonl_states(self.states_path, self.pools_path), read_trades(self.trades_path))
+        open_states = partial(jsonl_states, self.states_path, self.pools_path)
+        for processes, shards in [(1, 4), (2, 3)]:
+            output = os.path.join(self.directory.name, f"sharded-{processes}")
+            os.makedirs(output)
+            summary = replay_sharded(WOOFiLiquidityModule, open_states, self.trades_path, processes, output, shards)
+            self.assertEqual(summary.as_dict(), whole.as_dict())
+            lines = []
+            for name in sorted(os.listdir(output)):
+                with open(os.path.join(output, name)) as file:
+                    lines.extend(json.loads(line)["block"] for line in file)
+            self.assertEqual(lines, [trade["block"] for trade in self.trades])
+
+    def test_snapshot_states(self):
+        paths = []
+        for block, state in self.states.items():
+            store = WOOFiStateStore(self.fixed_parameters, state["quote_token_reserve"])
+            for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+                store.set_token(token, **{field: state[prefix + field] for field in TOKEN_STATE_FIELDS})
+            paths.append(os.path.join(self.directory.name, f"{block}.snapshot"))
+            write_snapshot(paths[-1], block, [store])
+
+        trades = [dict(trade, pool=0) for trade in self.trades[:25]]
+        trades_path = self.write("snapshot-trades.jsonl", trades)
+        results_path = os.path.join(self.directory.name, "snapshot-results.jsonl")
+        with open(results_path, "w") as results:
+            run_replay(self.module, snapshot_states(paths), read_trades(trades_path), results)
+        with open(results_path) as file:
+            results = [json.loads(line) for line in file]
+        for result, trade in zip(results[5:], trades[5:]):
+            self.assertEqual((result["fee"], result["amount_out"]), self.expected(trade))
+
+        self.assertEqual([update.block for update in snapshot_states(paths, start_block=15)], [10, 20])
+        self.assertEqual([update.block for update in snapshot_states(paths, start_block=25)], [20])
+
+        # a snapshot is closed once the update after its last one is taken; the latest stays open for its states
+        updates = snapshot_states(paths)
+        first, second = (next(updates).pair_state.func.__self__ for _ in range(2))
+        self.assertFalse(first.closed)
+        self.assertIsNone(next(updates, None))
+        self.assertEqual((first.closed, second.closed), (True, False))
+        # closing the generator closes the snapshots still open
+        updates = snapshot_states(paths)
+        first = next(updates).pair_state.func.__self__
+        updates.close()
+        self.assertTrue(first.closed)
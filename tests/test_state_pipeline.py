@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.state_pipeline import StateEvent, StatePipeline, jsonl_events, stream_events
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+
+
+async def events_of(events):
+    for event in events:
+        yield event
+
+
+class TestStatePipeline(unittest.TestCase):
+    def setUp(self):
+        pool_state = woofi_pool_state()
+        self.store = WOOFiStateStore(woofi_fixed_parameters(), pool_state["quote_token_reserve"])
+        for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+            self.store.set_token(token, **{field: pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+        self.price = pool_state["input_token_price"]
+
+    def test_coalesces_a_tick_into_one_version(self):
+        events = [StateEvent(WETH.address, {"price": self.price + index}) for index in range(10)]
+        events += [StateEvent(WETH.address, {"spread": 10**15}), StateEvent(CBBTC.address, {"reserve": 10**9}), StateEvent("0x0", {"price": 1})]
+        pipeline = StatePipeline(self.store, WOOFiStateStore.with_updates, tick=0.01)
+        asyncio.run(pipeline.run(events_of(events)))
+
+        version, store = pipeline.current
+        self.assertEqual(version, 1)
+        pair_state = store.pair_state(WETH, CBBTC)
+        self.assertEqual((pair_state["input_token_price"], pair_state["input_token_spread"]), (self.price + 9, 10**15))
+        self.assertEqual(pair_state["output_token_reserve"], 10**9)
+        # the published states are never modified
+        self.assertEqual(self.store.pair_state(WETH, CBBTC)["input_token_price"], self.price)
+
+        metrics = pipeline.metrics()
+        self.assertEqual((metrics.events, metrics.updates, metrics.rejected, metrics.versions), (13, 3, 1, 1))
+        self.assertAlmostEqual(metrics.coalesce_ratio, 13 / 3)
+        self.assertGreater(metrics.max_lag, 0)
+
+    def test_backpressure_bounds_the_queue(self):
+        events = [StateEvent(WETH.address, {"price": self.price + index}) for index in range(100)]
+        pipeline = StatePipeline(self.store, WOOFiStateStore.with_updates, tick=0, max_queue=4)
+
+        async def run():
+            seen = []
+
+            async def reader():
+                version = 0
+                while version < pipeline.current.version or not seen or seen[-1] < self.price + 99:
+                    version, store = await pipeline.wait_for_version(version)
+                    seen.append(store.pair_state(WETH, CBBTC)["input_token_price"])
+
+            await asyncio.gather(pipeline.run(events_of(events)), reader())
+            return seen
+
+        seen = asyncio.run(run())
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(seen[-1], self.price + 99)
+        metrics = pipeline.metrics()
+        self.assertGreater(metrics.source_waits, 0)
+        self.assertLessEqual(metrics.max_queue_depth, 5)
+        self.assertEqual(metrics.events, 100)
+        self.assertEqual(metrics.queue_depth, 0)
+
+    def test_file_and_socket_sources(self):
+        lines = [json.dumps({"key": WETH.address, "fields": {"price": self.price + index}}) + "\n" for index in range(20)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.jsonl")
+            with open(path, "w") as file:
+                file.writelines(lines)
+            pipeline = StatePipeline(self.store, WOOFiStateStore.with_updates)
+            asyncio.run(pipeline.run(jsonl_events(path, lines_per_yield=4)))
+            self.assertEqual(pipeline.current.state.pair_state(WETH, CBBTC)["input_token_price"], self.price + 19)
+
+            async def over_socket():
+                async def send(reader, writer):
+                    writer.writelines(line.encode() for line in lines)
+                    writer.write(json.dumps({"key": USDC.address, "fields": {"reserve": 7}}).encode() + b"\n")
+                    await writer.drain()
+                    writer.close()
+
+                socket_path = os.path.join(directory, "events.sock")
+                listener = await asyncio.start_unix_server(send, socket_path)
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+                pipeline = StatePipeline(self.store, WOOFiStateStore.with_updates)
+                await pipeline.run(stream_events(reader))
+                writer.close()
+                listener.close()
+                return pipeline
+
+            pipeline = asyncio.run(over_socket())
+            pair_state = pipeline.current.state.pair_state(WETH, CBBTC)
+            self.assertEqual((pair_state["input_token_price"], pair_state["quote_token_reserve"]), (self.price + 19, 7))
+            self.assertEqual(pipeline.metrics().events, 21)
@@ -0,0 +1,75 @@
+from decimal import Decimal
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.token_registry import PairTable, RegisteredToken, TokenRegistry, pair_key, token_address
+from modules.woofi_liquidity_module import SELL_BASE_TOKEN, SELL_QUOTE_TOKEN, SWAP_BASE_TO_BASE, WOOFiLiquidityModule, swap_direction
+from templates.liquidity_module import Token
+
+
+class TestTokenRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = TokenRegistry()
+        self.weth = self.registry.intern(WETH)
+        self.usdc = self.registry.intern(USDC)
+
+    def test_interns_by_normalized_address(self):
+        self.assertEqual((self.weth.id, self.usdc.id), (0, 1))
+        self.assertEqual(self.usdc.address, USDC.address.lower())
+        self.assertIs(self.registry.register(USDC.address.upper().replace("0X", "0x"), "USDC", 6, Decimal(1)), self.usdc)
+        self.assertIs(self.registry.get(USDC.address), self.usdc)
+        self.assertIs(self.registry[1], self.usdc)
+        self.assertIn(USDC.address.lower(), self.registry)
+        self.assertIsNone(self.registry.get(CBBTC.address))
+        self.assertEqual(len(self.registry), 2)
+        with self.assertRaises(ValueError):
+            self.registry.register(USDC.address, "USDC", 18, Decimal(1))
+
+    def test_registered_tokens_are_hashable_and_immutable(self):
+        other = TokenRegistry().intern(Token(address=USDC.address.lower(), symbol="USDC", decimals=6, reference_price=Decimal(1)))
+        self.assertEqual(other, self.usdc)
+        self.assertEqual(len({self.usdc, other, self.weth}), 2)
+        self.assertNotEqual(self.usdc, USDC)
+        with self.assertRaises(AttributeError):
+            self.usdc.decimals = 18
+        with self.assertRaises(AttributeError):
+            USDC.extra = 1
+
+    def test_pair_table(self):
+        calls = []
+        table = PairTable(lambda input_token, output_token: calls.append(1) or (input_token.symbol, output_token.symbol))
+        self.assertEqual(table.get(self.weth, self.usdc), ("WETH", "USDC"))
+        self.assertEqual(table.get(self.weth, self.usdc), ("WETH", "USDC"))
+        self.assertEqual(table.get(self.usdc, self.weth), ("USDC", "WETH"))
+        self.assertEqual((len(calls), len(table)), (2, 2))
+        self.assertNotEqual(pair_key(self.weth, self.usdc), pair_key(self.usdc, self.weth))
+
+    def test_token_address(self):
+        self.assertIs(token_address(self.usdc), self.usdc.address)
+        self.assertIs(token_address(USDC), self.usdc.address)
+        self.assertIs(token_address(Token(address=USDC.address.upper().replace("0X", "0x"), symbol="USDC", decimals=6, reference_price=Decimal(1))), self.usdc.address)
+
+    def test_woofi_directions_ignore_address_case(self):
+        module = WOOFiLiquidityModule()
+        fixed_parameters, pool_state = woofi_fixed_parameters(), woofi_pool_state()
+        cbbtc = self.registry.intern(CBBTC)
+        self.assertIsInstance(cbbtc, RegisteredToken)
+        self.assertEqual(swap_direction(fixed_parameters, self.usdc, cbbtc), SELL_QUOTE_TOKEN)
+        self.assertEqual(swap_direction(fixed_parameters, self.weth, self.usdc), SELL_BASE_TOKEN)
+        self.assertEqual(swap_direction(fixed_parameters, self.weth, cbbtc), SWAP_BASE_TO_BASE)
+
+        amount = int(10e18)
+        expected = module.get_amount_out(pool_state, fixed_parameters, WETH, CBBTC, amount)
+        self.assertEqual(module.get_amount_out(pool_state, fixed_parameters, self.weth, cbbtc, amount), expected)
+        # registered tokens resolve the direction of a pair once, then find it in the table of the quote token
+        registered_fixed_parameters = dict(fixed_parameters, quote_token=self.usdc)
+        for _ in range(2):
+            self.assertEqual(module.get_amount_out(pool_state, registered_fixed_parameters, self.weth, cbbtc, amount), expected)
+            self.assertEqual(module.get_amount_in(pool_state, registered_fixed_parameters, self.weth, cbbtc, 10**7),
+                             module.get_amount_in(pool_state, fixed_parameters, WETH, CBBTC, 10**7))
+        self.assertEqual(module.prepare_pool(pool_state, registered_fixed_parameters, self.usdc, cbbtc).direction, SELL_QUOTE_TOKEN)
+        self.assertEqual(len(module._directions[self.usdc.id]), 2)
+        pool = module.prepare_pool(pool_state, fixed_parameters, WETH, CBBTC)
+        self.assertEqual(module.get_amount_out(pool, None, self.weth, cbbtc, amount), expected)
+        with self.assertRaises(ValueError):
+            module.get_amount_out(pool, None, self.weth, self.usdc, amount)
@@ -0,0 +1,90 @@
+import random
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_columnar import WOOFiColumnarStore
+from modules.woofi_fuzz import random_case
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from templates.liquidity_module import Token
+
+
+class TestWOOFiColumnarStore(unittest.TestCase):
+    def setUp(self):
+        self.module = WOOFiLiquidityModule()
+        self.fixed_parameters = woofi_fixed_parameters()
+        rng = random.Random(11)
+        self.pools = []
+        for _ in range(60):
+            pool_state = woofi_pool_state()
+            for prefix in ("input_token_", "output_token_"):
+                pool_state[prefix + "price"] = int(pool_state[prefix + "price"] * rng.uniform(0.9, 1.1))
+                pool_state[prefix + "spread"] = int(pool_state[prefix + "spread"] * rng.uniform(0.2, 3))
+                pool_state[prefix + "coeff"] = int(pool_state[prefix + "coeff"] * rng.uniform(0.1, 10))
+                pool_state[prefix + "fee_rate"] = rng.choice([0, 5, 25, 100])
+                pool_state[prefix + "wo_feasible"] = rng.random() > 0.1
+            pool_state["output_token_reserve"] = int(pool_state["output_token_reserve"] * rng.uniform(0.01, 1))
+            pool_state["quote_token_reserve"] = rng.choice([0, 10**5, 10**9])
+            input_token, output_token = rng.choice([(USDC, CBBTC), (WETH, USDC), (WETH, CBBTC)])
+            self.pools.append((pool_state, input_token, output_token))
+
+        self.store = WOOFiColumnarStore()
+        for pool_state, input_token, output_token in self.pools:
+            self.store.add_pool(pool_state, self.fixed_parameters, input_token, output_token)
+
+    def test_quote_out_is_bit_identical_to_scalar(self):
+        for input_amount in [0, 1, 10**6, 10**9, 10**11, 10**15, 10**17, 10**18, int(10e18), 10**20, 10**22]:
+            fees, amounts_out, feasible = self.store.quote_out(input_amount)
+            expected = [
+                self.module.get_amount_out(pool_state, self.fixed_parameters, input_token, output_token, input_amount)
+                for pool_state, input_token, output_token in self.pools
+            ]
+            self.assertEqual(list(zip(fees, amounts_out)), expected)
+            self.assertEqual(feasible, [amount_out is not None for _, amount_out in expected])
+
+    def test_quote_out_matches_scalar_on_fuzz_cases(self):
+        # pools of every direction and scale from the fuzz generator, quoted together at their own amounts
+        generator = random.Random(12)
+        cases = [random_case(generator, self.module) for _ in range(1000)]
+        store = WOOFiColumnarStore()
+        for case in cases:
+            store.add_pool(case.pool_state, case.fixed_parameters, case.input_token, case.output_token)
+        fees, amounts_out, _ = store.quote_out([case.amount for case in cases])
+        for case, fee, amount_out in zip(cases, fees, amounts_out):
+            expected = self.module.get_amount_out(case.pool_state, case.fixed_parameters, case.input_token, case.output_token, case.amount)
+            self.assertEqual((fee, amount_out), expected, case.as_dict())
+        self.assertGreater(sum(amount_out is not None for amount_out in amounts_out), 300)
+
+    def test_per_pool_amounts_and_update(self):
+        input_amounts = [10**6 * (index + 1) for index in range(len(self.pools))]
+        _, amounts_out, _ = self.store.quote_out(input_amounts)
+        pool_state, input_token, output_token = self.pools[7]
+        self.assertEqual(amounts_out[7], self.module.get_amount_out(pool_state, self.fixed_parameters, input_token, output_token, input_amounts[7])[1])
+
+        self.store.update_pool(7, dict(pool_state, output_token_reserve=0), self.fixed_parameters, input_token, output_token)
+        self.assertIsNone(self.store.quote_out(input_amounts)[1][7])
+        with self.assertRaises(ValueError):
+            self.store.update_pool(7, pool_state, self.fixed_parameters, output_token, input_token)
+        with self.assertRaises(ValueError):
+            self.store.quote_out([1, 2])
+
+    def test_best_pool(self):
+        input_amount = 10**9
+        best = self.store.best_pool(input_amount, CBBTC)
+        candidates = [
+            (self.module.get_amount_out(pool_state, self.fixed_parameters, input_token, output_token, input_amount)[1], index)
+            for index, (pool_state, input_token, output_token) in enumerate(self.pools) if output_token is CBBTC
+        ]
+        amount_out, index = max((amount_out, -index) for amount_out, index in candidates if amount_out is not None)
+        self.assertEqual((best[0], best[2]), (-index, amount_out))
+        self.assertIsNone(self.store.best_pool(10**30))
+
+    def test_addresses_in_any_casing(self):
+        lower = {token.address: Token(address=token.address.lower(), symbol=token.symbol, decimals=token.decimals, reference_price=token.reference_price)
+                 for token in (USDC, WETH, CBBTC)}
+        pool_state, input_token, output_token = self.pools[7]
+        self.store.update_pool(7, pool_state, self.fixed_parameters, lower[input_token.address], lower[output_token.address])
+        self.assertEqual(self.store.best_pool(10**9, lower[CBBTC.address]), self.store.best_pool(10**9, CBBTC))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+from decimal import Decimal
+import unittest
+
+from modules.woofi_fuzz import PATHS, REFERENCE, ROUND_TRIP, FuzzCase, check_case, minimize, run
+from modules.woofi_liquidity_module import MAX_NOTIONAL_SWAP, WOOFiLiquidityModule
+from modules.woofi_reference import reference_in, reference_out
+from templates.liquidity_module import Token
+
+
+class OverpayingModule(WOOFiLiquidityModule):
+    # pays one unit too much on large dict path swaps
+    def get_amount_out(self, pool_state, fixed_parameters, input_token, output_token, input_amount):
+        fee, amount_out = super().get_amount_out(pool_state, fixed_parameters, input_token, output_token, input_amount)
+        if amount_out is not None and input_amount > 10**15:
+            amount_out += 1
+        return fee, amount_out
+
+
+class OverchargingModule(WOOFiLiquidityModule):
+    # asks one unit more input than the swap needs
+    def get_amount_in(self, pool_state, fixed_parameters, input_token, output_token, output_amount):
+        fee, amount_in = super().get_amount_in(pool_state, fixed_parameters, input_token, output_token, output_amount)
+        return fee, None if amount_in is None else amount_in + 1
+
+
+class ShortSightedModule(WOOFiLiquidityModule):
+    # rejects exact-out quotes of the largest output the pool pays
+    def get_amount_in(self, pool_state, fixed_parameters, input_token, output_token, output_amount):
+        if output_amount == self.get_liquidity_bound(pool_state, fixed_parameters, input_token, output_token).max_output_amount:
+            return None, None
+        return super().get_amount_in(pool_state, fixed_parameters, input_token, output_token, output_amount)
+
+
+class StaleStatesModule(WOOFiLiquidityModule):
+    # the states kernels still charge the fee of the output token on base to base swaps
+    def get_state_amounts_out(self, states, input_token, output_token, input_amounts):
+        states = [(dict(pool_state, input_token_fee_rate=pool_state["output_token_fee_rate"]), fixed_parameters) for pool_state, fixed_parameters in states]
+        return super().get_state_amounts_out(states, input_token, output_token, input_amounts)
+
+
+class TestWOOFiFuzz(unittest.TestCase):
+    def setUp(self):
+        self.module = WOOFiLiquidityModule()
+        self.input_token = Token(address="0x4200000000000000000000000000000000000006", decimals=18, symbol="WETH", reference_price=Decimal(1_750))
+        self.output_token = Token(address="0xcbB7C0000aB88B473b1f5aFd9ef808440eed33Bf", decimals=8, symbol="cbBTC", reference_price=Decimal(92_000))
+        self.quote_token = Token(address="0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913", decimals=6, symbol="USDC", reference_price=Decimal(1))
+        self.pool_state = {
+            "input_token_reserve": 100000000000000000000,
+            "input_token_fee_rate": 25,
+            "input_token_max_gamma": 3000000000000000,
+            "input_token_max_notional_swap": 1000000000000,
+            "input_token_price": 175000000000,
+            "input_token_spread": 941000000000000,
+            "input_token_coeff": 1660000000,
+            "input_token_wo_feasible": True,
+            "output_token_reserve": 10000000000,
+            "output_token_fee_rate": 25,
+            "output_token_max_gamma": 3000000000000000,
+            "output_token_max_notional_swap": 1000000000000,
+            "output_token_price": 9200000000000,
+            "output_token_spread": 1050000000000000,
+            "output_token_coeff": 1660000000,
+            "output_token_wo_feasible": True,
+            "quote_token_reserve": 1000000000,
+        }
+        self.fixed_parameters = {"base_fee_rate": int(1e5), "quote_token_decimals": 6, "oracle_price_decimals": 8, "quote_token": self.quote_token}
+
+    def test_reference_matches_contract_values(self):
+        self.assertEqual(reference_out(self.pool_state, self.fixed_parameters, self.input_token, self.output_token, int(10e18))[1], 18_975_966)
+        # get_amount_in asks 52_711_323_471_424_360_789: its float products lose about 1e-16 of the amount
+        self.assertEqual(reference_in(self.pool_state, self.fixed_parameters, self.input_token, self.output_token, int(1e8))[1], 52_711_323_471_424_365_432)
+
+        # 1 WETH sells for 1750 USDC less the spread and gamma, in integer arithmetic throughout
+        gamma = 10**18 * 175000000000 * 1660000000 // 10**8 // 10**18
+        quote_amount = 10**18 * 175000000000 * 10**6 // 10**8 * (10**18 - gamma - 941000000000000) // 10**18 // 10**18
+        fee = quote_amount * 25 // 10**5
+        self.assertEqual(reference_out(self.pool_state, self.fixed_parameters, self.input_token, self.quote_token, 10**18), (fee, quote_amount - fee))
+
+    def test_reference_trace_records_limits(self):
+        # 1000 WETH is 1.75M USDC of notional, above the 1M limit
+        trace = {}
+        self.assertEqual(reference_out(self.pool_state, self.fixed_parameters, self.input_token, self.quote_token, 1000 * 10**18, trace), (None, None))
+        self.assertEqual(trace["checks"][-1], (MAX_NOTIONAL_SWAP, 1_750_000 * 10**6, 10**12))
+
+        self.assertEqual(reference_in(self.pool_state, self.fixed_parameters, self.input_token, self.quote_token, 10**12), (None, None))
+        for output_amount in (1, 10**6, 10**9):
+            fee, amount_in = reference_in(self.pool_state, self.fixed_parameters, self.input_token, self.quote_token, output_amount)
+            self.assertGreaterEqual(reference_out(self.pool_state, self.fixed_parameters, self.input_token, self.quote_token, amount_in)[1], output_amount)
+            self.assertLess(reference_out(self.pool_state, self.fixed_parameters, self.input_token, self.quote_token, amount_in - 1)[1], output_amount)
+
+    def test_production_agrees_with_reference(self):
+        report = run(3000, processes=1, seed=1)
+        self.assertEqual(report.cases, 3000)
+        self.assertFalse(report.failed(), report.reproducers)
+        self.assertGreater(report.exact, report.tolerated)
+
+        # strictly, some quotes differ in the last digits
+        strict = run(3000, processes=1, seed=1, tolerance=0, max_reproducers=0)
+        self.assertEqual(strict.divergent[PATHS] + strict.divergent[ROUND_TRIP], 0)
+        self.assertEqual(strict.divergent[REFERENCE], report.tolerated)
+
+    def test_finds_and_minimizes_divergences(self):
+        report = run(500, processes=1, seed=2, max_reproducers=2, module_factory=OverpayingModule)
+        self.assertGreater(report.divergent[PATHS], 0)
+        self.assertEqual(len(report.reproducers), 2)
+        for reproducer in report.reproducers:
+            self.assertEqual(check_case(OverpayingModule(), FuzzCase.from_dict(reproducer))[0], reproducer["kinds"])
+
+        case = FuzzCase("out", self.pool_state, self.fixed_parameters, self.input_token, self.quote_token, 123_456_789_123_456_789)
+        kinds, results = check_case(OverpayingModule(), case)
+        self.assertEqual(kinds, [PATHS])
+        # every path that does not go through get_amount_out
+        self.assertEqual(results["paths"], ["batch", "states", "columnar"])
+        minimized = minimize(OverpayingModule(), case, kinds)
+        self.assertEqual(check_case(OverpayingModule(), minimized)[0], [PATHS])
+        self.assertEqual(minimized.amount, 2 * 10**15)
+        self.assertLess(sum(1 for value in minimized.pool_state.values() if value), sum(1 for value in case.pool_state.values() if value))
+        self.assertEqual(FuzzCase.from_dict(minimized.as_dict()).as_dict(), minimized.as_dict())
+
+        report = run(500, processes=1, seed=2, max_reproducers=1, module_factory=OverchargingModule)
+        self.assertGreater(report.divergent[ROUND_TRIP], 0)
+        # one unit of input more is within the tolerance of the exact model; only --exact would flag it
+        self.assertEqual(report.divergent[REFERENCE], 0)
+
+    def test_flags_divergent_states_kernels(self):
+        case = FuzzCase("out", dict(self.pool_state, input_token_fee_rate=100), self.fixed_parameters, self.input_token, self.output_token, 10**18)
+        self.assertEqual(check_case(self.module, case)[0], [])
+        kinds, results = check_case(StaleStatesModule(), case)
+        self.assertEqual(kinds, [PATHS])
+        self.assertEqual(results["paths"], ["states"])
+
+        report = run(500, processes=1, seed=4, max_reproducers=0, module_factory=StaleStatesModule)
+        self.assertGreater(report.divergent[PATHS], 0)
+
+    def test_flags_rejected_outputs_that_get_amount_out_reaches(self):
+        bound = self.module.get_liquidity_bound(self.pool_state, self.fixed_parameters, self.input_token, self.output_token)
+        case = FuzzCase("in", self.pool_state, self.fixed_parameters, self.input_token, self.output_token, bound.max_output_amount)
+        self.assertEqual(check_case(self.module, case)[0], [])
+        self.assertIn(ROUND_TRIP, check_case(ShortSightedModule(), case)[0])
+        # an output past the bound is rejected by both
+        self.assertEqual(check_case(ShortSightedModule(), case._replace(amount=bound.max_output_amount + 1))[0], [])
+
+        report = run(500, processes=1, seed=3, max_reproducers=0, module_factory=ShortSightedModule)
+        self.assertGreater(report.divergent[ROUND_TRIP], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 from datetime import datetime
 from decimal import Decimal
+import pickle
+import random
 import unittest
 
+from engine.instrumentation import InMemoryMetrics
 from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
 from templates.liquidity_module import Token
 
 
@@ -51,7 +55,437 @@ class TestWOOFiLiquidityModule(unittest.TestCase):
         output_amount = int(1e8)
         _, amount_in = self.module.get_amount_in(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, output_amount)
         self.assertIsNotNone(amount_in)
-        self.assertEqual(amount_in, 52_711_323_471_118_491_648)
+        self.assertEqual(amount_in, 52_711_323_471_424_360_789)
+
+    def test_get_amount_in_is_minimal_input(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        pairs = [
+            (quote_token, self.output_token), (self.input_token, quote_token), (self.input_token, self.output_token),
+            (quote_token, self.input_token), (self.output_token, quote_token), (self.output_token, self.input_token),
+        ]
+        output_amounts = [0, 1, 7, 10**3, 123_456, 10**6, 98_765_432, 10**8, 10**9]
+        for input_token, output_token in pairs:
+            for output_amount in output_amounts:
+                _, amount_in = self.module.get_amount_in(self.valid_pool_state, self.fixed_parameters, input_token, output_token, output_amount)
+                if amount_in is None:
+                    continue
+                _, amount_out = self.module.get_amount_out(self.valid_pool_state, self.fixed_parameters, input_token, output_token, amount_in)
+                self.assertGreaterEqual(amount_out, output_amount)
+                if amount_in > 0:
+                    _, amount_out = self.module.get_amount_out(self.valid_pool_state, self.fixed_parameters, input_token, output_token, amount_in - 1)
+                    self.assertLess(amount_out, output_amount)
+
+    def test_get_amount_in_unreachable_output(self):
+        # 20 cbBTC is within the reserve but needs more than max_notional_swap of quote token
+        self.assertEqual(self.module.get_amount_in(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, 2 * 10**9), (None, None))
+        self.assertEqual(self.module.get_amount_in(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, 10**11), (None, None))
+
+    def test_get_amount_in_round_trips_at_the_liquidity_bound(self):
+        # cbBTC -> WETH limited by the quote token reserve that pays the fee; near it the output moves in steps of one
+        # quote token unit, wider than the first correction of the estimate
+        pool_state = {
+            "input_token_fee_rate": 100, "input_token_max_gamma": 307564502212492, "input_token_max_notional_swap": 9374280360413,
+            "input_token_price": 1047701793, "input_token_spread": 0, "input_token_coeff": 0, "input_token_wo_feasible": True,
+            "output_token_fee_rate": 5, "output_token_max_gamma": 49113399737777, "output_token_max_notional_swap": 51264468996,
+            "output_token_price": 2371730594, "output_token_spread": 0, "output_token_coeff": 0, "output_token_wo_feasible": True,
+            "input_token_reserve": 59, "output_token_reserve": 316434707516153042829312, "quote_token_reserve": 12176658,
+        }
+        input_token, output_token = self.output_token, self.input_token
+        bound = self.module.get_liquidity_bound(pool_state, self.fixed_parameters, input_token, output_token)
+        self.assertEqual(bound.binding_limit, "insufficient_quote_reserve")
+        _, amount_in = self.module.get_amount_in(pool_state, self.fixed_parameters, input_token, output_token, bound.max_output_amount)
+        self.assertIsNotNone(amount_in)
+        self.assertLessEqual(amount_in, bound.max_input_amount)
+        _, amount_out = self.module.get_amount_out(pool_state, self.fixed_parameters, input_token, output_token, amount_in)
+        self.assertGreaterEqual(amount_out, bound.max_output_amount)
+
+    def test_get_amounts_out_matches_scalar(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        ladders = {
+            (quote_token, self.output_token): [0, 1, 10**6, 10**9, 10**10, 10**11, 10**12, 10**13],
+            (self.input_token, quote_token): [0, 1, 10**15, 10**18, 5 * 10**18, 10**19, 10**21],
+            (self.input_token, self.output_token): [0, 1, 10**15, 10**18, int(10e18), 10**20, 10**22],
+        }
+        for (input_token, output_token), input_amounts in ladders.items():
+            fees, amounts_out = self.module.get_amounts_out(self.valid_pool_state, self.fixed_parameters, input_token, output_token, input_amounts)
+            expected = [self.module.get_amount_out(self.valid_pool_state, self.fixed_parameters, input_token, output_token, input_amount) for input_amount in input_amounts]
+            self.assertEqual(list(zip(fees, amounts_out)), expected)
+            self.assertIn((None, None), expected)
+
+    def test_get_amounts_in_matches_scalar(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        ladders = {
+            (quote_token, self.output_token): [1, 10**4, 10**6, 10**8, 10**9, 10**11],
+            (self.input_token, quote_token): [1, 10**4, 10**6, 10**8, 10**9, 10**11],
+            (self.input_token, self.output_token): [1, 10**4, 10**6, 10**8, 10**9, 10**11],
+        }
+        for (input_token, output_token), output_amounts in ladders.items():
+            fees, amounts_in = self.module.get_amounts_in(self.valid_pool_state, self.fixed_parameters, input_token, output_token, output_amounts)
+            expected = [self.module.get_amount_in(self.valid_pool_state, self.fixed_parameters, input_token, output_token, output_amount) for output_amount in output_amounts]
+            self.assertEqual(list(zip(fees, amounts_in)), expected)
+            self.assertIn((None, None), expected)
+
+    def test_get_pair_amounts_match_scalar(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        store = WOOFiStateStore(self.fixed_parameters, self.valid_pool_state["quote_token_reserve"])
+        for token, prefix in [(self.input_token, "input_token_"), (self.output_token, "output_token_")]:
+            store.set_token(token, **{field: self.valid_pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+        tokens = [quote_token, self.input_token, self.output_token]
+        pairs = [(input_token, output_token) for input_token in tokens for output_token in tokens if input_token is not output_token]
+        quotes = [(input_token, output_token, amount) for amount in [0, 1, 10**6, 10**9, 10**12, 10**18, 10**21] for input_token, output_token in pairs]
+
+        for batch, scalar in [(self.module.get_pair_amounts_out, self.module.get_amount_out), (self.module.get_pair_amounts_in, self.module.get_amount_in)]:
+            fees, amounts = batch(store, self.fixed_parameters, quotes)
+            expected = [scalar(store.pair_state(input_token, output_token), self.fixed_parameters, input_token, output_token, amount) for input_token, output_token, amount in quotes]
+            self.assertEqual(list(zip(fees, amounts)), expected)
+            self.assertIn((None, None), expected)
+
+        # a pairwise state serves quotes of its own pair
+        quotes = [(self.input_token, self.output_token, amount) for amount in [10**15, 10**18, 10**20]]
+        fees, amounts = self.module.get_pair_amounts_out(self.valid_pool_state, self.fixed_parameters, quotes)
+        self.assertEqual(list(zip(fees, amounts)), [self.module.get_amount_out(self.valid_pool_state, self.fixed_parameters, *quote) for quote in quotes])
+
+    def test_get_state_amounts_match_scalar(self):
+        generator = random.Random(23)
+        for batch, scalar in [(self.module.get_state_amounts_out, self.module.get_amount_out), (self.module.get_state_amounts_in, self.module.get_amount_in)]:
+            for input_token, output_token in self.pairs():
+                states = [(pool_state, self.fixed_parameters) for pool_state, _ in self.random_states(generator, 60)]
+                # a second set of fixed parameters, and prepared pools among the dicts
+                other_fixed_parameters = dict(self.fixed_parameters, base_fee_rate=10**4)
+                states += [(pool_state, other_fixed_parameters) for pool_state, _ in self.random_states(generator, 20)]
+                states += [(self.module.prepare_pool(pool_state, self.fixed_parameters, input_token, output_token), None) for pool_state, _ in self.random_states(generator, 20)]
+                amounts = [int(10 ** generator.uniform(0, 22)) for _ in states]
+
+                fees, results = batch(states, input_token, output_token, amounts)
+                expected = [scalar(pool_state, fixed_parameters, input_token, output_token, amount) for (pool_state, fixed_parameters), amount in zip(states, amounts)]
+                self.assertEqual(list(zip(fees, results)), expected)
+                self.assertIn((None, None), expected)
+                self.assertLess(expected.count((None, None)), len(expected))
+                amount = 10**18 if batch == self.module.get_state_amounts_out else 10**6
+                self.assertEqual(batch(states, input_token, output_token, amount)[1], [
+                    scalar(pool_state, fixed_parameters, input_token, output_token, amount)[1] for pool_state, fixed_parameters in states
+                ])
+            with self.assertRaises(ValueError):
+                batch(states, input_token, output_token, [1, 2])
+
+    def test_native_batch_methods(self):
+        self.assertEqual(self.module.native_batch_methods(), {
+            "get_amounts_out", "get_amounts_in", "get_pair_amounts_out", "get_pair_amounts_in", "get_state_amounts_out", "get_state_amounts_in",
+            "get_marginal_rates", "get_price_impacts",
+        })
+
+    def test_get_amounts_out_infeasible_pool(self):
+        pool_state = dict(self.valid_pool_state, input_token_wo_feasible=False)
+        fees, amounts_out = self.module.get_amounts_out(pool_state, self.fixed_parameters, self.input_token, self.output_token, [10**18, 10**19])
+        self.assertEqual(fees, [None, None])
+        self.assertEqual(amounts_out, [None, None])
+
+    def test_prepared_pool_matches_dict_path(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        amounts = [1, 10**4, 10**6, 10**8, 10**9, 10**11, 10**15, 10**18, int(10e18), 10**20]
+        for input_token, output_token in [(quote_token, self.output_token), (self.input_token, quote_token), (self.input_token, self.output_token)]:
+            pool = self.module.prepare_pool(self.valid_pool_state, self.fixed_parameters, input_token, output_token)
+            for amount in amounts:
+                self.assertEqual(
+                    self.module.get_amount_out(pool, None, input_token, output_token, amount),
+                    self.module.get_amount_out(self.valid_pool_state, self.fixed_parameters, input_token, output_token, amount),
+                )
+                self.assertEqual(
+                    self.module.get_amount_in(pool, None, input_token, output_token, amount),
+                    self.module.get_amount_in(self.valid_pool_state, self.fixed_parameters, input_token, output_token, amount),
+                )
+
+    def test_prepared_pool_is_immutable(self):
+        pool = self.module.prepare_pool(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token)
+        with self.assertRaises(AttributeError):
+            pool.fee_rate = 0
+        with self.assertRaises(AttributeError):
+            pool.input.price = 1
+        with self.assertRaises(AttributeError):
+            pool.extra = 1
+
+    def test_prepared_pool_rejects_other_pair(self):
+        pool = self.module.prepare_pool(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token)
+        with self.assertRaises(ValueError):
+            self.module.get_amount_out(pool, None, self.output_token, self.input_token, int(1e8))
+
+    def test_prepare_pool_validates_state(self):
+        pool_state = dict(self.valid_pool_state)
+        del pool_state["quote_token_reserve"]
+        with self.assertRaisesRegex(ValueError, "quote_token_reserve"):
+            self.module.prepare_pool(pool_state, self.fixed_parameters, self.input_token, self.output_token)
+        # the quote reserve is only needed for base to base swaps
+        self.module.prepare_pool(pool_state, self.fixed_parameters, self.input_token, self.fixed_parameters["quote_token"])
+
+    def test_liquidity_bound_is_exact(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        pairs = [
+            (quote_token, self.output_token), (self.input_token, quote_token), (self.input_token, self.output_token),
+            (quote_token, self.input_token), (self.output_token, quote_token), (self.output_token, self.input_token),
+        ]
+        variants = [
+            ({}, {(quote_token, self.output_token): "max_notional_swap", (self.input_token, self.output_token): "max_notional_swap"}),
+            (dict(quote_token_reserve=10**3), {(self.input_token, self.output_token): "insufficient_quote_reserve"}),
+            (dict(output_token_reserve=10**7), {(quote_token, self.output_token): "insufficient_reserve", (self.input_token, self.output_token): "insufficient_reserve"}),
+            (dict(output_token_max_gamma=10**14), {(quote_token, self.output_token): "max_gamma", (self.input_token, self.output_token): "max_gamma"}),
+            (dict(input_token_coeff=0, output_token_coeff=0, input_token_fee_rate=0), {}),
+        ]
+        for overrides, binding_limits in variants:
+            pool_state = dict(self.valid_pool_state, **overrides)
+            for input_token, output_token in pairs:
+                bound = self.module.get_liquidity_bound(pool_state, self.fixed_parameters, input_token, output_token)
+                _, amount_out = self.module.get_amount_out(pool_state, self.fixed_parameters, input_token, output_token, bound.max_input_amount)
+                self.assertEqual(amount_out, bound.max_output_amount)
+                self.assertIsNotNone(amount_out)
+                self.assertEqual(self.module.get_amount_out(pool_state, self.fixed_parameters, input_token, output_token, bound.max_input_amount + 1), (None, None))
+                if (input_token, output_token) in binding_limits:
+                    self.assertEqual(bound.binding_limit, binding_limits[input_token, output_token], overrides)
+
+    def test_liquidity_bound_infeasible_pair(self):
+        pool_state = dict(self.valid_pool_state, input_token_wo_feasible=False)
+        bound = self.module.get_liquidity_bound(pool_state, self.fixed_parameters, self.input_token, self.output_token)
+        self.assertEqual(bound, (None, None, "wo_not_feasible"))
+
+    def test_marginal_rate_matches_finite_differences(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        pool_state = dict(self.valid_pool_state, output_token_reserve=10**12)
+        for input_token, output_token, input_amount in [(quote_token, self.output_token, 10**11), (self.input_token, quote_token, 10**17), (self.input_token, self.output_token, 10**20)]:
+            step = input_amount // 10**4
+            _, amount_out_above = self.module.get_amount_out(pool_state, self.fixed_parameters, input_token, output_token, input_amount + step)
+            _, amount_out_below = self.module.get_amount_out(pool_state, self.fixed_parameters, input_token, output_token, input_amount - step)
+            rate = self.module.get_marginal_rate(pool_state, self.fixed_parameters, input_token, output_token, input_amount)
+            self.assertAlmostEqual(rate / ((amount_out_above - amount_out_below) / (2 * step)), 1, delta=1e-4)
+            self.assertLess(rate, self.module.get_marginal_rate(pool_state, self.fixed_parameters, input_token, output_token, 0))
+
+    def test_price_impact(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        input_amount = 10**11
+        gamma = input_amount * (1 - 25 / 1e5) * self.valid_pool_state["output_token_coeff"] / 10**6
+        impact = self.module.get_price_impact(self.valid_pool_state, self.fixed_parameters, quote_token, self.output_token, input_amount)
+        self.assertAlmostEqual(impact, gamma / (1e18 - self.valid_pool_state["output_token_spread"]), delta=1e-12)
+        self.assertEqual(self.module.get_price_impact(self.valid_pool_state, self.fixed_parameters, quote_token, self.output_token, 0), 0)
+        self.assertIsNone(self.module.get_price_impact(self.valid_pool_state, self.fixed_parameters, quote_token, self.output_token, 10**13))
+
+        input_amounts = [0, 10**15, 10**18, int(10e18), 10**22]
+        impacts = self.module.get_price_impacts(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, input_amounts)
+        rates = self.module.get_marginal_rates(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, input_amounts)
+        for input_amount, impact, rate in zip(input_amounts, impacts, rates):
+            self.assertEqual(impact, self.module.get_price_impact(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, input_amount))
+            self.assertEqual(rate, self.module.get_marginal_rate(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, input_amount))
+        self.assertEqual(impacts[0], 0)
+        self.assertTrue(0 < impacts[1] < impacts[2] < impacts[3])
+        self.assertIsNone(impacts[-1])
+
+    def test_apply_swap(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        original = dict(self.valid_pool_state)
+
+        fee, amount_out, state = self.module.apply_swap(self.valid_pool_state, self.fixed_parameters, quote_token, self.output_token, 10**9)
+        self.assertEqual((fee, amount_out), self.module.get_amount_out(self.valid_pool_state, self.fixed_parameters, quote_token, self.output_token, 10**9))
+        self.assertEqual(self.valid_pool_state, original)
+        gamma = (10**9 - fee) * original["output_token_coeff"] // 10**6
+        self.assertEqual(state["output_token_price"], 10**18 * original["output_token_price"] // (10**18 - gamma))
+        self.assertEqual(state["output_token_reserve"], original["output_token_reserve"] - amount_out)
+        self.assertEqual(state["input_token_reserve"], original["input_token_reserve"] + 10**9 - fee)
+        self.assertEqual(state["quote_token_reserve"], original["quote_token_reserve"] + 10**9 - fee)
+        self.assertEqual(state["input_token_price"], original["input_token_price"])
+
+        fee, amount_out, state = self.module.apply_swap(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, int(10e18))
+        self.assertEqual((fee, amount_out), self.module.get_amount_out(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, int(10e18)))
+        self.assertEqual(state["input_token_reserve"], original["input_token_reserve"] + int(10e18))
+        self.assertEqual(state["output_token_reserve"], original["output_token_reserve"] - amount_out)
+        self.assertEqual(state["quote_token_reserve"], original["quote_token_reserve"] - fee)
+        self.assertLess(state["input_token_price"], original["input_token_price"])
+        self.assertGreater(state["output_token_price"], original["output_token_price"])
+        # the next swap in the same direction gets a worse rate
+        self.assertLess(self.module.get_amount_out(state, self.fixed_parameters, self.input_token, self.output_token, int(10e18))[1], amount_out)
+
+        self.assertEqual(self.module.apply_swap(self.valid_pool_state, self.fixed_parameters, quote_token, self.output_token, 2 * 10**12), (None, None, None))
+        with self.assertRaises(ValueError):
+            pool = self.module.prepare_pool(self.valid_pool_state, self.fixed_parameters, quote_token, self.output_token)
+            self.module.apply_swap(pool, None, quote_token, self.output_token, 10**9)
+
+    def test_rejection_reasons(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        cases = [
+            ("out", dict(input_token_wo_feasible=False), self.input_token, self.output_token, int(10e18), "swap_base_to_base_out", "wo_not_feasible"),
+            ("out", dict(output_token_price=0), quote_token, self.output_token, 10**9, "sell_quote_token_out", "non_positive_price"),
+            ("out", {}, quote_token, self.output_token, 2 * 10**12, "sell_quote_token_out", "max_notional_swap"),
+            ("out", dict(output_token_max_notional_swap=10**13), quote_token, self.output_token, 19 * 10**11, "sell_quote_token_out", "max_gamma"),
+            ("out", {}, self.input_token, self.output_token, 10**21, "swap_base_to_base_out", "max_notional_swap"),
+            ("out", dict(output_token_reserve=10), quote_token, self.output_token, 10**9, "sell_quote_token_out", "insufficient_reserve"),
+            ("out", dict(quote_token_reserve=0), self.input_token, self.output_token, int(10e18), "swap_base_to_base_out", "insufficient_quote_reserve"),
+            ("in", {}, self.input_token, self.output_token, 10**11, "swap_base_to_base_in", "insufficient_reserve"),
+            ("in", {}, self.input_token, self.output_token, 2 * 10**9, "swap_base_to_base_in", "max_notional_swap"),
+            ("in", dict(output_token_max_notional_swap=10**30, output_token_max_gamma=10**30, output_token_reserve=10**30), quote_token, self.output_token, 10**16, "sell_quote_token_in", "negative_discriminant"),
+        ]
+        for side, overrides, input_token, output_token, amount, operation, reason in cases:
+            metrics = InMemoryMetrics()
+            module = WOOFiLiquidityModule(instrumentation=metrics)
+            pool_state = dict(self.valid_pool_state, **overrides)
+            quote = module.get_amount_out if side == "out" else module.get_amount_in
+            self.assertEqual(quote(pool_state, self.fixed_parameters, input_token, output_token, amount), (None, None))
+            self.assertEqual(metrics.rejection_counts(operation), {reason: 1}, (operation, overrides))
+
+    def test_get_tvl_and_apy(self):
+        quote_token = self.fixed_parameters["quote_token"]
+        store = WOOFiStateStore(self.fixed_parameters, self.valid_pool_state["quote_token_reserve"])
+        for token, prefix in [(self.input_token, "input_token_"), (self.output_token, "output_token_")]:
+            store.set_token(token, **{field: self.valid_pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+        # 100 WETH at 1,750, 100 cbBTC at 92,000 and 1,000 USDC
+        self.assertEqual(self.module.get_tvl(store), Decimal(9_376_000))
+        self.assertEqual(self.module.get_tvl(store, self.input_token), Decimal(175_000))
+        self.assertEqual(self.module.get_tvl(store, quote_token), Decimal(1_000))
+        self.assertEqual(self.module.get_tvl(store, Token(address="0x0", symbol="X", decimals=18, reference_price=Decimal(1))), 0)
+        with self.assertRaises(TypeError):
+            self.module.get_tvl(self.valid_pool_state)
+        # a pairwise pool_state values the reserves of the tokens it names at their reference_price
+        self.assertEqual(self.module.get_tvl(self.valid_pool_state, self.input_token), 0)
+        named = dict(self.valid_pool_state, input_token=self.input_token.address.lower(), output_token=self.output_token.address)
+        self.assertEqual(self.module.get_tvl(named, self.input_token), 100 * self.input_token.reference_price)
+        self.assertEqual(self.module.get_tvl(named, quote_token), 0)
+        self.assertEqual(self.module.get_apy(named), 0)
+
+        self.assertEqual(self.module.get_apy(store), 0)
+        for hour in range(24):
+            store.fees.add(self.now + hour * 3600, 10**6)
+        # 24 USDC of fees in a day
+        self.assertAlmostEqual(self.module.get_apy(store), Decimal(24 * 365) / 9_376_000, delta=Decimal(1e-20))
+
+    def pairs(self) -> list:
+        quote_token = self.fixed_parameters["quote_token"]
+        return [(quote_token, self.output_token), (self.input_token, quote_token), (self.input_token, self.output_token)]
+
+    def random_states(self, generator: random.Random, count: int) -> list:
+        states = []
+        for _ in range(count):
+            pool_state = dict(self.valid_pool_state, quote_token_reserve=10 ** generator.randint(3, 13), output_token_reserve=10 ** generator.randint(4, 22))
+            for prefix in ("input_token_", "output_token_"):
+                pool_state[prefix + "price"] = int(pool_state[prefix + "price"] * generator.uniform(0.5, 2))
+                pool_state[prefix + "spread"] = generator.randrange(0, 10**16)
+                pool_state[prefix + "coeff"] = generator.randrange(0, 10**10)
+                pool_state[prefix + "fee_rate"] = generator.choice([0, 5, 25, 1000])
+            pool_state["input_token_wo_feasible"] = generator.random() > 0.05
+            states.append((pool_state, generator.choice(self.pairs())))
+        return states
+
+    def random_pools(self, generator: random.Random, count: int) -> list:
+        return [self.module.prepare_pool(pool_state, self.fixed_parameters, *pair) for pool_state, pair in self.random_states(generator, count)]
+
+    def test_estimate_out_bounds_quote_out(self):
+        pool_math = self.module.pool_math
+        generator = random.Random(19)
+        for pool in self.random_pools(generator, 150):
+            bound = pool_math.liquidity_bound(pool)
+            amounts = [0, 1] + [int(10 ** generator.uniform(0, 24)) for _ in range(20)]
+            if bound.max_input_amount is not None:
+                amounts += [bound.max_input_amount - 1, bound.max_input_amount, bound.max_input_amount + 1]
+            for amount in amounts:
+                _, amount_out = pool_math.quote_out(pool, amount)
+                estimate = pool_math.estimate_out(pool, amount)
+                if estimate is None:
+                    self.assertIsNone(amount_out, amount)
+                    continue
+                if estimate.lower is not None:
+                    self.assertIsNotNone(amount_out, amount)
+                    self.assertLessEqual(estimate.lower, amount_out)
+                if amount_out is not None:
+                    self.assertLessEqual(amount_out, estimate.upper)
+
+    def test_estimate_error_is_the_half_width_of_estimate_out(self):
+        pool_math = self.module.pool_math
+        generator = random.Random(21)
+        for pool in self.random_pools(generator, 100):
+            for amount in [0, 1] + [int(10 ** generator.uniform(0, 24)) for _ in range(10)]:
+                error = pool_math.estimate_error(pool, amount)
+                if not all(base is None or base.feasible for base in (pool.input, pool.output)):
+                    self.assertIsNone(error)
+                    continue
+                estimate = pool_math.estimate_out(pool, amount)
+                if estimate is not None and estimate.lower is not None:
+                    self.assertAlmostEqual(error, (estimate.upper - estimate.lower) / 2, delta=error * 1e-12)
+                else:
+                    # defined past the limits too
+                    self.assertGreater(error, 0)
+
+    def test_best_quote_out_matches_exhaustive_search(self):
+        pool_math = self.module.pool_math
+        generator = random.Random(20)
+        quote_token = self.fixed_parameters["quote_token"]
+        pools = self.random_pools(generator, 300)
+        for output_address in (self.output_token.address, quote_token.address):
+            same_output = [pool for pool in pools if pool.output_address == output_address]
+            for _ in range(20):
+                order = int(10 ** generator.uniform(6, 20))
+                candidates = [(pool, order - order * generator.randrange(3) // 100) for pool in generator.sample(same_output, 30)]
+                # duplicates tie, and the first one wins
+                candidates += candidates[:5]
+                best = None
+                for index, (pool, input_amount) in enumerate(candidates):
+                    fee, amount_out = pool_math.quote_out(pool, input_amount)
+                    if amount_out is not None and (best is None or amount_out > best[2]):
+                        best = (index, fee, amount_out)
+                result = pool_math.best_quote_out(candidates)
+                self.assertEqual(result if result is None else tuple(result[:3]), best)
+        rejected = self.module.prepare_pool(dict(self.valid_pool_state, output_token_reserve=0), self.fixed_parameters, quote_token, self.output_token)
+        self.assertIsNone(pool_math.best_quote_out([(rejected, 10**9)]))
+        self.assertIsNone(pool_math.best_quote_out([]))
+
+    def test_instrumentation_records_calls(self):
+        metrics = InMemoryMetrics()
+        module = WOOFiLiquidityModule(instrumentation=metrics)
+        quote_token = self.fixed_parameters["quote_token"]
+        self.assertEqual(
+            module.get_amount_out(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, int(10e18)),
+            self.module.get_amount_out(self.valid_pool_state, self.fixed_parameters, self.input_token, self.output_token, int(10e18)),
+        )
+        pool = module.prepare_pool(self.valid_pool_state, self.fixed_parameters, quote_token, self.output_token)
+        module.get_amount_in(pool, None, quote_token, self.output_token, 10**8)
+        module.get_amounts_out(pool, None, quote_token, self.output_token, [10**9, 10**15])
+
+        self.assertEqual(metrics.calls("swap_base_to_base_out"), 1)
+        self.assertEqual(metrics.calls("sell_quote_token_in"), 1)
+        self.assertEqual(metrics.calls("sell_quote_token_out_batch"), 1)
+        self.assertEqual(metrics.rejection_counts("sell_quote_token_out"), {"max_notional_swap": 1})
+        self.assertEqual(metrics.rejection_counts("swap_base_to_base_out"), {})
+
+    def test_instrumentation_covers_every_entry_point(self):
+        metrics = InMemoryMetrics()
+        module = WOOFiLiquidityModule(instrumentation=metrics)
+        quote_token = self.fixed_parameters["quote_token"]
+        pool_state, fixed_parameters = self.valid_pool_state, self.fixed_parameters
+
+        # keyword calls take the same path
+        self.assertEqual(
+            module.get_amount_out(pool_state=pool_state, fixed_parameters=fixed_parameters, input_token=quote_token, output_token=self.output_token, input_amount=10**9),
+            self.module.get_amount_out(pool_state, fixed_parameters, quote_token, self.output_token, 10**9),
+        )
+        module.get_amounts_in(pool_state, fixed_parameters, self.input_token, self.output_token, output_amounts=[10**8, 10**11])
+        module.get_pair_amounts_out(pool_state, fixed_parameters, [(self.input_token, quote_token, 10**18), (quote_token, self.output_token, 2 * 10**12)])
+        module.get_state_amounts_out([(pool_state, fixed_parameters), (dict(pool_state, output_token_reserve=10), fixed_parameters)], quote_token, self.output_token, 10**9)
+        module.get_state_amounts_in([(pool_state, fixed_parameters)], self.input_token, quote_token, [10**30])
+        module.pool_math.sell_base_token_in(pool_state, fixed_parameters, self.input_token, 10**8)
+        # quotes made inside other methods are not recorded
+        module.get_liquidity_bound(pool_state, fixed_parameters, self.input_token, self.output_token)
+        module.apply_swap(pool_state, fixed_parameters, self.input_token, self.output_token, 10**18)
+
+        self.assertEqual(metrics.calls("sell_quote_token_out"), 1)
+        self.assertEqual(metrics.calls("swap_base_to_base_in_batch"), 1)
+        self.assertEqual(metrics.calls("sell_base_token_out_batch"), 1)
+        self.assertEqual(metrics.calls("sell_quote_token_out_batch"), 1)
+        self.assertEqual(metrics.calls("sell_quote_token_out_states"), 1)
+        self.assertEqual(metrics.calls("sell_base_token_in_states"), 1)
+        self.assertEqual(metrics.rejection_counts("sell_base_token_in"), {"insufficient_reserve": 1})
+        self.assertEqual(metrics.calls("sell_base_token_in"), 1)
+        self.assertEqual(metrics.calls("swap_base_to_base_out"), 0)
+        self.assertEqual(metrics.rejection_counts("swap_base_to_base_in"), {"insufficient_reserve": 1})
+        self.assertEqual(metrics.rejection_counts("sell_quote_token_out"), {"max_notional_swap": 1, "insufficient_reserve": 1})
+
+        # an instrumented module pickles with its sink, e.g. for worker processes
+        copy = pickle.loads(pickle.dumps(module))
+        copy.get_amount_out(pool_state, fixed_parameters, self.input_token, self.output_token, 10**18)
+        self.assertEqual(copy.instrumentation.calls("swap_base_to_base_out"), 1)
+        self.assertEqual(metrics.calls("swap_base_to_base_out"), 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+import random
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from engine.token_registry import token_address
+from modules.woofi_fuzz import random_case
+from modules.woofi_liquidity_module import WOOFiLiquidityModule, WOOFiPoolMath, WOOFiPreparedPool
+from modules.woofi_quote_surface import WOOFiQuoteSurface, WOOFiQuoteSurfaces
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from templates.liquidity_module import Token
+
+
+class TestWOOFiQuoteSurface(unittest.TestCase):
+    def setUp(self):
+        self.pool_math = WOOFiPoolMath()
+        pool_state = woofi_pool_state()
+        self.store = WOOFiStateStore(woofi_fixed_parameters(), pool_state["quote_token_reserve"])
+        for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+            self.store.set_token(token, **{field: pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+
+    def test_lookups_are_within_the_envelope(self):
+        generator = random.Random(0)
+        module = WOOFiLiquidityModule()
+        for _ in range(300):
+            case = random_case(generator, module)
+            pool = WOOFiPreparedPool(case.pool_state, case.fixed_parameters, case.input_token, case.output_token)
+            surface = WOOFiQuoteSurface(pool, points=generator.choice((4, 32, 128)))
+            limit = surface.max_input_amount or 10
+            for amount in [0, limit, limit + 1] + [generator.randrange(limit + 1) for _ in range(10)] + [int(limit ** generator.random()) for _ in range(10)]:
+                amount_out = self.pool_math.quote_out(pool, amount)[1]
+                surface_amount_out, error = surface.lookup(amount)
+                if amount_out is None:
+                    self.assertIsNone(surface_amount_out)
+                else:
+                    self.assertLessEqual(abs(surface_amount_out - amount_out), error, case.as_dict())
+
+    def test_samples_and_exact_lookups(self):
+        pool = self.store.prepare_pool(WETH, CBBTC)
+        surface = WOOFiQuoteSurface(pool, points=16)
+        self.assertEqual(surface.inputs[0], 0)
+        self.assertEqual(surface.inputs[-1], self.pool_math.liquidity_bound(pool).max_input_amount)
+        self.assertLessEqual(len(surface.inputs), 17)
+        for amount in surface.inputs:
+            self.assertEqual(surface.lookup(amount), (self.pool_math.quote_out(pool, amount)[1], 0))
+
+        amount = surface.inputs[-1] // 3
+        self.assertGreater(surface.lookup(amount)[1], 0)
+        self.assertEqual(surface.lookup(amount, exact=True), (self.pool_math.quote_out(pool, amount)[1], 0))
+        self.assertEqual(surface.lookup(surface.inputs[-1] + 1), (None, None))
+        self.assertEqual(surface.lookup(surface.inputs[-1] + 1, exact=True), (None, None))
+
+    def test_infeasible_pool_rejects_every_amount(self):
+        self.store.update_token(WETH.address, wo_feasible=False)
+        surface = WOOFiQuoteSurface(self.store.prepare_pool(WETH, CBBTC))
+        self.assertEqual(surface.inputs, [])
+        self.assertEqual(surface.lookup(10**18), (None, None))
+
+    def test_background_rebuilds_changed_pairs(self):
+        surfaces = WOOFiQuoteSurfaces(points=32)
+        self.addCleanup(surfaces.close)
+        with self.assertRaises(KeyError):
+            surfaces.quote(WETH, CBBTC, 10**18)
+
+        surfaces.submit(self.store)
+        version, built = surfaces.wait_for_version(self.store.version, timeout=10)
+        self.assertEqual(version, self.store.version)
+        # every ordered pair of WETH, cbBTC and USDC
+        self.assertEqual(len(built), 6)
+        pool = self.store.prepare_pool(WETH, USDC)
+        self.assertEqual(surfaces.quote(WETH, USDC, 10**15, exact=True), (self.pool_math.quote_out(pool, 10**15)[1], 0))
+
+        price = self.store.record(CBBTC.address)["price"]
+        store = self.store.with_updates({CBBTC.address: {"price": price * 2}})
+        surfaces.submit(store)
+        version, rebuilt = surfaces.wait_for_version(store.version, timeout=10)
+        self.assertEqual(version, store.version)
+        # only the pairs of cbBTC are rebuilt
+        weth_usdc, weth_cbbtc = (token_address(WETH), token_address(USDC)), (token_address(WETH), token_address(CBBTC))
+        self.assertIs(rebuilt[weth_usdc], built[weth_usdc])
+        self.assertIsNot(rebuilt[weth_cbbtc], built[weth_cbbtc])
+        # surfaces are keyed by normalized address, whatever the casing of the tokens looked up
+        lower_usdc = Token(address=USDC.address.lower(), decimals=USDC.decimals, symbol=USDC.symbol, reference_price=USDC.reference_price)
+        self.assertIs(surfaces.surface(WETH, lower_usdc), rebuilt[weth_usdc])
+        surface_amount_out, error = surfaces.quote(WETH, CBBTC, 10**18)
+        amount_out = self.pool_math.quote_out(store.prepare_pool(WETH, CBBTC), 10**18)[1]
+        self.assertLessEqual(abs(surface_amount_out - amount_out), error)
+
+        surfaces.close()
+        with self.assertRaises(RuntimeError):
+            surfaces.submit(store)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+from decimal import Decimal
+import os
+import tempfile
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_snapshot import HEADER, WOOFiSnapshot, write_snapshot
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from templates.liquidity_module import Token
+
+
+class TestWOOFiSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.module = WOOFiLiquidityModule()
+        pool_state = woofi_pool_state()
+        self.stores = []
+        for quote_token_reserve, price in [(pool_state["quote_token_reserve"], 175000000000), (10**6, 180000000000)]:
+            store = WOOFiStateStore(woofi_fixed_parameters(), quote_token_reserve)
+            for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+                store.set_token(token, **{field: pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+            store.update_token(WETH.address, price=price)
+            self.stores.append(store)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "woofi.snapshot")
+        write_snapshot(self.path, 24_000_000, self.stores)
+
+    def test_round_trip(self):
+        with WOOFiSnapshot(self.path) as snapshot:
+            self.assertEqual((snapshot.block_number, snapshot.pool_count, snapshot.record_count), (24_000_000, 2, 4))
+            # the tokens are shared between the pools
+            self.assertEqual(snapshot.token_count, 3)
+            for pool, store in enumerate(self.stores):
+                self.assertEqual([token.address for token in snapshot.tokens(pool)], [token.address for token in store.tokens()])
+                fixed_parameters = snapshot.fixed_parameters(pool)
+                self.assertEqual({key: value for key, value in fixed_parameters.items() if key != "quote_token"},
+                                 {key: value for key, value in store.fixed_parameters.items() if key != "quote_token"})
+                for input_token, output_token in [(WETH, CBBTC), (CBBTC, USDC), (USDC, WETH)]:
+                    self.assertEqual(dict(snapshot.pair_state(pool, input_token, output_token)), dict(store.pair_state(input_token, output_token)))
+                    amount = 10 ** (input_token.decimals - 1)
+                    self.assertEqual(
+                        self.module.get_amount_out(snapshot.prepare_pool(pool, input_token, output_token), None, input_token, output_token, amount),
+                        self.module.get_amount_out(store.pair_state(input_token, output_token), store.fixed_parameters, input_token, output_token, amount),
+                    )
+
+    def test_tokens_and_state_store(self):
+        with WOOFiSnapshot(self.path) as snapshot:
+            token = snapshot.token(0)
+            self.assertEqual((token.address, token.symbol, token.decimals, token.reference_price), (WETH.address, "WETH", 18, Decimal(1_750)))
+            store = snapshot.state_store(1)
+            self.assertEqual(dict(store.pair_state(WETH, CBBTC)), dict(self.stores[1].pair_state(WETH, CBBTC)))
+            lower_cbbtc = Token(address=CBBTC.address.lower(), decimals=8, symbol="cbBTC", reference_price=CBBTC.reference_price)
+            self.assertEqual(dict(snapshot.pair_state(1, WETH, lower_cbbtc)), dict(store.pair_state(WETH, CBBTC)))
+            with self.assertRaises(IndexError):
+                snapshot.fixed_parameters(2)
+
+    def test_values_round_trip_exactly(self):
+        huge = Token(address="0x" + "ab" * 20, decimals=24, symbol="HUGE", reference_price=Decimal("0.000000123456789"))
+        self.stores[0].set_token(huge, **dict(self.stores[0].record(WETH.address), reserve=2**126 + 1, price=-1, wo_feasible=False))
+        write_snapshot(self.path, 1, self.stores)
+        with WOOFiSnapshot(self.path) as snapshot:
+            self.assertEqual(dict(snapshot.state_store(0).record(huge.address)), dict(self.stores[0].record(huge.address)))
+            self.assertEqual(snapshot.tokens(0)[-1].reference_price, huge.reference_price)
+
+        self.stores[0].update_token(huge.address, reserve=2**127)
+        with self.assertRaises(ValueError):
+            write_snapshot(self.path, 1, self.stores)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "r+b") as file:
+            file.write(b"NOTWOOFI")
+        with self.assertRaises(ValueError):
+            WOOFiSnapshot(self.path)
+
+        write_snapshot(self.path, 1, self.stores)
+        with open(self.path, "r+b") as file:
+            file.truncate(HEADER.size + 1)
+        with self.assertRaises(ValueError):
+            WOOFiSnapshot(self.path)
@@ -0,0 +1,159 @@
+from decimal import Decimal
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiFeeWindow, WOOFiStateStore, WOOFiSwapSimulation
+from templates.liquidity_module import Token
+
+
+class TestWOOFiStateStore(unittest.TestCase):
+    def setUp(self):
+        self.module = WOOFiLiquidityModule()
+        self.fixed_parameters = woofi_fixed_parameters()
+        self.pool_state = woofi_pool_state()
+        self.store = WOOFiStateStore(self.fixed_parameters, self.pool_state["quote_token_reserve"])
+        for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+            self.store.set_token(token, **{field: self.pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+
+    def test_pair_state_matches_pool_state(self):
+        self.assertEqual(dict(self.store.pair_state(WETH, CBBTC)), self.pool_state)
+        for input_token, output_token, amount in [(WETH, CBBTC, int(10e18)), (USDC, CBBTC, 10**9), (WETH, USDC, 10**17)]:
+            view = self.store.pair_state(input_token, output_token)
+            expected = self.module.get_amount_out(dict(view), self.fixed_parameters, input_token, output_token, amount)
+            self.assertIsNotNone(expected[1])
+            self.assertEqual(self.module.get_amount_out(view, self.fixed_parameters, input_token, output_token, amount), expected)
+            self.assertEqual(self.module.get_amount_out(self.store.prepare_pool(input_token, output_token), None, input_token, output_token, amount), expected)
+        # the output reserve of a sell base pair is the quote token reserve
+        self.assertEqual(self.store.pair_state(WETH, USDC)["output_token_reserve"], self.pool_state["quote_token_reserve"])
+
+    def test_addresses_in_any_casing(self):
+        lower_cbbtc = Token(address=CBBTC.address.lower(), decimals=8, symbol="cbBTC", reference_price=CBBTC.reference_price)
+        self.assertIs(self.store.record(CBBTC.address.upper().replace("0X", "0x")), self.store.record(CBBTC.address))
+        self.assertIs(self.store.prepare_pool(WETH, lower_cbbtc), self.store.prepare_pool(WETH, CBBTC))
+        self.store.set_token(lower_cbbtc, **self.store.record(CBBTC.address))
+        self.assertEqual(len(self.store.tokens()), 3)
+        with self.assertRaises(ValueError):
+            self.store.update_token(USDC.address.lower(), reserve=0)
+
+    def test_update_token_is_copy_on_write(self):
+        view = self.store.pair_state(WETH, CBBTC)
+        self.store.update_token(WETH.address, price=180000000000, spread=10**15)
+        self.assertEqual(view["input_token_price"], 175000000000)
+        updated = self.store.pair_state(WETH, CBBTC)
+        self.assertEqual((updated["input_token_price"], updated["input_token_spread"]), (180000000000, 10**15))
+        self.assertEqual(updated["input_token_coeff"], self.pool_state["input_token_coeff"])
+        self.assertEqual(self.store.version, 3)
+
+    def test_update_invalidates_only_touched_pairs(self):
+        dai = Token(address="0x50c5725949A6F0c72E6C4a641F24049A917DB0Cb", decimals=18, symbol="DAI", reference_price=Decimal(1))
+        self.store.set_token(dai, **{field: self.pool_state["input_token_" + field] for field in TOKEN_STATE_FIELDS})
+        pools = {pair: self.store.prepare_pool(*pair) for pair in [(WETH, CBBTC), (CBBTC, dai), (USDC, dai), (dai, USDC)]}
+
+        self.store.update_token(WETH.address, price=180000000000)
+        self.assertIsNot(self.store.prepare_pool(WETH, CBBTC), pools[WETH, CBBTC])
+        for pair in [(CBBTC, dai), (USDC, dai), (dai, USDC)]:
+            self.assertIs(self.store.prepare_pool(*pair), pools[pair])
+
+        # the quote reserve is read by base to base pools as well
+        self.store.set_quote_token_reserve(10**6)
+        self.assertIsNot(self.store.prepare_pool(CBBTC, dai), pools[CBBTC, dai])
+        self.assertEqual(self.store.prepare_pool(CBBTC, dai).quote_token_reserve, 10**6)
+
+    def test_swap_simulation_matches_apply_swap(self):
+        simulation = WOOFiSwapSimulation(self.store, self.module.pool_math)
+        records = {token.address: self.store.record(token.address) for token in self.store.tokens()}
+        # a route that crosses the pool three times; every leg touches the shared quote token reserve
+        for input_token, output_token, amount in [(WETH, USDC, 10**17), (USDC, CBBTC, 10**8), (WETH, CBBTC, 2 * 10**18)]:
+            state = dict(simulation.pair_state(input_token, output_token))
+            fee, amount_out, expected = self.module.apply_swap(state, self.fixed_parameters, input_token, output_token, amount)
+            self.assertIsNotNone(amount_out)
+            self.assertEqual(simulation.swap(input_token, output_token, amount), (fee, amount_out))
+            self.assertEqual(dict(simulation.pair_state(input_token, output_token)), expected)
+        # the original store is untouched
+        self.assertEqual({token.address: self.store.record(token.address) for token in self.store.tokens()}, records)
+
+    def test_swap_simulation_rollback(self):
+        simulation = WOOFiSwapSimulation(self.store)
+        start = simulation.version
+        self.assertEqual(simulation.swap(WETH, CBBTC, 10**30), (None, None))
+        self.assertEqual(simulation.version, start)
+
+        simulation.swap(WETH, CBBTC, 10**18)
+        branch = simulation.version
+        branch_records = {token.address: simulation.record(token.address) for token in simulation.tokens()}
+        first = simulation.swap(USDC, WETH, 10**9)
+        dai = Token(address="0x50c5725949A6F0c72E6C4a641F24049A917DB0Cb", decimals=18, symbol="DAI", reference_price=Decimal(1))
+        simulation.set_token(dai, **simulation.record(WETH.address))
+
+        simulation.rollback(branch)
+        self.assertEqual(simulation.version, branch)
+        self.assertEqual({token.address: simulation.record(token.address) for token in simulation.tokens()}, branch_records)
+        # the prepared pool of the rolled back pair is rebuilt from the restored records
+        self.assertEqual(simulation.swap(USDC, WETH, 10**9), first)
+
+        simulation.rollback(start)
+        self.assertEqual(dict(simulation.pair_state(WETH, CBBTC)), dict(self.store.pair_state(WETH, CBBTC)))
+        with self.assertRaises(ValueError):
+            simulation.rollback(start - 1)
+
+    def test_with_updates_leaves_the_store_unchanged(self):
+        dai = Token(address="0x50c5725949A6F0c72E6C4a641F24049A917DB0Cb", decimals=18, symbol="DAI", reference_price=Decimal(1))
+        self.store.set_token(dai, **{field: self.pool_state["input_token_" + field] for field in TOKEN_STATE_FIELDS})
+        untouched = self.store.prepare_pool(dai, CBBTC)
+        touched = self.store.prepare_pool(WETH, CBBTC)
+        before = dict(self.store.pair_state(WETH, CBBTC))
+
+        updated = self.store.with_updates({WETH.address: {"price": 180000000000, "spread": 10**15}})
+        self.assertEqual(dict(self.store.pair_state(WETH, CBBTC)), before)
+        self.assertIs(self.store.prepare_pool(WETH, CBBTC), touched)
+        self.assertEqual(updated.pair_state(WETH, CBBTC)["input_token_price"], 180000000000)
+        self.assertEqual(updated.version, self.store.version + 1)
+        # pairs without an updated token keep their prepared pools
+        self.assertIs(updated.prepare_pool(dai, CBBTC), untouched)
+        self.assertIsNot(updated.prepare_pool(WETH, CBBTC), touched)
+        # every base to base pair reads the quote token reserve
+        updated = updated.with_updates({USDC.address: {"reserve": 5}})
+        self.assertEqual(updated.pair_state(WETH, CBBTC)["quote_token_reserve"], 5)
+        self.assertIsNot(updated.prepare_pool(dai, CBBTC), untouched)
+        with self.assertRaises(ValueError):
+            self.store.with_updates({USDC.address: {"price": 1}})
+        with self.assertRaises(KeyError):
+            self.store.with_updates({"0x0": {"price": 1}})
+
+    def test_fee_window(self):
+        window = WOOFiFeeWindow(buckets=4, bucket_seconds=10)
+        self.assertEqual((window.total, window.seconds()), (0, 0))
+        for timestamp, fee in [(100, 1), (105, 2), (119, 4), (112, 8)]:
+            self.assertTrue(window.add(timestamp, fee))
+        self.assertEqual((window.total, window.seconds()), (15, 20))
+        # buckets 10 and 11 are still in the window ending in bucket 13, then leave it one at a time
+        window.advance(139)
+        self.assertEqual((window.total, window.seconds()), (15, 40))
+        window.advance(149)
+        self.assertEqual(window.total, 12)
+        self.assertFalse(window.add(99, 16))
+        window.add(145, 32)
+        window.advance(150)
+        self.assertEqual(window.total, 32)
+        window.advance(10**6)
+        self.assertEqual((window.total, window.seconds()), (0, 40))
+
+
+        # versions of a store get copies of its fees window
+        self.store.fees.add(100, 3)
+        updated = self.store.with_updates({WETH.address: {"price": 1}})
+        updated.fees.add(100, 7)
+        self.assertEqual((self.store.fees.total, updated.fees.total), (3, 10))
+
+    def test_rejects_bad_fields(self):
+        with self.assertRaises(ValueError):
+            self.store.update_token(WETH.address, oracle_price=1)
+        with self.assertRaises(ValueError):
+            self.store.set_token(WETH, price=1)
+        with self.assertRaises(KeyError):
+            self.store.update_token("0x0", price=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+from decimal import Decimal
+import random
+import unittest
+
+from benchmarks.woofi_fixtures import CBBTC, USDC, WETH, woofi_fixed_parameters, woofi_pool_state
+from modules.woofi_liquidity_module import WOOFiLiquidityModule
+from modules.woofi_state_store import TOKEN_STATE_FIELDS, WOOFiStateStore
+from modules.woofi_tvl import WOOFiTVLAggregator
+from templates.liquidity_module import Token
+
+DAI = Token(address="0x50c5725949A6F0c72E6C4a641F24049A917DB0Cb", decimals=18, symbol="DAI", reference_price=Decimal(1))
+
+
+class TestWOOFiTVLAggregator(unittest.TestCase):
+    def setUp(self):
+        self.module = WOOFiLiquidityModule()
+        pool_state = woofi_pool_state()
+        self.stores = {}
+        for pool, quote_reference_price in [("base", Decimal(1)), ("arbitrum", Decimal("0.000571"))]:
+            fixed_parameters = dict(woofi_fixed_parameters(), quote_token=Token(address=USDC.address, symbol="USDC", decimals=6, reference_price=quote_reference_price))
+            store = WOOFiStateStore(fixed_parameters, pool_state["quote_token_reserve"])
+            for token, prefix in [(WETH, "input_token_"), (CBBTC, "output_token_")]:
+                store.set_token(token, **{field: pool_state[prefix + field] for field in TOKEN_STATE_FIELDS})
+            self.stores[pool] = store
+        self.aggregator = WOOFiTVLAggregator()
+        for pool, store in self.stores.items():
+            self.aggregator.add_pool(pool, store)
+
+    def assert_totals_match_rescan(self):
+        for pool, store in self.stores.items():
+            self.assertEqual(self.aggregator.tvl(pool), self.module.get_tvl(store))
+            for token in (WETH, CBBTC, USDC, DAI):
+                self.assertEqual(self.aggregator.tvl(pool, token), self.module.get_tvl(store, token))
+        # sums over pools of the rounded Decimals may differ in the last digit
+        for token in (WETH, CBBTC, USDC, DAI):
+            expected = sum(self.module.get_tvl(store, token) for store in self.stores.values())
+            self.assertAlmostEqual(self.aggregator.tvl(token=token), expected, delta=expected * Decimal(1e-25))
+        expected = sum(self.module.get_tvl(store) for store in self.stores.values())
+        self.assertAlmostEqual(self.aggregator.tvl(), expected, delta=expected * Decimal(1e-25))
+
+    def test_incremental_updates_match_rescan(self):
+        self.assert_totals_match_rescan()
+        generator = random.Random(21)
+        for _ in range(200):
+            pool = generator.choice(list(self.stores))
+            token = generator.choice([WETH, CBBTC, USDC])
+            if token is USDC:
+                self.aggregator.update_token(pool, token.address, reserve=generator.randrange(10**12))
+            else:
+                fields = generator.choice([{"price": generator.randrange(1, 10**14)}, {"reserve": generator.randrange(10**22)}, {"spread": 10**15}])
+                self.aggregator.update_token(pool, token.address, **fields)
+        self.assert_totals_match_rescan()
+
+        self.stores["base"].set_token(DAI, **dict(self.stores["base"].record(WETH.address), price=10**8))
+        self.aggregator.revalue("base", [DAI.address])
+        updated = self.stores["arbitrum"].with_updates({WETH.address: {"reserve": 7}})
+        self.stores["arbitrum"] = updated
+        self.aggregator.set_store("arbitrum", updated, [WETH.address])
+        self.assert_totals_match_rescan()
+
+        self.aggregator.remove_pool("base")
+        del self.stores["base"]
+        self.assert_totals_match_rescan()
+
+    def test_apy(self):
+        start = 472_222 * 3600
+        for minute in range(0, 24 * 60, 10):
+            self.aggregator.record_fee("base", start + minute * 60, 10**6)
+        self.assertEqual(self.aggregator.apy("base"), self.module.get_apy(self.stores["base"]))
+        self.assertAlmostEqual(self.aggregator.apy("base"), Decimal(144 * 365) / 9_376_000, delta=Decimal(1e-20))
+        self.assertEqual(self.aggregator.apy("arbitrum"), 0)
+        self.assertAlmostEqual(self.aggregator.apy(), Decimal(144 * 365) / (9_376_000 * Decimal("1.000571")), delta=Decimal(1e-20))
+        # half of the fees leave the window
+        self.assertAlmostEqual(self.aggregator.apy("base", start + 36 * 3600 - 1), Decimal(72 * 365) / 9_376_000, delta=Decimal(1e-20))
+        self.assertEqual(self.aggregator.apy(timestamp=start + 10**6), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()